@@ -2,7 +2,14 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict
 
 class BaseCollector(ABC):
-    """采集器基类"""
+    """采集器基类
+
+    设置了name的子类由运行时自动发现; interval为默认采集间隔(秒),
+    可在配置中按采集器覆盖。
+    """
+    
+    name: str = ""
+    interval: float = 60.0
     
     @abstractmethod
     async def collect(self) -> Dict[str, Any]:
@@ -12,4 +19,12 @@ class BaseCollector(ABC):
     @abstractmethod
     async def validate(self, data: Dict[str, Any]) -> bool:
         """验证采集数据"""
-        pass 
\ No newline at end of file
+        pass
+
+    async def commit(self, data: Dict[str, Any]) -> None:
+        """collect返回的data已交给发送器(已发送或已持久化)后调用"""
+        pass
+
+    async def close(self) -> None:
+        """释放采集器持有的资源"""
+        pass
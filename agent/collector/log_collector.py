@@ -1,33 +1,259 @@
 import asyncio
-from typing import List
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 from .base import BaseCollector
 
+# 单次采集每个文件最多读取的字节数, 避免积压时一次占用过多内存
+READ_CHUNK_SIZE = 256 * 1024
+MAX_READ_BYTES = 8 * 1024 * 1024
+
+class _OpenFile:
+    """保持打开的日志文件, 跨采集周期复用句柄
+
+    offset为已读完整行的结束位置, 行尾残片不计入, 留待下次读取。
+    """
+
+    def __init__(self, path: str, offset: int):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        st = os.fstat(self.fd)
+        self.inode = st.st_ino
+        self.offset = offset if offset <= st.st_size else 0
+        os.lseek(self.fd, self.offset, os.SEEK_SET)
+        self.partial = b""
+        self.rotated_at: Optional[float] = None
+
+    def read_lines(self) -> List[str]:
+        if os.fstat(self.fd).st_size < self.offset + len(self.partial):
+            # 文件被截断(copytruncate), 从头读取
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            self.offset = 0
+            self.partial = b""
+        lines = []
+        read = 0
+        while read < MAX_READ_BYTES:
+            chunk = os.read(self.fd, READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            read += len(chunk)
+            parts = (self.partial + chunk).split(b"\n")
+            self.partial = parts.pop()
+            for part in parts:
+                self.offset += len(part) + 1
+                lines.append(part.decode("utf-8", errors="replace").rstrip("\r"))
+        return lines
+
+    def flush_partial(self) -> List[str]:
+        """轮转后的旧文件不再有写入时, 把最后一行残片作为完整行"""
+        if not self.partial:
+            return []
+        line = self.partial.decode("utf-8", errors="replace").rstrip("\r")
+        self.offset += len(self.partial)
+        self.partial = b""
+        return [line]
+
+    def close(self) -> None:
+        os.close(self.fd)
+
 class LogCollector(BaseCollector):
+    """增量日志采集器
+
+    文件句柄在采集周期之间保持打开, 位置以 (inode, offset) 记录, 尚未
+    读完的轮转旧文件也各自记录。文件被改名轮转时旧句柄继续读取, 在
+    rotate_grace秒内没有新写入后才把残片作为最后一行并关闭; 被截断时
+    从头读取。
+
+    每次采集的位置先暂存, 运行时在该次数据交给发送器后调用commit,
+    才写入checkpoint_file, 重启后从最后一次已交付的位置继续。
+    """
+
+    name = "log"
+    interval = 5.0
+
     def __init__(self, config: dict):
         self.log_paths = config["log_paths"]
-        self.patterns = config["patterns"]
-        self.last_positions = {}
+        self.patterns = [re.compile(p) for p in config.get("patterns") or []]
+        self.checkpoint_file: Optional[str] = config.get("checkpoint_file")
+        self.rotate_grace = float(config.get("rotate_grace", 5.0))
+        # path -> {"inode": int, "offset": int, "rotated": [...]}, 已交付的位置
+        self.last_positions: Dict[str, Dict] = self._load_checkpoints()
+        self._files: Dict[str, _OpenFile] = {}
+        # 已轮转、仍在读到末尾的旧文件
+        self._rotated: List[_OpenFile] = []
+        # 本进程已打开过的路径, 只有首次打开时按检查点补读旧文件
+        self._seen: Set[str] = set()
+        # id(采集结果) -> 该次采集后的位置, 等待commit
+        self._pending: Dict[int, Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
 
     async def collect(self) -> dict:
-        """增量采集日志"""
-        logs = []
+        """增量采集日志, 文件读取在线程中执行"""
+        return await asyncio.to_thread(self._collect)
+
+    def _collect(self) -> dict:
+        now = time.monotonic()
+        lines: List[Tuple[str, str]] = []
         for path in self.log_paths:
-            position = self.last_positions.get(path, 0)
-            new_logs = await self._collect_file(path, position)
-            logs.extend(new_logs)
-        return {"logs": logs}
+            if path not in self._seen:
+                # 首次打开, 停机期间轮转的旧文件先于新文件读取
+                try:
+                    self._open(path, os.stat(path).st_ino, now)
+                except OSError:
+                    pass
+        for old in list(self._rotated):
+            try:
+                got = old.read_lines()
+            except OSError:
+                got = []
+            if got:
+                old.rotated_at = now
+            elif now - old.rotated_at >= self.rotate_grace:
+                got = old.flush_partial()
+                self._rotated.remove(old)
+                old.close()
+            lines.extend((old.path, line) for line in got)
+        for path in self.log_paths:
+            lines.extend((path, line) for line in self._collect_file(path, now))
+
+        data = {"logs": [
+            self._parse_log(path, line) for path, line in lines if self._match_patterns(line)
+        ]}
+        with self._lock:
+            self._pending[id(data)] = self._positions()
+        return data
+
+    async def commit(self, data: dict) -> None:
+        """data已交给发送器, 推进检查点
 
-    async def _collect_file(self, path: str, position: int) -> List[dict]:
-        """采集单个日志文件"""
+        发送队列按顺序交付, 更早的采集结果已交付或已被丢弃, 一并移除。
+        """
+        positions = None
+        with self._lock:
+            for key in list(self._pending):
+                snapshot = self._pending.pop(key)
+                if key == id(data):
+                    positions = snapshot
+                    break
+        if positions is None:
+            return
+        self.last_positions = positions
+        await asyncio.to_thread(self._save_checkpoints)
+
+    async def validate(self, data: dict) -> bool:
+        return isinstance(data.get("logs"), list)
+
+    async def close(self) -> None:
+        self._save_checkpoints()
+        for opened in list(self._files.values()) + self._rotated:
+            opened.close()
+        self._files.clear()
+        self._rotated.clear()
+
+    def _collect_file(self, path: str, now: float) -> List[str]:
+        """采集单个日志文件, 处理轮转与截断"""
+        lines = []
         try:
-            with open(path, 'r') as f:
-                f.seek(position)
-                new_logs = []
-                for line in f:
-                    if self._match_patterns(line):
-                        new_logs.append(self._parse_log(line))
-                self.last_positions[path] = f.tell()
-                return new_logs
-        except Exception as e:
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                inode = None
+
+            current = self._files.get(path)
+            if current and current.inode != inode:
+                # 已轮转: 旧句柄转入待读完列表, 写入方可能仍持有旧文件
+                lines.extend(current.read_lines())
+                current.rotated_at = now
+                self._rotated.append(current)
+                del self._files[path]
+                current = None
+
+            if current is None and inode is not None:
+                current = self._open(path, inode, now)
+            if current is not None:
+                lines.extend(current.read_lines())
+        except OSError:
             # 处理文件访问异常
-            return [] 
\ No newline at end of file
+            pass
+        return lines
+
+    def _open(self, path: str, inode: int, now: float) -> _OpenFile:
+        checkpoint = self.last_positions.get(path) if path not in self._seen else None
+        self._seen.add(path)
+        offset = 0
+        if checkpoint:
+            entries = checkpoint.get("rotated", []) + [checkpoint]
+            for entry in entries:
+                if entry["inode"] == inode:
+                    offset = entry["offset"]
+                    continue
+                # 停机前未读完或停机期间轮转的旧文件, 从记录的位置补读
+                old_path = self._find_by_inode(path, entry["inode"])
+                if old_path:
+                    old = _OpenFile(old_path, entry["offset"])
+                    old.path = path
+                    old.rotated_at = now
+                    self._rotated.append(old)
+        opened = _OpenFile(path, offset)
+        self._files[path] = opened
+        return opened
+
+    def _positions(self) -> Dict[str, Dict]:
+        """当前已读位置: 当前文件的 (inode, offset), 未读完的旧文件记录在rotated中"""
+        positions = dict(self.last_positions)
+        for path in self.log_paths:
+            entries = [
+                {"inode": opened.inode, "offset": opened.offset}
+                for opened in self._rotated if opened.path == path
+            ]
+            if path in self._files:
+                opened = self._files[path]
+                entries.append({"inode": opened.inode, "offset": opened.offset})
+            if not entries:
+                continue
+            position = dict(entries[-1])
+            if len(entries) > 1:
+                position["rotated"] = entries[:-1]
+            positions[path] = position
+        return positions
+
+    @staticmethod
+    def _find_by_inode(path: str, inode: int) -> Optional[str]:
+        directory = os.path.dirname(path) or "."
+        base = os.path.basename(path)
+        for name in sorted(os.listdir(directory)):
+            candidate = os.path.join(directory, name)
+            if name.startswith(base) and os.stat(candidate).st_ino == inode:
+                return candidate
+        return None
+
+    def _match_patterns(self, line: str) -> bool:
+        if not self.patterns:
+            return True
+        return any(pattern.search(line) for pattern in self.patterns)
+
+    def _parse_log(self, path: str, line: str) -> dict:
+        return {"path": path, "timestamp": time.time(), "message": line}
+
+    def _load_checkpoints(self) -> Dict[str, Dict]:
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return {}
+        try:
+            with open(self.checkpoint_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoints(self) -> None:
+        if not self.checkpoint_file:
+            return
+        tmp = self.checkpoint_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.last_positions, f)
+            os.replace(tmp, self.checkpoint_file)
+        except OSError:
+            pass
@@ -0,0 +1,139 @@
+import asyncio
+import os
+from typing import Any, Dict, List
+import psutil
+from .base import BaseCollector
+
+class SystemCollector(BaseCollector):
+    """CPU、负载与内存"""
+
+    name = "system"
+    interval = 10.0
+
+    def __init__(self, config: dict):
+        psutil.cpu_percent()  # 首次调用只建立基准
+
+    async def collect(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._collect)
+
+    def _collect(self) -> Dict[str, Any]:
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        return {
+            "cpu_percent": psutil.cpu_percent(),
+            "load": list(os.getloadavg()) if hasattr(os, "getloadavg") else None,
+            "memory_percent": memory.percent,
+            "memory_available": memory.available,
+            "swap_percent": swap.percent,
+        }
+
+    async def validate(self, data: Dict[str, Any]) -> bool:
+        return "cpu_percent" in data and "memory_percent" in data
+
+class DiskCollector(BaseCollector):
+    """各分区使用率与各磁盘IO计数"""
+
+    name = "disk"
+    interval = 60.0
+
+    def __init__(self, config: dict):
+        self.all_partitions = config.get("all_partitions", False)
+
+    async def collect(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._collect)
+
+    def _collect(self) -> Dict[str, Any]:
+        partitions = {}
+        for part in psutil.disk_partitions(all=self.all_partitions):
+            try:
+                usage = psutil.disk_usage(part.mountpoint)
+            except OSError:
+                # 未就绪的光驱、已卸载的网络盘等
+                continue
+            partitions[part.mountpoint] = {
+                "device": part.device,
+                "fstype": part.fstype,
+                "total": usage.total,
+                "used": usage.used,
+                "percent": usage.percent,
+            }
+        io = psutil.disk_io_counters(perdisk=True) or {}
+        return {
+            "partitions": partitions,
+            "io": {disk: counters._asdict() for disk, counters in io.items()},
+        }
+
+    async def validate(self, data: Dict[str, Any]) -> bool:
+        return isinstance(data.get("partitions"), dict)
+
+class NetworkCollector(BaseCollector):
+    """各网卡流量计数"""
+
+    name = "network"
+    interval = 10.0
+
+    def __init__(self, config: dict):
+        # 默认跳过回环网卡
+        self.exclude = set(config.get("exclude", ["lo"]))
+
+    async def collect(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._collect)
+
+    def _collect(self) -> Dict[str, Any]:
+        counters = psutil.net_io_counters(pernic=True)
+        return {
+            "interfaces": {
+                nic: c._asdict() for nic, c in counters.items() if nic not in self.exclude
+            }
+        }
+
+    async def validate(self, data: Dict[str, Any]) -> bool:
+        return isinstance(data.get("interfaces"), dict)
+
+class ProcessCollector(BaseCollector):
+    """按CPU和内存排序的前N个进程
+
+    Process对象跨周期保留, cpu_percent为两次采集之间的占用;
+    遍历进程表在线程中执行, 不阻塞事件循环。
+    """
+
+    name = "process"
+    interval = 30.0
+
+    def __init__(self, config: dict):
+        self.top_n = int(config.get("top_n", 10))
+        self._procs: Dict[int, psutil.Process] = {}
+
+    async def collect(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._collect)
+
+    def _collect(self) -> Dict[str, Any]:
+        rows: List[Dict[str, Any]] = []
+        seen = set()
+        for proc in psutil.process_iter(["pid", "name", "username", "memory_percent"]):
+            info = proc.info
+            pid = info["pid"]
+            seen.add(pid)
+            try:
+                # 沿用上次的对象, 否则cpu_percent总是0
+                cpu = self._procs.setdefault(pid, proc).cpu_percent()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            rows.append({
+                "pid": pid,
+                "name": info["name"],
+                "user": info["username"],
+                "cpu_percent": cpu,
+                "memory_percent": round(info["memory_percent"] or 0.0, 2),
+            })
+        for pid in set(self._procs) - seen:
+            del self._procs[pid]
+
+        top = {}
+        for key in ("cpu_percent", "memory_percent"):
+            for row in sorted(rows, key=lambda r: r[key], reverse=True)[:self.top_n]:
+                top[row["pid"]] = row
+        return {"count": len(rows), "top": list(top.values())}
+
+    async def validate(self, data: Dict[str, Any]) -> bool:
+        return isinstance(data.get("top"), list)
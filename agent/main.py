@@ -0,0 +1,43 @@
+import asyncio
+import json
+import logging
+import signal
+import sys
+from runtime import AgentRuntime
+from sender.http import HttpSender
+
+logger = logging.getLogger(__name__)
+
+def load_config(path: str) -> dict:
+    """读取JSON配置文件
+
+    顶层为运行时配置(hostname, jitter, send_queue_size, collectors),
+    sender为HttpSender的配置(server_url, auth_key, retry等)。
+    """
+    with open(path) as f:
+        return json.load(f)
+
+async def serve(config: dict) -> None:
+    """运行采集运行时, 收到SIGTERM/SIGINT后停止"""
+    runtime = AgentRuntime(config, HttpSender(config["sender"]))
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    task = asyncio.create_task(runtime.run())
+    waiter = asyncio.create_task(stopping.wait())
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    logger.info("Stopping agent runtime")
+    await runtime.stop()
+    waiter.cancel()
+    await task
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) != 2:
+        print("Usage: python main.py <config.json>")
+        sys.exit(1)
+
+    asyncio.run(serve(load_config(sys.argv[1])))
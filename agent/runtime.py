@@ -0,0 +1,276 @@
+import asyncio
+import importlib
+import logging
+import pkgutil
+import random
+import socket
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type
+from collector.base import BaseCollector
+from sender.base import BaseSender
+
+logger = logging.getLogger(__name__)
+
+# 未配置collectors时启用的采集器
+DEFAULT_COLLECTORS = ("system", "disk", "network", "process")
+# 超出预算时采集间隔最多放大的倍数
+MAX_STRETCH = 16.0
+# 停止时等待发送队列清空的最长时间(秒)
+SEND_DRAIN_TIMEOUT = 10.0
+
+def discover_collectors(package: str = "collector") -> Dict[str, Type[BaseCollector]]:
+    """导入采集器包中的所有模块, 返回 name -> 采集器类"""
+    module = importlib.import_module(package)
+    for info in pkgutil.iter_modules(module.__path__):
+        try:
+            importlib.import_module(f"{package}.{info.name}")
+        except ImportError as e:
+            # 缺少可选依赖的采集器不影响其他采集器
+            logger.warning(f"Skipping collector module {info.name}: {e}")
+
+    found: Dict[str, Type[BaseCollector]] = {}
+    pending = list(BaseCollector.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if cls.name and not getattr(cls, "__abstractmethods__", None):
+            found[cls.name] = cls
+    return found
+
+@dataclass
+class CollectorState:
+    """单个采集器的调度状态与开销统计"""
+    collector: BaseCollector
+    interval: float
+    timeout: float           # 单次采集的墙钟时间上限(秒)
+    cpu_budget: float        # 平均占用单核CPU的比例上限
+    next_run: float = 0.0
+    stretch: float = 1.0     # 超预算时对间隔的放大倍数
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    cpu_time: float = 0.0
+    last_duration: float = 0.0
+    # 超时后仍在执行的采集, 结束前不再启动新的一次
+    inflight: Optional[asyncio.Task] = None
+
+    @property
+    def effective_interval(self) -> float:
+        return self.interval * self.stretch
+
+class AgentRuntime:
+    """Agent采集运行时
+
+    自动发现BaseCollector的实现, 各采集器按自己的间隔在同一个调度协程
+    中依次执行。首次执行时间在一个间隔内随机分布, 之后每次加入jitter,
+    大量Agent不会在同一时刻采集和上报。调度协程最多等待一次采集timeout秒,
+    超时的采集(阻塞工作在线程中, 无法中断)继续在后台完成, 结果丢弃,
+    完成前该采集器的后续周期被跳过; CPU占用超过cpu_budget时按比例拉长
+    该采集器的间隔, 回到预算内后逐步恢复, Agent自身开销在繁忙主机上也有
+    上限。同一轮到期的采集结果合并为一个数据包放入有界发送队列, 由独立的
+    发送协程交给发送器攒批上报, 上报慢或失败不会推迟采集; 队列满时丢弃
+    最旧的数据包。发送器接收数据包后调用各采集器的commit, 采集器据此推进
+    检查点。
+    """
+
+    def __init__(self, config: dict, sender: BaseSender):
+        self.sender = sender
+        self.jitter = float(config.get("jitter", 0.1))
+        self.hostname = config.get("hostname") or socket.gethostname()
+        self.send_queue_size = int(config.get("send_queue_size", 100))
+        self.states: Dict[str, CollectorState] = {}
+        self.dropped_payloads = 0
+        self._running = False
+        # stop时唤醒等待下一次采集的调度循环; 调度循环退出后置位
+        self._wake: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._send_task: Optional[asyncio.Task] = None
+
+        available = discover_collectors()
+        configured = config.get("collectors") or {name: {} for name in DEFAULT_COLLECTORS}
+        for name, options in configured.items():
+            options = options or {}
+            if not options.get("enabled", True):
+                continue
+            cls = available.get(name)
+            if cls is None:
+                logger.warning(f"Unknown collector: {name}")
+                continue
+            try:
+                collector = cls(options)
+            except Exception as e:
+                logger.error(f"Failed to create collector {name}: {e}")
+                continue
+            interval = float(options.get("interval", cls.interval))
+            self.states[name] = CollectorState(
+                collector=collector,
+                interval=interval,
+                timeout=float(options.get("timeout", min(interval / 2, 10.0))),
+                cpu_budget=float(options.get("cpu_budget", 0.01))
+            )
+
+    def _schedule_first(self, now: float) -> None:
+        for state in self.states.values():
+            state.next_run = now + random.uniform(0, state.interval)
+
+    def _schedule_next(self, state: CollectorState, now: float) -> None:
+        interval = state.effective_interval
+        state.next_run = now + interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def run(self) -> None:
+        """运行调度循环直到stop"""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        self._wake = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._outbox = asyncio.Queue(maxsize=self.send_queue_size)
+        self._send_task = asyncio.create_task(self._send_loop())
+        self._schedule_first(loop.time())
+        try:
+            await self._schedule_loop(loop)
+        finally:
+            self._stopped.set()
+
+    async def _schedule_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        while self._running and self.states:
+            next_run = min(state.next_run for state in self.states.values())
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, next_run - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            if not self._running:
+                break
+            now = loop.time()
+            due = [(name, state) for name, state in self.states.items() if state.next_run <= now]
+            results: Dict[str, Any] = {}
+            for name, state in due:
+                data = await self._run_one(name, state)
+                if data is not None:
+                    results[name] = data
+                self._schedule_next(state, loop.time())
+            if results:
+                self._enqueue({
+                    "hostname": self.hostname,
+                    "timestamp": time.time(),
+                    "collectors": results,
+                })
+
+    def _enqueue(self, payload: Dict[str, Any]) -> None:
+        """放入发送队列, 满时丢弃最旧的数据包"""
+        if self._outbox.full():
+            self._outbox.get_nowait()
+            self._outbox.task_done()
+            self.dropped_payloads += 1
+            logger.warning(f"Send queue full, dropped oldest payload "
+                           f"({self.dropped_payloads} dropped so far)")
+        self._outbox.put_nowait(payload)
+
+    async def _send_loop(self) -> None:
+        """依次把数据包交给发送器"""
+        while True:
+            payload = await self._outbox.get()
+            try:
+                if await self.sender.send(payload):
+                    for name, data in payload["collectors"].items():
+                        await self.states[name].collector.commit(data)
+            except Exception as e:
+                logger.error(f"Failed to send payload: {e}")
+            finally:
+                self._outbox.task_done()
+
+    async def _run_one(self, name: str, state: CollectorState) -> Optional[Dict[str, Any]]:
+        """执行一次采集并按开销调整间隔"""
+        if state.inflight is not None:
+            if not state.inflight.done():
+                state.timeouts += 1
+                logger.warning(f"Collector {name} still running, skipping this cycle")
+                return None
+            state.inflight = None
+
+        cpu_start = time.process_time()
+        wall_start = time.monotonic()
+        data = None
+        try:
+            task = asyncio.ensure_future(state.collector.collect())
+            done, _ = await asyncio.wait({task}, timeout=state.timeout)
+            if not done:
+                # 不取消: 线程中的阻塞调用无法中断, 让它跑完并丢弃结果
+                state.inflight = task
+                task.add_done_callback(_discard_result)
+                state.timeouts += 1
+                state.stretch = min(state.stretch * 2, MAX_STRETCH)
+                logger.warning(f"Collector {name} exceeded {state.timeout}s, "
+                               f"interval stretched to {state.effective_interval:.0f}s")
+                return None
+            data = task.result()
+            if not await state.collector.validate(data):
+                logger.warning(f"Collector {name} returned invalid data")
+                state.failures += 1
+                data = None
+        except Exception as e:
+            state.failures += 1
+            logger.error(f"Collector {name} failed: {e}")
+        finally:
+            state.runs += 1
+            state.last_duration = time.monotonic() - wall_start
+
+        # 调度协程依次执行采集, 进程CPU时间的增量近似为本次采集的开销
+        used = time.process_time() - cpu_start
+        state.cpu_time += used
+        share = used / state.effective_interval
+        if share > state.cpu_budget:
+            state.stretch = min(state.stretch * share / state.cpu_budget, MAX_STRETCH)
+            logger.warning(f"Collector {name} used {used * 1000:.0f}ms CPU, "
+                           f"interval stretched to {state.effective_interval:.0f}s")
+        elif state.stretch > 1.0:
+            state.stretch = max(1.0, state.stretch / 1.5)
+        return data
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "interval": state.interval,
+                "effective_interval": state.effective_interval,
+                "runs": state.runs,
+                "failures": state.failures,
+                "timeouts": state.timeouts,
+                "cpu_time": round(state.cpu_time, 3),
+                "last_duration": round(state.last_duration, 3),
+            }
+            for name, state in self.states.items()
+        }
+
+    async def stop(self) -> None:
+        """停止调度循环, 等正在进行的采集结束后发送剩余数据并释放资源"""
+        self._running = False
+        if self._wake is not None:
+            self._wake.set()
+            # 调度循环可能正在执行一轮采集, 结束后才能关闭采集器
+            await self._stopped.wait()
+        inflight = [s.inflight for s in self.states.values() if s.inflight and not s.inflight.done()]
+        if inflight:
+            timeout = max(s.timeout for s in self.states.values())
+            _, pending = await asyncio.wait(inflight, timeout=timeout)
+            if pending:
+                logger.warning(f"{len(pending)} timed out collections still running on stop")
+        if self._send_task:
+            try:
+                await asyncio.wait_for(self._outbox.join(), SEND_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropped {self._outbox.qsize()} unsent payloads on stop")
+            self._send_task.cancel()
+            try:
+                await self._send_task
+            except asyncio.CancelledError:
+                pass
+            self._send_task = None
+        for state in self.states.values():
+            await state.collector.close()
+        await self.sender.close()
+
+def _discard_result(task: asyncio.Task) -> None:
+    """取走超时采集的结果或异常, 避免未取回异常的警告"""
+    if not task.cancelled():
+        task.exception()
@@ -7,4 +7,8 @@ class BaseSender(ABC):
     @abstractmethod
     async def send(self, data: Dict[str, Any]) -> bool:
         """发送数据"""
-        pass 
\ No newline at end of file
+        pass
+
+    async def close(self) -> None:
+        """发送剩余数据并释放连接"""
+        pass
@@ -0,0 +1,74 @@
+import os
+import re
+from typing import List, Optional, Tuple
+
+FILE_PATTERN = re.compile(r"^batch_(\d{12})\.bin$")
+
+class DiskBuffer:
+    """磁盘环形缓冲
+
+    每个未发送的批次保存为一个按序号命名的文件, 重启后按序号顺序重放。
+    总大小超过max_bytes时丢弃最旧的批次, 断网时间再长也不会占满磁盘。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        # (序号, 大小), 按序号升序
+        self._entries: List[Tuple[int, int]] = []
+        for name in os.listdir(directory):
+            match = FILE_PATTERN.match(name)
+            if match:
+                path = os.path.join(directory, name)
+                self._entries.append((int(match.group(1)), os.path.getsize(path)))
+            elif name.endswith(".tmp"):
+                # 写入中途退出留下的临时文件
+                os.remove(os.path.join(directory, name))
+        self._entries.sort()
+        self.size = sum(size for _, size in self._entries)
+        self._next_seq = self._entries[-1][0] + 1 if self._entries else 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"batch_{seq:012d}.bin")
+
+    def push(self, data: bytes) -> int:
+        """追加一个批次并返回序号, 先写临时文件再改名"""
+        seq = self._next_seq
+        self._next_seq += 1
+        path = self._path(seq)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        self._entries.append((seq, len(data)))
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            self.pop(self._entries[0][0])
+            self.dropped += 1
+        return seq
+
+    def peek(self) -> Optional[Tuple[int, bytes]]:
+        """返回最旧的批次, 缓冲为空时返回None"""
+        if not self._entries:
+            return None
+        seq = self._entries[0][0]
+        with open(self._path(seq), "rb") as f:
+            return seq, f.read()
+
+    def pop(self, seq: int) -> None:
+        """删除已发送的批次"""
+        for i, (entry_seq, size) in enumerate(self._entries):
+            if entry_seq == seq:
+                del self._entries[i]
+                self.size -= size
+                try:
+                    os.remove(self._path(seq))
+                except FileNotFoundError:
+                    pass
+                return
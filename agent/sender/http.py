@@ -1,27 +1,229 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
 import aiohttp
 from .base import BaseSender
+from .buffer import DiskBuffer
+
+try:
+    import zstandard
+except ImportError:  # 未安装时使用gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+def _seconds(value, default: float) -> float:
+    """解析时长配置, 支持数字(秒)和"500ms"/"1s"/"5m"形式"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    for suffix, scale in (("ms", 0.001), ("s", 1), ("m", 60), ("h", 3600)):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * scale
+    return float(value)
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
 
 class HttpSender(BaseSender):
+    """HTTP发送器
+
+    复用同一个ClientSession; 多个采集周期的数据攒成一批, 压缩后一次
+    上报。批次在攒满batch_size或首条数据到达batch_interval后由定时器
+    上报, 不依赖下一次send; 攒批中的数据同时追加到缓冲目录下的日志文件,
+    进程崩溃重启后重新载入。发送失败按retry配置指数退避重试, 仍失败的
+    批次写入磁盘环形缓冲, 之后的批次排在其后, 恢复连接时按原顺序重放。
+    每批带batch_id, 服务端可据此对重放去重。
+    """
+
     def __init__(self, config: dict):
         self.server_url = config["server_url"]
         self.auth_key = config["auth_key"]
         self.retry_config = config["retry"]
+        self.initial_delay = _seconds(self.retry_config.get("initial_delay"), 1.0)
+        self.max_delay = _seconds(self.retry_config.get("max_delay"), 300.0)
+        self.multiplier = float(self.retry_config.get("multiplier", 2.0))
+        self.jitter = float(self.retry_config.get("jitter", 0.1))
+        self.max_attempts = int(self.retry_config.get("max_attempts", 3))
+
+        self.batch_size = int(config.get("batch_size", 10))  # 每批最多包含的采集周期数
+        self.batch_interval = _seconds(config.get("batch_interval"), 10.0)  # 最长攒批时间
+        self.timeout = _seconds(config.get("timeout"), 10.0)
+        compression = config.get("compression") or ("zstd" if zstandard else "gzip")
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, falling back to gzip")
+            compression = "gzip"
+        self.compression = compression
+        buffer_dir = config.get("buffer_dir", "/var/lib/agent/buffer")
+        self.buffer = DiskBuffer(
+            buffer_dir,
+            max_bytes=int(config.get("buffer_max_bytes", 256 * 1024 * 1024))
+        )
+        # 攒批中的数据, 上报或写入缓冲后删除; 上报期间到达的数据写入新文件
+        self._journal_path = os.path.join(buffer_dir, "pending.jsonl")
+        self._flushing_path = f"{self._journal_path}.flushing"
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._pending: List[Dict[str, Any]] = self._load_journal()
+        self._pending_since = time.monotonic()
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.auth_key}"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
 
     async def send(self, data: Dict[str, Any]) -> bool:
-        """通过HTTP发送数据"""
+        """加入待发送批次, 攒满batch_size或超过batch_interval时上报
+
+        数据已上报、已写入磁盘缓冲或已记入攒批日志即返回True。
+        """
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(data)
+        try:
+            self._append_journal(data)
+        except OSError as e:
+            logger.warning(f"Failed to journal pending payload: {e}")
+        if len(self._pending) < self.batch_size and \
+                time.monotonic() - self._pending_since < self.batch_interval:
+            if self._timer is None or self._timer.done():
+                self._timer = asyncio.create_task(self._flush_later())
+            return True
+        return await self.flush()
+
+    async def _flush_later(self) -> None:
+        """首条数据到达batch_interval后上报"""
+        await asyncio.sleep(max(0.0, self._pending_since + self.batch_interval - time.monotonic()))
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Scheduled flush failed: {e}")
+
+    async def flush(self) -> bool:
+        """上报待发送的数据, 返回本批是否已离开内存(已发送或已缓冲)"""
+        async with self._lock:
+            # 先重放缓冲中的旧批次, 保证顺序
+            drained = await self._drain()
+            if not self._pending:
+                return True
+            items, self._pending = self._pending, []
+            self._rotate_journal()
+            body = json.dumps(
+                {"batch_id": uuid.uuid4().hex, "items": items},
+                ensure_ascii=False, default=str
+            ).encode()
+            stored = f"{self.compression}\n".encode() + _compress(body, self.compression)
+            if drained and await self._post(stored):
+                self._remove_flushing()
+                return True
+            try:
+                self.buffer.push(stored)
+            except OSError as e:
+                logger.error(f"Failed to buffer {len(items)} payloads, dropping them: {e}")
+                self._remove_flushing()
+                return False
+            self._remove_flushing()
+            return True
+
+    def _load_journal(self) -> List[Dict[str, Any]]:
+        """载入上次退出时未上报的攒批数据"""
+        items = []
+        for path in (self._flushing_path, self._journal_path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            items.append(json.loads(line))
+                        except ValueError:
+                            # 崩溃时写了一半的最后一行
+                            continue
+            except FileNotFoundError:
+                continue
+        if items:
+            logger.info(f"Recovered {len(items)} pending payloads from {self._journal_path}")
+            # 合并为一个文件, 后续上报成功后一并删除
+            with open(f"{self._journal_path}.tmp", "w", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+            os.replace(f"{self._journal_path}.tmp", self._journal_path)
+            self._remove_flushing()
+        return items
+
+    def _append_journal(self, data: Dict[str, Any]) -> None:
+        with open(self._journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+
+    def _rotate_journal(self) -> None:
+        """本批数据的日志改名为.flushing, 之后到达的数据写入新日志"""
+        try:
+            os.replace(self._journal_path, self._flushing_path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_flushing(self) -> None:
+        try:
+            os.remove(self._flushing_path)
+        except FileNotFoundError:
+            pass
+
+    async def _drain(self) -> bool:
+        """按顺序重放磁盘缓冲, 全部发送成功返回True"""
+        while True:
+            head = self.buffer.peek()
+            if head is None:
+                return True
+            seq, stored = head
+            if not await self._post(stored):
+                return False
+            self.buffer.pop(seq)
+
+    async def _post(self, stored: bytes) -> bool:
+        """按retry配置发送一个批次"""
+        codec, _, body = stored.partition(b"\n")
         headers = {
-            "Authorization": f"Bearer {self.auth_key}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "Content-Encoding": codec.decode()
         }
-        
-        async with aiohttp.ClientSession() as session:
+        delay = self.initial_delay
+        for attempt in range(1, self.max_attempts + 1):
             try:
-                async with session.post(
-                    self.server_url,
-                    json=data,
-                    headers=headers
-                ) as response:
-                    return response.status == 200
-            except Exception as e:
-                # 处理网络异常
-                return False 
\ No newline at end of file
+                session = await self._get_session()
+                async with session.post(self.server_url, data=body, headers=headers) as response:
+                    if response.status < 300:
+                        return True
+                    if 400 <= response.status < 500 and response.status not in (408, 429):
+                        # 服务端拒收, 重发也不会成功, 不再占用缓冲
+                        logger.error(f"Server rejected batch with status {response.status}, dropping it")
+                        return True
+                    logger.warning(f"Upload failed with status {response.status} (attempt {attempt})")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Upload failed: {e} (attempt {attempt})")
+            if attempt < self.max_attempts:
+                await asyncio.sleep(delay * (1 + random.uniform(-self.jitter, self.jitter)))
+                delay = min(delay * self.multiplier, self.max_delay)
+        return False
+
+    async def close(self) -> None:
+        """上报剩余数据并关闭连接, 发不出去的数据留在磁盘缓冲"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
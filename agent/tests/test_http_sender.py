@@ -0,0 +1,149 @@
+import asyncio
+import json
+from aiohttp import web
+from sender.buffer import DiskBuffer
+from sender.http import HttpSender
+
+class UploadServer:
+    """本地上报端点, statuses为依次返回的状态码, 用完后返回200"""
+
+    def __init__(self):
+        self.statuses = []
+        self.requests = 0
+        self.batches = []
+        self._runner = None
+        self.url = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status < 300:
+            # aiohttp按Content-Encoding解压请求体
+            assert request.headers["Content-Encoding"] == "gzip"
+            self.batches.append(json.loads(await request.read()))
+        return web.Response(status=status)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/upload", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/upload"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+    @property
+    def items(self):
+        return [item["n"] for batch in self.batches for item in batch["items"]]
+
+def _sender(server: UploadServer, tmp_path, **options) -> HttpSender:
+    config = {
+        "server_url": server.url,
+        "auth_key": "key",
+        "retry": {"initial_delay": "1ms", "max_delay": "5ms", "max_attempts": 3},
+        "compression": "gzip",
+        "buffer_dir": str(tmp_path / "buffer"),
+        "batch_size": 3,
+        "batch_interval": 60,
+    }
+    config.update(options)
+    return HttpSender(config)
+
+def test_disk_buffer_order_and_capacity(tmp_path):
+    """测试磁盘缓冲按序重放、重启后保留, 超出容量时丢弃最旧的批次"""
+    buffer = DiskBuffer(str(tmp_path), max_bytes=30)
+    for i in range(3):
+        buffer.push(f"batch-{i}-xxxx".encode())
+    assert len(buffer) == 2
+    assert buffer.dropped == 1
+    (tmp_path / "batch_000000000009.bin.tmp").write_bytes(b"partial")
+
+    reopened = DiskBuffer(str(tmp_path), max_bytes=30)
+    assert not (tmp_path / "batch_000000000009.bin.tmp").exists()
+    seq, data = reopened.peek()
+    assert data == b"batch-1-xxxx"
+    reopened.pop(seq)
+    assert reopened.peek()[1] == b"batch-2-xxxx"
+    assert reopened.push(b"next") == 3
+
+def test_batches_by_size_and_interval(tmp_path):
+    """测试攒满batch_size立即上报, 不满时首条数据到达batch_interval后上报"""
+    async def run():
+        async with UploadServer() as server:
+            sender = _sender(server, tmp_path)
+            for i in range(3):
+                assert await sender.send({"n": i})
+            assert server.items == [0, 1, 2]
+            assert len(server.batches) == 1
+            await sender.close()
+
+            sender = _sender(server, tmp_path, batch_interval="20ms")
+            await sender.send({"n": 3})
+            assert server.items == [0, 1, 2]
+            await asyncio.sleep(0.1)
+            assert server.items == [0, 1, 2, 3]
+            await sender.close()
+
+    asyncio.run(run())
+
+def test_retry_then_success(tmp_path):
+    """测试5xx按退避重试, 4xx拒收的批次不重发也不进入缓冲"""
+    async def run():
+        async with UploadServer() as server:
+            sender = _sender(server, tmp_path, batch_size=1)
+            server.statuses = [503, 429]
+            assert await sender.send({"n": 0})
+            assert server.requests == 3
+            assert server.items == [0]
+
+            server.statuses = [400]
+            assert await sender.send({"n": 1})
+            assert server.requests == 4
+            assert len(sender.buffer) == 0
+            await sender.close()
+
+    asyncio.run(run())
+
+def test_spill_to_disk_and_replay_in_order(tmp_path):
+    """测试重试用尽的批次写入磁盘缓冲, 恢复后先按原顺序重放再发新批次"""
+    async def run():
+        async with UploadServer() as server:
+            sender = _sender(server, tmp_path, batch_size=1)
+            server.statuses = [500] * 3
+            assert await sender.send({"n": 0})
+            assert len(sender.buffer) == 1
+            # 缓冲未清空时新批次排在其后, 不单独尝试
+            server.statuses = [500] * 3
+            assert await sender.send({"n": 1})
+            assert len(sender.buffer) == 2
+            assert server.batches == []
+
+            assert await sender.send({"n": 2})
+            assert server.items == [0, 1, 2]
+            assert len(sender.buffer) == 0
+            assert len({batch["batch_id"] for batch in server.batches}) == 3
+            await sender.close()
+
+    asyncio.run(run())
+
+def test_pending_journal_survives_restart(tmp_path):
+    """测试攒批中的数据在进程重启后重新载入并上报"""
+    async def run():
+        async with UploadServer() as server:
+            sender = _sender(server, tmp_path)
+            await sender.send({"n": 0})
+            await sender.send({"n": 1})
+            sender._timer.cancel()  # 模拟进程在上报前退出
+
+            restarted = _sender(server, tmp_path)
+            await restarted.send({"n": 2})
+            assert server.items == [0, 1, 2]
+            assert not (tmp_path / "buffer" / "pending.jsonl").exists()
+            await restarted.close()
+
+    asyncio.run(run())
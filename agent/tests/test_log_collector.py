@@ -0,0 +1,86 @@
+import asyncio
+import os
+from collector.log_collector import LogCollector
+
+def _collector(tmp_path, **options) -> LogCollector:
+    return LogCollector({
+        "log_paths": [str(tmp_path / "app.log")],
+        "checkpoint_file": str(tmp_path / "checkpoint.json"),
+        **options
+    })
+
+def _collect(collector: LogCollector, commit: bool = True) -> list:
+    async def run():
+        data = await collector.collect()
+        if commit:
+            await collector.commit(data)
+        return [log["message"] for log in data["logs"]]
+    return asyncio.run(run())
+
+def _append(path, text: str) -> None:
+    with open(path, "a") as f:
+        f.write(text)
+
+def test_rotation_reads_old_file_until_grace(tmp_path):
+    """测试改名轮转后旧文件在宽限期内继续读取, 残片不提前作为整行"""
+    log = tmp_path / "app.log"
+    _append(log, "a\nb\npar")
+    collector = _collector(tmp_path, rotate_grace=60)
+    assert _collect(collector) == ["a", "b"]
+
+    os.rename(log, tmp_path / "app.log.1")
+    _append(log, "x\n")
+    _append(tmp_path / "app.log.1", "tial")
+    assert _collect(collector) == ["x"]
+
+    # 写入方仍持有旧文件, 补完残片后作为完整行
+    _append(tmp_path / "app.log.1", "\nc\nta")
+    assert _collect(collector) == ["partial", "c"]
+
+    # 宽限期过后残片作为最后一行, 旧文件关闭
+    collector.rotate_grace = 0
+    assert _collect(collector) == ["ta"]
+    assert collector._rotated == []
+    _append(log, "y\n")
+    assert _collect(collector) == ["y"]
+    asyncio.run(collector.close())
+
+def test_truncation_restarts_from_beginning(tmp_path):
+    """测试copytruncate截断后从头读取"""
+    log = tmp_path / "app.log"
+    _append(log, "one\ntwo\n")
+    collector = _collector(tmp_path)
+    assert _collect(collector) == ["one", "two"]
+
+    with open(log, "w") as f:
+        f.write("new\n")
+    assert _collect(collector) == ["new"]
+    asyncio.run(collector.close())
+
+def test_restart_resumes_from_delivered_position(tmp_path):
+    """测试重启后从最后一次已交付的位置继续, 停机期间的轮转也不丢行"""
+    log = tmp_path / "app.log"
+    _append(log, "1\n2\n")
+    collector = _collector(tmp_path)
+    assert _collect(collector) == ["1", "2"]
+    _append(log, "3\n")
+    # 未交付的采集不推进检查点
+    assert _collect(collector, commit=False) == ["3"]
+    asyncio.run(collector.close())
+
+    collector = _collector(tmp_path)
+    assert _collect(collector) == ["3"]
+    asyncio.run(collector.close())
+
+    # 停机期间写入并轮转
+    _append(log, "4\n")
+    os.rename(log, tmp_path / "app.log.1")
+    _append(log, "5\n")
+    collector = _collector(tmp_path, rotate_grace=0)
+    assert _collect(collector) == ["4", "5"]
+    asyncio.run(collector.close())
+
+    collector = _collector(tmp_path)
+    _append(log, "6\n")
+    assert _collect(collector) == ["6"]
+    asyncio.run(collector.close())
@@ -0,0 +1,133 @@
+import asyncio
+from collector.base import BaseCollector
+from runtime import AgentRuntime
+from sender.base import BaseSender
+
+class GatedCollector(BaseCollector):
+    """collect等待gate放行, 记录提交与关闭"""
+
+    name = "test_gated"
+    interval = 3600.0
+
+    def __init__(self, config: dict):
+        self.gate = asyncio.Event() if config.get("gated") else None
+        self.collecting = False
+        self.closed = False
+        self.committed = []
+
+    async def collect(self):
+        self.collecting = True
+        if self.gate:
+            await self.gate.wait()
+        assert not self.closed
+        self.collecting = False
+        return {"value": 1}
+
+    async def validate(self, data) -> bool:
+        return "value" in data
+
+    async def commit(self, data) -> None:
+        self.committed.append(data)
+
+    async def close(self) -> None:
+        self.closed = True
+
+class CountingCollector(GatedCollector):
+    name = "test_counting"
+
+class RecordingSender(BaseSender):
+    def __init__(self):
+        self.payloads = []
+        self.closed = False
+
+    async def send(self, data) -> bool:
+        self.payloads.append(data)
+        return True
+
+    async def close(self) -> None:
+        self.closed = True
+
+def _runtime(**collectors) -> AgentRuntime:
+    return AgentRuntime({"hostname": "host-1", "collectors": collectors}, RecordingSender())
+
+async def _until(predicate, timeout: float = 1.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+def test_due_collectors_merged_and_committed_after_send():
+    """测试同一轮到期的采集合并为一个数据包, 发送后提交"""
+    async def run():
+        runtime = _runtime(test_gated={}, test_counting={})
+        runtime._schedule_first = lambda now: None
+        task = asyncio.create_task(runtime.run())
+        await _until(lambda: runtime.sender.payloads)
+        await runtime.stop()
+        await task
+
+        payload = runtime.sender.payloads[0]
+        assert payload["hostname"] == "host-1"
+        assert set(payload["collectors"]) == {"test_gated", "test_counting"}
+        for state in runtime.states.values():
+            assert state.collector.committed
+
+    asyncio.run(run())
+
+def test_stop_wakes_sleeping_loop():
+    """测试stop立即唤醒等待下一次采集的调度循环"""
+    async def run():
+        runtime = _runtime(test_gated={})
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(runtime.stop(), 1.0)
+        await asyncio.wait_for(task, 1.0)
+        collector = runtime.states["test_gated"].collector
+        assert collector.closed
+        assert runtime.sender.closed
+        assert runtime.sender.payloads == []
+
+    asyncio.run(run())
+
+def test_stop_waits_for_running_collection():
+    """测试stop等正在进行的采集结束、结果发出后才关闭采集器"""
+    async def run():
+        runtime = _runtime(test_gated={"gated": True, "timeout": 5})
+        state = runtime.states["test_gated"]
+        runtime._schedule_first = lambda now: None
+        task = asyncio.create_task(runtime.run())
+        await _until(lambda: state.collector.collecting)
+
+        stopping = asyncio.create_task(runtime.stop())
+        await asyncio.sleep(0.02)
+        assert not stopping.done()
+        assert not state.collector.closed
+
+        state.collector.gate.set()
+        await asyncio.wait_for(stopping, 1.0)
+        await task
+        assert state.collector.closed
+        assert [p["collectors"] for p in runtime.sender.payloads] == [{"test_gated": {"value": 1}}]
+        assert state.collector.committed == [{"value": 1}]
+
+    asyncio.run(run())
+
+def test_stop_waits_for_timed_out_collection():
+    """测试超时后仍在后台执行的采集结束后才关闭采集器"""
+    async def run():
+        runtime = _runtime(test_gated={"gated": True, "timeout": 0.01})
+        state = runtime.states["test_gated"]
+        runtime._schedule_first = lambda now: None
+        task = asyncio.create_task(runtime.run())
+        await _until(lambda: state.inflight is not None)
+
+        stopping = asyncio.create_task(runtime.stop())
+        await asyncio.sleep(0.005)
+        assert not state.collector.closed
+        state.collector.gate.set()
+        await asyncio.wait_for(stopping, 1.0)
+        await task
+        assert state.collector.closed
+        assert runtime.sender.payloads == []
+
+    asyncio.run(run())
@@ -2,82 +2,314 @@ import asyncio
 import websockets
 import json
 import logging
-from datetime import datetime
+import random
+from collections import deque
+from enum import Enum
+from datetime import datetime, timedelta
+from typing import Optional
 import psutil
 import platform
+from app.domain.agent.codec import AGENT_METRIC_FIELDS, CODEC_NAME, FRAME_SEQ, MetricEncoder, MetricSchema
+from app.agent.sampler import SampleRing
+
+# 高频采样的字段
+SAMPLED_FIELDS = ("cpu_percent", "memory_percent", "disk_usage")
+# 除平均值外随周期汇总上报的统计
+SUMMARY_STATS = {"cpu_percent": ("min", "max", "p95"), "memory_percent": ("min", "max", "p95")}
+
+# 单个二进制帧最多携带的积压样本数
+MAX_FRAME_SAMPLES = 60
+# 等待服务端回复hello的时间, 超时按旧服务端处理, 以JSON上报
+HANDSHAKE_TIMEOUT = 10.0
 
 logger = logging.getLogger(__name__)
 
+class ConnectionState(str, Enum):
+    """连接状态"""
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    BACKOFF = "backoff"
+    STOPPED = "stopped"
+
+class Backoff:
+    """带full jitter的指数退避
+
+    等待时间在[0, 当前上限]内均匀分布, 服务端重启后大量Agent的重连
+    分散开, 不会同时涌入。连接稳定保持stable_after秒后才重置, 连上即断
+    的情况下上限继续增长。
+    """
+
+    def __init__(self, initial: float = 1.0, maximum: float = 300.0,
+                 multiplier: float = 2.0, stable_after: float = 30.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.stable_after = stable_after
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        cap = min(self.maximum, self.initial * self.multiplier ** self.attempts)
+        self.attempts += 1
+        return random.uniform(0, cap)
+
+    def connection_lasted(self, seconds: float) -> None:
+        if seconds >= self.stable_after:
+            self.attempts = 0
+
 class AgentClient:
-    """Agent客户端"""
+    """Agent客户端
+
+    采样与上报解耦: 汇总结果按序号写入内存积压队列, 由连接上的发送任务
+    补发; 服务端逐批ack后才从队列移除, 断线期间的数据在重连后按顺序
+    补齐。重连带上resume_token, 服务端恢复会话并告知已接收的序号,
+    只补发之后的部分。
+    """
     
     def __init__(
         self,
         server_url: str,
         agent_id: str,
-        heartbeat_interval: int = 30
+        heartbeat_interval: int = 30,
+        sample_interval: float = 1.0,
+        report_interval: float = 60.0,
+        buffer_seconds: float = 3600.0,
+        backlog_size: int = 1440,
+        backoff: Optional[Backoff] = None
     ):
         self.server_url = server_url
         self.agent_id = agent_id
         self.heartbeat_interval = heartbeat_interval
+        self.sample_interval = sample_interval
+        self.report_interval = report_interval
         self.websocket = None
+        # 最近buffer_seconds秒的原始样本, 跨重连保留, 供服务端按需拉取
+        self.ring = SampleRing(SAMPLED_FIELDS, max(1, int(buffer_seconds / sample_interval)))
+        self.schema = MetricSchema(AGENT_METRIC_FIELDS)
+        # 服务端确认支持delta-v1后才以二进制帧上报指标, 否则沿用JSON
+        self.encoder = None
+        self.state = ConnectionState.DISCONNECTED
+        self.backoff = backoff or Backoff()
+        # 待确认的汇总 (序号, 时间, 数据), 断线过久时丢弃最旧的
+        self.backlog = deque(maxlen=backlog_size)
+        self.seq = 0        # 最后一个汇总的序号
+        self.acked_seq = 0  # 服务端已确认的序号
+        self.sent_seq = 0   # 本连接已发出的序号
+        self.resume_token = None
+        self._session_acks = False  # 服务端是否逐批ack
+        self._seq_frames = False    # 服务端是否接受带序号的二进制帧
+        self._ready = None    # 握手完成, 可以补发积压
+        self._pending = None  # 积压队列有新数据
     
-    async def connect(self):
-        """连接服务器"""
+    async def run(self):
+        """保持连接直到stop, 断线后按退避策略重连"""
+        loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._pending = asyncio.Event()
+        # 采样与连接无关, 断线期间照常采样
+        sampler = asyncio.create_task(self.collect_metrics())
         try:
-            self.websocket = await websockets.connect(
-                f"{self.server_url}/ws/agents/{self.agent_id}"
-            )
-            logger.info("Connected to server")
-            
-            # 启动心跳任务
-            asyncio.create_task(self.send_heartbeat())
-            # 启动指标收集任务
-            asyncio.create_task(self.collect_metrics())
-            
-            # 处理服务器消息
-            while True:
-                message = await self.websocket.recv()
-                await self.handle_message(json.loads(message))
-        
-        except Exception as e:
-            logger.error(f"Connection failed: {str(e)}")
-            # 重试连接
-            await asyncio.sleep(5)
-            await self.connect()
+            while self.state != ConnectionState.STOPPED:
+                self.state = ConnectionState.CONNECTING
+                connected_at = None
+                try:
+                    url = f"{self.server_url}/ws/agents/{self.agent_id}"
+                    if self.resume_token:
+                        url += f"?resume={self.resume_token}"
+                    async with websockets.connect(url) as websocket:
+                        connected_at = loop.time()
+                        self.state = ConnectionState.CONNECTED
+                        logger.info("Connected to server")
+                        await self._serve(websocket)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Connection failed: {str(e)}")
+                if self.state == ConnectionState.STOPPED:
+                    break
+                if connected_at is not None:
+                    self.backoff.connection_lasted(loop.time() - connected_at)
+                delay = self.backoff.next_delay()
+                self.state = ConnectionState.BACKOFF
+                logger.info(f"Reconnecting in {delay:.1f}s, {len(self.backlog)} reports pending")
+                await asyncio.sleep(delay)
+        finally:
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+    
+    # 兼容旧的入口
+    connect = run
+    
+    async def stop(self):
+        """停止重连并关闭当前连接"""
+        self.state = ConnectionState.STOPPED
+        if self.websocket is not None:
+            await self.websocket.close()
+    
+    async def _serve(self, websocket):
+        """在一条连接上收发消息, 任一任务结束即断开"""
+        self.websocket = websocket
+        self.sent_seq = self.acked_seq
+        self._session_acks = False
+        self._ready.clear()
+        await self.send_hello()
+        tasks = [
+            asyncio.create_task(self.send_heartbeat()),
+            asyncio.create_task(self.send_backlog()),
+            asyncio.create_task(self.receive_messages()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # 抛出导致断开的异常
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.websocket = None
+            self.encoder = None
+    
+    async def receive_messages(self):
+        """处理服务器消息, 连接关闭时抛出异常"""
+        async for message in self.websocket:
+            await self.handle_message(json.loads(message))
+    
+    async def send_hello(self):
+        """声明支持的指标编码并发送字段模式, 新连接的第一帧总是关键帧"""
+        self.encoder = None
+        self._seq_frames = False
+        await self.websocket.send(json.dumps({
+            "type": "hello",
+            "codecs": [CODEC_NAME],
+            "schema": self.schema.to_dict(),
+            "seq": self.acked_seq,
+            "seq_frames": True
+        }))
     
     async def send_heartbeat(self):
-        """发送心跳"""
+        """发送心跳, 发送失败时抛出异常触发重连"""
+        while True:
+            await self.websocket.send(json.dumps({
+                "type": "heartbeat",
+                "timestamp": datetime.now().isoformat()
+            }))
+            await asyncio.sleep(self.heartbeat_interval)
+    
+    def acknowledge(self, seq: int) -> None:
+        """服务端已接收seq及之前的汇总"""
+        self.acked_seq = max(self.acked_seq, seq)
+        self.sent_seq = max(self.sent_seq, self.acked_seq)
+        while self.backlog and self.backlog[0][0] <= self.acked_seq:
+            self.backlog.popleft()
+    
+    async def send_backlog(self):
+        """握手完成后按序号补发积压的汇总
+
+        只把序号连续的汇总合并成帧。服务端协商了seq_frames时帧前附带
+        第一个汇总的序号, 服务端据此跳过已接收的部分; 旧服务端按样本数
+        顺延序号, 与已发送部分不连续(积压溢出丢弃过)的汇总改以带序号的
+        JSON发送。
+        """
         while True:
             try:
-                await self.websocket.send(json.dumps({
-                    "type": "heartbeat",
-                    "timestamp": datetime.now().isoformat()
-                }))
-                await asyncio.sleep(self.heartbeat_interval)
-            except Exception as e:
-                logger.error(f"Failed to send heartbeat: {str(e)}")
-                break
+                await asyncio.wait_for(self._ready.wait(), HANDSHAKE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # 旧服务端不回复hello, 沿用JSON
+                logger.info("No codec reply from server, reporting metrics as JSON")
+                self.encoder = None
+                self._ready.set()
+            self._pending.clear()
+            pending = [entry for entry in self.backlog if entry[0] > self.sent_seq]
+            while pending and self._ready.is_set():
+                if self.encoder and (self._seq_frames or pending[0][0] == self.sent_seq + 1):
+                    chunk = [pending[0]]
+                    for entry in pending[1:MAX_FRAME_SAMPLES]:
+                        if entry[0] != chunk[-1][0] + 1:
+                            break
+                        chunk.append(entry)
+                    # 二进制帧: 计数器发差值, 百分比量化为整数
+                    frame = self.encoder.encode([(ts, data) for _, ts, data in chunk])
+                    if self._seq_frames:
+                        frame = FRAME_SEQ.pack(chunk[0][0]) + frame
+                    await self.websocket.send(frame)
+                else:
+                    chunk = pending[:1]
+                    seq, timestamp, data = chunk[0]
+                    await self.websocket.send(json.dumps({
+                        "type": "metrics",
+                        "seq": seq,
+                        "timestamp": timestamp.isoformat(),
+                        "data": data
+                    }))
+                pending = pending[len(chunk):]
+                if self._ready.is_set():
+                    # 发送期间收到codec_reset时保留回退后的位置
+                    self.sent_seq = chunk[-1][0]
+                if not self._session_acks:
+                    # 服务端不支持ack, 发出即视为送达
+                    self.acknowledge(self.sent_seq)
+            if not self._pending.is_set():
+                await self._pending.wait()
+    
+    def sample(self) -> None:
+        """采集一个高频样本写入环形缓冲"""
+        self.ring.append(datetime.now(), (
+            psutil.cpu_percent(),
+            psutil.virtual_memory().percent,
+            psutil.disk_usage("/").percent
+        ))
+    
+    def build_report(self, since: datetime) -> dict:
+        """汇总since以来的样本: 百分比取平均值, 另附min/max/p95"""
+        summary = self.ring.summarize(since)
+        data = {field: round(stats["avg"], 2) for field, stats in summary.items()}
+        for field, stats in SUMMARY_STATS.items():
+            for stat in stats:
+                data[f"{field}_{stat}"] = summary[field][stat] if field in summary else None
+        data["network"] = dict(psutil.net_io_counters()._asdict())
+        data["samples"] = len(self.ring.since(since))
+        data["sample_interval"] = self.sample_interval
+        return data
     
     async def collect_metrics(self):
-        """收集系统指标"""
+        """按sample_interval高频采样, 每report_interval上报一次汇总"""
+        loop = asyncio.get_running_loop()
+        psutil.cpu_percent()  # 首次调用只建立基准
+        next_sample = loop.time()
+        window_start = datetime.now()
+        next_report = loop.time() + self.report_interval
         while True:
             try:
-                metrics = {
-                    "type": "metrics",
-                    "timestamp": datetime.now().isoformat(),
-                    "data": {
-                        "cpu_percent": psutil.cpu_percent(),
-                        "memory_percent": psutil.virtual_memory().percent,
-                        "disk_usage": psutil.disk_usage("/").percent,
-                        "network": dict(psutil.net_io_counters()._asdict())
-                    }
-                }
-                await self.websocket.send(json.dumps(metrics))
-                await asyncio.sleep(60)  # 每分钟采集一次
+                next_sample += self.sample_interval
+                await asyncio.sleep(max(0.0, next_sample - loop.time()))
+                self.sample()
+                if loop.time() < next_report:
+                    continue
+                next_report += self.report_interval
+                timestamp = datetime.now()
+                data = self.build_report(window_start)
+                window_start = timestamp
+                if len(self.backlog) == self.backlog.maxlen:
+                    logger.warning(f"Report backlog full, dropping report {self.backlog[0][0]}")
+                self.seq += 1
+                self.backlog.append((self.seq, timestamp, data))
+                self._pending.set()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Failed to collect metrics: {str(e)}")
-                break
+    
+    async def send_raw_samples(self, message: dict):
+        """返回最近seconds秒的原始高频样本, 用于排查短时尖峰"""
+        seconds = float(message.get("seconds") or 300)
+        since = datetime.now() - timedelta(seconds=seconds)
+        await self.websocket.send(json.dumps({
+            "type": "raw_samples",
+            "request_id": message.get("request_id"),
+            "sample_interval": self.sample_interval,
+            "fields": list(self.ring.fields),
+            "samples": [[ts.isoformat(), *values] for ts, values in self.ring.since(since)]
+        }))
     
     async def handle_message(self, message: dict):
         """处理服务器消息"""
@@ -89,6 +321,33 @@ class AgentClient:
         elif msg_type == "config":
             # 处理配置更新
             await self.handle_config_update(message)
+        elif msg_type == "session":
+            # 会话建立或恢复, 跳过服务端已接收的部分
+            self.resume_token = message.get("resume_token")
+            self._session_acks = True
+            self.acknowledge(int(message.get("ack_seq") or 0))
+            if message.get("resumed"):
+                logger.info(f"Session resumed at seq {self.acked_seq}")
+        elif msg_type == "ack":
+            self.acknowledge(int(message["seq"]))
+        elif msg_type == "codec":
+            # 握手结果, 之后开始补发积压
+            if message.get("codec") == CODEC_NAME and message.get("schema_id") == self.schema.id:
+                self.encoder = MetricEncoder(self.schema)
+                self._seq_frames = bool(message.get("seq_frames"))
+            else:
+                self.encoder = None
+                self._seq_frames = False
+            self._ready.set()
+            self._pending.set()
+        elif msg_type == "raw_request":
+            # 服务端拉取原始样本
+            await self.send_raw_samples(message)
+        elif msg_type == "codec_reset":
+            # 服务端无法解码, 重新握手后从已确认处补发
+            self._ready.clear()
+            self.sent_seq = self.acked_seq
+            await self.send_hello()
     
     async def handle_upgrade(self, message: dict):
         """处理升级命令"""
@@ -129,11 +388,11 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     
     if len(sys.argv) != 3:
-        print("Usage: python client.py <server_url> <agent_id>")
+        print("Usage: python -m app.agent.client <server_url> <agent_id>")
         sys.exit(1)
     
     server_url = sys.argv[1]
     agent_id = sys.argv[2]
     
     client = AgentClient(server_url, agent_id)
-    asyncio.run(client.connect()) 
\ No newline at end of file
+    asyncio.run(client.run()) 
\ No newline at end of file
@@ -0,0 +1,64 @@
+import math
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """最近秩法求分位数, values需已排序"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+class SampleRing:
+    """定长环形缓冲
+
+    预先分配capacity行, 写满后覆盖最旧的样本, 内存占用固定。
+    每行为一个时间戳和按fields顺序排列的数值。
+    """
+
+    def __init__(self, fields: Sequence[str], capacity: int):
+        if capacity < 1:
+            raise ValueError("Ring capacity must be positive")
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._timestamps: List[Optional[datetime]] = [None] * capacity
+        self._rows: List[Optional[Tuple[float, ...]]] = [None] * capacity
+        self._next = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: datetime, values: Sequence[float]) -> None:
+        self._timestamps[self._next] = timestamp
+        self._rows[self._next] = tuple(values)
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def since(self, start: Optional[datetime] = None) -> List[Tuple[datetime, Tuple[float, ...]]]:
+        """按时间顺序返回start之后(含)的样本"""
+        result = []
+        # 从最新的样本往回找, 窗口通常远小于缓冲
+        for i in range(self.count):
+            pos = (self._next - 1 - i) % self.capacity
+            timestamp = self._timestamps[pos]
+            if start is not None and timestamp < start:
+                break
+            result.append((timestamp, self._rows[pos]))
+        result.reverse()
+        return result
+
+    def summarize(self, start: Optional[datetime] = None) -> Dict[str, Dict[str, float]]:
+        """统计start之后各字段的min/max/avg/p95"""
+        rows = [row for _, row in self.since(start)]
+        if not rows:
+            return {}
+        summary = {}
+        for field, column in zip(self.fields, zip(*rows)):
+            ordered = sorted(column)
+            summary[field] = {
+                "min": ordered[0],
+                "max": ordered[-1],
+                "avg": sum(ordered) / len(ordered),
+                "p95": percentile(ordered, 0.95),
+            }
+        return summary
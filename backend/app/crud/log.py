@@ -1,12 +1,20 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
-from sqlalchemy import and_, or_, text
+from typing import List, Optional, Dict, Any, Sequence, Set, Tuple
+from datetime import date, datetime, timedelta
+import base64
+import csv
+import heapq
+import io
+import json
+import threading
+from sqlalchemy import and_, or_, text, func, tuple_
 from sqlalchemy.orm import Session
-from app.models.log import LogSource, LogParseRule, Log
+from app.models.log import LogSource, LogParseRule, Log, LogTemplate, LogMetricRule
+from app.infrastructure.config import settings
+from app.infrastructure.log.archive import ARCHIVE_COLUMNS, ArchiveQuery, LogArchiveStore
 from app.interface.api.v1.schemas.log import (
     LogSourceCreate, LogSourceUpdate,
     LogParseRuleCreate, LogParseRuleUpdate,
-    LogEntry, LogQuery
+    LogEntry, LogQuery, LogMetricRuleCreate
 )
 
 class CRUDLogSource:
@@ -94,7 +102,73 @@ class CRUDLogParseRule:
             db.commit()
         return obj
 
+class CRUDLogMetricRule:
+    def get(self, db: Session, id: int) -> Optional[LogMetricRule]:
+        return db.query(LogMetricRule).filter(LogMetricRule.id == id).first()
+
+    def get_multi(
+        self, db: Session, *, skip: int = 0, limit: int = 100
+    ) -> List[LogMetricRule]:
+        return db.query(LogMetricRule).offset(skip).limit(limit).all()
+
+    def get_enabled(self, db: Session) -> List[LogMetricRule]:
+        return db.query(LogMetricRule).filter(LogMetricRule.enabled.is_(True)).all()
+
+    def create(self, db: Session, *, obj_in: LogMetricRuleCreate) -> LogMetricRule:
+        db_obj = LogMetricRule(**obj_in.dict())
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def delete(self, db: Session, *, id: int) -> Optional[LogMetricRule]:
+        obj = db.query(LogMetricRule).get(id)
+        if obj:
+            db.delete(obj)
+            db.commit()
+        return obj
+
+# 全文搜索使用的分词配置, 需与018迁移中的表达式索引一致
+LOG_SEARCH_CONFIG = "simple"
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def encode_log_cursor(log_obj: Log) -> str:
+    """以最后一条日志的 (timestamp, id) 生成分页游标"""
+    raw = f"{log_obj.timestamp.isoformat()}|{log_obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_log_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid log search cursor")
+
+def _is_missing_partition(error: Exception) -> bool:
+    """写入的行没有对应的日分区 (check_violation: no partition of relation ... found for row)"""
+    # SQLAlchemy包装的异常在orig上, COPY直接抛出psycopg2的异常
+    orig = getattr(error, "orig", error)
+    return getattr(orig, "pgcode", None) == "23514" and "no partition" in str(orig)
+
+# 批量写入的列, 顺序与COPY语句一致
+LOG_COPY_COLUMNS = (
+    "source_id", "timestamp", "level", "message", "parsed_fields", "metadata", "template_id"
+)
+
 class CRUDLog:
+    def __init__(self):
+        # 已确认存在的日分区, 避免每批写入都检查分区
+        self._partition_days: Set[date] = set()
+        # 移出数据库的冷数据
+        self.archive = LogArchiveStore(
+            settings.LOG_ARCHIVE_DIR,
+            workers=settings.LOG_ARCHIVE_SCAN_WORKERS,
+            block_rows=settings.LOG_ARCHIVE_BLOCK_ROWS
+        )
+        self._retention_lock = threading.Lock()
+
     def create(self, db: Session, *, obj_in: LogEntry) -> Log:
         db_obj = Log(**obj_in.dict())
         db.add(db_obj)
@@ -102,36 +176,301 @@ class CRUDLog:
         db.refresh(db_obj)
         return db_obj
 
+    def create_many(self, db: Session, *, objs_in: Sequence[LogEntry]) -> int:
+        """在一个事务内批量写入日志, 返回写入行数
+
+        PostgreSQL(psycopg2)下使用COPY, 其他驱动退化为多行INSERT。
+        """
+        if not objs_in:
+            return 0
+        self._ensure_partitions_for(db, objs_in)
+        try:
+            self._insert_many(db, objs_in)
+        except Exception as e:
+            if not _is_missing_partition(e):
+                raise
+            # 分区缓存是进程内的, 其他进程删除或归档分区后不会失效; 重新确认后重试一次
+            self._partition_days.clear()
+            self._ensure_partitions_for(db, objs_in)
+            self._insert_many(db, objs_in)
+        return len(objs_in)
+
+    def _insert_many(self, db: Session, objs_in: Sequence[LogEntry]) -> None:
+        try:
+            connection = db.connection()
+            if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2":
+                with connection.connection.cursor() as cursor:
+                    self._copy(cursor, objs_in)
+            else:
+                db.execute(Log.__table__.insert(), [
+                    {column: getattr(obj, column) for column in LOG_COPY_COLUMNS}
+                    for obj in objs_in
+                ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    def ensure_partitions(self, db: Session, *, start: date, days: int) -> int:
+        """创建 [start, start + days) 范围内缺失的日分区, 返回新建分区数"""
+        created = db.execute(
+            text("SELECT ensure_log_partitions(:start, :days)"),
+            {"start": start, "days": days}
+        ).scalar()
+        db.commit()
+        self._partition_days.update(start + timedelta(days=i) for i in range(days))
+        return created or 0
+
+    def drop_partitions_before(self, db: Session, *, cutoff: datetime) -> int:
+        """删除整天早于cutoff的日分区, 返回删除的估算行数
+
+        保留策略直接删除分区, 代价与历史数据总量无关。
+        """
+        dropped = db.execute(
+            text("SELECT drop_log_partitions_before(:cutoff)"),
+            {"cutoff": cutoff.date()}
+        ).scalar()
+        db.commit()
+        self._partition_days = {d for d in self._partition_days if d >= cutoff.date()}
+        return dropped or 0
+
+    def archive_partitions_before(self, db: Session, *, cutoff: datetime) -> int:
+        """把整天早于cutoff的日分区写入冷数据归档后删除, 返回归档行数
+
+        分区先从logs上分离并改名, 之后的写入不会再落进正在归档的表
+        (迟到日志重新建分区, 下次归档时合并)。分离后的表按 (timestamp, id)
+        顺序流式读出写成归档文件, 文件落盘后才删除; 中途失败时表仍在,
+        下次重新归档, 重复的行由write_day去掉。
+        """
+        tables = db.execute(text("""
+            SELECT c.relname, i.inhrelid IS NOT NULL AS attached
+            FROM pg_class c
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'logs'::regclass
+            WHERE c.relkind = 'r'
+              AND c.relname ~ '^logs_p[0-9]{8}(_archiving)?$'
+              AND to_date(substring(c.relname FROM 7 FOR 8), 'YYYYMMDD') < :cutoff
+            ORDER BY attached, c.relname
+        """), {"cutoff": cutoff.date()}).all()
+
+        archived = 0
+        for name, attached in tables:
+            day = datetime.strptime(name[len("logs_p"):len("logs_p") + 8], "%Y%m%d").date()
+            self._partition_days.discard(day)
+            if attached:
+                db.execute(text(f'ALTER TABLE logs DETACH PARTITION "{name}"'))
+                db.execute(text(f'ALTER TABLE "{name}" RENAME TO "{name}_archiving"'))
+                db.commit()
+                name = f"{name}_archiving"
+            rows = db.connection().execution_options(stream_results=True).execute(
+                text(f'SELECT {", ".join(ARCHIVE_COLUMNS)} FROM "{name}" ORDER BY timestamp, id')
+            )
+            archived += self.archive.write_day(day, (tuple(row) for row in rows))
+            db.execute(text(f'DROP TABLE "{name}"'))
+            db.commit()
+        return archived
+
+    def apply_retention(
+        self, db: Session, *, retention_days: int, archive_after_days: Optional[int] = None
+    ) -> int:
+        """执行日志保留策略, 返回归档与删除的行数
+
+        给出archive_after_days时先把更早的分区移入归档, 再删除超出
+        retention_days的分区和归档。同一进程内的调用串行执行。
+        """
+        with self._retention_lock:
+            now = datetime.now()
+            affected = 0
+            if archive_after_days:
+                affected += self.archive_partitions_before(db, cutoff=now - timedelta(days=archive_after_days))
+            cutoff = now - timedelta(days=retention_days)
+            affected += self.drop_partitions_before(db, cutoff=cutoff)
+            affected += self.archive.delete_before(cutoff.date())
+            return affected
+
+    def _ensure_partitions_for(self, db: Session, objs_in: Sequence[LogEntry]) -> None:
+        if db.bind.dialect.name != "postgresql":
+            return
+        days = {obj.timestamp.date() for obj in objs_in} - self._partition_days
+        if days:
+            start = min(days)
+            self.ensure_partitions(db, start=start, days=(max(days) - start).days + 1)
+
+    def _copy(self, cursor, objs_in: Sequence[LogEntry]) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objs_in:
+            writer.writerow((
+                obj.source_id,
+                obj.timestamp.isoformat(),
+                obj.level,
+                obj.message,
+                json.dumps(obj.parsed_fields, ensure_ascii=False, default=str)
+                if obj.parsed_fields is not None else None,
+                json.dumps(obj.metadata, ensure_ascii=False, default=str)
+                if obj.metadata is not None else None,
+                obj.template_id,
+            ))
+        buffer.seek(0)
+        # 未加引号的空字段为NULL; message非空约束下空字符串仍按空串写入
+        cursor.copy_expert(
+            f"COPY {Log.__tablename__} ({', '.join(LOG_COPY_COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (message))",
+            buffer
+        )
+
     def search(
         self, db: Session, *, query: LogQuery
-    ) -> List[Log]:
+    ) -> Tuple[List[Log], Optional[str]]:
+        """搜索日志, 按 (timestamp, id) 倒序游标分页
+
+        返回本页日志和下一页游标, 没有更多数据时游标为None。
+        所有条件均为绑定参数, 文本与字段过滤分别命中三元组/全文索引和jsonb包含索引。
+        """
         filters = []
         
-        if query.start_time:
-            filters.append(Log.timestamp >= query.start_time)
-        if query.end_time:
-            filters.append(Log.timestamp <= query.end_time)
+        cursor = decode_log_cursor(query.cursor) if query.cursor else None
+        
+        # 时间范围始终作为普通比较条件给出, 规划器据此只扫描相关日分区;
+        # 未指定起始时间时只搜索最近LOG_SEARCH_DEFAULT_DAYS天
+        end_time = query.end_time
+        if cursor and (end_time is None or cursor[0] < end_time):
+            end_time = cursor[0]
+        start_time = query.start_time or (query.end_time or datetime.now()) - timedelta(
+            days=settings.LOG_SEARCH_DEFAULT_DAYS
+        )
+        filters.append(Log.timestamp >= start_time)
+        if end_time:
+            filters.append(Log.timestamp <= end_time)
         if query.source_ids:
             filters.append(Log.source_id.in_(query.source_ids))
         if query.levels:
             filters.append(Log.level.in_(query.levels))
         if query.search_text:
-            filters.append(Log.message.ilike(f"%{query.search_text}%"))
-        if query.field_filters:
-            for field, value in query.field_filters.items():
+            if query.search_mode == "fulltext":
                 filters.append(
-                    text(f"parsed_fields->'{field}' = '{value}'::jsonb")
+                    func.to_tsvector(LOG_SEARCH_CONFIG, Log.message).op("@@")(
+                        func.websearch_to_tsquery(LOG_SEARCH_CONFIG, query.search_text)
+                    )
+                )
+            else:
+                filters.append(Log.message.ilike(f"%{_escape_like(query.search_text)}%", escape="\\"))
+        if query.field_filters:
+            # 多个字段合并为一次包含判断: parsed_fields @> {"field": value, ...}
+            filters.append(
+                text("logs.parsed_fields @> CAST(:field_filters AS jsonb)").bindparams(
+                    field_filters=json.dumps(query.field_filters, ensure_ascii=False, default=str)
                 )
+            )
+        if query.template_ids:
+            filters.append(Log.template_id.in_(query.template_ids))
+        if cursor:
+            filters.append(tuple_(Log.timestamp, Log.id) < tuple_(*cursor))
 
         base_query = db.query(Log)
         if filters:
             base_query = base_query.filter(and_(*filters))
         
-        return base_query.order_by(Log.timestamp.desc())\
-                        .offset(query.offset)\
-                        .limit(query.limit)\
-                        .all()
+        items = base_query.order_by(Log.timestamp.desc(), Log.id.desc())\
+                          .limit(query.limit)\
+                          .all()
+        items = self._merge_archive(items, query, start_time, end_time, cursor)
+        next_cursor = encode_log_cursor(items[-1]) if len(items) == query.limit else None
+        return items, next_cursor
+
+    def _merge_archive(
+        self,
+        items: List[Log],
+        query: LogQuery,
+        start_time: datetime,
+        end_time: Optional[datetime],
+        cursor: Optional[Tuple[datetime, int]]
+    ) -> List[Log]:
+        """时间范围覆盖到已归档的日期时, 并入归档中的日志
+
+        数据库这一页已满且最后一条晚于最新归档日时无需扫描归档。
+        归档结果与数据库结果同按 (timestamp, id) 倒序合并, 游标对两者通用。
+        """
+        newest = self.archive.newest_day()
+        if newest is None or start_time.date() > newest:
+            return items
+        if len(items) == query.limit and items[-1].timestamp.date() > newest:
+            return items
+        rows = self.archive.search(ArchiveQuery(
+            start_time=start_time,
+            end_time=end_time,
+            source_ids=query.source_ids,
+            levels=query.levels,
+            template_ids=query.template_ids,
+            search_text=query.search_text,
+            search_mode=query.search_mode,
+            field_filters=query.field_filters,
+            cursor=cursor,
+            limit=query.limit
+        ))
+        archived = [Log(**row) for row in rows]
+        merged = heapq.merge(items, archived, key=lambda l: (l.timestamp, l.id), reverse=True)
+        return list(merged)[:query.limit]
+
+    def top_templates(
+        self,
+        db: Session,
+        *,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        source_id: Optional[int] = None,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """时间范围内日志条数最多的模板
+
+        在 (template_id, timestamp) 索引上分组计数, 时间范围默认与搜索一致。
+        """
+        end_time = end_time or datetime.now()
+        start_time = start_time or end_time - timedelta(days=settings.LOG_SEARCH_DEFAULT_DAYS)
+        counts = db.query(Log.template_id, func.count().label("count")).filter(
+            Log.timestamp >= start_time,
+            Log.timestamp <= end_time,
+            Log.template_id.isnot(None)
+        )
+        if source_id is not None:
+            counts = counts.filter(Log.source_id == source_id)
+        counts = counts.group_by(Log.template_id)\
+                       .order_by(func.count().desc())\
+                       .limit(limit)\
+                       .subquery()
+        rows = db.query(counts.c.template_id, counts.c.count, LogTemplate.template, LogTemplate.sample)\
+                 .outerjoin(LogTemplate, LogTemplate.id == counts.c.template_id)\
+                 .order_by(counts.c.count.desc())\
+                 .all()
+        return [
+            {"template_id": r.template_id, "count": r.count, "template": r.template, "sample": r.sample}
+            for r in rows
+        ]
+
+class CRUDLogTemplate:
+    def get_multi_by_source(self, db: Session, *, source_id: int) -> List[LogTemplate]:
+        return db.query(LogTemplate).filter(LogTemplate.source_id == source_id).all()
+
+    def upsert_many(self, db: Session, *, source_id: int, templates: Sequence[Any]) -> int:
+        """写入新模板或更新已泛化的模板文本, templates为领域层的LogTemplate"""
+        if not templates:
+            return 0
+        db.execute(
+            text("""
+                INSERT INTO log_templates (id, source_id, template, sample)
+                VALUES (:id, :source_id, :template, :sample)
+                ON CONFLICT (id) DO UPDATE
+                SET template = EXCLUDED.template, updated_at = CURRENT_TIMESTAMP
+            """),
+            [
+                {"id": t.id, "source_id": source_id, "template": t.template, "sample": t.sample}
+                for t in templates
+            ]
+        )
+        db.commit()
+        return len(templates)
 
 log_source = CRUDLogSource()
 log_parse_rule = CRUDLogParseRule()
-log = CRUDLog() 
\ No newline at end of file
+log = CRUDLog()
+log_template = CRUDLogTemplate()
+log_metric_rule = CRUDLogMetricRule() 
\ No newline at end of file
@@ -0,0 +1,273 @@
+import struct
+import zlib
+from operator import itemgetter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 协商时使用的编码名称
+CODEC_NAME = "delta-v1"
+
+GAUGE = "gauge"      # 瞬时值, 按scale量化为整数
+COUNTER = "counter"  # 单调累计值, 传输与上一个样本的差值
+
+MAGIC = 0xD1
+FLAG_KEYFRAME = 0x01
+HEADER = struct.Struct("<BBHH")  # 魔数, 标志, 模式ID, 样本数
+# 握手协商seq_frames后, 每个二进制帧前附带其第一个样本的上报序号,
+# 帧内样本的序号依次加一
+FRAME_SEQ = struct.Struct("<Q")
+
+# 列宽代码 -> struct格式字符; 0表示整列差值都为0, 不占字节
+WIDTHS = (None, "h", "i", "q")
+LIMITS = ((0, 0), (-(1 << 15), (1 << 15) - 1), (-(1 << 31), (1 << 31) - 1))
+
+EPOCH = datetime(1970, 1, 1)
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """指标字段, name中的"."表示嵌套, 如 network.bytes_sent"""
+    name: str
+    kind: str = GAUGE
+    scale: int = 100  # 仅对gauge生效, 100即保留两位小数
+
+# Agent每个上报周期发送的系统指标
+AGENT_METRIC_FIELDS = (
+    FieldSpec("cpu_percent"),
+    FieldSpec("memory_percent"),
+    FieldSpec("disk_usage"),
+    # 上报周期内高频采样的统计, 上面的百分比为周期平均值
+    FieldSpec("cpu_percent_min"),
+    FieldSpec("cpu_percent_max"),
+    FieldSpec("cpu_percent_p95"),
+    FieldSpec("memory_percent_min"),
+    FieldSpec("memory_percent_max"),
+    FieldSpec("memory_percent_p95"),
+    FieldSpec("network.bytes_sent", COUNTER),
+    FieldSpec("network.bytes_recv", COUNTER),
+    FieldSpec("network.packets_sent", COUNTER),
+    FieldSpec("network.packets_recv", COUNTER),
+    FieldSpec("network.errin", COUNTER),
+    FieldSpec("network.errout", COUNTER),
+    FieldSpec("network.dropin", COUNTER),
+    FieldSpec("network.dropout", COUNTER),
+)
+
+class CodecError(ValueError):
+    """帧无法解码, 需要重新握手"""
+
+class MetricSchema:
+    """握手时交换一次的字段模式, 之后的帧只携带数值"""
+
+    def __init__(self, fields: Sequence[FieldSpec]):
+        self.fields = tuple(fields)
+        self.names = [f.name for f in self.fields]
+        self.paths = [tuple(name.split(".")) for name in self.names]
+        description = ";".join(f"{f.name}:{f.kind}:{f.scale}" for f in self.fields)
+        self.id = zlib.crc32(description.encode()) & 0xFFFF
+
+    def to_dict(self) -> Dict:
+        return {
+            "schema_id": self.id,
+            "fields": [{"name": f.name, "kind": f.kind, "scale": f.scale} for f in self.fields],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MetricSchema":
+        try:
+            schema = cls([FieldSpec(f["name"], f.get("kind", GAUGE), int(f.get("scale", 100)))
+                          for f in data["fields"]])
+        except (KeyError, TypeError, ValueError) as e:
+            raise CodecError(f"Invalid metric schema: {e}")
+        if any(f.kind not in (GAUGE, COUNTER) for f in schema.fields):
+            raise CodecError("Unknown metric field kind")
+        if schema.id != data.get("schema_id", schema.id):
+            raise CodecError("Metric schema id mismatch")
+        return schema
+
+def _width(deltas: Sequence[int]) -> int:
+    low, high = min(deltas), max(deltas)
+    for code, (lower, upper) in enumerate(LIMITS):
+        if lower <= low and high <= upper:
+            return code
+    return 3
+
+class MetricEncoder:
+    """Agent端编码器
+
+    一帧包含一个或多个样本, 按列存放: 第0列为毫秒时间戳, 其余为各字段;
+    每个值是与前一个样本的差值(gauge先量化为整数), 每列按其中最大的
+    差值选择0/2/4/8字节宽度, 不变的列不占字节。关键帧从0开始计算差值,
+    每keyframe_interval帧发送一次, 也用于重新握手后的第一帧。
+    """
+
+    def __init__(self, schema: MetricSchema, keyframe_interval: int = 60):
+        self.schema = schema
+        self.keyframe_interval = keyframe_interval
+        self.reset()
+
+    def reset(self) -> None:
+        """下一帧作为关键帧发送"""
+        self._state: Optional[List[int]] = None
+        self._frames = 0
+
+    def _row(self, timestamp: datetime, data: Dict) -> List[int]:
+        row = [(timestamp - EPOCH) // timedelta(milliseconds=1)]
+        for field, path in zip(self.schema.fields, self.schema.paths):
+            value = data
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            value = value or 0
+            row.append(round(value * field.scale) if field.kind == GAUGE else int(value))
+        return row
+
+    def encode(self, samples: Sequence[Tuple[datetime, Dict]]) -> bytes:
+        """编码按时间顺序排列的样本"""
+        rows = [self._row(ts, data) for ts, data in samples]
+        keyframe = self._state is None or self._frames % self.keyframe_interval == 0
+        previous = [0] * len(rows[0]) if keyframe else self._state
+
+        columns = []
+        for i, prev in enumerate(previous):
+            deltas = []
+            for row in rows:
+                deltas.append(row[i] - prev)
+                prev = row[i]
+            columns.append(deltas)
+        codes = [_width(deltas) for deltas in columns]
+
+        bitmap = bytearray((len(codes) + 3) // 4)
+        for i, code in enumerate(codes):
+            bitmap[i // 4] |= code << (i % 4 * 2)
+        fmt = "<" + "".join(WIDTHS[code] * len(rows) for code in codes if code)
+        values = [v for code, deltas in zip(codes, columns) if code for v in deltas]
+
+        self._state = rows[-1]
+        self._frames += 1
+        return (
+            HEADER.pack(MAGIC, FLAG_KEYFRAME if keyframe else 0, self.schema.id, len(rows))
+            + bytes(bitmap)
+            + struct.pack(fmt, *values)
+        )
+
+class MetricDecoder:
+    """服务端解码器, 每个连接一个, 保存上一个样本用于还原差值
+
+    每种列宽组合的struct只编译一次, 一帧只调用一次unpack; 单样本帧
+    直接按列下标相加, 不逐列循环。
+    """
+
+    def __init__(self, schema: MetricSchema):
+        self.schema = schema
+        self._state: Optional[List[int]] = None
+        self._bitmap_size = (len(schema.fields) + 1 + 3) // 4
+        # (位图, 样本数) -> (struct, 各列宽代码, 单样本时各列在解包结果中的下标)
+        self._layouts: Dict[Tuple[bytes, int], Tuple[struct.Struct, List[int], List[int]]] = {}
+        # 还原为与JSON上报相同的嵌套结构, 列0为时间戳
+        self._gauges = [
+            (i + 1, field.scale) for i, field in enumerate(schema.fields) if field.kind == GAUGE
+        ]
+        self._scalar_keys = [path[0] for path in schema.paths if len(path) == 1]
+        self._scalar_cols = self._getter([i + 1 for i, path in enumerate(schema.paths) if len(path) == 1])
+        groups: Dict[str, List[Tuple[str, int]]] = {}
+        for i, path in enumerate(schema.paths):
+            if len(path) > 1:
+                groups.setdefault(path[0], []).append((path[1], i + 1))
+        self._groups = [
+            (name, [key for key, _ in members], self._getter([col for _, col in members]))
+            for name, members in groups.items()
+        ]
+
+    @staticmethod
+    def _getter(cols: List[int]):
+        """按列下标一次取出多列, 始终返回元组"""
+        if len(cols) == 1:
+            col = cols[0]
+            return lambda values: (values[col],)
+        return itemgetter(*cols)
+
+    def _layout(self, bitmap: bytes, count: int) -> Tuple[struct.Struct, List[int], List[int]]:
+        layout = self._layouts.get((bitmap, count))
+        if layout is None:
+            codes = [
+                bitmap[i // 4] >> (i % 4 * 2) & 0b11
+                for i in range(len(self.schema.fields) + 1)
+            ]
+            fmt = "<" + "".join(WIDTHS[code] * count for code in codes if code)
+            index = []
+            pos = 0
+            for code in codes:
+                # 不占字节的列指向解包结果末尾追加的0
+                index.append(pos if code else -1)
+                pos += 1 if code else 0
+            layout = self._layouts[(bitmap, count)] = (struct.Struct(fmt), codes, index)
+        return layout
+
+    def decode(self, frame: bytes) -> List[Tuple[datetime, Dict]]:
+        """解码一帧, 返回 [(时间, 指标)], 指标与JSON上报的data结构相同"""
+        return [self._sample(row) for row in self.decode_rows(frame)]
+
+    def reader(self, *names: str) -> Callable[[List[int]], Tuple]:
+        """返回从decode_rows的行中取出指定字段的函数, 跳过构造嵌套字典
+
+        返回值依次为时间和各字段的值。
+        """
+        cols = [self.schema.names.index(name) + 1 for name in names]
+        getter = self._getter(cols)
+        gauges = [
+            (i, self.schema.fields[col - 1].scale)
+            for i, col in enumerate(cols) if self.schema.fields[col - 1].kind == GAUGE
+        ]
+
+        def read(row: List[int]) -> Tuple:
+            values = list(getter(row))
+            for i, scale in gauges:
+                values[i] /= scale
+            return (EPOCH + timedelta(milliseconds=row[0]), *values)
+        return read
+
+    def decode_rows(self, frame: bytes) -> List[List[int]]:
+        """解码一帧, 返回各样本的原始整数行(列0为毫秒时间戳); 无法解码时抛出CodecError"""
+        try:
+            magic, flags, schema_id, count = HEADER.unpack_from(frame)
+        except struct.error:
+            raise CodecError("Truncated metric frame")
+        if magic != MAGIC or schema_id != self.schema.id:
+            raise CodecError("Unknown metric frame")
+        if not flags & FLAG_KEYFRAME and self._state is None:
+            raise CodecError("Delta frame without a preceding keyframe")
+        start = HEADER.size + self._bitmap_size
+        packer, codes, index = self._layout(frame[HEADER.size:start], count)
+        if len(frame) - start != packer.size:
+            raise CodecError("Metric frame length mismatch")
+        values = packer.unpack_from(frame, start)
+
+        state = [0] * len(codes) if flags & FLAG_KEYFRAME else self._state
+        if count == 1:
+            values += (0,)
+            rows = [[prev + values[i] for prev, i in zip(state, index)]]
+        else:
+            columns = []
+            pos = 0
+            for code, prev in zip(codes, state):
+                if not code:
+                    columns.append([prev] * count)
+                    continue
+                column = []
+                for delta in values[pos:pos + count]:
+                    prev += delta
+                    column.append(prev)
+                columns.append(column)
+                pos += count
+            rows = [list(row) for row in zip(*columns)]
+        self._state = rows[-1]
+        return rows
+
+    def _sample(self, row: List[int]) -> Tuple[datetime, Dict]:
+        values = list(row)
+        for col, scale in self._gauges:
+            values[col] /= scale
+        data = dict(zip(self._scalar_keys, self._scalar_cols(values)))
+        for name, keys, getter in self._groups:
+            data[name] = dict(zip(keys, getter(values)))
+        return EPOCH + timedelta(milliseconds=row[0]), data
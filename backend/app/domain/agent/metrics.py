@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from abc import ABC, abstractmethod
 
 @dataclass
@@ -15,6 +15,11 @@ class AgentMetrics:
     network_in: int
     network_out: int
     created_at: datetime
+    # 上报周期内高频采样的统计, 上面的百分比为周期平均值; 旧版本Agent不上报
+    cpu_percent_max: Optional[float] = None
+    cpu_percent_p95: Optional[float] = None
+    memory_percent_max: Optional[float] = None
+    memory_percent_p95: Optional[float] = None
 
 @dataclass
 class AgentMetricsHourly:
@@ -40,6 +45,11 @@ class AgentMetricsRepository(ABC):
         """保存指标"""
         pass
     
+    @abstractmethod
+    async def save_metrics_batch(self, metrics: List[AgentMetrics]) -> None:
+        """批量保存指标(单次往返多行写入)"""
+        pass
+    
     @abstractmethod
     async def save_hourly_metrics(self, metrics: AgentMetricsHourly) -> None:
         """保存小时聚合指标"""
@@ -68,4 +78,19 @@ class AgentMetricsRepository(ABC):
     @abstractmethod
     async def cleanup_metrics(self, before: datetime) -> None:
         """清理指标"""
-        pass 
\ No newline at end of file
+        pass
+    
+    @abstractmethod
+    async def rollup_hourly_metrics(self, hour: datetime) -> int:
+        """在数据库侧汇总指定小时所有Agent的指标, 返回写入行数"""
+        pass
+    
+    @abstractmethod
+    async def get_latest_hourly_hour(self) -> Optional[datetime]:
+        """获取最近一次已汇总的小时"""
+        pass
+    
+    @abstractmethod
+    async def cleanup_hourly_metrics(self, before: datetime) -> None:
+        """清理小时聚合指标"""
+        pass
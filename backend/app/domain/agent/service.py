@@ -16,12 +16,15 @@ class AgentService:
         agent_repo: AgentRepository,
         version_repo: AgentVersionRepository,
         task_repo: UpgradeTaskRepository,
-        metrics_repo: AgentMetricsRepository
+        metrics_repo: AgentMetricsRepository,
+        metrics_cache=None
     ):
         self.agent_repo = agent_repo
         self.version_repo = version_repo
         self.task_repo = task_repo
         self.metrics_repo = metrics_repo
+        # 可选的分桶指标缓存, 提供get_raw_metrics/get_hourly_metrics(..., loader)
+        self.metrics_cache = metrics_cache
     
     async def register_agent(
         self,
@@ -147,11 +150,16 @@ class AgentService:
             raise InvalidTimeRangeError("时间范围不能超过7天")
         
         try:
-            metrics = await self.metrics_repo.get_metrics(
-                agent_id=agent_id,
-                start_time=start_time,
-                end_time=end_time
-            )
+            if self.metrics_cache:
+                metrics = await self.metrics_cache.get_raw_metrics(
+                    agent_id, start_time, end_time, self.metrics_repo.get_metrics
+                )
+            else:
+                metrics = await self.metrics_repo.get_metrics(
+                    agent_id=agent_id,
+                    start_time=start_time,
+                    end_time=end_time
+                )
             
             if not metrics:
                 raise MetricsNotFoundError(f"未找到Agent {agent_id} 在指定时间范围的指标数据")
@@ -184,11 +192,16 @@ class AgentService:
             raise InvalidTimeRangeError("时间范围不能超过30天")
         
         try:
-            metrics = await self.metrics_repo.get_hourly_metrics(
-                agent_id=agent_id,
-                start_time=start_time,
-                end_time=end_time
-            )
+            if self.metrics_cache:
+                metrics = await self.metrics_cache.get_hourly_metrics(
+                    agent_id, start_time, end_time, self.metrics_repo.get_hourly_metrics
+                )
+            else:
+                metrics = await self.metrics_repo.get_hourly_metrics(
+                    agent_id=agent_id,
+                    start_time=start_time,
+                    end_time=end_time
+                )
             
             if not metrics:
                 raise MetricsNotFoundError(f"未找到Agent {agent_id} 在指定时间范围的聚合指标数据")
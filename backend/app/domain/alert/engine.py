@@ -0,0 +1,335 @@
+import ast
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .aggregate import AlertEvent, AlertRule
+
+logger = logging.getLogger(__name__)
+
+# 条件表达式中可引用的窗口聚合量
+CONDITION_FIELDS = ("value", "last", "avg", "min", "max", "sum", "count", "rate")
+
+Predicate = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+class InvalidConditionError(ValueError):
+    """告警条件无法解析"""
+    pass
+
+_COMPARE_OPS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+
+def _compile_node(node: ast.AST) -> Predicate:
+    """将表达式AST编译为作用于列向量的闭包"""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda cols: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in CONDITION_FIELDS:
+            raise InvalidConditionError(f"未知的条件变量: {node.id}")
+        name = node.id
+        return lambda cols: cols[name]
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand)
+        if isinstance(node.op, ast.USub):
+            return lambda cols: np.negative(operand(cols))
+        if isinstance(node.op, ast.Not):
+            return lambda cols: np.logical_not(operand(cols))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        op = _BINARY_OPS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda cols: op(left(cols), right(cols))
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(v) for v in node.values]
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        def bool_op(cols):
+            result = parts[0](cols)
+            for part in parts[1:]:
+                result = op(result, part(cols))
+            return result
+        return bool_op
+
+    if isinstance(node, ast.Compare) and all(type(o) in _COMPARE_OPS for o in node.ops):
+        # 支持链式比较, 如 "50 < value <= 90"
+        operands = [_compile_node(node.left)] + [_compile_node(c) for c in node.comparators]
+        ops = [_COMPARE_OPS[type(o)] for o in node.ops]
+        def compare(cols):
+            values = [operand(cols) for operand in operands]
+            result = ops[0](values[0], values[1])
+            for i in range(1, len(ops)):
+                result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+            return result
+        return compare
+
+    raise InvalidConditionError(f"不支持的条件表达式: {ast.dump(node)}")
+
+def compile_condition(condition: str) -> Predicate:
+    """编译告警条件
+
+    条件为Python表达式子集, 如 "value > 90"、"avg > 80 and max > 95"、
+    "rate > 1000", 编译结果对所有服务器的聚合列一次性求值, 返回布尔向量。
+    """
+    try:
+        tree = ast.parse(condition.strip(), mode="eval")
+    except SyntaxError as e:
+        raise InvalidConditionError(f"告警条件语法错误: {condition}") from e
+    return _compile_node(tree)
+
+class MetricWindows:
+    """按列组织的指标窗口
+
+    每个指标类型一个 [服务器数 × 样本数] 矩阵, 样本按时间升序、
+    尾部以NaN填充, 同一指标类型、同一窗口长度的聚合只计算一次。
+    """
+
+    def __init__(self, server_ids: List[str], now: datetime):
+        self.server_ids = np.array(server_ids, dtype=object)
+        self.server_index = {sid: i for i, sid in enumerate(server_ids)}
+        self.now = now.timestamp()
+        self._values: Dict[str, np.ndarray] = {}
+        self._times: Dict[str, np.ndarray] = {}
+        self._aggregates: Dict[Tuple[str, int], Dict[str, np.ndarray]] = {}
+
+    @classmethod
+    def from_samples(
+        cls,
+        samples: Iterable[Tuple[str, str, datetime, float]],
+        now: Optional[datetime] = None
+    ) -> "MetricWindows":
+        """由 (server_id, metric_type, timestamp, value) 样本构建"""
+        grouped: Dict[str, Dict[str, List[Tuple[float, float]]]] = {}
+        servers: Dict[str, None] = {}
+        for server_id, metric_type, timestamp, value in samples:
+            servers[server_id] = None
+            grouped.setdefault(metric_type, {}).setdefault(server_id, []).append(
+                (timestamp.timestamp(), value)
+            )
+
+        windows = cls(list(servers), now or datetime.now())
+        for metric_type, by_server in grouped.items():
+            width = max(len(points) for points in by_server.values())
+            values = np.full((len(servers), width), np.nan)
+            times = np.full((len(servers), width), np.nan)
+            for server_id, points in by_server.items():
+                points.sort()
+                row = windows.server_index[server_id]
+                times[row, :len(points)] = [p[0] for p in points]
+                values[row, :len(points)] = [p[1] for p in points]
+            windows.add_metric(metric_type, values, times)
+        return windows
+
+    def add_metric(self, metric_type: str, values: np.ndarray, times: np.ndarray) -> None:
+        """添加一个指标类型的矩阵(时间为Unix秒)"""
+        self._values[metric_type] = values
+        self._times[metric_type] = times
+        self._aggregates = {k: v for k, v in self._aggregates.items() if k[0] != metric_type}
+
+    def has_metric(self, metric_type: str) -> bool:
+        return metric_type in self._values
+
+    def aggregates(self, metric_type: str, interval: int) -> Dict[str, np.ndarray]:
+        """计算窗口聚合列, 窗口为 [now - interval, now]"""
+        key = (metric_type, interval)
+        if key in self._aggregates:
+            return self._aggregates[key]
+
+        values = self._values[metric_type]
+        times = self._times[metric_type]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mask = (times >= self.now - interval) & ~np.isnan(values)
+            count = mask.sum(axis=1)
+            has_data = count > 0
+            rows = np.arange(values.shape[0])
+
+            # 样本按时间升序, 窗口内首/末样本即掩码的首/末True位置
+            first_idx = np.argmax(mask, axis=1)
+            last_idx = values.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+            first = np.where(has_data, values[rows, first_idx], np.nan)
+            last = np.where(has_data, values[rows, last_idx], np.nan)
+            elapsed = times[rows, last_idx] - times[rows, first_idx]
+
+            total = np.where(mask, values, 0.0).sum(axis=1)
+            result = {
+                "value": last,
+                "last": last,
+                "count": count.astype(float),
+                "sum": np.where(has_data, total, np.nan),
+                "avg": np.where(has_data, total / np.maximum(count, 1), np.nan),
+                "max": np.where(has_data, np.where(mask, values, -np.inf).max(axis=1), np.nan),
+                "min": np.where(has_data, np.where(mask, values, np.inf).min(axis=1), np.nan),
+                "rate": np.where(has_data & (elapsed > 0), (last - first) / elapsed, 0.0),
+                "_has_data": has_data,
+            }
+        self._aggregates[key] = result
+        return result
+
+class ActiveAlertIndex:
+    """活动告警内存索引, 按 (rule_id, server_id) 定位告警事件"""
+
+    def __init__(self):
+        self._by_rule: Dict[str, Dict[str, AlertEvent]] = {}
+        self.loaded = False
+
+    def load(self, events: Iterable[AlertEvent]) -> None:
+        self._by_rule.clear()
+        for event in events:
+            self.add(event)
+        self.loaded = True
+
+    def add(self, event: AlertEvent) -> None:
+        self._by_rule.setdefault(event.rule_id, {})[event.server_id] = event
+
+    def get(self, rule_id: str, server_id: str) -> Optional[AlertEvent]:
+        return self._by_rule.get(rule_id, {}).get(server_id)
+
+    def pop(self, rule_id: str, server_id: str) -> Optional[AlertEvent]:
+        events = self._by_rule.get(rule_id)
+        if not events:
+            return None
+        event = events.pop(server_id, None)
+        if not events:
+            del self._by_rule[rule_id]
+        return event
+
+    def by_rule(self, rule_id: str) -> Dict[str, AlertEvent]:
+        return self._by_rule.get(rule_id, {})
+
+    def __len__(self) -> int:
+        return sum(len(events) for events in self._by_rule.values())
+
+@dataclass
+class CompiledRule:
+    """编译后的告警规则"""
+    rule: AlertRule
+    predicate: Predicate
+    condition: str
+
+@dataclass
+class EvaluationResult:
+    """一次批量评估的状态变化"""
+    fired: List[Tuple[AlertRule, str, Dict]] = field(default_factory=list)
+    continuing: List[AlertEvent] = field(default_factory=list)
+    resolved: List[AlertEvent] = field(default_factory=list)
+
+class AlertRuleEngine:
+    """告警规则引擎
+
+    规则条件只编译一次; 每轮评估对同一(指标, 窗口, 条件)在全部服务器上
+    向量化求值一次, 再按项目切片得到各规则的触发服务器, 与活动告警索引比对
+    得出新触发、持续和恢复的告警。
+    """
+
+    def __init__(self):
+        self._compiled: Dict[str, CompiledRule] = {}
+        self.index = ActiveAlertIndex()
+
+    def compile_rule(self, rule: AlertRule) -> Optional[CompiledRule]:
+        cached = self._compiled.get(rule.id)
+        if cached and cached.condition == rule.condition:
+            cached.rule = rule
+            return cached
+        try:
+            compiled = CompiledRule(rule, compile_condition(rule.condition), rule.condition)
+        except InvalidConditionError as e:
+            logger.error(f"Skip alert rule {rule.id}: {str(e)}")
+            self._compiled.pop(rule.id, None)
+            return None
+        self._compiled[rule.id] = compiled
+        return compiled
+
+    def sync_rules(self, rules: Iterable[AlertRule]) -> List[CompiledRule]:
+        """同步规则集, 仅对新增或条件变化的规则重新编译"""
+        active = [r for r in rules if r.enabled]
+        ids = {r.id for r in active}
+        for rule_id in list(self._compiled):
+            if rule_id not in ids:
+                del self._compiled[rule_id]
+        return [c for c in (self.compile_rule(r) for r in active) if c]
+
+    def evaluate(
+        self,
+        rules: Iterable[AlertRule],
+        windows: MetricWindows,
+        server_projects: Dict[str, str]
+    ) -> EvaluationResult:
+        """批量评估所有规则
+
+        server_projects: server_id -> project_id, 规则只作用于其所属项目的服务器。
+        """
+        compiled_rules = self.sync_rules(rules)
+        result = EvaluationResult()
+
+        project_rows: Dict[str, np.ndarray] = {}
+        for server_id, project_id in server_projects.items():
+            row = windows.server_index.get(server_id)
+            if row is not None:
+                project_rows.setdefault(project_id, []).append(row)
+        project_rows = {k: np.array(v, dtype=np.intp) for k, v in project_rows.items()}
+        empty = np.array([], dtype=np.intp)
+
+        verdicts: Dict[Tuple[str, int, str], np.ndarray] = {}
+        for compiled in compiled_rules:
+            rule = compiled.rule
+            rows = project_rows.get(rule.project_id, empty)
+            firing_rows = empty
+            if rows.size and windows.has_metric(rule.metric_type):
+                key = (rule.metric_type, rule.interval, compiled.condition)
+                verdict = verdicts.get(key)
+                if verdict is None:
+                    columns = windows.aggregates(rule.metric_type, rule.interval)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        verdict = np.broadcast_to(
+                            compiled.predicate(columns), columns["_has_data"].shape
+                        ).astype(bool) & columns["_has_data"]
+                    verdicts[key] = verdict
+                firing_rows = rows[verdict[rows]]
+
+            firing = set(windows.server_ids[firing_rows].tolist())
+            active = self.index.by_rule(rule.id)
+            for server_id in firing:
+                event = active.get(server_id)
+                if event:
+                    result.continuing.append(event)
+                else:
+                    columns = windows.aggregates(rule.metric_type, rule.interval)
+                    row = windows.server_index[server_id]
+                    details = {
+                        "metric_type": rule.metric_type,
+                        "condition": rule.condition,
+                        **{
+                            name: float(columns[name][row])
+                            for name in ("value", "avg", "min", "max", "rate")
+                        }
+                    }
+                    result.fired.append((rule, server_id, details))
+            for server_id in [s for s in active if s not in firing]:
+                # 只恢复本轮有数据的服务器, 数据缺失不视为恢复
+                row = windows.server_index.get(server_id)
+                if row is None or not windows.has_metric(rule.metric_type):
+                    continue
+                if windows.aggregates(rule.metric_type, rule.interval)["_has_data"][row]:
+                    result.resolved.append(active[server_id])
+
+        return result
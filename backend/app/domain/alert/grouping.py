@@ -0,0 +1,136 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+from .aggregate import AlertEvent, AlertRule, AlertSeverity
+
+# 分组可用的标签
+GROUP_LABELS = ("rule", "project", "severity", "server")
+
+# 摘要中逐条列出的最大告警数
+DIGEST_MAX_LINES = 20
+
+# 级别由低到高, 分组的级别取组内最高的
+SEVERITY_RANK = {AlertSeverity.INFO: 0, AlertSeverity.WARNING: 1, AlertSeverity.CRITICAL: 2}
+
+@dataclass
+class AlertGroup:
+    """一个分组窗口内的告警"""
+    key: Tuple[str, ...]
+    labels: Dict[str, str]
+    severity: AlertSeverity
+    events: List[Tuple[AlertEvent, AlertRule]] = field(default_factory=list)
+    opened_at: float = field(default_factory=time.monotonic)
+
+@dataclass
+class AlertDigest:
+    """分组摘要通知"""
+    group: AlertGroup
+    subject: str
+    content: str
+    params: Dict
+
+class ChannelRateLimiter:
+    """按渠道限制每分钟发送的摘要数
+
+    超出上限的摘要不发送, 其告警数累计后附在该渠道下一条摘要中。
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._sent: Dict[str, Deque[float]] = {}
+        self._suppressed: Dict[str, int] = {}
+
+    def acquire(self, channel_id: str, alerts: int, now: Optional[float] = None) -> Optional[int]:
+        """允许发送时返回此前被限流的告警数, 否则记入限流计数并返回None"""
+        now = time.monotonic() if now is None else now
+        sent = self._sent.setdefault(channel_id, deque())
+        while sent and sent[0] <= now - 60:
+            sent.popleft()
+        if len(sent) >= self.per_minute:
+            self._suppressed[channel_id] = self._suppressed.get(channel_id, 0) + alerts
+            return None
+        sent.append(now)
+        return self._suppressed.pop(channel_id, 0)
+
+class AlertGrouper:
+    """告警分组
+
+    新告警按配置的标签(规则、项目、级别、服务器)归组, 窗口结束时每组
+    只生成一条摘要通知, 机架级故障产生的成百上千条告警因此合并为少量通知。
+    """
+
+    def __init__(self, group_by: Sequence[str], window: float):
+        unknown = [label for label in group_by if label not in GROUP_LABELS]
+        if unknown:
+            raise ValueError(f"Unknown alert group labels: {', '.join(unknown)}")
+        self.group_by = tuple(group_by)
+        self.window = window
+        self._groups: Dict[Tuple[str, ...], AlertGroup] = {}
+
+    def add(self, event: AlertEvent, rule: AlertRule, now: Optional[float] = None) -> None:
+        """加入告警"""
+        values = {
+            "rule": rule.id,
+            "project": rule.project_id,
+            "severity": event.severity.value,
+            "server": event.server_id,
+        }
+        key = tuple(values[label] for label in self.group_by)
+        group = self._groups.get(key)
+        if group is None:
+            labels = {label: values[label] for label in self.group_by}
+            if "rule" in labels:
+                labels["rule"] = rule.name
+            opened_at = time.monotonic() if now is None else now
+            group = self._groups[key] = AlertGroup(key, labels, event.severity, opened_at=opened_at)
+        elif SEVERITY_RANK[event.severity] > SEVERITY_RANK[group.severity]:
+            # 不按级别分组时, 组内出现更高级别的告警须按该级别选择渠道
+            group.severity = event.severity
+        group.events.append((event, rule))
+
+    def pending(self) -> int:
+        return sum(len(g.events) for g in self._groups.values())
+
+    def flush(self, force: bool = False, now: Optional[float] = None) -> List[AlertDigest]:
+        """取出窗口已结束的分组并生成摘要"""
+        now = time.monotonic() if now is None else now
+        ready = [
+            key for key, group in self._groups.items()
+            if force or now - group.opened_at >= self.window
+        ]
+        return [self._digest(self._groups.pop(key)) for key in ready]
+
+    def _digest(self, group: AlertGroup) -> AlertDigest:
+        events = group.events
+        total = len(events)
+        rules = sorted({rule.name for _, rule in events})
+        servers = sorted({event.server_id for event, _ in events})
+
+        title = rules[0] if len(rules) == 1 else f"{rules[0]} 等{len(rules)}条规则"
+        subject = f"[{group.severity.value}] {total}条告警: {title}"
+
+        lines = [
+            "分组: " + ", ".join(f"{k}={v}" for k, v in group.labels.items()),
+            f"告警数: {total}, 涉及服务器: {len(servers)}",
+            ""
+        ]
+        for event, rule in events[:DIGEST_MAX_LINES]:
+            value = event.details.get("value") if event.details else None
+            suffix = f" value={value:.2f}" if isinstance(value, (int, float)) else ""
+            lines.append(f"- {event.first_occurred_at:%H:%M:%S} {event.server_id} {rule.name}{suffix}")
+        if total > DIGEST_MAX_LINES:
+            lines.append(f"... 另有{total - DIGEST_MAX_LINES}条告警未列出")
+
+        return AlertDigest(
+            group=group,
+            subject=subject,
+            content="\n".join(lines),
+            params={
+                "severity": group.severity.value,
+                "summary": subject,
+                "count": total,
+                "labels": group.labels,
+                "servers": servers[:DIGEST_MAX_LINES]
+            }
+        )
@@ -1,6 +1,42 @@
 from abc import ABC, abstractmethod
-from typing import List
-from .aggregate import AlertLevel, NotificationChannel
+from datetime import datetime
+from typing import List, Optional
+from .aggregate import AlertLevel, NotificationChannel, AlertRule, AlertEvent
+
+class AlertRuleRepository(ABC):
+    @abstractmethod
+    async def save(self, rule: AlertRule) -> None:
+        pass
+    
+    @abstractmethod
+    async def get_by_id(self, rule_id: str) -> Optional[AlertRule]:
+        pass
+    
+    @abstractmethod
+    async def list_by_project(self, project_id: str) -> List[AlertRule]:
+        pass
+    
+    @abstractmethod
+    async def list_enabled(self) -> List[AlertRule]:
+        pass
+
+class AlertEventRepository(ABC):
+    @abstractmethod
+    async def save(self, event: AlertEvent) -> None:
+        pass
+    
+    @abstractmethod
+    async def get_active_by_rule(self, rule_id: str) -> List[AlertEvent]:
+        pass
+    
+    @abstractmethod
+    async def list_active(self) -> List[AlertEvent]:
+        pass
+    
+    @abstractmethod
+    async def touch(self, event_ids: List[str], occurred_at: datetime) -> None:
+        """批量更新持续告警的最近发生时间"""
+        pass
 
 class AlertLevelRepository(ABC):
     @abstractmethod
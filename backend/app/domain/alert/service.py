@@ -16,10 +16,14 @@ from .aggregate import (
     AlertLevel,
     NotificationType
 )
+from .engine import AlertRuleEngine, MetricWindows, EvaluationResult
+from .streaming import AlertTransition
+from .grouping import AlertGrouper, AlertDigest, ChannelRateLimiter
 from ..monitor.service import MonitorService
 from ...interface.api.v1.ws import broadcast_alert
-from ...infrastructure.notification.sender import NotificationSender
+from ...infrastructure.notification.sender import NotificationDispatcher
 from ...interface.ws.messages import broadcast_alert
+import asyncio
 import json
 import logging
 
@@ -35,7 +39,10 @@ class AlertService:
         channel_repo: NotificationChannelRepository,
         monitor_service: MonitorService,
         level_repo: AlertLevelRepository,
-        notification_sender: NotificationSender
+        notification_sender: NotificationDispatcher,
+        rule_engine: Optional[AlertRuleEngine] = None,
+        alert_grouper: Optional[AlertGrouper] = None,
+        rate_limiter: Optional[ChannelRateLimiter] = None
     ):
         self.rule_repo = rule_repo
         self.event_repo = event_repo
@@ -43,6 +50,11 @@ class AlertService:
         self.monitor_service = monitor_service
         self.level_repo = level_repo
         self.notification_sender = notification_sender
+        # 规则引擎持有编译缓存和活动告警索引, 应在多次检查间复用
+        self.rule_engine = rule_engine or AlertRuleEngine()
+        # 配置分组器后新告警先归组, 由flush_alert_groups按组发送摘要
+        self.alert_grouper = alert_grouper
+        self.rate_limiter = rate_limiter
     
     async def create_rule(
         self,
@@ -72,26 +84,52 @@ class AlertService:
         await self.rule_repo.save(rule)
         return rule
     
-    async def check_alerts(self, server_id: str) -> None:
-        """检查服务器告警"""
-        # 获取最新指标
-        metrics = await self.monitor_service.get_server_metrics(
-            server_id=server_id,
-            hours=1
-        )
+    async def check_alerts(
+        self,
+        windows: MetricWindows,
+        server_projects: Dict[str, str]
+    ) -> EvaluationResult:
+        """批量检查告警
         
-        # 获取告警规则
-        rules = await self.rule_repo.list_by_project(server_id)
+        windows: 全部服务器的列式指标窗口
+        server_projects: server_id -> project_id
+        """
+        if not self.rule_engine.index.loaded:
+            # 活动告警只在首次检查时从数据库加载, 之后由内存索引维护
+            self.rule_engine.index.load(await self.event_repo.list_active())
         
-        for rule in rules:
-            if not rule.enabled:
-                continue
-                
-            # 评估告警条件
-            if self._evaluate_condition(rule.condition, metrics):
-                await self._create_or_update_alert(rule, server_id, metrics)
-            else:
-                await self._resolve_alerts(rule.id, server_id)
+        rules = await self.rule_repo.list_enabled()
+        result = self.rule_engine.evaluate(rules, windows, server_projects)
+        
+        now = datetime.now()
+        for rule, server_id, details in result.fired:
+            await self._create_or_update_alert(rule, server_id, details)
+        
+        if result.continuing:
+            for event in result.continuing:
+                event.last_occurred_at = now
+            await self.event_repo.touch([e.id for e in result.continuing], now)
+        
+        for event in result.resolved:
+            await self._resolve_alerts(event.rule_id, event.server_id)
+        
+        if result.fired or result.resolved:
+            logger.info(
+                f"Alert check: {len(result.fired)} fired, "
+                f"{len(result.continuing)} continuing, {len(result.resolved)} resolved"
+            )
+        return result
+    
+    async def apply_transition(self, transition: AlertTransition) -> None:
+        """应用流式评估产生的告警状态变化"""
+        if transition.firing:
+            await self._create_or_update_alert(
+                transition.rule,
+                transition.server_id,
+                transition.details
+            )
+        else:
+            await self._resolve_alerts(transition.rule.id, transition.server_id)
     
     async def _create_or_update_alert(
         self,
@@ -99,15 +137,16 @@ class AlertService:
         server_id: str,
         metrics: Dict
     ) -> None:
-        """创建或更新告警"""
+        """创建或更新告警
+        
+        批量检查与流式评估共用同一个服务实例并发调用, 新告警在写库前先
+        占用活动告警索引, 同一 (rule_id, server_id) 只会创建一个事件。
+        """
         now = datetime.now()
+        index = self.rule_engine.index
         
         # 检查是否存在活动告警
-        active_alerts = await self.event_repo.get_active_by_rule(rule.id)
-        existing = next(
-            (a for a in active_alerts if a.server_id == server_id),
-            None
-        )
+        existing = index.get(rule.id, server_id)
         
         if existing:
             # 更新现有告警
@@ -128,19 +167,28 @@ class AlertService:
                 resolved_at=None,
                 notification_sent=False
             )
-            await self.event_repo.save(event)
+            index.add(event)
+            try:
+                await self.event_repo.save(event)
+            except Exception:
+                # 写库失败时释放占用, 下一次检查重新创建
+                if index.get(rule.id, server_id) is event:
+                    index.pop(rule.id, server_id)
+                raise
             
             # 发送通知
-            await self._send_notifications(event)
+            if self.alert_grouper:
+                self.alert_grouper.add(event, rule)
+            else:
+                await self._send_notifications(event)
     
     async def _resolve_alerts(self, rule_id: str, server_id: str) -> None:
         """解决告警"""
-        active_alerts = await self.event_repo.get_active_by_rule(rule_id)
-        for alert in active_alerts:
-            if alert.server_id == server_id:
-                alert.status = AlertStatus.RESOLVED
-                alert.resolved_at = datetime.now()
-                await self.event_repo.save(alert) 
+        alert = self.rule_engine.index.pop(rule_id, server_id)
+        if alert:
+            alert.status = AlertStatus.RESOLVED
+            alert.resolved_at = datetime.now()
+            await self.event_repo.save(alert)
     
     async def create_alert(
         self,
@@ -205,13 +253,43 @@ class AlertService:
             }
         }
         
-        # 发送通知
+        # 投递给通知分发器后立即返回, 发送、重试和结果日志由分发器的工作协程完成,
+        # 告警处理不等待最慢的渠道
         for channel in channels:
-            success = await self.notification_sender.send(channel, message)
-            if success:
-                logger.info(f"Sent alert notification via {channel.type}")
-            else:
-                logger.error(f"Failed to send alert notification via {channel.type}")
+            self.notification_sender.dispatch(channel, message)
+    
+    async def flush_alert_groups(self, force: bool = False) -> int:
+        """投递窗口已结束的告警分组摘要, 返回投递的摘要数"""
+        if not self.alert_grouper:
+            return 0
+        
+        sent = 0
+        channels_by_severity: Dict[AlertSeverity, List[NotificationChannel]] = {}
+        for digest in self.alert_grouper.flush(force):
+            severity = digest.group.severity
+            if severity not in channels_by_severity:
+                channels_by_severity[severity] = await self.channel_repo.get_channels_by_level(severity)
+            
+            for channel in channels_by_severity[severity]:
+                message = self._digest_message(digest, channel)
+                if message and self.notification_sender.dispatch(channel, message):
+                    sent += 1
+        return sent
+    
+    def _digest_message(self, digest: AlertDigest, channel: NotificationChannel) -> Optional[Dict]:
+        """生成渠道摘要消息, 渠道被限流时返回None"""
+        content = digest.content
+        if self.rate_limiter:
+            suppressed = self.rate_limiter.acquire(channel.id, digest.params["count"])
+            if suppressed is None:
+                return None
+            if suppressed:
+                content += f"\n\n(此前有{suppressed}条告警因发送频率限制未单独通知)"
+        return {
+            "subject": digest.subject,
+            "content": content,
+            "params": digest.params
+        }
     
     def _format_alert_message(self, alert: AlertEvent) -> str:
         """格式化告警消息"""
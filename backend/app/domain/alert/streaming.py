@@ -0,0 +1,181 @@
+import logging
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .aggregate import AlertRule
+from .engine import ActiveAlertIndex, CompiledRule, InvalidConditionError, compile_condition
+
+logger = logging.getLogger(__name__)
+
+class SlidingWindow:
+    """滑动时间窗口
+
+    维护窗口内的和、单调队列形式的最大/最小值以及首尾样本,
+    每个样本摊还O(1)更新, 无需回读历史数据。
+    """
+
+    __slots__ = ("interval", "samples", "total", "_max", "_min")
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self.samples: deque = deque()
+        self.total = 0.0
+        self._max: deque = deque()
+        self._min: deque = deque()
+
+    def add(self, timestamp: float, value: float) -> bool:
+        """加入样本, 早于窗口内最新样本的乱序数据被忽略"""
+        if self.samples and timestamp < self.samples[-1][0]:
+            return False
+        sample = (timestamp, value)
+        self.samples.append(sample)
+        self.total += value
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append(sample)
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append(sample)
+        self._evict(timestamp - self.interval)
+        return True
+
+    def _evict(self, cutoff: float) -> None:
+        while self.samples and self.samples[0][0] < cutoff:
+            sample = self.samples.popleft()
+            self.total -= sample[1]
+            if self._max and self._max[0] is sample:
+                self._max.popleft()
+            if self._min and self._min[0] is sample:
+                self._min.popleft()
+        if not self.samples:
+            self.total = 0.0
+
+    def columns(self) -> Dict[str, float]:
+        """窗口聚合量, 字段与批量引擎一致"""
+        first_ts, first = self.samples[0]
+        last_ts, last = self.samples[-1]
+        count = len(self.samples)
+        elapsed = last_ts - first_ts
+        return {
+            "value": last,
+            "last": last,
+            "count": float(count),
+            "sum": self.total,
+            "avg": self.total / count,
+            "max": self._max[0][1],
+            "min": self._min[0][1],
+            "rate": (last - first) / elapsed if elapsed > 0 else 0.0,
+        }
+
+@dataclass
+class AlertTransition:
+    """告警状态变化"""
+    rule: AlertRule
+    server_id: str
+    firing: bool
+    details: Dict
+
+class StreamingAlertEvaluator:
+    """流式告警评估器
+
+    由指标写入流直接驱动: 每个样本只更新对应 (服务器, 指标, 窗口) 的
+    滑动窗口并评估相关规则, 条件越过阈值的那个样本即产生状态变化。
+    规则编译结果与批量引擎共享同一套条件语法。告警是否处于触发状态每次
+    都从与批量检查共用的ActiveAlertIndex读取, 批量检查触发或恢复的告警
+    流式评估立即可见。状态变化由告警服务写库并更新索引; 写库失败时abort,
+    之后的样本会重新产生这次变化。
+    """
+
+    def __init__(self, index: Optional[ActiveAlertIndex] = None):
+        self.index = index if index is not None else ActiveAlertIndex()
+        self._compiled: Dict[str, CompiledRule] = {}
+        self._rules: Dict[Tuple[str, str], List[CompiledRule]] = {}
+        self._intervals: Dict[Tuple[str, str], Set[int]] = {}
+        self._server_projects: Dict[str, str] = {}
+        self._windows: Dict[Tuple[str, str, int], SlidingWindow] = {}
+        # 已产生、尚未commit/abort的状态变化
+        self._pending: Set[Tuple[str, str]] = set()
+
+    def sync(self, rules: Iterable[AlertRule], server_projects: Dict[str, str]) -> None:
+        """同步规则与服务器归属, 仅重新编译新增或条件变化的规则"""
+        compiled: Dict[str, CompiledRule] = {}
+        for rule in rules:
+            if not rule.enabled:
+                continue
+            cached = self._compiled.get(rule.id)
+            if cached and cached.condition == rule.condition:
+                cached.rule = rule
+                compiled[rule.id] = cached
+                continue
+            try:
+                compiled[rule.id] = CompiledRule(rule, compile_condition(rule.condition), rule.condition)
+            except InvalidConditionError as e:
+                logger.error(f"Skip alert rule {rule.id}: {str(e)}")
+        self._compiled = compiled
+
+        self._rules = {}
+        self._intervals = {}
+        for c in compiled.values():
+            key = (c.rule.project_id, c.rule.metric_type)
+            self._rules.setdefault(key, []).append(c)
+            self._intervals.setdefault(key, set()).add(c.rule.interval)
+        self._server_projects = dict(server_projects)
+
+        # 释放不再被任何规则使用的窗口
+        used = {(m, i) for (_, m), intervals in self._intervals.items() for i in intervals}
+        self._windows = {
+            k: w for k, w in self._windows.items()
+            if (k[1], k[2]) in used and k[0] in self._server_projects
+        }
+
+    def observe(
+        self,
+        server_id: str,
+        metric_type: str,
+        timestamp: datetime,
+        value: float
+    ) -> List[AlertTransition]:
+        """输入一个样本, 返回由此产生的告警状态变化"""
+        project_id = self._server_projects.get(server_id)
+        if project_id is None:
+            return []
+        key = (project_id, metric_type)
+        rules = self._rules.get(key)
+        if not rules:
+            return []
+
+        ts = timestamp.timestamp()
+        columns: Dict[int, Dict[str, float]] = {}
+        for interval in self._intervals[key]:
+            window_key = (server_id, metric_type, interval)
+            window = self._windows.get(window_key)
+            if window is None:
+                window = self._windows[window_key] = SlidingWindow(interval)
+            window.add(ts, value)
+            columns[interval] = window.columns()
+
+        transitions = []
+        for compiled in rules:
+            rule = compiled.rule
+            cols = columns[rule.interval]
+            firing = bool(compiled.predicate(cols))
+            state_key = (rule.id, server_id)
+            if state_key in self._pending:
+                continue
+            if firing != (self.index.get(rule.id, server_id) is not None):
+                self._pending.add(state_key)
+                details = {"metric_type": metric_type, "condition": rule.condition}
+                details.update(
+                    (name, cols[name]) for name in ("value", "avg", "min", "max", "rate")
+                )
+                transitions.append(AlertTransition(rule, server_id, firing, details))
+        return transitions
+
+    def commit(self, transition: AlertTransition) -> None:
+        """状态变化已写库, 索引已由告警服务更新"""
+        self._pending.discard((transition.rule.id, transition.server_id))
+
+    def abort(self, transition: AlertTransition) -> None:
+        """状态变化写库失败, 保持原状态"""
+        self._pending.discard((transition.rule.id, transition.server_id))
@@ -57,6 +57,8 @@ class LogCollectorService:
         
         # 获取解析器
         parsers = await self.log_repo.get_collector_parsers(collector.id)
+        parsers = [p for p in parsers if p.enabled]
+        batch_size = config.get('batch_size', 1000)
         
         # 读取文件
         async with aiofiles.open(path, mode='r') as f:
@@ -64,29 +66,29 @@ class LogCollectorService:
             await f.seek(0, 2)
             
             while True:
-                line = await f.readline()
-                if not line:
-                    await asyncio.sleep(1)
-                    continue
-                
-                # 解析日志
-                log_entry = None
-                for parser in parsers:
-                    if not parser.enabled:
-                        continue
-                    
-                    log_entry = parser.parse(line)
-                    if log_entry:
+                # 一次读取当前可读的行(最多batch_size行), 整批解析后一次保存
+                records = []
+                line = ""
+                for _ in range(batch_size):
+                    line = await f.readline()
+                    if not line:
                         break
+                    
+                    # 解析日志
+                    for parser in parsers:
+                        log_entry = parser.parse(line)
+                        if log_entry:
+                            records.append({
+                                "content": line,
+                                "parsed": log_entry,
+                                "timestamp": datetime.now()
+                            })
+                            break
                 
-                if log_entry:
-                    # 保存解析结果
-                    await self.log_repo.save_log(
-                        collector_id=collector.id,
-                        content=line,
-                        parsed=log_entry,
-                        timestamp=datetime.now()
-                    )
+                if records:
+                    await self.log_repo.save_logs(collector.id, records)
+                elif not line:
+                    await asyncio.sleep(1)
     
     async def _collect_syslog(self, collector: LogCollector) -> None:
         """采集系统日志"""
@@ -0,0 +1,124 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+from ..monitor.aggregate import MetricValue
+
+# nginx request_time/upstream_response_time(秒)的默认分桶
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 直接取自日志条目的字段, 其余字段从parsed_fields读取
+ENTRY_ATTRIBUTES = ("level", "source_id", "template_id")
+
+class LogMetricKind(str, Enum):
+    COUNTER = "counter"      # 按标签计数, 如各级别日志条数、各状态码请求数
+    HISTOGRAM = "histogram"  # 数值字段分桶, 如请求耗时
+
+@dataclass
+class LogMetricRule:
+    """日志派生指标规则
+
+    匹配filters的日志按group_by字段取值分组, 计数或按value_field分桶,
+    每个刷新周期输出一组自定义指标数据点。
+    """
+    id: int
+    metric_id: str
+    server_id: str
+    kind: LogMetricKind
+    source_id: Optional[int] = None  # 为空时匹配所有日志源
+    filters: Dict[str, Any] = field(default_factory=dict)
+    group_by: List[str] = field(default_factory=list)
+    value_field: Optional[str] = None
+    buckets: List[float] = field(default_factory=lambda: list(DEFAULT_LATENCY_BUCKETS))
+
+def _get(entry, name: str):
+    if name in ENTRY_ATTRIBUTES:
+        return getattr(entry, name, None)
+    fields = entry.parsed_fields
+    return fields.get(name) if fields else None
+
+class LogMetricAggregator:
+    """在采集过程中把日志流折算为指标
+
+    observe只做字典计数, 不访问数据库; collect输出上个周期的增量并清零。
+    计数器每个标签组合输出一个点; 直方图按Prometheus约定输出累计分桶
+    (标签le)以及stat=sum/count两个点, 可由告警规则直接引用。
+    """
+
+    def __init__(self, rules: Iterable[LogMetricRule] = ()):
+        self.set_rules(rules)
+
+    def set_rules(self, rules: Iterable[LogMetricRule]) -> None:
+        self.rules = list(rules)
+        self._by_source: Dict[Optional[int], List[LogMetricRule]] = {}
+        for rule in self.rules:
+            self._by_source.setdefault(rule.source_id, []).append(rule)
+        for rule in self.rules:
+            rule.buckets = sorted(rule.buckets)
+        self._reset()
+
+    def _reset(self) -> None:
+        # (规则ID, 标签取值) -> 计数
+        self._counts: Dict[Tuple[int, Tuple], int] = {}
+        # (规则ID, 标签取值) -> [各分桶计数..., 超出最大分桶的计数, 总和]
+        self._histograms: Dict[Tuple[int, Tuple], List[float]] = {}
+
+    def observe(self, source_id: int, entries: Iterable) -> None:
+        """累计一批日志"""
+        rules = self._by_source.get(source_id, []) + self._by_source.get(None, [])
+        if not rules:
+            return
+        counts = self._counts
+        histograms = self._histograms
+        for entry in entries:
+            for rule in rules:
+                if rule.filters and any(_get(entry, k) != v for k, v in rule.filters.items()):
+                    continue
+                key = (rule.id, tuple(_get(entry, name) for name in rule.group_by))
+                if rule.kind == LogMetricKind.COUNTER:
+                    counts[key] = counts.get(key, 0) + 1
+                    continue
+                try:
+                    value = float(_get(entry, rule.value_field))
+                except (TypeError, ValueError):
+                    continue
+                hist = histograms.get(key)
+                if hist is None:
+                    hist = histograms[key] = [0] * (len(rule.buckets) + 1) + [0.0]
+                hist[bisect_left(rule.buckets, value)] += 1
+                hist[-1] += value
+
+    def collect(self, timestamp: Optional[datetime] = None) -> List[MetricValue]:
+        """输出本周期的指标数据点并清零"""
+        timestamp = timestamp or datetime.now()
+        rules = {rule.id: rule for rule in self.rules}
+        values: List[MetricValue] = []
+
+        def point(rule: LogMetricRule, value: float, labels: Dict) -> None:
+            values.append(MetricValue(
+                id=str(uuid4()),
+                metric_id=rule.metric_id,
+                server_id=rule.server_id,
+                value=value,
+                labels=labels,
+                timestamp=timestamp
+            ))
+
+        for (rule_id, group), count in self._counts.items():
+            rule = rules[rule_id]
+            point(rule, count, dict(zip(rule.group_by, group)))
+
+        for (rule_id, group), hist in self._histograms.items():
+            rule = rules[rule_id]
+            labels = dict(zip(rule.group_by, group))
+            cumulative = 0
+            for bound, count in zip(list(rule.buckets) + ["+Inf"], hist[:-1]):
+                cumulative += count
+                point(rule, cumulative, {**labels, "le": str(bound)})
+            point(rule, hist[-1], {**labels, "stat": "sum"})
+            point(rule, cumulative, {**labels, "stat": "count"})
+
+        self._reset()
+        return values
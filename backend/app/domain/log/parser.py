@@ -1,98 +1,243 @@
+import json
 import re
 from datetime import datetime
-from typing import Dict, Optional
-from .aggregate import LogFormat, LogLevel, LogEntry
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from .aggregate import LogFormat, LogLevel, LogEntry, LogParseRule
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# 内置格式的正则只编译一次
+SYSLOG_PATTERN = re.compile(r"^(\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})\s+(\w+)\s+([^:]+):\s+(.*)$")
+# nginx与apache的combined格式一致
+COMBINED_PATTERN = re.compile(
+    r'(?P<remote_addr>[\d\.]+)\s+-\s+(?P<remote_user>[^\s]*)\s+\[(?P<time_local>[\w:/]+\s[+\-]\d{4})\]\s+'
+    r'"(?P<request>[^"]*?)"\s+(?P<status>\d{3})\s+(?P<body_bytes_sent>\d+)\s+'
+    r'"(?P<http_referer>[^"]*?)"\s+"(?P<http_user_agent>[^"]*?)"'
+)
+
+# 按优先级分组的级别关键字, 一次扫描即可判定
+LEVEL_PATTERN = re.compile(r"(error|fail|exception)|(warn)|(debug)", re.IGNORECASE)
+LEVEL_GROUPS = ("error", "warning", "debug")
+
+# JSON日志常见的时间格式
+TIMESTAMP_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+)
+
+# 同一秒内的日志共享时间戳字符串, 缓存解析结果避免重复strptime
+@lru_cache(maxsize=4096)
+def _parse_syslog_time(value: str) -> datetime:
+    # 按闰年解析, 2月29日也能解析; 年份由调用方补上
+    return datetime.strptime("2000 " + " ".join(value.split()), "%Y %b %d %H:%M:%S")
+
+def _parse_syslog_timestamp(value: str) -> datetime:
+    # syslog时间不带年份, 取当前年份; 年初收到的上一年12月底的日志归入上一年
+    now = datetime.now()
+    ts = _parse_syslog_time(value)
+    year = now.year - 1 if ts.month == 12 and now.month == 1 else now.year
+    return ts.replace(year=year)
+
+@lru_cache(maxsize=4096)
+def _parse_nginx_timestamp(value: str) -> datetime:
+    return datetime.strptime(value, "%d/%b/%Y:%H:%M:%S %z")
+
+@lru_cache(maxsize=4096)
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+def guess_level(message: str) -> str:
+    """根据消息内容猜测日志级别, 优先级 error > warning > debug > info"""
+    best = None
+    for match in LEVEL_PATTERN.finditer(message):
+        index = match.lastindex - 1
+        if index == 0:
+            return LEVEL_GROUPS[0]
+        if best is None or index < best:
+            best = index
+    return LEVEL_GROUPS[best] if best is not None else "info"
+
+def literal_prefix(pattern: "re.Pattern") -> str:
+    """提取正则开头的字面量前缀, 用于正则匹配前的快速过滤"""
+    if pattern.flags & re.IGNORECASE:
+        return ""
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return ""
+    chars = []
+    for op, arg in parsed:
+        if op == sre_parse.AT and arg == sre_parse.AT_BEGINNING and not chars:
+            continue
+        if op != sre_parse.LITERAL:
+            break
+        chars.append(chr(arg))
+    return "".join(chars)
 
 class LogParser:
     """日志解析器"""
-    
+
     def __init__(self, config):
         self.config = config
         self.format = LogFormat(config.format)
         self.pattern = config.pattern
-        self.fields = config.fields
-        
+        self.fields = config.fields or {}
+
         if self.format == LogFormat.CUSTOM and not self.pattern:
             raise ValueError("Custom format requires pattern")
-    
+
+        # 正则与解析函数在构造时确定, 逐行解析不再分支判断
+        self.regex = re.compile(self.pattern) if self.pattern else None
+        self._parse: Callable[[str], Optional[Dict]] = {
+            LogFormat.SYSLOG: self._parse_syslog,
+            LogFormat.JSON: self._parse_json,
+            LogFormat.NGINX: self._parse_nginx,
+            LogFormat.APACHE: self._parse_apache,
+            LogFormat.CUSTOM: self._parse_custom,
+        }[self.format]
+
     def parse(self, line: str) -> Optional[Dict]:
         """解析日志行"""
-        if self.format == LogFormat.SYSLOG:
-            return self._parse_syslog(line)
-        elif self.format == LogFormat.JSON:
-            return self._parse_json(line)
-        elif self.format == LogFormat.NGINX:
-            return self._parse_nginx(line)
-        elif self.format == LogFormat.APACHE:
-            return self._parse_apache(line)
-        elif self.format == LogFormat.CUSTOM:
-            return self._parse_custom(line)
-        return None
-    
+        return self._parse(line)
+
+    def parse_batch(self, lines: Iterable[str]) -> List[Optional[Dict]]:
+        """批量解析, 结果与输入逐行对应, 无法解析的行为None"""
+        parse = self._parse
+        return [parse(line) for line in lines]
+
     def _parse_syslog(self, line: str) -> Optional[Dict]:
         # 标准syslog格式解析
-        pattern = r"^(\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})\s+(\w+)\s+([^:]+):\s+(.*)$"
-        match = re.match(pattern, line)
+        match = SYSLOG_PATTERN.match(line)
         if not match:
             return None
-        
+
         timestamp, host, program, message = match.groups()
+        try:
+            ts = _parse_syslog_timestamp(timestamp)
+        except ValueError:
+            # 如非闰年的2月29日
+            ts = None
         return {
-            "timestamp": self._parse_syslog_timestamp(timestamp),
+            "timestamp": ts,
             "host": host,
             "program": program,
             "message": message,
-            "level": self._guess_level(message)
+            "level": guess_level(message)
         }
-    
+
     def _parse_json(self, line: str) -> Optional[Dict]:
         try:
             data = json.loads(line)
             return {
-                "timestamp": self._parse_timestamp(data.get("timestamp", "")),
+                "timestamp": _parse_timestamp(data.get("timestamp", "")),
                 "level": data.get("level", "info").lower(),
                 "message": data.get("message", ""),
                 **{k: v for k, v in data.items() if k not in ["timestamp", "level", "message"]}
             }
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, AttributeError):
             return None
-    
+
     def _parse_nginx(self, line: str) -> Optional[Dict]:
         # nginx访问日志格式解析
-        pattern = r'(?P<remote_addr>[\d\.]+)\s+-\s+(?P<remote_user>[^\s]*)\s+\[(?P<time_local>[\w:/]+\s[+\-]\d{4})\]\s+"(?P<request>[^"]*?)"\s+(?P<status>\d{3})\s+(?P<body_bytes_sent>\d+)\s+"(?P<http_referer>[^"]*?)"\s+"(?P<http_user_agent>[^"]*?)"'
-        match = re.match(pattern, line)
+        match = COMBINED_PATTERN.match(line)
         if not match:
             return None
-        
+
         data = match.groupdict()
-        data["timestamp"] = self._parse_nginx_timestamp(data["time_local"])
+        data["timestamp"] = _parse_nginx_timestamp(data["time_local"])
         data["level"] = "info"
         return data
-    
+
+    def _parse_apache(self, line: str) -> Optional[Dict]:
+        # apache combined格式与nginx默认格式相同
+        return self._parse_nginx(line)
+
     def _parse_custom(self, line: str) -> Optional[Dict]:
-        match = re.match(self.pattern, line)
+        match = self.regex.match(line)
         if not match:
             return None
-        
+
         data = match.groupdict()
         # 应用字段映射
         return {
             self.fields.get(k, k): v
             for k, v in data.items()
         }
-    
-    def _guess_level(self, message: str) -> str:
-        """根据消息内容猜测日志级别"""
-        message = message.lower()
-        if any(x in message for x in ["error", "fail", "exception"]):
-            return "error"
-        elif any(x in message for x in ["warn", "warning"]):
-            return "warning"
-        elif any(x in message for x in ["debug"]):
-            return "debug"
-        return "info"
-    
-    def _parse_timestamp(self, ts_str: str) -> datetime:
-        """解析时间戳"""
-        # 实现各种时间格式的解析
-        pass 
\ No newline at end of file
+
+class LogRuleMatcher:
+    """多规则日志匹配器
+
+    每条规则的正则只编译一次。规则按正则开头的字面量前缀建立首字符索引,
+    一行日志只对首字符命中且前缀相同的规则以及无前缀的规则执行正则匹配,
+    规则越多, 跳过的正则匹配越多。多条规则都能匹配时取列表中靠前的规则。
+    """
+
+    def __init__(self, rules: Sequence[LogParseRule]):
+        self.rules = list(rules)
+        # (顺序, 前缀, 正则, 规则)
+        compiled = [
+            (order, literal_prefix(regex), regex, rule)
+            for order, rule in enumerate(self.rules)
+            for regex in (re.compile(rule.pattern),)
+        ]
+        self._unprefixed = [c for c in compiled if not c[1]]
+        self._by_first_char: Dict[str, List[Tuple]] = {}
+        for c in compiled:
+            if c[1]:
+                self._by_first_char.setdefault(c[1][0], []).append(c)
+        # 首字符对应的候选规则(含无前缀规则)按原顺序合并后缓存
+        self._candidates: Dict[str, List[Tuple]] = {
+            char: sorted(prefixed + self._unprefixed, key=lambda c: c[0])
+            for char, prefixed in self._by_first_char.items()
+        }
+
+    def match(self, line: str) -> Optional[Tuple[LogParseRule, Dict]]:
+        """返回首个匹配的规则及解析出的字段"""
+        candidates = self._candidates.get(line[:1], self._unprefixed)
+        for _, prefix, regex, rule in candidates:
+            if prefix and not line.startswith(prefix):
+                continue
+            match = regex.match(line)
+            if match:
+                return rule, self._convert(rule, match.groupdict())
+        return None
+
+    def parse_batch(self, lines: Iterable[str]) -> List[Optional[Tuple[LogParseRule, Dict]]]:
+        """批量匹配, 结果与输入逐行对应"""
+        match = self.match
+        return [match(line) for line in lines]
+
+    @staticmethod
+    def _convert(rule: LogParseRule, data: Dict) -> Dict:
+        """按规则声明的字段类型转换取值"""
+        for name, value in data.items():
+            if value is None:
+                continue
+            field_type = rule.fields.get(name)
+            try:
+                if field_type == "int":
+                    data[name] = int(value)
+                elif field_type == "float":
+                    data[name] = float(value)
+            except ValueError:
+                pass
+        return data
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Dict, List, Optional
 from .aggregate import LogParseRule, LogCollectConfig
 
 class LogParseRuleRepository(ABC):
@@ -46,4 +46,20 @@ class LogCollectConfigRepository(ABC):
     @abstractmethod
     async def delete(self, config_id: str) -> None:
         """删除采集配置"""
-        pass 
\ No newline at end of file
+        pass
+
+class LogRepository(ABC):
+    """日志采集仓储接口"""
+    
+    @abstractmethod
+    async def get_collector_parsers(self, collector_id: str) -> List["LogParser"]:
+        """获取采集器关联的解析器"""
+        pass
+    
+    @abstractmethod
+    async def save_logs(self, collector_id: str, records: List[Dict]) -> None:
+        """在一个事务内批量保存日志
+        
+        records: [{"content": 原始行, "parsed": 解析结果, "timestamp": 采集时间}]
+        """
+        pass
@@ -0,0 +1,258 @@
+import math
+import operator
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# 直接取自日志条目的字段, 其余字段从parsed_fields读取
+ENTRY_FIELDS = ("source_id", "level", "template_id", "message")
+
+# 正则最大长度, 过滤器由客户端提交
+MAX_PATTERN_LENGTH = 512
+# 正则只匹配值的前这么多个字符, 限制单次匹配的最坏耗时
+MAX_MATCH_LENGTH = 4096
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _compare(op: Callable[[float, float], bool]) -> Callable[[Any, Any], bool]:
+    def check(actual, expected) -> bool:
+        actual = _number(actual)
+        return actual is not None and op(actual, expected)
+    return check
+
+# 字段谓词: (实际值, 预处理后的期望值) -> 是否匹配
+FIELD_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda actual, expected: actual is not None and str(actual) == expected,
+    "ne": lambda actual, expected: actual is None or str(actual) != expected,
+    "in": lambda actual, expected: actual is not None and str(actual) in expected,
+    "regex": lambda actual, expected: actual is not None and expected.search(str(actual)[:MAX_MATCH_LENGTH]) is not None,
+    "exists": lambda actual, expected: (actual is not None) == expected,
+    "gt": _compare(operator.gt),
+    "gte": _compare(operator.ge),
+    "lt": _compare(operator.lt),
+    "lte": _compare(operator.le),
+}
+
+@dataclass
+class FieldPredicate:
+    """字段条件, 如 {"field": "status", "op": "gte", "value": 500}"""
+    field: str
+    op: str = "eq"
+    value: Any = None
+
+    def compile(self) -> Callable[[Dict], bool]:
+        if self.op not in FIELD_OPERATORS:
+            raise ValueError(f"Unknown field operator: {self.op}")
+        # 期望值只预处理一次
+        if self.op in ("eq", "ne"):
+            expected = str(self.value)
+        elif self.op == "in":
+            values = self.value if isinstance(self.value, (list, tuple, set)) else [self.value]
+            expected = {str(v) for v in values}
+        elif self.op == "regex":
+            expected = _compile_pattern(self.value)
+        elif self.op == "exists":
+            expected = True if self.value is None else bool(self.value)
+        else:
+            expected = _number(self.value)
+            if expected is None:
+                raise ValueError(f"Operator {self.op} requires a numeric value")
+        check = FIELD_OPERATORS[self.op]
+        name = self.field
+        if name in ENTRY_FIELDS:
+            return lambda entry: check(entry.get(name), expected)
+        return lambda entry: check((entry.get("parsed_fields") or {}).get(name), expected)
+
+def _compile_pattern(pattern) -> "re.Pattern":
+    if not isinstance(pattern, str) or not pattern:
+        raise ValueError("Pattern must be a non-empty string")
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"Pattern longer than {MAX_PATTERN_LENGTH} characters")
+    try:
+        parsed = sre_parse.parse(pattern)
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {e}")
+    if _has_nested_repeat(parsed):
+        # (a+)+、(\w*)* 之类的嵌套量词在不匹配时会灾难性回溯
+        raise ValueError("Pattern must not contain nested quantifiers")
+    return compiled
+
+def _has_nested_repeat(parsed, repeated: bool = False) -> bool:
+    """正则中是否有次数可变的量词嵌套在可重复多次的量词内"""
+    for op, av in parsed:
+        if op in _REPEATS:
+            low, high, sub = av
+            many = high > 1
+            if repeated and low != high:
+                return True
+            if _has_nested_repeat(sub, repeated or many):
+                return True
+        elif op == sre_parse.SUBPATTERN:
+            if _has_nested_repeat(av[-1], repeated):
+                return True
+        elif op == sre_parse.BRANCH:
+            if any(_has_nested_repeat(branch, repeated) for branch in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _has_nested_repeat(av[1], repeated):
+                return True
+    return False
+
+@dataclass
+class LiveTailFilter:
+    """实时跟踪的过滤条件
+
+    各条件之间为与关系; 未给出的条件不参与过滤。
+    """
+    source_ids: List[int] = field(default_factory=list)
+    levels: List[str] = field(default_factory=list)
+    pattern: Optional[str] = None  # 对日志消息做正则搜索
+    fields: List[FieldPredicate] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LiveTailFilter":
+        """由客户端消息构造, 条件不合法时抛出ValueError"""
+        if not isinstance(data, dict):
+            raise ValueError("Filter must be an object")
+        source_ids = data.get("source_id") or []
+        if not isinstance(source_ids, list):
+            source_ids = [source_ids]
+        levels = data.get("level") or []
+        if not isinstance(levels, list):
+            levels = [levels]
+        fields = data.get("fields") or []
+        if isinstance(fields, dict):
+            # 简写 {"status": "500"} 即等值条件
+            fields = [{"field": k, "op": "eq", "value": v} for k, v in fields.items()]
+        try:
+            tail_filter = cls(
+                source_ids=[int(s) for s in source_ids],
+                levels=[str(l).lower() for l in levels],
+                pattern=data.get("pattern"),
+                fields=[FieldPredicate(**f) for f in fields]
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid live tail filter: {e}")
+        # 提前编译以尽早报告错误
+        tail_filter.compile()
+        return tail_filter
+
+    def to_dict(self) -> Dict:
+        return {
+            "source_id": self.source_ids,
+            "level": self.levels,
+            "pattern": self.pattern,
+            "fields": [{"field": f.field, "op": f.op, "value": f.value} for f in self.fields],
+        }
+
+    def compile(self) -> Callable[[Dict], bool]:
+        """编译为单个判断函数, 代价小的条件在前, 正则在最后"""
+        checks: List[Callable[[Dict], bool]] = []
+        if self.source_ids:
+            source_ids = set(self.source_ids)
+            checks.append(lambda e: e.get("source_id") in source_ids)
+        if self.levels:
+            levels = set(self.levels)
+            checks.append(lambda e: (e.get("level") or "").lower() in levels)
+        checks.extend(f.compile() for f in self.fields)
+        if self.pattern:
+            search = _compile_pattern(self.pattern).search
+            checks.append(lambda e: search((e.get("message") or "")[:MAX_MATCH_LENGTH]) is not None)
+
+        if not checks:
+            return lambda e: True
+        if len(checks) == 1:
+            return checks[0]
+        return lambda e: all(check(e) for check in checks)
+
+class LiveTailSampler:
+    """按速率限制采样
+
+    令牌桶每秒补充max_rate条; 一批匹配的日志超过剩余令牌时在整批内
+    等间隔抽样, 而不是只保留开头几条, 尖峰期间看到的仍是整体的缩影。
+    被丢弃的条数按级别累计, 每summary_interval秒生成一次摘要。
+    """
+
+    def __init__(self, max_rate: float, summary_interval: float = 5.0):
+        self.max_rate = max_rate
+        self.summary_interval = summary_interval
+        self._tokens = float(max_rate)
+        self._refilled_at = time.monotonic()
+        self._window_start = self._refilled_at
+        self._matched = 0
+        self._dropped = 0
+        self._dropped_by_level: Dict[str, int] = {}
+
+    def sample(self, entries: Sequence[Dict], now: Optional[float] = None) -> List[Dict]:
+        now = time.monotonic() if now is None else now
+        self._tokens = min(self.max_rate, self._tokens + (now - self._refilled_at) * self.max_rate)
+        self._refilled_at = now
+        self._matched += len(entries)
+
+        allowed = int(self._tokens)
+        if len(entries) <= allowed:
+            self._tokens -= len(entries)
+            return list(entries)
+
+        stride = len(entries) / allowed if allowed else math.inf
+        keep = {int(i * stride) for i in range(allowed)}
+        sampled = []
+        for i, entry in enumerate(entries):
+            if i in keep:
+                sampled.append(entry)
+            else:
+                level = entry.get("level") or "unknown"
+                self._dropped_by_level[level] = self._dropped_by_level.get(level, 0) + 1
+        self._tokens -= allowed
+        self._dropped += len(entries) - allowed
+        return sampled
+
+    def summary(self, now: Optional[float] = None) -> Optional[Dict]:
+        """窗口结束且有丢弃时返回摘要并开始新窗口, 否则返回None"""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._window_start
+        if elapsed < self.summary_interval:
+            return None
+        summary = None
+        if self._dropped:
+            summary = {
+                "window_seconds": round(elapsed, 3),
+                "matched": self._matched,
+                "sent": self._matched - self._dropped,
+                "dropped": self._dropped,
+                "dropped_by_level": self._dropped_by_level,
+                "max_rate": self.max_rate,
+            }
+        self._window_start = now
+        self._matched = 0
+        self._dropped = 0
+        self._dropped_by_level = {}
+        return summary
+
+class LiveTailSession:
+    """单个客户端的实时跟踪: 过滤条件编译一次, 逐批过滤后按速率采样"""
+
+    def __init__(self, tail_filter: LiveTailFilter, max_rate: float, summary_interval: float = 5.0):
+        self.filter = tail_filter
+        self.matches = tail_filter.compile()
+        self.sampler = LiveTailSampler(max_rate, summary_interval)
+
+    def offer(self, entries: Sequence[Dict], now: Optional[float] = None) -> List[Dict]:
+        """返回本批要发送给客户端的日志"""
+        matched = [e for e in entries if self.matches(e)]
+        if not matched:
+            return matched
+        return self.sampler.sample(matched, now)
@@ -0,0 +1,169 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 模板中的参数占位符
+PARAM = "<*>"
+
+# 含数字的词(数值、IP、时长、十六进制ID等)在建树与匹配前直接视为参数
+DIGIT_PATTERN = re.compile(r"\d")
+
+@dataclass
+class LogTemplate:
+    """日志模板(Drain中的日志簇)"""
+    id: int
+    tokens: List[str]
+    count: int = 0
+    sample: Optional[str] = None
+    updated_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+def template_id(source_id: int, tokens: Iterable[str]) -> int:
+    """由日志源和初始模板生成稳定ID, 多个进程各自发现同一模板时ID一致"""
+    digest = hashlib.blake2b(
+        f"{source_id}|{' '.join(tokens)}".encode(), digest_size=8
+    ).digest()
+    # 落在BIGINT正数范围内
+    return int.from_bytes(digest, "big") >> 1
+
+class TemplateMiner:
+    """Drain在线日志模板挖掘
+
+    按词数和前depth-2个词构成的前缀树把日志分到叶子节点, 叶子内选择与
+    模板相似度最高的簇, 相似度不低于sim_threshold时并入该簇并把不一致
+    的位置泛化为参数, 否则新建簇。每条日志O(depth)定位候选簇, 与日志
+    总量和簇数量基本无关。
+
+    簇的ID在创建时确定, 之后模板泛化不改变ID, 因此已写入的日志始终
+    指向同一模板。
+    """
+
+    def __init__(
+        self,
+        source_id: int = 0,
+        depth: int = 4,
+        sim_threshold: float = 0.4,
+        max_children: int = 100,
+        cache_size: int = 100_000
+    ):
+        if depth < 3:
+            raise ValueError("Template tree depth must be at least 3")
+        self.source_id = source_id
+        self.depth = depth
+        self.sim_threshold = sim_threshold
+        self.max_children = max_children
+        self.cache_size = cache_size
+        self.templates: Dict[int, LogTemplate] = {}
+        # 词数 -> 前缀树; 叶子为簇列表
+        self._root: Dict[int, Dict] = {}
+        # 预处理后的词序列 -> 簇, 重复出现的日志跳过树查找
+        self._cache: Dict[Tuple[str, ...], LogTemplate] = {}
+        # 新建或模板改变、尚未持久化的簇
+        self._dirty: Dict[int, LogTemplate] = {}
+
+    @staticmethod
+    def tokenize(message: str) -> Tuple[List[str], Tuple[str, ...]]:
+        """返回原始词和预处理后的词"""
+        tokens = message.split()
+        masked = tuple(PARAM if DIGIT_PATTERN.search(t) else t for t in tokens)
+        return tokens, masked
+
+    def add(self, message: str) -> Tuple[LogTemplate, List[str]]:
+        """归类一条日志, 返回所属模板和提取出的参数"""
+        tokens, masked = self.tokenize(message)
+        cluster = self._cache.get(masked)
+        if cluster is None:
+            cluster = self._match(masked)
+            if cluster is None:
+                cluster = self._create(masked, message)
+            elif self._merge(cluster, masked):
+                self._dirty[cluster.id] = cluster
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[masked] = cluster
+        cluster.count += 1
+        params = [t for t, p in zip(tokens, cluster.tokens) if p == PARAM]
+        return cluster, params
+
+    def add_batch(self, messages: Iterable[str]) -> List[Tuple[LogTemplate, List[str]]]:
+        """批量归类, 结果与输入逐条对应"""
+        add = self.add
+        return [add(message) for message in messages]
+
+    def load(self, templates: Iterable[Tuple[int, str]]) -> None:
+        """载入已持久化的模板 (id, 模板文本), 重启后沿用原有ID"""
+        for cluster_id, text in templates:
+            if cluster_id in self.templates:
+                continue
+            cluster = LogTemplate(id=cluster_id, tokens=text.split())
+            self.templates[cluster_id] = cluster
+            self._leaf(tuple(cluster.tokens)).append(cluster)
+
+    def pop_dirty(self) -> List[LogTemplate]:
+        """取出需要持久化的模板"""
+        dirty = list(self._dirty.values())
+        self._dirty.clear()
+        return dirty
+
+    def _leaf(self, tokens: Tuple[str, ...]) -> List[LogTemplate]:
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            children = node
+            if token not in children:
+                # 子节点数达到上限后, 新出现的词都归到参数节点
+                token = token if len(children) < self.max_children else PARAM
+            node = children.setdefault(token, {})
+        return node.setdefault(None, [])
+
+    def _match(self, tokens: Tuple[str, ...]) -> Optional[LogTemplate]:
+        node = self._root.get(len(tokens))
+        if node is None:
+            return None
+        for token in tokens[:self.depth - 2]:
+            child = node.get(token)
+            if child is None:
+                child = node.get(PARAM)
+                if child is None:
+                    return None
+            node = child
+        best, best_sim, best_params = None, -1.0, -1
+        for cluster in node.get(None, ()):
+            same = params = 0
+            for template_token, token in zip(cluster.tokens, tokens):
+                if template_token == PARAM:
+                    params += 1
+                elif template_token == token:
+                    same += 1
+            sim = same / len(tokens) if tokens else 1.0
+            if sim > best_sim or (sim == best_sim and params > best_params):
+                best, best_sim, best_params = cluster, sim, params
+        return best if best is not None and best_sim >= self.sim_threshold else None
+
+    def _merge(self, cluster: LogTemplate, tokens: Tuple[str, ...]) -> bool:
+        changed = False
+        for i, token in enumerate(tokens):
+            if cluster.tokens[i] != token and cluster.tokens[i] != PARAM:
+                cluster.tokens[i] = PARAM
+                changed = True
+        if changed:
+            cluster.updated_at = datetime.now()
+        return changed
+
+    def _create(self, tokens: Tuple[str, ...], message: str) -> LogTemplate:
+        cluster = LogTemplate(
+            id=template_id(self.source_id, tokens),
+            tokens=list(tokens),
+            sample=message
+        )
+        existing = self.templates.get(cluster.id)
+        if existing is not None:
+            return existing
+        self.templates[cluster.id] = cluster
+        self._leaf(tokens).append(cluster)
+        self._dirty[cluster.id] = cluster
+        return cluster
@@ -1,99 +1,391 @@
-from typing import List, Optional
-import json
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import math
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from uuid import UUID
+from prometheus_client import Counter
 from ...domain.agent.metrics import AgentMetrics, AgentMetricsHourly
+from ..config import settings
+
+NAN = float("nan")
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+MetricsLoader = Callable[[str, datetime, datetime], Awaitable[List]]
+
+class CacheMetrics:
+    """指标缓存监控指标"""
+
+    def __init__(self):
+        self.lookups = Counter(
+            'agent_metrics_cache_lookups_total',
+            'Agent metrics cache range lookups by result',
+            ['kind', 'result']
+        )
+        self.buckets = Counter(
+            'agent_metrics_cache_buckets_total',
+            'Agent metrics cache bucket reads by result',
+            ['kind', 'result']
+        )
+
+cache_metrics = CacheMetrics()
+
+@dataclass
+class CacheStats:
+    """缓存命中统计(按范围查询计)"""
+    hits: int = 0
+    partial_hits: int = 0
+    misses: int = 0
+    bucket_hits: int = 0
+    bucket_misses: int = 0
+
+class ColumnarCodec:
+    """按列二进制编码
+
+    格式: 版本(1B) + 行数(4B), 之后依次为id列(16B UUID)、时间列(int64, 距
+    1970-01-01的微秒数, 按整数计算不经浮点)、浮点列(float64)、可空浮点列
+    (float64, 空值存NaN)、整数列(int64), 整体zlib压缩。
+    """
+
+    VERSION = 3
+
+    def __init__(
+        self,
+        time_fields: Tuple[str, ...],
+        float_fields: Tuple[str, ...],
+        int_fields: Tuple[str, ...],
+        nullable_float_fields: Tuple[str, ...] = ()
+    ):
+        self.time_fields = time_fields
+        self.float_fields = float_fields
+        self.nullable_float_fields = nullable_float_fields
+        self.int_fields = int_fields
+
+    @staticmethod
+    def _to_bytes(values: array) -> bytes:
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values.tobytes()
+
+    @staticmethod
+    def _from_bytes(typecode: str, data: bytes) -> array:
+        values = array(typecode)
+        values.frombytes(data)
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+    def encode(self, items: List) -> bytes:
+        parts = [struct.pack("<BI", self.VERSION, len(items))]
+        parts.append(b"".join(UUID(item.id).bytes for item in items))
+        for name in self.time_fields:
+            parts.append(self._to_bytes(array("q", (
+                (getattr(item, name) - EPOCH) // ONE_MICROSECOND for item in items
+            ))))
+        for name in self.float_fields:
+            parts.append(self._to_bytes(array("d", (getattr(item, name) for item in items))))
+        for name in self.nullable_float_fields:
+            parts.append(self._to_bytes(array("d", (
+                NAN if getattr(item, name) is None else getattr(item, name) for item in items
+            ))))
+        for name in self.int_fields:
+            parts.append(self._to_bytes(array("q", (getattr(item, name) for item in items))))
+        return zlib.compress(b"".join(parts), 1)
+
+    def decode(self, data: bytes, factory: Callable, **constants) -> List:
+        """解码为对象列表, constants为桶内各行相同的字段(如agent_id)"""
+        raw = zlib.decompress(data)
+        version, count = struct.unpack_from("<BI", raw)
+        if version != self.VERSION:
+            raise ValueError(f"Unsupported cache encoding version: {version}")
+        offset = struct.calcsize("<BI")
+
+        ids = [str(UUID(bytes=raw[offset + i * 16:offset + (i + 1) * 16])) for i in range(count)]
+        offset += count * 16
+
+        columns: Dict[str, list] = {"id": ids}
+        width = count * 8
+        for name in self.time_fields:
+            micros = self._from_bytes("q", raw[offset:offset + width])
+            columns[name] = [EPOCH + timedelta(microseconds=v) for v in micros]
+            offset += width
+        for name in self.float_fields:
+            columns[name] = self._from_bytes("d", raw[offset:offset + width]).tolist()
+            offset += width
+        for name in self.nullable_float_fields:
+            columns[name] = [
+                None if math.isnan(v) else v
+                for v in self._from_bytes("d", raw[offset:offset + width])
+            ]
+            offset += width
+        for name in self.int_fields:
+            columns[name] = self._from_bytes("q", raw[offset:offset + width]).tolist()
+            offset += width
+
+        names = list(columns)
+        return [
+            factory(**constants, **dict(zip(names, row)))
+            for row in zip(*(columns[n] for n in names))
+        ]
+
+RAW_CODEC = ColumnarCodec(
+    time_fields=("timestamp", "created_at"),
+    float_fields=("cpu_percent", "memory_percent", "disk_usage"),
+    int_fields=("network_in", "network_out"),
+    nullable_float_fields=(
+        "cpu_percent_max", "cpu_percent_p95",
+        "memory_percent_max", "memory_percent_p95"
+    )
+)
+
+HOURLY_CODEC = ColumnarCodec(
+    time_fields=("hour", "created_at"),
+    float_fields=(
+        "cpu_percent_avg", "cpu_percent_max",
+        "memory_percent_avg", "memory_percent_max",
+        "disk_usage_avg", "disk_usage_max"
+    ),
+    int_fields=("network_in_total", "network_out_total")
+)
 
 class AgentMetricsCache:
-    """Agent指标缓存"""
-    
-    def __init__(self, redis):
+    """Agent指标缓存
+
+    按固定时间桶缓存每个Agent的指标(原始指标默认10分钟一桶, 小时聚合按天分桶),
+    任意时间范围由缓存桶拼装, 仅对缺失的连续桶区间回源查询。
+    桶结束后还要再等一个迟到窗口才写入缓存: 原始指标会经溢出文件重放、
+    Agent磁盘缓冲和断线积压迟到, 小时聚合要等最后一小时汇总完成。
+    超过迟到窗口才到达的数据由写入和汇总路径调用invalidate_*使对应桶失效。
+    """
+
+    def __init__(
+        self,
+        redis,
+        raw_bucket_seconds: int = 600,
+        hourly_bucket_seconds: int = 86400,
+        raw_lateness: int = 300,
+        hourly_lateness: int = 7200
+    ):
         self.redis = redis
         self.raw_prefix = "agent:metrics:raw:"
         self.hourly_prefix = "agent:metrics:hourly:"
+        # 每个聚合桶一个集合, 记录缓存了该桶的key, 失效时不必扫描整个keyspace
+        self.hourly_index_prefix = "agent:metrics:hourly_keys:"
+        self.raw_bucket = raw_bucket_seconds
+        self.hourly_bucket = hourly_bucket_seconds
         self.ttl = 3600  # 缓存1小时
-    
+        self.hourly_ttl = 86400  # 聚合数据变化少, 缓存1天
+        # 桶结束后多久才视为不再变化(秒)
+        self.lateness = {"raw": raw_lateness, "hourly": hourly_lateness}
+        self.stats = {"raw": CacheStats(), "hourly": CacheStats()}
+
     async def get_raw_metrics(
-        self,
-        agent_id: str,
-        start_time: datetime,
-        end_time: datetime
-    ) -> Optional[List[AgentMetrics]]:
-        """获取原始指标缓存"""
-        key = f"{self.raw_prefix}{agent_id}:{start_time.isoformat()}:{end_time.isoformat()}"
-        data = await self.redis.get(key)
-        if not data:
-            return None
-        
-        metrics_data = json.loads(data)
-        return [
-            AgentMetrics(
-                **{
-                    **m,
-                    "timestamp": datetime.fromisoformat(m["timestamp"]),
-                    "created_at": datetime.fromisoformat(m["created_at"])
-                }
-            )
-            for m in metrics_data
-        ]
-    
-    async def set_raw_metrics(
         self,
         agent_id: str,
         start_time: datetime,
         end_time: datetime,
-        metrics: List[AgentMetrics]
-    ) -> None:
-        """设置原始指标缓存"""
-        key = f"{self.raw_prefix}{agent_id}:{start_time.isoformat()}:{end_time.isoformat()}"
-        data = [
-            {
-                **m.__dict__,
-                "timestamp": m.timestamp.isoformat(),
-                "created_at": m.created_at.isoformat()
-            }
-            for m in metrics
-        ]
-        await self.redis.setex(key, self.ttl, json.dumps(data))
-    
+        loader: MetricsLoader
+    ) -> List[AgentMetrics]:
+        """获取原始指标, 缺失部分通过loader(agent_id, start, end)回源"""
+        return await self._get_range(
+            kind="raw",
+            prefix=self.raw_prefix,
+            bucket_seconds=self.raw_bucket,
+            ttl=self.ttl,
+            codec=RAW_CODEC,
+            factory=AgentMetrics,
+            time_field="timestamp",
+            agent_id=agent_id,
+            start_time=start_time,
+            end_time=end_time,
+            loader=loader
+        )
+
     async def get_hourly_metrics(
         self,
         agent_id: str,
         start_time: datetime,
-        end_time: datetime
-    ) -> Optional[List[AgentMetricsHourly]]:
-        """获取小时聚合指标缓存"""
-        key = f"{self.hourly_prefix}{agent_id}:{start_time.isoformat()}:{end_time.isoformat()}"
-        data = await self.redis.get(key)
-        if not data:
-            return None
-        
-        metrics_data = json.loads(data)
-        return [
-            AgentMetricsHourly(
-                **{
-                    **m,
-                    "hour": datetime.fromisoformat(m["hour"]),
-                    "created_at": datetime.fromisoformat(m["created_at"])
-                }
+        end_time: datetime,
+        loader: MetricsLoader
+    ) -> List[AgentMetricsHourly]:
+        """获取小时聚合指标, 缺失部分通过loader(agent_id, start, end)回源"""
+        return await self._get_range(
+            kind="hourly",
+            prefix=self.hourly_prefix,
+            bucket_seconds=self.hourly_bucket,
+            ttl=self.hourly_ttl,
+            codec=HOURLY_CODEC,
+            factory=AgentMetricsHourly,
+            time_field="hour",
+            agent_id=agent_id,
+            start_time=start_time,
+            end_time=end_time,
+            loader=loader
+        )
+
+    async def invalidate(self, agent_id: str, start_time: datetime, end_time: datetime) -> None:
+        """使覆盖指定时间范围的桶失效(如补算聚合后)"""
+        keys = []
+        for prefix, bucket_seconds in (
+            (self.raw_prefix, self.raw_bucket),
+            (self.hourly_prefix, self.hourly_bucket)
+        ):
+            keys.extend(
+                f"{prefix}{agent_id}:{b}"
+                for b in self._bucket_range(start_time, end_time, bucket_seconds)
             )
-            for m in metrics_data
-        ]
-    
-    async def set_hourly_metrics(
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def invalidate_late_samples(self, samples: List[AgentMetrics]) -> None:
+        """写入样本后调用, 使可能已缓存的原始指标桶失效"""
+        now = datetime.now().timestamp()
+        keys = set()
+        for sample in samples:
+            bucket = int(sample.timestamp.timestamp()) // self.raw_bucket * self.raw_bucket
+            if self._settled("raw", bucket, self.raw_bucket, now):
+                keys.add(f"{self.raw_prefix}{sample.agent_id}:{bucket}")
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def invalidate_hourly(self, hour: datetime) -> None:
+        """汇总(或重算)某小时后调用, 使所有Agent包含该小时的聚合桶失效"""
+        bucket = int(hour.timestamp()) // self.hourly_bucket * self.hourly_bucket
+        if not self._settled("hourly", bucket, self.hourly_bucket, datetime.now().timestamp()):
+            return
+        index = f"{self.hourly_index_prefix}{bucket}"
+        keys = await self.redis.smembers(index)
+        await self.redis.delete(index, *keys)
+
+    def _settled(self, kind: str, bucket: int, bucket_seconds: int, now: float) -> bool:
+        """桶已结束且超过迟到窗口, 可以(或可能已经)写入缓存"""
+        return bucket + bucket_seconds + self.lateness[kind] <= now
+
+    def get_stats(self) -> Dict:
+        """获取命中统计"""
+        return {kind: stats.__dict__.copy() for kind, stats in self.stats.items()}
+
+    @staticmethod
+    def _bucket_range(start_time: datetime, end_time: datetime, bucket_seconds: int) -> List[int]:
+        first = int(start_time.timestamp()) // bucket_seconds * bucket_seconds
+        last = int(end_time.timestamp()) // bucket_seconds * bucket_seconds
+        return list(range(first, last + 1, bucket_seconds))
+
+    async def _get_range(
         self,
+        kind: str,
+        prefix: str,
+        bucket_seconds: int,
+        ttl: int,
+        codec: ColumnarCodec,
+        factory: Callable,
+        time_field: str,
         agent_id: str,
         start_time: datetime,
         end_time: datetime,
-        metrics: List[AgentMetricsHourly]
-    ) -> None:
-        """设置小时聚合指标缓存"""
-        key = f"{self.hourly_prefix}{agent_id}:{start_time.isoformat()}:{end_time.isoformat()}"
-        data = [
-            {
-                **m.__dict__,
-                "hour": m.hour.isoformat(),
-                "created_at": m.created_at.isoformat()
-            }
-            for m in metrics
+        loader: MetricsLoader
+    ) -> List:
+        stats = self.stats[kind]
+        buckets = self._bucket_range(start_time, end_time, bucket_seconds)
+        keys = [f"{prefix}{agent_id}:{b}" for b in buckets]
+        cached = await self.redis.mget(keys)
+
+        items: Dict[int, List] = {}
+        missing: List[int] = []
+        for bucket, data in zip(buckets, cached):
+            if data is None:
+                missing.append(bucket)
+                continue
+            try:
+                items[bucket] = codec.decode(data, factory, agent_id=agent_id)
+            except ValueError:
+                # 旧编码版本的缓存, 按未命中重新加载
+                missing.append(bucket)
+
+        stats.bucket_hits += len(buckets) - len(missing)
+        stats.bucket_misses += len(missing)
+        cache_metrics.buckets.labels(kind=kind, result="hit").inc(len(buckets) - len(missing))
+        cache_metrics.buckets.labels(kind=kind, result="miss").inc(len(missing))
+        if not missing:
+            result = "hit"
+            stats.hits += 1
+        elif len(missing) == len(buckets):
+            result = "miss"
+            stats.misses += 1
+        else:
+            result = "partial_hit"
+            stats.partial_hits += 1
+        cache_metrics.lookups.labels(kind=kind, result=result).inc()
+
+        if missing:
+            fetched = await self._load_missing(
+                missing, bucket_seconds, time_field, agent_id, loader
+            )
+            items.update(fetched)
+
+            # 只缓存已结束且超过迟到窗口的桶
+            now = datetime.now().timestamp()
+            async with self.redis.pipeline() as pipe:
+                for bucket, bucket_items in fetched.items():
+                    if self._settled(kind, bucket, bucket_seconds, now):
+                        key = f"{prefix}{agent_id}:{bucket}"
+                        pipe.setex(key, ttl, codec.encode(bucket_items))
+                        if kind == "hourly":
+                            index = f"{self.hourly_index_prefix}{bucket}"
+                            pipe.sadd(index, key)
+                            pipe.expire(index, ttl)
+                await pipe.execute()
+
+        return [
+            item
+            for bucket in buckets
+            for item in items.get(bucket, [])
+            if start_time <= getattr(item, time_field) <= end_time
         ]
-        await self.redis.setex(key, self.ttl, json.dumps(data)) 
\ No newline at end of file
+
+    async def _load_missing(
+        self,
+        missing: List[int],
+        bucket_seconds: int,
+        time_field: str,
+        agent_id: str,
+        loader: MetricsLoader
+    ) -> Dict[int, List]:
+        """将相邻的缺失桶合并为连续区间, 每个区间回源一次"""
+        runs: List[List[int]] = []
+        for bucket in missing:
+            if runs and runs[-1][-1] + bucket_seconds == bucket:
+                runs[-1].append(bucket)
+            else:
+                runs.append([bucket])
+
+        fetched: Dict[int, List] = {}
+        for run in runs:
+            run_start = datetime.fromtimestamp(run[0])
+            run_end = datetime.fromtimestamp(run[-1] + bucket_seconds) - timedelta(microseconds=1)
+            for bucket in run:
+                fetched[bucket] = []
+            for item in await loader(agent_id, run_start, run_end):
+                bucket = int(getattr(item, time_field).timestamp()) // bucket_seconds * bucket_seconds
+                if bucket in fetched:
+                    fetched[bucket].append(item)
+        return fetched
+
+_agent_metrics_cache: Optional[AgentMetricsCache] = None
+
+def get_agent_metrics_cache() -> Optional[AgentMetricsCache]:
+    """按配置返回进程内共享的指标缓存, 未启用时返回None"""
+    global _agent_metrics_cache
+    if _agent_metrics_cache is None and settings.AGENT_METRICS_CACHE_ENABLED:
+        # redis>=4.2 自带asyncio客户端
+        from redis import asyncio as aioredis
+        _agent_metrics_cache = AgentMetricsCache(
+            aioredis.from_url(settings.AGENT_METRICS_CACHE_REDIS_URL),
+            raw_lateness=settings.AGENT_METRICS_CACHE_RAW_LATENESS,
+            hourly_lateness=settings.AGENT_METRICS_CACHE_HOURLY_LATENESS
+        )
+    return _agent_metrics_cache
@@ -25,11 +25,75 @@ class Settings(BaseSettings):
     # 告警配置
     ALERT_CHECK_INTERVAL: int = 60  # 告警检查间隔(秒)
     ALERT_NOTIFICATION_RETRY: int = 3  # 通知重试次数
+    ALERT_STREAM_SYNC_INTERVAL: int = 60  # 流式告警规则同步间隔(秒)
+    ALERT_GROUP_BY: list = ["rule", "severity"]  # 告警分组标签: rule/project/severity/server
+    ALERT_GROUP_WINDOW: int = 30  # 告警分组窗口(秒)
+    ALERT_CHANNEL_RATE_LIMIT: int = 20  # 每个渠道每分钟最多发送的摘要数
+    
+    # 通知发送配置
+    NOTIFICATION_WORKERS: int = 16  # 并发发送协程数
+    NOTIFICATION_QUEUE_SIZE: int = 10_000  # 发送队列容量
+    NOTIFICATION_CHANNEL_CONCURRENCY: int = 4  # 单渠道默认并发上限(可由渠道配置max_concurrency覆盖)
+    NOTIFICATION_RETRY_BACKOFF: float = 1.0  # 重试退避基数(秒)
+    NOTIFICATION_RETRY_BACKOFF_MAX: float = 60.0  # 重试退避上限(秒)
+    NOTIFICATION_HTTP_POOL_SIZE: int = 100  # HTTP连接池大小
+    NOTIFICATION_HTTP_TIMEOUT: float = 10.0  # 单次发送超时(秒)
+    NOTIFICATION_SMTP_POOL_SIZE: int = 4  # 每个SMTP服务器保留的空闲连接数
+    NOTIFICATION_DRAIN_TIMEOUT: float = 5.0  # 停止时等待已入队通知发送完毕的最长时间(秒)
     
     # Agent配置
     AGENT_STATUS_CHECK_INTERVAL: int = 30  # Agent状态检查间隔(秒)
     AGENT_OFFLINE_THRESHOLD: int = 300  # Agent离线阈值(秒)
     AGENT_METRICS_RETENTION_DAYS: int = 7  # Agent指标保留天数
+    AGENT_METRICS_AGG_RETENTION_DAYS: int = 30  # Agent小时聚合指标保留天数
+    AGENT_METRICS_ROLLUP_MODE: str = "sql"  # 小时汇总方式: sql(数据库侧单条语句) / python(逐Agent计算)
+    AGENT_METRICS_ROLLUP_BACKFILL_HOURS: int = 168  # 停机后最多补算的小时数
+    AGENT_METRICS_CACHE_ENABLED: bool = False  # 指标查询按时间桶缓存到Redis(需要redis)
+    AGENT_METRICS_CACHE_REDIS_URL: str = "redis://localhost:6379/1"
+    AGENT_METRICS_CACHE_RAW_LATENESS: int = 300  # 原始指标桶结束后多久才缓存(秒)
+    AGENT_METRICS_CACHE_HOURLY_LATENESS: int = 7200  # 小时聚合桶结束后多久才缓存(秒), 需覆盖最后一小时的汇总
+    AGENT_RESUME_TTL: float = 600.0  # 断线会话保留时间(秒), 期间可凭resume_token恢复
+    AGENT_OFFLINE_GRACE: float = 60.0  # 断线超过该时间仍未重连才标记离线(秒)
+    
+    # Agent指标写入缓冲配置
+    AGENT_METRICS_INGEST_BATCH_SIZE: int = 1000  # 单批最大行数
+    AGENT_METRICS_INGEST_FLUSH_INTERVAL: float = 1.0  # 最长攒批时间(秒)
+    AGENT_METRICS_INGEST_QUEUE_SIZE: int = 50_000  # 队列容量, 满时背压
+    AGENT_METRICS_INGEST_SPILL_PATH: str = "data/agent_metrics_spill.jsonl"  # 数据库不可用时的溢出文件
+    AGENT_METRICS_INGEST_SPILL_MAX_BYTES: int = 512_000_000  # 溢出文件上限
+    
+    # 日志批量写入配置
+    LOG_INGEST_BATCH_SIZE: int = 5000  # 单个事务最多写入的行数
+    LOG_INGEST_FLUSH_INTERVAL: float = 0.5  # 最长攒批时间(秒)
+    LOG_INGEST_QUEUE_SIZE: int = 10_000  # 队列中最多等待的提交批次数, 满时背压
+    LOG_INGEST_MAX_RETRIES: int = 3  # 写入失败重试次数
+    
+    # 日志存储配置
+    LOG_RETENTION_DAYS: int = 30  # 日志保留天数, 按天删除分区
+    LOG_PARTITION_PREMAKE_DAYS: int = 7  # 提前创建的日分区天数
+    LOG_SEARCH_DEFAULT_DAYS: int = 7  # 未指定起始时间时的搜索范围(天)
+    LOG_ARCHIVE_DIR: str = "data/log_archive"  # 冷数据归档目录, 每天一个文件
+    LOG_ARCHIVE_BLOCK_ROWS: int = 8192  # 归档块的行数, 块是跳过与解压的最小单位
+    LOG_ARCHIVE_SCAN_WORKERS: int = 4  # 并行扫描的归档文件数
+    LOG_TAIL_CHECKPOINT_DIR: str = "data/tail_checkpoints"  # 文件跟踪检查点目录
+    LOG_TAIL_POLL_INTERVAL: float = 1.0  # inotify不可用时的轮询间隔(秒)
+    LOG_TEMPLATE_ENABLED: bool = True  # 采集时挖掘日志模板
+    LOG_TEMPLATE_DEPTH: int = 4  # Drain前缀树深度
+    LOG_TEMPLATE_SIM_THRESHOLD: float = 0.4  # 并入已有模板的最低相似度
+    LOG_METRICS_FLUSH_INTERVAL: float = 10.0  # 日志派生指标的输出周期(秒)
+    LOG_METRICS_RULE_REFRESH: float = 60.0  # 重新加载指标规则的间隔(秒)
+    
+    # WebSocket配置
+    WS_CLIENT_QUEUE_SIZE: int = 1000  # 每个连接的发送队列容量
+    WS_BACKPLANE: str = "local"  # 跨进程广播: local(仅本进程) / redis(Redis发布订阅)
+    WS_BACKPLANE_REDIS_URL: str = "redis://localhost:6379/0"
+    WS_BACKPLANE_CHANNEL: str = "ws:broadcast"
+    WS_BACKPLANE_BATCH_SIZE: int = 100  # 单次PUBLISH合并的最大消息数
+    WS_BACKPLANE_BATCH_INTERVAL: float = 0.02  # 最长攒批时间(秒)
+    WS_BACKPLANE_PRESENCE_INTERVAL: float = 2.0  # 各进程订阅者存在标记的刷新间隔(秒)
+    WS_BACKPLANE_MAX_PENDING: int = 10000  # 等待发布的最大消息数, 超出时丢弃最旧的
+    WS_LIVE_TAIL_MAX_RATE: float = 200.0  # 实时跟踪每个连接每秒最多推送的日志条数, 超出时采样
+    WS_LIVE_TAIL_SUMMARY_INTERVAL: float = 5.0  # 采样丢弃摘要的推送间隔(秒)
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
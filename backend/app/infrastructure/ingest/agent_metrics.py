@@ -0,0 +1,377 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+from prometheus_client import Counter, Gauge, Histogram
+from ...domain.agent.metrics import AgentMetrics, AgentMetricsRepository
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class IngestMetrics:
+    """指标写入缓冲监控指标"""
+
+    def __init__(self):
+        self.rows = Counter(
+            'agent_metrics_ingest_rows_total',
+            'Total number of agent metric rows handled by the ingest buffer',
+            ['result']
+        )
+        self.flush_latency = Histogram(
+            'agent_metrics_ingest_flush_latency_seconds',
+            'Latency of one batched agent metrics flush in seconds'
+        )
+        self.queue_depth = Gauge(
+            'agent_metrics_ingest_queue_depth',
+            'Number of agent metric samples waiting to be flushed'
+        )
+
+ingest_metrics = IngestMetrics()
+
+# rows_per_second的统计窗口(秒)
+RATE_WINDOW = 60.0
+
+@dataclass
+class IngestStats:
+    """写入缓冲统计"""
+    rows_written: int = 0
+    rows_spilled: int = 0
+    rows_replayed: int = 0
+    rows_dropped: int = 0
+    batches_flushed: int = 0
+    flush_failures: int = 0
+    last_flush_latency: float = 0.0
+    total_flush_latency: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+    # 最近RATE_WINDOW秒内每次写入的 (时间, 行数)
+    recent: Deque[Tuple[float, int]] = field(default_factory=deque)
+
+    def record_written(self, rows: int) -> None:
+        now = time.monotonic()
+        self.rows_written += rows
+        self.recent.append((now, rows))
+        self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self.recent and self.recent[0][0] <= now - RATE_WINDOW:
+            self.recent.popleft()
+
+    @property
+    def avg_flush_latency(self) -> float:
+        if not self.batches_flushed:
+            return 0.0
+        return self.total_flush_latency / self.batches_flushed
+
+    @property
+    def rows_per_second(self) -> float:
+        """最近RATE_WINDOW秒的写入速率, 启动不足一个窗口时按已运行时间计算"""
+        now = time.monotonic()
+        self._trim(now)
+        window = min(RATE_WINDOW, now - self.started_at)
+        if window <= 0:
+            return 0.0
+        return sum(rows for _, rows in self.recent) / window
+
+class AgentMetricsIngestBuffer:
+    """Agent指标写入缓冲
+
+    汇聚多个Agent上报的样本, 达到批量大小或刷新间隔时通过
+    save_metrics_batch一次写入。队列有界, 满时submit阻塞形成背压;
+    数据库不可用时批次落盘到溢出文件, 恢复后按顺序重放; 溢出文件也
+    写不进时丢弃该批次并计数, 刷新循环不会因此退出。
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue_size: Optional[int] = None,
+        spill_path: Optional[str] = None,
+        spill_max_bytes: Optional[int] = None
+    ):
+        self.batch_size = batch_size or settings.AGENT_METRICS_INGEST_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.AGENT_METRICS_INGEST_FLUSH_INTERVAL
+        self.max_queue_size = max_queue_size or settings.AGENT_METRICS_INGEST_QUEUE_SIZE
+        self.spill_path = spill_path or settings.AGENT_METRICS_INGEST_SPILL_PATH
+        self.spill_max_bytes = spill_max_bytes or settings.AGENT_METRICS_INGEST_SPILL_MAX_BYTES
+        self.repo: Optional[AgentMetricsRepository] = None
+        # 可选的指标查询缓存, 写入后使迟到样本所在的已缓存桶失效
+        self.cache = None
+        self.stats = IngestStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # 正在收集的批次, 停止时由stop写出
+        self._collecting: List[AgentMetrics] = []
+        # 正在写入或重放, 此时停止要等它完成而不是取消
+        self._busy = False
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, repo: AgentMetricsRepository, cache=None) -> None:
+        """启动刷新任务"""
+        if self.running:
+            return
+        self.repo = repo
+        self.cache = cache
+        self.stats = IngestStats()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._collecting = []
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Agent metrics ingest buffer started "
+            f"(batch_size={self.batch_size}, flush_interval={self.flush_interval}s)"
+        )
+
+    async def stop(self) -> None:
+        """停止刷新任务并写出剩余样本
+
+        正在写入的批次等待写完, 正在收集的批次与队列中的样本一起写出。
+        """
+        if not self._task:
+            return
+        self._stopping = True
+        if not self._busy:
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        remaining = self._collecting + self._drain(self._queue.qsize())
+        self._collecting = []
+        if remaining:
+            await self._flush(remaining)
+        logger.info("Agent metrics ingest buffer stopped")
+
+    async def submit(self, metrics: AgentMetrics) -> None:
+        """提交样本, 队列满时等待(背压)"""
+        if not self.running:
+            raise RuntimeError("Agent metrics ingest buffer is not running")
+        await self._queue.put(metrics)
+        ingest_metrics.queue_depth.set(self._queue.qsize())
+
+    def submit_nowait(self, metrics: AgentMetrics) -> bool:
+        """提交样本, 队列满时立即返回False"""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(metrics)
+        except asyncio.QueueFull:
+            self.stats.rows_dropped += 1
+            ingest_metrics.rows.labels(result="dropped").inc()
+            return False
+        ingest_metrics.queue_depth.set(self._queue.qsize())
+        return True
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        data = asdict(self.stats)
+        data.pop("started_at")
+        data.pop("recent")
+        data.update(
+            avg_flush_latency=self.stats.avg_flush_latency,
+            rows_per_second=self.stats.rows_per_second,
+            queue_depth=self._queue.qsize() if self._queue else 0,
+            queue_capacity=self.max_queue_size,
+            spill_bytes=self._spill_size()
+        )
+        return data
+
+    async def _run(self) -> None:
+        """刷新循环"""
+        while not self._stopping:
+            batch = await self._collect_batch()
+            self._busy = True
+            try:
+                if batch:
+                    await self._flush(batch)
+                elif self._spill_size():
+                    await self._replay_spill()
+            except Exception as e:
+                # 刷新循环退出后submit会全部失败, 任何意外错误都只记录
+                logger.error(f"Agent metrics ingest flush loop error: {str(e)}")
+            finally:
+                self._busy = False
+
+    async def _collect_batch(self) -> List[AgentMetrics]:
+        """按数量或时间收集一个批次"""
+        loop = asyncio.get_running_loop()
+        try:
+            first = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+        except asyncio.TimeoutError:
+            return []
+
+        batch = self._collecting = [first]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            batch.extend(self._drain(self.batch_size - len(batch)))
+            if len(batch) >= self.batch_size:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        self._collecting = []
+        ingest_metrics.queue_depth.set(self._queue.qsize())
+        return batch
+
+    def _drain(self, limit: int) -> List[AgentMetrics]:
+        """非阻塞取出队列中的样本"""
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return items
+
+    async def _flush(self, batch: List[AgentMetrics]) -> bool:
+        """写入一个批次, 失败时落盘"""
+        start = time.perf_counter()
+        try:
+            await self.repo.save_metrics_batch(batch)
+        except Exception as e:
+            self.stats.flush_failures += 1
+            logger.error(
+                f"Failed to flush {len(batch)} agent metrics, spilling to disk: {str(e)}"
+            )
+            await self._spill(batch)
+            return False
+
+        latency = time.perf_counter() - start
+        self.stats.record_written(len(batch))
+        self.stats.batches_flushed += 1
+        self.stats.last_flush_latency = latency
+        self.stats.total_flush_latency += latency
+        ingest_metrics.rows.labels(result="written").inc(len(batch))
+        ingest_metrics.flush_latency.observe(latency)
+        await self._invalidate_cache(batch)
+
+        # 数据库已恢复, 重放此前落盘的批次
+        if self._spill_size():
+            await self._replay_spill()
+        return True
+
+    async def _invalidate_cache(self, batch: List[AgentMetrics]) -> None:
+        """使已缓存的查询桶失效, 缓存不可用不影响写入"""
+        if not self.cache:
+            return
+        try:
+            await self.cache.invalidate_late_samples(batch)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate agent metrics cache: {str(e)}")
+
+    def _spill_size(self) -> int:
+        """溢出文件(含重放中文件)总字节数"""
+        size = 0
+        for path in (self.spill_path, f"{self.spill_path}.replay"):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    async def _spill(self, batch: List[AgentMetrics]) -> None:
+        """将批次追加到溢出文件, 文件已满或无法写入时丢弃"""
+        if self._spill_size() >= self.spill_max_bytes:
+            self._drop(batch, f"spill file {self.spill_path} is full")
+            return
+
+        try:
+            await asyncio.to_thread(self._write_spill, self.spill_path, batch, "a")
+        except OSError as e:
+            self._drop(batch, f"cannot write spill file {self.spill_path}: {str(e)}")
+            return
+        self.stats.rows_spilled += len(batch)
+        ingest_metrics.rows.labels(result="spilled").inc(len(batch))
+
+    def _drop(self, batch: List[AgentMetrics], reason: str) -> None:
+        self.stats.rows_dropped += len(batch)
+        ingest_metrics.rows.labels(result="dropped").inc(len(batch))
+        logger.error(f"Dropped {len(batch)} agent metrics, {reason}")
+
+    def _write_spill(
+        self,
+        path: str,
+        metrics: List[AgentMetrics],
+        mode: str = "w"
+    ) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, mode, encoding="utf-8") as f:
+            for m in metrics:
+                f.write(json.dumps({
+                    **m.__dict__,
+                    "timestamp": m.timestamp.isoformat(),
+                    "created_at": m.created_at.isoformat()
+                }) + "\n")
+
+    async def _replay_spill(self) -> None:
+        """按顺序重放溢出文件"""
+        replay_path = f"{self.spill_path}.replay"
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            # 先移走溢出文件, 重放期间的新失败批次写入新的溢出文件
+            os.replace(self.spill_path, replay_path)
+
+        metrics = await asyncio.to_thread(self._read_spill, replay_path)
+        for offset in range(0, len(metrics), self.batch_size):
+            chunk = metrics[offset:offset + self.batch_size]
+            try:
+                await self.repo.save_metrics_batch(chunk)
+            except Exception as e:
+                # 数据库仍不可用, 保留未重放部分等待下次重放
+                logger.warning(f"Spill replay interrupted: {str(e)}")
+                await asyncio.to_thread(
+                    self._write_spill, replay_path, metrics[offset:]
+                )
+                return
+            self.stats.record_written(len(chunk))
+            self.stats.rows_replayed += len(chunk)
+            ingest_metrics.rows.labels(result="replayed").inc(len(chunk))
+            await self._invalidate_cache(chunk)
+
+        await asyncio.to_thread(os.remove, replay_path)
+        logger.info(f"Replayed {len(metrics)} spilled agent metrics")
+
+    def _read_spill(self, path: str) -> List[AgentMetrics]:
+        metrics = []
+        corrupt = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    m = json.loads(line)
+                    metrics.append(AgentMetrics(
+                        **{
+                            **m,
+                            "timestamp": datetime.fromisoformat(m["timestamp"]),
+                            "created_at": datetime.fromisoformat(m["created_at"])
+                        }
+                    ))
+                except (ValueError, TypeError, KeyError):
+                    # 如写入中途断电留下的半行, 跳过以免整个文件无法重放
+                    corrupt += 1
+        if corrupt:
+            self.stats.rows_dropped += corrupt
+            logger.error(f"Skipped {corrupt} corrupt lines in spill file {path}")
+        return metrics
+
+agent_metrics_ingest = AgentMetricsIngestBuffer()
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Iterable, List, Optional
+from prometheus_client import Counter
+from sqlalchemy.orm import Session
+from ...crud.log import log_metric_rule
+from ...domain.log.metrics import LogMetricAggregator, LogMetricKind, LogMetricRule
+from ...domain.monitor.repository import MetricValueRepository
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+log_metric_points = Counter(
+    'log_metrics_points_total',
+    'Total number of log-derived metric points handled',
+    ['result']
+)
+
+class LogMetricsRecorder:
+    """日志派生指标记录器
+
+    采集任务调用observe在内存中累计, 后台任务每flush_interval秒通过
+    MetricValueRepository把增量写入custom_metric_values, 并定期从数据库
+    重新加载规则。图表和告警读取时间序列, 不再反复扫描日志表。
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        rule_refresh: Optional[float] = None
+    ):
+        self.flush_interval = flush_interval or settings.LOG_METRICS_FLUSH_INTERVAL
+        self.rule_refresh = rule_refresh or settings.LOG_METRICS_RULE_REFRESH
+        self.aggregator = LogMetricAggregator()
+        self.repo: Optional[MetricValueRepository] = None
+        self.session_factory: Optional[Callable[[], Session]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._rules_loaded_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(
+        self,
+        repo: MetricValueRepository,
+        session_factory: Callable[[], Session]
+    ) -> None:
+        if self.running:
+            return
+        self.repo = repo
+        self.session_factory = session_factory
+        await self._load_rules()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Log metrics recorder started with {len(self.aggregator.rules)} rules")
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        logger.info("Log metrics recorder stopped")
+
+    def observe(self, source_id: int, entries: Iterable) -> None:
+        """累计一批已解析的日志"""
+        if self.running:
+            self.aggregator.observe(source_id, entries)
+
+    async def flush(self) -> None:
+        """写出本周期的指标"""
+        await self._write(self.aggregator.collect())
+
+    async def _write(self, values: List) -> None:
+        if not values:
+            return
+        try:
+            await self.repo.save_values(values)
+            log_metric_points.labels(result="written").inc(len(values))
+        except Exception as e:
+            # 派生指标可以容忍丢失一个周期, 不阻塞日志采集
+            log_metric_points.labels(result="failed").inc(len(values))
+            logger.error(f"Failed to write {len(values)} log metric points: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self._rules_loaded_at >= self.rule_refresh:
+                await self._load_rules()
+
+    async def _load_rules(self) -> None:
+        try:
+            rules = await asyncio.to_thread(self._fetch_rules)
+        except Exception as e:
+            logger.error(f"Failed to load log metric rules: {str(e)}")
+            return
+        # 按旧规则累计的数据先取出再换规则, 两步之间没有await,
+        # 写库期间observe的日志按新规则累计, 不会被清掉
+        values = self.aggregator.collect() if self.aggregator.rules else []
+        self.aggregator.set_rules(rules)
+        self._rules_loaded_at = time.monotonic()
+        await self._write(values)
+
+    def _fetch_rules(self) -> List[LogMetricRule]:
+        db = self.session_factory()
+        try:
+            rules = []
+            for r in log_metric_rule.get_enabled(db):
+                rule = LogMetricRule(
+                    id=r.id,
+                    metric_id=r.metric_id,
+                    server_id=r.server_id,
+                    kind=LogMetricKind(r.kind),
+                    source_id=r.source_id,
+                    filters=r.filters or {},
+                    group_by=r.group_by or [],
+                    value_field=r.value_field
+                )
+                if r.buckets:
+                    rule.buckets = list(r.buckets)
+                rules.append(rule)
+            return rules
+        finally:
+            db.close()
+
+log_metrics = LogMetricsRecorder()
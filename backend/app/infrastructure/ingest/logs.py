@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.orm import Session
+from ...crud.log import log as crud_log
+from ...interface.api.v1.schemas.log import LogEntry
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class LogIngestMetrics:
+    """日志批量写入监控指标"""
+
+    def __init__(self):
+        self.rows = Counter(
+            'log_ingest_rows_total',
+            'Total number of log rows handled by the log writer',
+            ['result']
+        )
+        self.flush_latency = Histogram(
+            'log_ingest_flush_latency_seconds',
+            'Latency of one batched log flush in seconds'
+        )
+        self.queue_depth = Gauge(
+            'log_ingest_queue_depth',
+            'Number of log batches waiting to be written'
+        )
+
+log_ingest_metrics = LogIngestMetrics()
+
+@dataclass
+class LogIngestStats:
+    """日志写入统计"""
+    rows_written: int = 0
+    rows_failed: int = 0
+    batches_flushed: int = 0
+    flush_failures: int = 0
+    last_flush_latency: float = 0.0
+    total_flush_latency: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def avg_flush_latency(self) -> float:
+        if not self.batches_flushed:
+            return 0.0
+        return self.total_flush_latency / self.batches_flushed
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        if elapsed <= 0:
+            return 0.0
+        return self.rows_written / elapsed
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # 生产者可以不等待确认, 避免未读取的异常告警
+    if not future.cancelled():
+        future.exception()
+
+class LogBatchWriter:
+    """日志批量写入器
+
+    采集器提交的日志先进入有界队列, 后台任务按行数或时间攒批, 在一个
+    事务内通过COPY或多行INSERT写入。submit返回的future在批次提交后完成,
+    生产者可以等待确认, 也可以继续采集而不阻塞在数据库提交上。
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue_size: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.batch_size = batch_size or settings.LOG_INGEST_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.LOG_INGEST_FLUSH_INTERVAL
+        self.max_queue_size = max_queue_size or settings.LOG_INGEST_QUEUE_SIZE
+        self.max_retries = settings.LOG_INGEST_MAX_RETRIES if max_retries is None else max_retries
+        self.session_factory: Optional[Callable[[], Session]] = None
+        self.stats = LogIngestStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # 正在攒批、尚未开始写入的批次, 停止时一并写出
+        self._collecting: List[Tuple[List[LogEntry], asyncio.Future]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, session_factory: Callable[[], Session]) -> None:
+        """启动写入任务, 每个批次使用独立的会话"""
+        if self.running:
+            return
+        self.session_factory = session_factory
+        self.stats = LogIngestStats()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Log writer started (batch_size={self.batch_size}, flush_interval={self.flush_interval}s)"
+        )
+
+    async def stop(self) -> None:
+        """停止写入任务并写出剩余日志"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        remaining = self._collecting + self._drain(self._queue.qsize())
+        self._collecting = []
+        if remaining:
+            await self._flush(remaining)
+        logger.info("Log writer stopped")
+
+    async def submit(self, entries: Sequence[LogEntry]) -> asyncio.Future:
+        """提交一批日志, 队列满时等待(背压)
+
+        返回的future在写入提交后得到写入行数, 写入最终失败时带有异常。
+        """
+        if not self.running:
+            raise RuntimeError("Log writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        if not entries:
+            future.set_result(0)
+            return future
+        await self._queue.put((list(entries), future))
+        log_ingest_metrics.queue_depth.set(self._queue.qsize())
+        return future
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        data = asdict(self.stats)
+        data.pop("started_at")
+        data.update(
+            avg_flush_latency=self.stats.avg_flush_latency,
+            rows_per_second=self.stats.rows_per_second,
+            queue_depth=self._queue.qsize() if self._queue else 0,
+            queue_capacity=self.max_queue_size
+        )
+        return data
+
+    async def _run(self) -> None:
+        """写入循环"""
+        while True:
+            batch = await self._collect_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _collect_batch(self) -> List[Tuple[List[LogEntry], asyncio.Future]]:
+        """按行数或时间收集一个批次"""
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        batch = self._collecting = [first]
+        rows = len(first[0])
+        deadline = loop.time() + self.flush_interval
+        while rows < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[0])
+
+        self._collecting = []
+        log_ingest_metrics.queue_depth.set(self._queue.qsize())
+        return batch
+
+    def _drain(self, limit: int) -> List[Tuple[List[LogEntry], asyncio.Future]]:
+        """非阻塞取出队列中的批次"""
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return items
+
+    async def _flush(self, batch: List[Tuple[List[LogEntry], asyncio.Future]]) -> None:
+        """在一个事务内写入批次并确认各生产者"""
+        entries = [entry for items, _ in batch for entry in items]
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                written = await asyncio.to_thread(self._write, entries)
+                break
+            except Exception as e:
+                self.stats.flush_failures += 1
+                if attempt >= self.max_retries:
+                    self.stats.rows_failed += len(entries)
+                    log_ingest_metrics.rows.labels(result="failed").inc(len(entries))
+                    logger.error(f"Failed to write {len(entries)} log entries: {str(e)}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                await asyncio.sleep(min(2 ** attempt, 10))
+
+        latency = time.perf_counter() - start
+        self.stats.rows_written += written
+        self.stats.batches_flushed += 1
+        self.stats.last_flush_latency = latency
+        self.stats.total_flush_latency += latency
+        log_ingest_metrics.rows.labels(result="written").inc(written)
+        log_ingest_metrics.flush_latency.observe(latency)
+        for items, future in batch:
+            if not future.done():
+                future.set_result(len(items))
+
+    def _write(self, entries: List[LogEntry]) -> int:
+        db = self.session_factory()
+        try:
+            return crud_log.create_many(db, objs_in=entries)
+        finally:
+            db.close()
+
+log_writer = LogBatchWriter()
@@ -0,0 +1,380 @@
+import heapq
+import json
+import logging
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 未安装时使用标准库zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 归档的列, 与logs表一致
+ARCHIVE_COLUMNS = (
+    "id", "source_id", "timestamp", "level", "message", "parsed_fields", "metadata", "template_id"
+)
+MAGIC = b"LGA1"
+FOOTER = struct.Struct("<Q4s")  # 索引长度 + 魔数
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+# 块内模板ID不多于该数量时记入块索引, 用于按模板下钻时跳过块
+MAX_INDEXED_TEMPLATES = 64
+FILE_PATTERN = re.compile(r"^logs_(\d{8})\.lga$")
+WORD = re.compile(r"\w+")
+# websearch语法的一项: [-]"短语" 或 [-]单词
+QUERY_TERM = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+
+def _to_micros(ts: datetime) -> int:
+    return (ts - EPOCH) // ONE_MICROSECOND
+
+def _from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+def _fulltext_matcher(text: str) -> Callable[[str], bool]:
+    """按websearch_to_tsquery的语法生成消息匹配函数
+
+    与数据库的simple配置一致按单词整体匹配、不做词干处理: 空格分隔的项
+    都须出现, or分隔的各组任一命中即可, -排除, "短语"要求单词相邻;
+    含标点的项(如status=500)拆成相邻的单词。单词按字母数字切分, IP、路径等
+    数据库解析器整体识别的片段在这里被拆开, 结果可能略有出入。
+    """
+    groups: List[List[Tuple[bool, Tuple[str, ...]]]] = [[]]
+    for match in QUERY_TERM.finditer(text):
+        negate, term = bool(match.group(1)), match.group(2)
+        if term is None:
+            term = match.group(3)
+            if term.lower() == "or":
+                groups.append([])
+                continue
+            negate = term.startswith("-")
+            term = term.lstrip("-")
+        words = tuple(WORD.findall(term.lower()))
+        if words:
+            groups[-1].append((negate, words))
+    groups = [group for group in groups if group]
+
+    def contains(words: List[str], vocabulary: set, phrase: Tuple[str, ...]) -> bool:
+        if len(phrase) == 1:
+            return phrase[0] in vocabulary
+        n = len(phrase)
+        return any(tuple(words[i:i + n]) == phrase for i in range(len(words) - n + 1))
+
+    def matches(message: str) -> bool:
+        words = WORD.findall(message.lower())
+        vocabulary = set(words)
+        return any(
+            all(contains(words, vocabulary, phrase) != negate for negate, phrase in group)
+            for group in groups
+        )
+    return matches
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 6)
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this log archive")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+@dataclass
+class ArchiveQuery:
+    """归档扫描条件, 与CRUDLog.search的条件一一对应"""
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    source_ids: Optional[Sequence[int]] = None
+    levels: Optional[Sequence[str]] = None
+    template_ids: Optional[Sequence[int]] = None
+    search_text: Optional[str] = None
+    search_mode: str = "substring"
+    field_filters: Optional[Dict[str, Any]] = None
+    # (timestamp, id), 只返回严格早于它的日志
+    cursor: Optional[Tuple[datetime, int]] = None
+    limit: int = 100
+
+    def row_filter(self) -> Callable[[Dict], bool]:
+        """生成逐行判断函数, 块级条件已由块索引处理过一遍, 这里仍逐行校验"""
+        checks: List[Callable[[Dict], bool]] = []
+        if self.source_ids:
+            source_ids = set(self.source_ids)
+            checks.append(lambda r: r["source_id"] in source_ids)
+        if self.levels:
+            levels = set(self.levels)
+            checks.append(lambda r: r["level"] in levels)
+        if self.template_ids:
+            template_ids = set(self.template_ids)
+            checks.append(lambda r: r["template_id"] in template_ids)
+        if self.search_text:
+            if self.search_mode == "fulltext":
+                # 归档中没有分词索引, 逐行分词匹配
+                matches = _fulltext_matcher(self.search_text)
+                checks.append(lambda r: matches(r["message"]))
+            else:
+                needle = self.search_text.lower()
+                checks.append(lambda r: needle in r["message"].lower())
+        if self.field_filters:
+            expected = self.field_filters.items()
+            checks.append(lambda r: bool(r["parsed_fields"]) and all(
+                r["parsed_fields"].get(k) == v for k, v in expected
+            ))
+        return lambda r: all(check(r) for check in checks)
+
+class LogArchiveWriter:
+    """把一天的日志写成归档文件
+
+    行按 (timestamp, id) 升序分块, 每块各列单独序列化后整体压缩;
+    文件末尾的索引记录每块的偏移、时间范围、级别、日志源和模板,
+    查询据此跳过不相关的块。先写临时文件再改名, 中途失败不留下半个文件。
+    """
+
+    def __init__(self, path: str, block_rows: int = 8192, codec: Optional[str] = None):
+        self.path = path
+        self.block_rows = block_rows
+        self.codec = codec or ("zstd" if zstandard else "zlib")
+        self.rows = 0
+
+    def write(self, rows: Iterable[Sequence]) -> int:
+        """rows为按ARCHIVE_COLUMNS排列、按 (timestamp, id) 升序的元组, 返回写入行数"""
+        tmp = f"{self.path}.tmp"
+        index: List[Dict] = []
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            block: List[Sequence] = []
+            for row in rows:
+                block.append(row)
+                if len(block) >= self.block_rows:
+                    index.append(self._write_block(f, block))
+                    block = []
+            if block:
+                index.append(self._write_block(f, block))
+            data = json.dumps({"codec": self.codec, "blocks": index}).encode()
+            f.write(data)
+            f.write(FOOTER.pack(len(data), MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        return self.rows
+
+    def _write_block(self, f, block: List[Sequence]) -> Dict:
+        columns = list(zip(*block))
+        timestamps = [_to_micros(ts) for ts in columns[2]]
+        payload = {
+            "id": columns[0],
+            "source_id": columns[1],
+            "timestamp": timestamps,
+            "level": columns[3],
+            "message": columns[4],
+            "parsed_fields": columns[5],
+            "metadata": columns[6],
+            "template_id": columns[7],
+        }
+        data = _compress(json.dumps(payload, ensure_ascii=False, default=str).encode(), self.codec)
+        offset = f.tell()
+        f.write(data)
+        self.rows += len(block)
+        templates = set(columns[7])
+        return {
+            "offset": offset,
+            "length": len(data),
+            "rows": len(block),
+            "min_ts": min(timestamps),
+            "max_ts": max(timestamps),
+            "levels": sorted({l for l in columns[3] if l is not None}) + ([None] if None in columns[3] else []),
+            "source_ids": sorted({s for s in columns[1] if s is not None}),
+            "template_ids": sorted(t for t in templates if t is not None)
+            if len(templates) <= MAX_INDEXED_TEMPLATES else None,
+        }
+
+class LogArchive:
+    """单个归档文件的读取"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            f.seek(-FOOTER.size, os.SEEK_END)
+            length, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Invalid log archive: {path}")
+            f.seek(-FOOTER.size - length, os.SEEK_END)
+            meta = json.loads(f.read(length))
+        self.codec = meta["codec"]
+        self.blocks: List[Dict] = meta["blocks"]
+
+    @property
+    def rows(self) -> int:
+        return sum(b["rows"] for b in self.blocks)
+
+    def candidate_blocks(self, query: ArchiveQuery) -> List[Dict]:
+        """按块索引跳过不可能命中的块, 按时间倒序返回"""
+        start = _to_micros(query.start_time) if query.start_time else None
+        end = _to_micros(query.end_time) if query.end_time else None
+        if query.cursor:
+            cursor_ts = _to_micros(query.cursor[0])
+            end = cursor_ts if end is None else min(end, cursor_ts)
+        levels = set(query.levels) if query.levels else None
+        sources = set(query.source_ids) if query.source_ids else None
+        templates = set(query.template_ids) if query.template_ids else None
+
+        blocks = []
+        for block in self.blocks:
+            if start is not None and block["max_ts"] < start:
+                continue
+            if end is not None and block["min_ts"] > end:
+                continue
+            if levels and levels.isdisjoint(block["levels"]):
+                continue
+            if sources and sources.isdisjoint(block["source_ids"]):
+                continue
+            if templates and block["template_ids"] is not None and templates.isdisjoint(block["template_ids"]):
+                continue
+            blocks.append(block)
+        blocks.reverse()
+        return blocks
+
+    def iter_rows(self) -> Iterable[Tuple]:
+        """按写入顺序逐行返回ARCHIVE_COLUMNS元组"""
+        for block in self.blocks:
+            for row in self.read_block(block):
+                yield tuple(row[c] for c in ARCHIVE_COLUMNS)
+
+    def read_block(self, block: Dict) -> List[Dict]:
+        with open(self.path, "rb") as f:
+            f.seek(block["offset"])
+            data = f.read(block["length"])
+        columns = json.loads(_decompress(data, self.codec))
+        columns["timestamp"] = [_from_micros(ts) for ts in columns["timestamp"]]
+        return [dict(zip(ARCHIVE_COLUMNS, values)) for values in zip(*(columns[c] for c in ARCHIVE_COLUMNS))]
+
+    def search(self, query: ArchiveQuery, matches: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """返回命中的日志, 按 (timestamp, id) 倒序, 最多query.limit条"""
+        matches = matches or query.row_filter()
+        results: List[Dict] = []
+        for block in self.candidate_blocks(query):
+            for row in reversed(self.read_block(block)):
+                ts = row["timestamp"]
+                if query.start_time and ts < query.start_time:
+                    continue
+                if query.end_time and ts > query.end_time:
+                    continue
+                if query.cursor and (ts, row["id"]) >= query.cursor:
+                    continue
+                if matches(row):
+                    results.append(row)
+            # 行按 (timestamp, id) 升序写入, 更早的块只含更小的键, 凑满一页即可停止
+            if len(results) >= query.limit:
+                break
+        return results[:query.limit]
+
+def _dedupe(rows: Iterable[Sequence]) -> Iterable[Sequence]:
+    """跳过 (timestamp, id) 相同的行
+
+    归档写入后、分区删除前中断时, 下次会再次归档同一批行; 输入已按
+    (timestamp, id) 排序, 重复行必然相邻。
+    """
+    previous = None
+    for row in rows:
+        key = (row[2], row[0])
+        if key != previous:
+            previous = key
+            yield row
+
+class LogArchiveStore:
+    """按天组织的日志归档目录
+
+    冷数据以 logs_YYYYMMDD.lga 保存, 每个文件对应一个已删除的日分区。
+    查询从最新的一天开始, 以workers个线程并行扫描多天的文件, 按天序
+    合并结果, 凑满一页即停止。
+    """
+
+    def __init__(self, directory: str, workers: int = 4, block_rows: int = 8192):
+        self.directory = directory
+        self.workers = workers
+        self.block_rows = block_rows
+
+    def path_for(self, day: date) -> str:
+        return os.path.join(self.directory, f"logs_{day:%Y%m%d}.lga")
+
+    def days(self) -> List[date]:
+        if not os.path.isdir(self.directory):
+            return []
+        days = []
+        for name in os.listdir(self.directory):
+            match = FILE_PATTERN.match(name)
+            if match:
+                days.append(datetime.strptime(match.group(1), "%Y%m%d").date())
+        return sorted(days)
+
+    def newest_day(self) -> Optional[date]:
+        days = self.days()
+        return days[-1] if days else None
+
+    def write_day(self, day: date, rows: Iterable[Sequence]) -> int:
+        """写入一天的日志; 当天已有归档时按 (timestamp, id) 与其合并后重写"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(day)
+        if os.path.exists(path):
+            rows = heapq.merge(LogArchive(path).iter_rows(), rows, key=lambda r: (r[2], r[0]))
+        return LogArchiveWriter(path, block_rows=self.block_rows).write(_dedupe(rows))
+
+    def delete_before(self, cutoff: date) -> int:
+        """删除早于cutoff的归档, 返回删除的行数"""
+        deleted = 0
+        for day in self.days():
+            if day >= cutoff:
+                break
+            path = self.path_for(day)
+            rows = 0
+            try:
+                rows = LogArchive(path).rows
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read archive before deleting {path}: {e}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # 另一个进程已删除
+                continue
+            except OSError as e:
+                # 留到下一次清理, 不影响其余文件
+                logger.error(f"Failed to delete archive {path}: {e}")
+                continue
+            deleted += rows
+        return deleted
+
+    def search(self, query: ArchiveQuery) -> List[Dict]:
+        """在归档中搜索, 返回按 (timestamp, id) 倒序的最多query.limit条日志"""
+        start_day = query.start_time.date() if query.start_time else None
+        end = query.end_time
+        if query.cursor and (end is None or query.cursor[0] < end):
+            end = query.cursor[0]
+        end_day = end.date() if end else None
+        days = [
+            d for d in reversed(self.days())
+            if (start_day is None or d >= start_day) and (end_day is None or d <= end_day)
+        ]
+        if not days:
+            return []
+
+        matches = query.row_filter()
+        results: List[Dict] = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for i in range(0, len(days), self.workers):
+                window = days[i:i + self.workers]
+                pages = pool.map(
+                    lambda d: LogArchive(self.path_for(d)).search(query, matches), window
+                )
+                for page in pages:
+                    results.extend(page)
+                if len(results) >= query.limit:
+                    break
+        return results[:query.limit]
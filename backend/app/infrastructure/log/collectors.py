@@ -2,15 +2,17 @@ import os
 import re
 import json
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Generator
+from typing import Dict, Any, AsyncIterator, List, Generator
 from datetime import datetime
 import asyncio
-import aiofiles
 import asyncssh
 from systemd import journal
 
 from app.models.log import LogSource, LogParseRule
 from app.interface.api.v1.schemas.log import LogEntry
+from app.infrastructure.config import settings
+from app.infrastructure.log.syslog import SyslogReceiver
+from app.infrastructure.log.tailer import FileTailer
 
 class LogCollector(ABC):
     """日志采集器基类"""
@@ -24,26 +26,33 @@ class LogCollector(ABC):
         """采集日志"""
         pass
 
+    async def collect_batches(self) -> AsyncIterator[List[LogEntry]]:
+        """按批采集日志, 默认逐条包装, 高吞吐的采集器可以覆盖"""
+        async for entry in self.collect():
+            yield [entry]
+
 class FileLogCollector(LogCollector):
-    """文件日志采集器"""
+    """文件日志采集器
+
+    config支持单个path或paths列表, 同一个跟踪器在一个任务内跟踪全部文件,
+    检查点按日志源保存, 重启后从上次确认的位置继续。
+    """
     
     async def collect(self) -> Generator[LogEntry, None, None]:
-        path = self.config["path"]
-        if not os.path.exists(path):
-            return
-            
-        async with aiofiles.open(path, mode='r') as f:
-            # 从文件末尾开始读取
-            await f.seek(0, 2)
-            while True:
-                line = await f.readline()
-                if not line:
-                    await asyncio.sleep(1)
-                    continue
-                    
+        paths = self.config.get("paths") or [self.config["path"]]
+        tailer = FileTailer(
+            paths,
+            checkpoint_path=os.path.join(
+                settings.LOG_TAIL_CHECKPOINT_DIR, f"source_{self.source.id}.json"
+            ),
+            poll_interval=settings.LOG_TAIL_POLL_INTERVAL
+        )
+        async for path, lines in tailer.follow():
+            now = datetime.now()
+            for line in lines:
                 yield LogEntry(
                     source_id=self.source.id,
-                    timestamp=datetime.now(),
+                    timestamp=now,
                     message=line.strip(),
                     level=None,  # 需要通过解析规则提取
                     parsed_fields=None,  # 需要通过解析规则提取
@@ -51,37 +60,30 @@ class FileLogCollector(LogCollector):
                 )
 
 class SyslogCollector(LogCollector):
-    """Syslog采集器"""
+    """Syslog采集器
+
+    config: port, protocol(udp/tcp), 可选host。接收与解析在SyslogReceiver中
+    完成, 按批产出日志。
+    """
     
     async def collect(self) -> Generator[LogEntry, None, None]:
-        port = self.config["port"]
-        protocol = self.config["protocol"]
-        
-        # 实现syslog服务器监听
-        server = await asyncio.start_server(
-            self._handle_connection, '0.0.0.0', port
-        )
-        
-        async with server:
-            await server.serve_forever()
+        async for entries in self.collect_batches():
+            for entry in entries:
+                yield entry
     
-    async def _handle_connection(
-        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
-    ):
-        while True:
-            data = await reader.readline()
-            if not data:
-                break
-                
-            message = data.decode().strip()
-            yield LogEntry(
-                source_id=self.source.id,
-                timestamp=datetime.now(),
-                message=message,
-                level=None,
-                parsed_fields=None,
-                metadata={"protocol": self.config["protocol"]}
-            )
+    async def collect_batches(self) -> AsyncIterator[List[LogEntry]]:
+        receiver = SyslogReceiver(
+            self.source.id,
+            host=self.config.get("host", "0.0.0.0"),
+            port=self.config["port"],
+            protocol=self.config.get("protocol", "udp").lower()
+        )
+        await receiver.start()
+        try:
+            async for entries in receiver.batches():
+                yield entries
+        finally:
+            receiver.close()
 
 class JournaldCollector(LogCollector):
     """Systemd Journal采集器"""
@@ -4,18 +4,31 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app.crud import log_source, log_parse_rule, log
+from app.crud.log import log_template
+from app.domain.log.template import TemplateMiner
+from app.infrastructure.config import settings
 from app.models.log import LogSource, LogParseRule
 from app.interface.api.v1.schemas.log import LogEntry
+from app.infrastructure.ingest.logs import log_writer
+from app.infrastructure.ingest.log_metrics import log_metrics
+from app.interface.api.v1.ws import broadcast_log_entries
+from app.infrastructure.persistence.database import SessionLocal
 from .collectors import CollectorFactory
 from .parsers import LogParserChain
 
 class LogService:
-    """日志服务"""
+    """日志服务
+
+    采集循环中的数据库操作(模板载入和写入、写入器未运行时的日志写入)
+    在线程中以独立会话执行, 不阻塞事件循环。
+    """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, session_factory=SessionLocal):
         self.db = db
+        self.session_factory = session_factory
         self.collectors = {}
         self.parser_chains = {}
+        self.template_miners = {}
         
     async def start(self):
         """启动日志采集"""
@@ -39,13 +52,60 @@ class LogService:
         collector = self.collectors[source_id]
         parser_chain = self.parser_chains[source_id]
         
-        async for entry in collector.collect():
+        miner = await self._get_template_miner(source_id)
+        
+        async for entries in collector.collect_batches():
             # 解析日志
-            parsed_entry = parser_chain.parse(entry)
+            parsed_entries = [parser_chain.parse(entry) for entry in entries]
+            if miner:
+                await self._apply_templates(miner, source_id, parsed_entries)
+            log_metrics.observe(source_id, parsed_entries)
+            await broadcast_log_entries(parsed_entries)
             
-            # 保存到数据库
-            await log.create(self.db, obj_in=parsed_entry)
+            # 交给批量写入器, 不等待提交确认
+            if log_writer.running:
+                await log_writer.submit(parsed_entries)
+            else:
+                await asyncio.to_thread(self._in_session, log.create_many, objs_in=parsed_entries)
+
+    def _in_session(self, func, **kwargs):
+        """以独立会话调用CRUD函数, 供线程中执行"""
+        db = self.session_factory()
+        try:
+            return func(db, **kwargs)
+        finally:
+            db.close()
             
+    async def _get_template_miner(self, source_id: int):
+        """创建日志源的模板挖掘器, 载入已持久化的模板以沿用原有ID"""
+        if not settings.LOG_TEMPLATE_ENABLED:
+            return None
+        miner = self.template_miners.get(source_id)
+        if miner is None:
+            miner = TemplateMiner(
+                source_id,
+                depth=settings.LOG_TEMPLATE_DEPTH,
+                sim_threshold=settings.LOG_TEMPLATE_SIM_THRESHOLD
+            )
+            templates = await asyncio.to_thread(
+                self._in_session, log_template.get_multi_by_source, source_id=source_id
+            )
+            miner.load((t.id, t.template) for t in templates)
+            self.template_miners[source_id] = miner
+        return miner
+    
+    async def _apply_templates(self, miner: TemplateMiner, source_id: int, entries: List[LogEntry]):
+        """为每条日志分配模板ID并记录参数, 新模板先于日志写入"""
+        for entry, (template, params) in zip(entries, miner.add_batch(e.message for e in entries)):
+            entry.template_id = template.id
+            if params:
+                entry.parsed_fields = {**(entry.parsed_fields or {}), "template_params": params}
+        dirty = miner.pop_dirty()
+        if dirty:
+            await asyncio.to_thread(
+                self._in_session, log_template.upsert_many, source_id=source_id, templates=dirty
+            )
+    
     def add_source(self, source: LogSource):
         """添加新的日志源"""
         if source.id in self.collectors:
@@ -62,4 +122,5 @@ class LogService:
     def remove_source(self, source_id: int):
         """移除日志源"""
         self.collectors.pop(source_id, None)
-        self.parser_chains.pop(source_id, None) 
\ No newline at end of file
+        self.parser_chains.pop(source_id, None)
+        self.template_miners.pop(source_id, None) 
\ No newline at end of file
@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.interface.api.v1.schemas.log import LogEntry
+
+logger = logging.getLogger(__name__)
+
+# syslog严重级别(0-7)到日志级别的映射
+SEVERITY_LEVELS = (
+    "critical", "critical", "critical", "error",
+    "warning", "info", "info", "debug",
+)
+
+# RFC 5424: "<PRI>1 TIMESTAMP HOSTNAME APP-NAME PROCID MSGID SD [MSG]", SD元素内允许转义的']'
+RFC5424_PATTERN = re.compile(
+    r"<(\d{1,3})>1 (\S+) (\S+) (\S+) (\S+) (\S+) (-|(?:\[(?:[^\]\\]|\\.)*\])+)(?: (.*))?",
+    re.DOTALL
+)
+# RFC 3164: "<PRI>Mmm dd hh:mm:ss HOST TAG[PID]: MSG", TAG之后的部分都视为消息
+RFC3164_PATTERN = re.compile(
+    r"<(\d{1,3})>(\w{3} [ \d]\d \d{2}:\d{2}:\d{2}) (\S+) ([^:\[\s]+)(?:\[([^\]]*)\])?:? ?(.*)",
+    re.DOTALL
+)
+# 只有PRI头的非标准消息
+PRI_PATTERN = re.compile(r"<(\d{1,3})>(.*)", re.DOTALL)
+
+# 单条TCP消息的上限: 换行分帧超出时按已收到的部分成帧, octet-counting声明超出时断开连接
+MAX_FRAME_SIZE = 64 * 1024
+
+@lru_cache(maxsize=1024)
+def _parse_3164_time(value: str) -> datetime:
+    # 按闰年解析, 2月29日也能解析; 年份由调用方补上
+    return datetime.strptime("2000 " + " ".join(value.split()), "%Y %b %d %H:%M:%S")
+
+def _parse_3164_timestamp(value: str) -> datetime:
+    # RFC 3164时间不带年份, 取当前年份; 年初收到的上一年12月底的消息归入上一年
+    now = datetime.now()
+    ts = _parse_3164_time(value)
+    year = now.year - 1 if ts.month == 12 and now.month == 1 else now.year
+    return ts.replace(year=year)
+
+def _parse_5424_timestamp(value: str) -> Optional[datetime]:
+    # 与RFC 3164及入库时间一致, 统一转换为无时区的本地时间
+    if value == "-":
+        return None
+    try:
+        if value.endswith("Z"):
+            ts = datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc)
+        else:
+            ts = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts
+
+def parse_syslog_message(data: str) -> Optional[Dict]:
+    """解析一条syslog消息, 自动识别RFC 5424与RFC 3164格式
+
+    返回包含timestamp、level、message及头部字段的字典,
+    没有合法PRI头时返回None。
+    """
+    if data.endswith(("\r", "\n")):
+        data = data.rstrip("\r\n")
+    match = RFC5424_PATTERN.match(data)
+    if match:
+        pri, timestamp, hostname, app_name, procid, msgid, structured_data, message = match.groups()
+        if message is None:
+            message = ""
+        elif message.startswith("\ufeff"):
+            # RFC 5424允许MSG以UTF-8 BOM开头
+            message = message[1:]
+        facility, severity = divmod(int(pri), 8)
+        fields = {
+            "facility": facility,
+            "severity": severity,
+            "hostname": hostname if hostname != "-" else None,
+            "app_name": app_name if app_name != "-" else None,
+            "procid": procid if procid != "-" else None,
+            "msgid": msgid if msgid != "-" else None,
+            "structured_data": structured_data if structured_data != "-" else None,
+        }
+        ts = _parse_5424_timestamp(timestamp)
+    else:
+        match = RFC3164_PATTERN.match(data)
+        if match:
+            pri, timestamp, hostname, app_name, procid, message = match.groups()
+            facility, severity = divmod(int(pri), 8)
+            fields = {
+                "facility": facility,
+                "severity": severity,
+                "hostname": hostname,
+                "app_name": app_name,
+                "procid": procid,
+            }
+            try:
+                ts = _parse_3164_timestamp(timestamp)
+            except ValueError:
+                ts = None
+        else:
+            match = PRI_PATTERN.match(data)
+            if not match:
+                return None
+            # 非标准消息只有PRI头, 其余整体作为消息
+            pri, message = match.groups()
+            facility, severity = divmod(int(pri), 8)
+            fields = {"facility": facility, "severity": severity}
+            ts = None
+
+    return {
+        "timestamp": ts,
+        "level": SEVERITY_LEVELS[severity],
+        "message": message,
+        "parsed_fields": fields,
+    }
+
+class SyslogTCPProtocol(asyncio.Protocol):
+    """TCP syslog连接, 按RFC 6587分帧
+
+    帧以数字开头时按octet-counting("长度 消息")解析, 否则按换行分隔;
+    同一连接中两种方式可以混用。声明长度超过MAX_FRAME_SIZE的帧不会被
+    缓冲, 直接断开连接。
+    """
+
+    def __init__(self, receiver: "SyslogReceiver"):
+        self.receiver = receiver
+        self.buffer = b""
+        self.peer = None
+        self.transport: Optional[asyncio.BaseTransport] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+        self.peer = transport.get_extra_info("peername")
+
+    def data_received(self, data: bytes) -> None:
+        buffer = self.buffer + data if self.buffer else data
+        frames = []
+        pos = 0
+        size = len(buffer)
+        while pos < size:
+            if 48 <= buffer[pos] <= 57:
+                space = buffer.find(b" ", pos, pos + 8)
+                if space > 0 and buffer[pos:space].isdigit():
+                    length = int(buffer[pos:space])
+                    if length > MAX_FRAME_SIZE:
+                        self._reject(length, frames)
+                        return
+                    end = space + 1 + length
+                    if end > size:
+                        break
+                    frames.append(buffer[space + 1:end])
+                    pos = end
+                    continue
+            newline = buffer.find(b"\n", pos)
+            if newline < 0:
+                if size - pos > MAX_FRAME_SIZE:
+                    frames.append(buffer[pos:])
+                    pos = size
+                break
+            if newline > pos:
+                frames.append(buffer[pos:newline])
+            pos = newline + 1
+        self.buffer = buffer[pos:]
+        if frames:
+            self.receiver.feed(frames, self.peer)
+
+    def _reject(self, length: int, frames: List[bytes]) -> None:
+        """对端声明的帧长超出上限, 交付此前完整的帧后断开连接"""
+        logger.warning(f"Syslog frame of {length} bytes from {self.peer} exceeds {MAX_FRAME_SIZE}, closing connection")
+        self.buffer = b""
+        if frames:
+            self.receiver.feed(frames, self.peer)
+        if self.transport is not None:
+            self.transport.close()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.buffer.strip():
+            self.receiver.feed([self.buffer], self.peer)
+        self.buffer = b""
+
+class SyslogUDPProtocol(asyncio.DatagramProtocol):
+    """UDP syslog, 每个数据报是一条消息"""
+
+    def __init__(self, receiver: "SyslogReceiver"):
+        self.receiver = receiver
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.receiver.feed([data], addr)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning(f"Syslog UDP error: {exc}")
+
+class SyslogReceiver:
+    """syslog接收器
+
+    协议层只做分帧, 原始消息攒到batch_size条或flush_interval秒后
+    统一解析成LogEntry放入有界队列, 由消费者整批提交给日志写入器。
+    队列满时丢弃新批次并计数, 避免接收端内存无限增长。
+    """
+
+    def __init__(
+        self,
+        source_id: int,
+        host: str = "0.0.0.0",
+        port: int = 514,
+        protocol: str = "udp",
+        batch_size: int = 1000,
+        flush_interval: float = 0.2,
+        max_pending_batches: int = 100
+    ):
+        if protocol not in ("udp", "tcp"):
+            raise ValueError(f"Unsupported syslog protocol: {protocol}")
+        self.source_id = source_id
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_batches = max_pending_batches
+        self.received = 0
+        self.dropped = 0
+        self._pending: List[Tuple[bytes, object]] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._server = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        if self.protocol == "udp":
+            self._server, _ = await loop.create_datagram_endpoint(
+                lambda: SyslogUDPProtocol(self), local_addr=(self.host, self.port)
+            )
+        else:
+            self._server = await loop.create_server(
+                lambda: SyslogTCPProtocol(self), self.host, self.port
+            )
+        logger.info(f"Syslog receiver listening on {self.protocol}://{self.host}:{self.port}")
+
+    def close(self) -> None:
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._server:
+            self._server.close()
+            self._server = None
+        self.flush()
+
+    def feed(self, frames: List[bytes], peer) -> None:
+        """协议层回调, 只追加原始帧"""
+        self.received += len(frames)
+        self._pending.extend((frame, peer) for frame in frames)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_interval, self.flush
+            )
+
+    def flush(self) -> None:
+        """解析待处理的帧并放入队列"""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        entries = self.parse_batch(pending)
+        try:
+            self._queue.put_nowait(entries)
+        except asyncio.QueueFull:
+            self.dropped += len(entries)
+            logger.warning(f"Syslog queue full, dropped {len(entries)} messages")
+
+    def parse_batch(self, frames: List[Tuple[bytes, object]]) -> List[LogEntry]:
+        """批量解析原始帧为LogEntry"""
+        now = datetime.now()
+        source_id = self.source_id
+        # 同一对端的消息共享metadata
+        metadata_by_peer: Dict[object, Dict] = {}
+        entries = []
+        for frame, peer in frames:
+            metadata = metadata_by_peer.get(peer)
+            if metadata is None:
+                metadata = metadata_by_peer[peer] = {
+                    "protocol": self.protocol, "peer": peer[0] if peer else None
+                }
+            text = frame.decode("utf-8", errors="replace")
+            parsed = parse_syslog_message(text)
+            if parsed is None:
+                parsed = {"timestamp": now, "level": None, "message": text.strip(), "parsed_fields": None}
+            elif parsed["timestamp"] is None:
+                parsed["timestamp"] = now
+            parsed["source_id"] = source_id
+            parsed["metadata"] = metadata
+            parsed["template_id"] = None
+            # 字段均来自解析结果, 跳过校验
+            entries.append(LogEntry.construct(**parsed))
+        return entries
+
+    async def batches(self):
+        """按批产出解析后的日志"""
+        while True:
+            yield await self._queue.get()
@@ -0,0 +1,386 @@
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify事件掩码
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+class Inotify:
+    """基于libc的inotify封装, 不可用时构造抛出OSError"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not supported on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, str] = {}
+
+    def add_watch(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+        self._watches[wd] = directory
+
+    def read_events(self) -> Tuple[Set[Tuple[str, str]], bool]:
+        """读取待处理事件, 返回 ({(目录, 文件名)}, 是否队列溢出)"""
+        changed: Set[Tuple[str, str]] = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif wd in self._watches:
+                    changed.add((self._watches[wd], name))
+        return changed, overflow
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+@dataclass
+class TailedFile:
+    """一个被跟踪的文件句柄
+
+    offset为已交付给消费者的字节位置, read_offset为已读取位置,
+    两者之间是尚未确认的行和行尾残片。
+    """
+    path: str
+    fd: int
+    inode: int
+    offset: int
+    read_offset: int = 0
+    partial: bytes = b""
+    rotated_at: Optional[float] = None
+    pending_offset: int = field(default=0, repr=False)
+
+    @classmethod
+    def open(cls, path: str, offset: int = 0, at_end: bool = False) -> "TailedFile":
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        st = os.fstat(fd)
+        if at_end or offset > st.st_size:
+            offset = st.st_size if at_end else 0
+        os.lseek(fd, offset, os.SEEK_SET)
+        return cls(path, fd, st.st_ino, offset, offset, pending_offset=offset)
+
+    def read_lines(self, chunk_size: int, max_bytes: int) -> List[str]:
+        """按大块读取并自行切分完整行, 行尾残片留待下次"""
+        if os.fstat(self.fd).st_size < self.read_offset:
+            # copytruncate方式轮转: 文件被截断, 从头读取
+            logger.info(f"Log file truncated, restarting from beginning: {self.path}")
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            self.offset = self.read_offset = 0
+            self.partial = b""
+
+        lines: List[str] = []
+        read = 0
+        while read < max_bytes:
+            chunk = os.read(self.fd, chunk_size)
+            if not chunk:
+                break
+            read += len(chunk)
+            self.read_offset += len(chunk)
+            data = self.partial + chunk
+            parts = data.split(b"\n")
+            self.partial = parts.pop()
+            lines.extend(p.decode("utf-8", errors="replace").rstrip("\r") for p in parts)
+        # 已读完整行对应的位置, 确认交付后写入检查点
+        self.pending_offset = self.read_offset - len(self.partial)
+        return lines
+
+    def flush_partial(self) -> List[str]:
+        """文件轮转完毕时, 把最后一行残片作为完整行交付"""
+        if not self.partial:
+            return []
+        line = self.partial.decode("utf-8", errors="replace").rstrip("\r")
+        self.partial = b""
+        self.pending_offset = self.read_offset
+        return [line]
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+class CheckpointStore:
+    """(inode, offset) 检查点, 原子写入磁盘"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.data: Dict[str, Dict[str, int]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignore corrupted tail checkpoint {path}: {e}")
+
+    def get(self, path: str) -> Optional[Dict[str, int]]:
+        return self.data.get(path)
+
+    def set(self, path: str, inode: int, offset: int) -> None:
+        self.data[path] = {"inode": inode, "offset": offset}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+class FileTailer:
+    """多文件跟踪器
+
+    一个任务跟踪任意多个文件: 监听所在目录的inotify事件(不可用时轮询),
+    按大块读取并切分行, 以 (inode, offset) 检查点落盘, 重启后从上次
+    确认的位置继续。文件被改名轮转后, 旧文件继续读到末尾再切换到新文件;
+    被截断时从头读取。
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[str],
+        checkpoint_path: Optional[str] = None,
+        poll_interval: float = 1.0,
+        chunk_size: int = 256 * 1024,
+        max_read_bytes: int = 4 * 1024 * 1024,
+        rotate_grace: float = 5.0,
+        checkpoint_interval: float = 5.0,
+        start_at_end: bool = True,
+        use_inotify: bool = True
+    ):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.checkpoints = CheckpointStore(checkpoint_path)
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.max_read_bytes = max_read_bytes
+        self.rotate_grace = rotate_grace
+        self.checkpoint_interval = checkpoint_interval
+        self.start_at_end = start_at_end
+        self.use_inotify = use_inotify
+        self.files: Dict[str, TailedFile] = {}
+        # 已轮转、仍在读到末尾的旧文件
+        self.rotated: List[TailedFile] = []
+        self._inotify: Optional[Inotify] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_checkpoint = 0.0
+
+    def open_files(self) -> None:
+        """按检查点打开所有文件"""
+        for path in self.paths:
+            if path not in self.files:
+                self._open(path, initial=True)
+
+    def _open(self, path: str, initial: bool = False) -> None:
+        checkpoint = self.checkpoints.get(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+
+        if checkpoint and checkpoint["inode"] != st.st_ino:
+            # 停机期间发生了轮转: 先从检查点位置读完旧文件, 新文件从头读
+            old_path = self._find_by_inode(path, checkpoint["inode"]) if initial else None
+            if old_path:
+                old = TailedFile.open(old_path, checkpoint["offset"])
+                old.path = path
+                old.rotated_at = time.monotonic()
+                self.rotated.append(old)
+            tailed = TailedFile.open(path)
+        elif checkpoint:
+            tailed = TailedFile.open(path, checkpoint["offset"])
+        else:
+            # 首次跟踪且无检查点时按配置从末尾开始, 之后新出现的文件从头读
+            tailed = TailedFile.open(path, at_end=initial and self.start_at_end)
+        self.files[path] = tailed
+        self._checkpoint(path)
+
+    @staticmethod
+    def _find_by_inode(path: str, inode: int) -> Optional[str]:
+        directory = os.path.dirname(path)
+        base = os.path.basename(path)
+        try:
+            names = sorted(n for n in os.listdir(directory) if n.startswith(base))
+        except OSError:
+            return None
+        for name in names:
+            candidate = os.path.join(directory, name)
+            try:
+                if os.stat(candidate).st_ino == inode:
+                    return candidate
+            except OSError:
+                continue
+        return None
+
+    def poll(self) -> List[Tuple[str, List[str]]]:
+        """读取所有文件的新增行, 处理轮转与截断
+
+        返回 [(路径, 行列表)], 消费者处理完后调用commit()确认。
+        """
+        batches: List[Tuple[str, List[str]]] = []
+        now = time.monotonic()
+
+        for old in list(self.rotated):
+            lines = old.read_lines(self.chunk_size, self.max_read_bytes)
+            if lines:
+                old.rotated_at = now
+            elif now - old.rotated_at >= self.rotate_grace:
+                # 旧文件已无写入, 读完最后的残片后关闭
+                lines = old.flush_partial()
+                self.rotated.remove(old)
+                old.close()
+            if lines:
+                batches.append((old.path, lines))
+
+        for path in self.paths:
+            tailed = self.files.get(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None
+
+            if tailed and (st is None or st.st_ino != tailed.inode):
+                # 改名轮转: 旧句柄转入待读完列表
+                tailed.rotated_at = now
+                self.rotated.append(tailed)
+                lines = tailed.read_lines(self.chunk_size, self.max_read_bytes)
+                if lines:
+                    batches.append((path, lines))
+                del self.files[path]
+                tailed = None
+
+            if tailed is None and st is not None:
+                self._open(path)
+                tailed = self.files.get(path)
+            if tailed is None:
+                continue
+
+            lines = tailed.read_lines(self.chunk_size, self.max_read_bytes)
+            if lines:
+                batches.append((path, lines))
+        return batches
+
+    def commit(self) -> None:
+        """确认上一次poll返回的行已处理, 推进检查点"""
+        for tailed in list(self.files.values()) + self.rotated:
+            tailed.offset = tailed.pending_offset
+        for path in self.files:
+            self._checkpoint(path)
+        now = time.monotonic()
+        if now - self._last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoints()
+            self._last_checkpoint = now
+
+    def _checkpoint(self, path: str) -> None:
+        # 旧文件读完之前检查点停留在旧文件上, 重启后先补读旧文件
+        rotated = [t for t in self.rotated if t.path == path]
+        tailed = rotated[0] if rotated else self.files[path]
+        self.checkpoints.set(path, tailed.inode, tailed.offset)
+
+    def save_checkpoints(self) -> None:
+        try:
+            self.checkpoints.save()
+        except OSError as e:
+            logger.error(f"Failed to save tail checkpoint: {e}")
+
+    def _setup_inotify(self) -> None:
+        if not self.use_inotify:
+            return
+        try:
+            self._inotify = Inotify()
+            for directory in sorted({os.path.dirname(p) for p in self.paths}):
+                self._inotify.add_watch(directory)
+        except OSError as e:
+            logger.info(f"inotify unavailable, falling back to polling: {e}")
+            if self._inotify:
+                self._inotify.close()
+            self._inotify = None
+            return
+        asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+
+    def _on_inotify(self) -> None:
+        _, overflow = self._inotify.read_events()
+        if overflow:
+            logger.warning("inotify queue overflow, rescanning all files")
+        # 任何事件都触发一次全量poll, poll本身只读有新增数据的文件
+        self._wakeup.set()
+
+    async def follow(self) -> AsyncIterator[Tuple[str, List[str]]]:
+        """持续产出 (路径, 行列表)
+
+        每批在消费者取下一批时确认; inotify可用时有事件立即读取,
+        否则每poll_interval秒轮询, inotify下同样保留低频轮询兜底。
+        """
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self.open_files)
+        self._setup_inotify()
+        fallback_interval = self.poll_interval * 5 if self._inotify else self.poll_interval
+        try:
+            while True:
+                batches = await asyncio.to_thread(self.poll)
+                for batch in batches:
+                    yield batch
+                self.commit()
+                if not batches:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), fallback_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._inotify:
+            try:
+                asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            except RuntimeError:
+                pass
+            self._inotify.close()
+            self._inotify = None
+        self.save_checkpoints()
+        for tailed in list(self.files.values()) + self.rotated:
+            tailed.close()
+        self.files.clear()
+        self.rotated.clear()
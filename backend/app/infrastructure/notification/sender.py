@@ -1,6 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Deque, Dict, Any, List, Optional, Set, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+import random
 import smtplib
+import threading
+import time
 import requests
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -9,9 +15,32 @@ import aiohttp
 import logging
 from ...domain.alert.aggregate import NotificationType, NotificationChannel
 import json
+from prometheus_client import Counter, Gauge, Histogram
 
 logger = logging.getLogger(__name__)
 
+class NotificationMetrics:
+    """通知发送监控指标"""
+    
+    def __init__(self):
+        self.sent = Counter(
+            'notification_sent_total',
+            'Total number of notification deliveries by channel and result',
+            ['channel', 'result']
+        )
+        self.latency = Histogram(
+            'notification_send_latency_seconds',
+            'Notification delivery latency in seconds',
+            ['channel']
+        )
+        self.queue_depth = Gauge(
+            'notification_queue_depth',
+            'Number of notifications waiting or in flight per channel type',
+            ['channel']
+        )
+
+notification_metrics = NotificationMetrics()
+
 class NotificationSender(ABC):
     """通知发送器接口"""
     
@@ -20,8 +49,106 @@ class NotificationSender(ABC):
         """发送通知"""
         pass
 
+class SMTPConnectionPool:
+    """SMTP连接池
+    
+    按 (主机, 端口, 用户) 复用已建立并登录的连接, 取出时以NOOP探活,
+    空闲超时的连接直接关闭。连接在线程中使用, 因此以线程锁保护。
+    """
+    
+    def __init__(self, max_idle: int = 4, idle_timeout: float = 60):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple, List[Tuple[smtplib.SMTP, float]]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(config: Dict) -> Tuple:
+        return (
+            config['smtp_host'],
+            config['smtp_port'],
+            config.get('username'),
+            bool(config.get('use_tls'))
+        )
+    
+    def acquire(self, config: Dict) -> smtplib.SMTP:
+        """获取连接, 无可用空闲连接时新建"""
+        key = self._key(config)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                server, last_used = idle.pop()
+            if time.monotonic() - last_used < self.idle_timeout:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except smtplib.SMTPException:
+                    pass
+                except OSError:
+                    pass
+            self._close(server)
+        
+        server = smtplib.SMTP(config['smtp_host'], config['smtp_port'], timeout=settings.NOTIFICATION_HTTP_TIMEOUT)
+        if config.get('use_tls'):
+            server.starttls()
+        if config.get('username') and config.get('password'):
+            server.login(config['username'], config['password'])
+        return server
+    
+    def release(self, config: Dict, server: smtplib.SMTP) -> None:
+        """归还连接"""
+        key = self._key(config)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+    
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for server, _ in connections:
+                self._close(server)
+    
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
 class EmailSender(NotificationSender):
-    """邮件发送器"""
+    """邮件发送器
+    
+    HTTP类渠道共用一个带连接池的aiohttp会话(保持长连接),
+    邮件通过SMTP连接池复用连接。
+    """
+    
+    def __init__(self, smtp_pool: Optional[SMTPConnectionPool] = None):
+        self.smtp_pool = smtp_pool or SMTPConnectionPool(max_idle=settings.NOTIFICATION_SMTP_POOL_SIZE)
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话, 首次使用或关闭后重建"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=settings.NOTIFICATION_HTTP_POOL_SIZE,
+                    keepalive_timeout=30
+                ),
+                timeout=aiohttp.ClientTimeout(total=settings.NOTIFICATION_HTTP_TIMEOUT)
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        """关闭会话和SMTP连接"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        await asyncio.to_thread(self.smtp_pool.close_all)
     
     async def send(self, channel: NotificationChannel, message: Dict[str, Any]) -> bool:
         """发送通知"""
@@ -52,36 +179,41 @@ class EmailSender(NotificationSender):
             body = MIMEText(message['content'], 'plain')
             msg.attach(body)
             
-            with smtplib.SMTP(config['smtp_host'], config['smtp_port']) as server:
-                if config.get('use_tls'):
-                    server.starttls()
-                if config.get('username') and config.get('password'):
-                    server.login(config['username'], config['password'])
-                server.send_message(msg)
+            await asyncio.to_thread(self._send_email_sync, config, msg)
             return True
         except Exception as e:
             logger.error(f"Failed to send email: {str(e)}")
             return False
     
+    def _send_email_sync(self, config: Dict, msg: MIMEMultipart) -> None:
+        """在线程中使用池化连接发送邮件"""
+        server = self.smtp_pool.acquire(config)
+        try:
+            server.send_message(msg)
+        except Exception:
+            self.smtp_pool._close(server)
+            raise
+        self.smtp_pool.release(config, server)
+    
     async def _send_webhook(self, config: Dict, message: Dict) -> bool:
         """发送Webhook通知"""
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    'Content-Type': 'application/json',
-                    **config.get('headers', {})
-                }
-                payload = {
-                    **message['params'],
-                    'title': message['subject'],
-                    'content': message['content']
-                }
-                async with session.post(
-                    config['url'],
-                    json=payload,
-                    headers=headers
-                ) as resp:
-                    return resp.status < 400
+            session = self._get_session()
+            headers = {
+                'Content-Type': 'application/json',
+                **config.get('headers', {})
+            }
+            payload = {
+                **message['params'],
+                'title': message['subject'],
+                'content': message['content']
+            }
+            async with session.post(
+                config['url'],
+                json=payload,
+                headers=headers
+            ) as resp:
+                return resp.status < 400
         except Exception as e:
             logger.error(f"Failed to send webhook: {str(e)}")
             return False
@@ -89,22 +221,22 @@ class EmailSender(NotificationSender):
     async def _send_sms(self, config: Dict, message: Dict) -> bool:
         """发送短信"""
         try:
-            async with aiohttp.ClientSession() as session:
-                # 这里使用阿里云短信服务作为示例
-                payload = {
-                    'AccessKeyId': config['access_key_id'],
-                    'Action': 'SendSms',
-                    'SignName': config['sign_name'],
-                    'TemplateCode': config['template_code'],
-                    'PhoneNumbers': config['phone_numbers'],
-                    'TemplateParam': json.dumps(message['params'])
-                }
-                async with session.post(
-                    'https://dysmsapi.aliyuncs.com',
-                    data=payload
-                ) as resp:
-                    result = await resp.json()
-                    return result.get('Code') == 'OK'
+            session = self._get_session()
+            # 这里使用阿里云短信服务作为示例
+            payload = {
+                'AccessKeyId': config['access_key_id'],
+                'Action': 'SendSms',
+                'SignName': config['sign_name'],
+                'TemplateCode': config['template_code'],
+                'PhoneNumbers': config['phone_numbers'],
+                'TemplateParam': json.dumps(message['params'])
+            }
+            async with session.post(
+                'https://dysmsapi.aliyuncs.com',
+                data=payload
+            ) as resp:
+                result = await resp.json()
+                return result.get('Code') == 'OK'
         except Exception as e:
             logger.error(f"Failed to send SMS: {str(e)}")
             return False
@@ -112,15 +244,290 @@ class EmailSender(NotificationSender):
     async def _send_slack(self, config: Dict, message: Dict) -> bool:
         """发送Slack通知"""
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    'text': f"*{message['subject']}*\n{message['content']}"
-                }
-                async with session.post(
-                    config['webhook_url'],
-                    json=payload
-                ) as resp:
-                    return resp.status == 200
+            session = self._get_session()
+            payload = {
+                'text': f"*{message['subject']}*\n{message['content']}"
+            }
+            async with session.post(
+                config['webhook_url'],
+                json=payload
+            ) as resp:
+                return resp.status == 200
         except Exception as e:
             logger.error(f"Failed to send Slack message: {str(e)}")
-            return False 
\ No newline at end of file
+            return False 
+
+@dataclass
+class _DeliveryJob:
+    """待发送通知"""
+    channel: NotificationChannel
+    message: Dict[str, Any]
+    future: Optional[asyncio.Future] = None
+    attempt: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+@dataclass
+class _ChannelLane:
+    """单渠道的并发占用与等待队列"""
+    limit: int
+    active: int = 0
+    waiting: Deque[_DeliveryJob] = field(default_factory=deque)
+
+@dataclass
+class ChannelStats:
+    """单渠道发送统计"""
+    pending: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    total_latency: float = 0.0
+
+class NotificationDispatcher(NotificationSender):
+    """通知分发器
+    
+    有界容量 + 固定数量的工作协程并发发送。每个渠道有独立的并发上限,
+    渠道已满时通知转入该渠道的等待队列, 工作协程继续处理其他渠道, 由该渠道
+    完成发送的工作协程接着取出等待的通知, 慢渠道不会占住全部工作协程。
+    并发上限取自通知携带的渠道配置, 渠道配置修改后即生效。
+    失败后按带抖动的指数退避重新入队, 最多重试ALERT_NOTIFICATION_RETRY次。
+    未启动时退化为直接调用底层发送器。停止时在drain_timeout内等待已入队的
+    通知发送完毕, 等待重试及超时未完成的通知以失败结束, 等待send结果的
+    调用方不会挂起。
+    """
+    
+    def __init__(
+        self,
+        sender: Optional[NotificationSender] = None,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        channel_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        drain_timeout: Optional[float] = None
+    ):
+        self.sender = sender or EmailSender()
+        self.workers = workers or settings.NOTIFICATION_WORKERS
+        self.queue_size = queue_size or settings.NOTIFICATION_QUEUE_SIZE
+        self.channel_concurrency = channel_concurrency or settings.NOTIFICATION_CHANNEL_CONCURRENCY
+        self.max_retries = settings.ALERT_NOTIFICATION_RETRY if max_retries is None else max_retries
+        self.drain_timeout = settings.NOTIFICATION_DRAIN_TIMEOUT if drain_timeout is None else drain_timeout
+        self.stats: Dict[str, ChannelStats] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lanes: Dict[str, _ChannelLane] = {}
+        # 尚未完成的通知(排队、发送中或等待重试), 以id(job)为键, 数量受queue_size限制
+        self._jobs: Dict[int, _DeliveryJob] = {}
+        self._retry_timers: Dict[int, asyncio.TimerHandle] = {}
+        self._pending_by_type: Dict[str, int] = {}
+        # 未启动时直接发送的后台任务, 保留引用直到完成
+        self._direct: Set[asyncio.Task] = set()
+        self._stopping = False
+        self._drained: Optional[asyncio.Event] = None
+    
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+    
+    async def start(self) -> None:
+        """启动工作协程"""
+        if self.running:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._drained = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.workers)
+        ]
+        logger.info(f"Notification dispatcher started with {self.workers} workers")
+    
+    async def stop(self) -> None:
+        """等待已入队的通知发送完毕后停止工作协程并关闭连接"""
+        self._stopping = True
+        # 等待重试的通知不再发送
+        for job_id, timer in list(self._retry_timers.items()):
+            timer.cancel()
+            self._finish(self._jobs.get(job_id), False)
+        self._retry_timers = {}
+        if self.running and self._jobs:
+            self._drained.clear()
+            try:
+                await asyncio.wait_for(self._drained.wait(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self._direct:
+            await asyncio.wait(self._direct, timeout=self.drain_timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._lanes = {}
+        unfinished = list(self._jobs.values())
+        if unfinished:
+            logger.warning(f"Notification dispatcher stopped with {len(unfinished)} undelivered notifications")
+        for job in unfinished:
+            self._finish(job, False)
+        if hasattr(self.sender, "close"):
+            await self.sender.close()
+    
+    async def send(self, channel: NotificationChannel, message: Dict[str, Any]) -> bool:
+        """发送通知并等待结果(含重试), 容量已满时返回False"""
+        if not self.running:
+            return await self.sender.send(channel, message)
+        job = _DeliveryJob(channel, message, asyncio.get_running_loop().create_future())
+        if not self._admit(job):
+            return False
+        return await job.future
+    
+    def dispatch(self, channel: NotificationChannel, message: Dict[str, Any]) -> bool:
+        """投递通知不等待结果, 结果由工作协程记录日志; 容量已满或正在停止时返回False
+        
+        未启动时在后台任务中直接发送。
+        """
+        if not self.running:
+            if self._stopping:
+                return False
+            task = asyncio.create_task(self.sender.send(channel, message))
+            self._direct.add(task)
+            task.add_done_callback(self._direct.discard)
+            task.add_done_callback(
+                lambda t: self._log_result(channel, not t.cancelled() and t.exception() is None and t.result())
+            )
+            return True
+        return self._admit(_DeliveryJob(channel, message))
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """按渠道获取队列深度、成功/失败数和平均延迟"""
+        return {
+            channel_id: {
+                "pending": s.pending,
+                "sent": s.sent,
+                "failed": s.failed,
+                "retried": s.retried,
+                "avg_latency": s.total_latency / s.sent if s.sent else 0.0
+            }
+            for channel_id, s in self.stats.items()
+        }
+    
+    def _track(self, channel: NotificationChannel) -> ChannelStats:
+        return self.stats.setdefault(channel.id, ChannelStats())
+    
+    def _admit(self, job: _DeliveryJob) -> bool:
+        """接收新通知, 未完成的通知达到queue_size或正在停止时拒绝"""
+        channel = job.channel
+        if self._stopping or len(self._jobs) >= self.queue_size:
+            self._track(channel).failed += 1
+            notification_metrics.sent.labels(channel=channel.type.value, result="dropped").inc()
+            reason = "stopping" if self._stopping else "queue full"
+            logger.error(f"Notification dispatcher {reason}, dropping notification via {channel.type} ({channel.id})")
+            return False
+        self._jobs[id(job)] = job
+        self._track(channel).pending += 1
+        self._adjust_depth(channel, 1)
+        self._queue.put_nowait(job)
+        return True
+    
+    def _adjust_depth(self, channel: NotificationChannel, delta: int) -> None:
+        # 与其他指标一致按渠道类型标记, 同类型渠道的队列深度合计
+        channel_type = channel.type.value
+        depth = self._pending_by_type[channel_type] = self._pending_by_type.get(channel_type, 0) + delta
+        notification_metrics.queue_depth.labels(channel=channel_type).set(depth)
+    
+    @staticmethod
+    def _log_result(channel: NotificationChannel, success: bool) -> None:
+        if success:
+            logger.info(f"Sent notification via {channel.type} ({channel.id})")
+        else:
+            logger.error(f"Failed to send notification via {channel.type} ({channel.id})")
+    
+    def _lane(self, channel: NotificationChannel) -> _ChannelLane:
+        """渠道的并发占用, 上限按本次通知携带的渠道配置刷新"""
+        limit = channel.config.get("max_concurrency", self.channel_concurrency)
+        lane = self._lanes.get(channel.id)
+        if lane is None:
+            lane = self._lanes[channel.id] = _ChannelLane(limit)
+        lane.limit = limit
+        return lane
+    
+    def _backoff(self, attempt: int) -> float:
+        """全抖动指数退避"""
+        ceiling = min(
+            settings.NOTIFICATION_RETRY_BACKOFF_MAX,
+            settings.NOTIFICATION_RETRY_BACKOFF * (2 ** attempt)
+        )
+        return random.uniform(0, ceiling)
+    
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            channel_id = job.channel.id
+            lane = self._lane(job.channel)
+            if lane.active >= lane.limit:
+                # 渠道已满, 转入等待队列, 由该渠道完成发送的工作协程接手
+                lane.waiting.append(job)
+                continue
+            while job is not None:
+                lane.active += 1
+                try:
+                    await self._deliver(job)
+                except Exception as e:
+                    logger.error(f"Notification worker error: {str(e)}")
+                    self._finish(job, False)
+                finally:
+                    lane.active -= 1
+                job = lane.waiting.popleft() if lane.waiting and lane.active < lane.limit else None
+            if not lane.active and not lane.waiting and self._lanes.get(channel_id) is lane:
+                # 空闲渠道不常驻, 渠道删除后不残留
+                del self._lanes[channel_id]
+    
+    async def _deliver(self, job: _DeliveryJob) -> None:
+        channel = job.channel
+        start = time.perf_counter()
+        success = await self.sender.send(channel, job.message)
+        latency = time.perf_counter() - start
+        notification_metrics.latency.labels(channel=channel.type.value).observe(latency)
+        
+        if success:
+            self._track(channel).total_latency += latency
+            self._finish(job, True)
+            return
+        
+        if job.attempt >= self.max_retries or self._stopping:
+            logger.error(
+                f"Giving up notification via {channel.type} ({channel.id}) "
+                f"after {job.attempt + 1} attempts"
+            )
+            self._finish(job, False)
+            return
+        
+        # 延迟后重新入队, 不占用工作协程
+        delay = self._backoff(job.attempt)
+        job.attempt += 1
+        self._track(channel).retried += 1
+        notification_metrics.sent.labels(channel=channel.type.value, result="retry").inc()
+        self._retry_timers[id(job)] = asyncio.get_running_loop().call_later(delay, self._requeue, job)
+    
+    def _requeue(self, job: _DeliveryJob) -> None:
+        self._retry_timers.pop(id(job), None)
+        self._queue.put_nowait(job)
+    
+    def _finish(self, job: Optional[_DeliveryJob], success: bool) -> None:
+        if job is None or self._jobs.pop(id(job), None) is None:
+            return
+        stats = self._track(job.channel)
+        stats.pending -= 1
+        if success:
+            stats.sent += 1
+        else:
+            stats.failed += 1
+        notification_metrics.sent.labels(
+            channel=job.channel.type.value,
+            result="success" if success else "failed"
+        ).inc()
+        self._adjust_depth(job.channel, -1)
+        self._log_result(job.channel, success)
+        if job.future and not job.future.done():
+            job.future.set_result(success)
+        if not self._jobs and self._drained is not None:
+            self._drained.set()
+
+notification_dispatcher = NotificationDispatcher()
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from uuid import uuid4
 from .database import Database
@@ -8,6 +8,10 @@ from ...domain.agent.metrics import (
     AgentMetricsRepository
 )
 
+# agent_metrics每行13个参数, PostgreSQL单条语句最多32767个绑定参数
+METRICS_INSERT_COLUMNS = 13
+METRICS_INSERT_MAX_ROWS = 32767 // METRICS_INSERT_COLUMNS
+
 class AgentMetricsRepositoryImpl(AgentMetricsRepository):
     def __init__(self, db: Database):
         self.db = db
@@ -17,8 +21,10 @@ class AgentMetricsRepositoryImpl(AgentMetricsRepository):
             INSERT INTO agent_metrics (
                 id, agent_id, timestamp,
                 cpu_percent, memory_percent, disk_usage,
-                network_in, network_out, created_at
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                network_in, network_out, created_at,
+                cpu_percent_max, cpu_percent_p95,
+                memory_percent_max, memory_percent_p95
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
         """
         await self.db.execute(
             query,
@@ -30,10 +36,58 @@ class AgentMetricsRepositoryImpl(AgentMetricsRepository):
             metrics.disk_usage,
             metrics.network_in,
             metrics.network_out,
-            metrics.created_at
+            metrics.created_at,
+            metrics.cpu_percent_max,
+            metrics.cpu_percent_p95,
+            metrics.memory_percent_max,
+            metrics.memory_percent_p95
         )
     
+    async def save_metrics_batch(self, metrics: List[AgentMetrics]) -> None:
+        """批量保存指标
+        
+        按参数上限分片, 每片生成一条多行INSERT, 一次往返写入。
+        """
+        for offset in range(0, len(metrics), METRICS_INSERT_MAX_ROWS):
+            chunk = metrics[offset:offset + METRICS_INSERT_MAX_ROWS]
+            placeholders = []
+            args = []
+            for i, m in enumerate(chunk):
+                base = i * METRICS_INSERT_COLUMNS
+                placeholders.append(
+                    "(" + ", ".join(
+                        f"${base + j + 1}" for j in range(METRICS_INSERT_COLUMNS)
+                    ) + ")"
+                )
+                args.extend((
+                    m.id,
+                    m.agent_id,
+                    m.timestamp,
+                    m.cpu_percent,
+                    m.memory_percent,
+                    m.disk_usage,
+                    m.network_in,
+                    m.network_out,
+                    m.created_at,
+                    m.cpu_percent_max,
+                    m.cpu_percent_p95,
+                    m.memory_percent_max,
+                    m.memory_percent_p95
+                ))
+            query = f"""
+                INSERT INTO agent_metrics (
+                    id, agent_id, timestamp,
+                    cpu_percent, memory_percent, disk_usage,
+                    network_in, network_out, created_at,
+                    cpu_percent_max, cpu_percent_p95,
+                    memory_percent_max, memory_percent_p95
+                ) VALUES {", ".join(placeholders)}
+                ON CONFLICT (id) DO NOTHING
+            """
+            await self.db.execute(query, *args)
+    
     async def save_hourly_metrics(self, metrics: AgentMetricsHourly) -> None:
+        """保存小时聚合指标, 同一Agent同一小时重复聚合时覆盖已有结果"""
         query = """
             INSERT INTO agent_metrics_hourly (
                 id, agent_id, hour,
@@ -43,6 +97,16 @@ class AgentMetricsRepositoryImpl(AgentMetricsRepository):
                 network_in_total, network_out_total,
                 created_at
             ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+            ON CONFLICT (agent_id, hour) DO UPDATE SET
+                cpu_percent_avg = EXCLUDED.cpu_percent_avg,
+                cpu_percent_max = EXCLUDED.cpu_percent_max,
+                memory_percent_avg = EXCLUDED.memory_percent_avg,
+                memory_percent_max = EXCLUDED.memory_percent_max,
+                disk_usage_avg = EXCLUDED.disk_usage_avg,
+                disk_usage_max = EXCLUDED.disk_usage_max,
+                network_in_total = EXCLUDED.network_in_total,
+                network_out_total = EXCLUDED.network_out_total,
+                created_at = EXCLUDED.created_at
         """
         await self.db.execute(
             query,
@@ -95,4 +159,59 @@ class AgentMetricsRepositoryImpl(AgentMetricsRepository):
         await self.db.execute(
             "DELETE FROM agent_metrics WHERE timestamp < $1",
             before
-        ) 
\ No newline at end of file
+        )
+    
+    async def rollup_hourly_metrics(self, hour: datetime) -> int:
+        """汇总小时指标
+        
+        单条INSERT ... SELECT ... GROUP BY agent_id完成全部Agent的汇总,
+        依赖(agent_id, hour)唯一索引按小时幂等, 重跑时覆盖已有结果。
+        峰值优先取Agent上报的周期内最大值, 旧版本Agent退回周期平均值。
+        """
+        query = """
+            INSERT INTO agent_metrics_hourly (
+                id, agent_id, hour,
+                cpu_percent_avg, cpu_percent_max,
+                memory_percent_avg, memory_percent_max,
+                disk_usage_avg, disk_usage_max,
+                network_in_total, network_out_total,
+                created_at
+            )
+            SELECT
+                gen_random_uuid()::text, agent_id, $1,
+                AVG(cpu_percent), MAX(COALESCE(cpu_percent_max, cpu_percent)),
+                AVG(memory_percent), MAX(COALESCE(memory_percent_max, memory_percent)),
+                AVG(disk_usage), MAX(disk_usage),
+                SUM(network_in), SUM(network_out),
+                NOW()
+            FROM agent_metrics
+            WHERE timestamp >= $1
+            AND timestamp < $1 + INTERVAL '1 hour'
+            GROUP BY agent_id
+            ON CONFLICT (agent_id, hour) DO UPDATE SET
+                cpu_percent_avg = EXCLUDED.cpu_percent_avg,
+                cpu_percent_max = EXCLUDED.cpu_percent_max,
+                memory_percent_avg = EXCLUDED.memory_percent_avg,
+                memory_percent_max = EXCLUDED.memory_percent_max,
+                disk_usage_avg = EXCLUDED.disk_usage_avg,
+                disk_usage_max = EXCLUDED.disk_usage_max,
+                network_in_total = EXCLUDED.network_in_total,
+                network_out_total = EXCLUDED.network_out_total,
+                created_at = EXCLUDED.created_at
+            RETURNING id
+        """
+        rows = await self.db.fetch_all(query, hour)
+        return len(rows)
+    
+    async def get_latest_hourly_hour(self) -> Optional[datetime]:
+        """获取最近一次已汇总的小时"""
+        return await self.db.fetch_val(
+            "SELECT MAX(hour) FROM agent_metrics_hourly"
+        )
+    
+    async def cleanup_hourly_metrics(self, before: datetime) -> None:
+        """清理小时聚合指标"""
+        await self.db.execute(
+            "DELETE FROM agent_metrics_hourly WHERE hour < $1",
+            before
+        )
@@ -2,8 +2,21 @@ from typing import List, Optional
 from datetime import datetime
 from sqlalchemy import select, and_
 from .database import Database
-from ...domain.alert.repository import AlertLevelRepository, NotificationChannelRepository
-from ...domain.alert.aggregate import AlertLevel, NotificationChannel, NotificationType
+from ...domain.alert.repository import (
+    AlertLevelRepository,
+    NotificationChannelRepository,
+    AlertRuleRepository,
+    AlertEventRepository
+)
+from ...domain.alert.aggregate import (
+    AlertLevel,
+    NotificationChannel,
+    NotificationType,
+    AlertRule,
+    AlertEvent,
+    AlertSeverity,
+    AlertStatus
+)
 
 class AlertLevelRepositoryImpl(AlertLevelRepository):
     def __init__(self, db: Database):
@@ -115,4 +128,123 @@ class NotificationChannelRepositoryImpl(NotificationChannelRepository):
                 }
             )
             for row in rows
-        ] 
\ No newline at end of file
+        ]
+
+class AlertRuleRepositoryImpl(AlertRuleRepository):
+    def __init__(self, db: Database):
+        self.db = db
+    
+    async def save(self, rule: AlertRule) -> None:
+        query = """
+            INSERT INTO alert_rules (
+                id, project_id, name, description, metric_type,
+                condition, severity, interval, enabled,
+                created_at, updated_at
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+            ON CONFLICT (id) DO UPDATE SET
+                name = $3,
+                description = $4,
+                metric_type = $5,
+                condition = $6,
+                severity = $7,
+                interval = $8,
+                enabled = $9,
+                updated_at = $11
+        """
+        await self.db.execute(
+            query,
+            rule.id,
+            rule.project_id,
+            rule.name,
+            rule.description,
+            rule.metric_type,
+            rule.condition,
+            rule.severity.value,
+            rule.interval,
+            rule.enabled,
+            rule.created_at,
+            rule.updated_at
+        )
+    
+    async def get_by_id(self, rule_id: str) -> Optional[AlertRule]:
+        query = "SELECT * FROM alert_rules WHERE id = $1"
+        row = await self.db.fetch_one(query, rule_id)
+        if not row:
+            return None
+        return self._to_rule(row)
+    
+    async def list_by_project(self, project_id: str) -> List[AlertRule]:
+        query = "SELECT * FROM alert_rules WHERE project_id = $1"
+        rows = await self.db.fetch_all(query, project_id)
+        return [self._to_rule(row) for row in rows]
+    
+    async def list_enabled(self) -> List[AlertRule]:
+        query = "SELECT * FROM alert_rules WHERE enabled = true"
+        rows = await self.db.fetch_all(query)
+        return [self._to_rule(row) for row in rows]
+    
+    def _to_rule(self, row) -> AlertRule:
+        return AlertRule(
+            **{
+                **row,
+                "severity": AlertSeverity(row["severity"])
+            }
+        )
+
+class AlertEventRepositoryImpl(AlertEventRepository):
+    def __init__(self, db: Database):
+        self.db = db
+    
+    async def save(self, event: AlertEvent) -> None:
+        query = """
+            INSERT INTO alert_events (
+                id, rule_id, server_id, status, severity,
+                summary, details, first_occurred_at, last_occurred_at,
+                resolved_at, notification_sent
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+            ON CONFLICT (id) DO UPDATE SET
+                status = $4,
+                details = $7,
+                last_occurred_at = $9,
+                resolved_at = $10,
+                notification_sent = $11
+        """
+        await self.db.execute(
+            query,
+            event.id,
+            event.rule_id,
+            event.server_id,
+            event.status.value,
+            event.severity.value,
+            event.summary,
+            event.details,
+            event.first_occurred_at,
+            event.last_occurred_at,
+            event.resolved_at,
+            event.notification_sent
+        )
+    
+    async def get_active_by_rule(self, rule_id: str) -> List[AlertEvent]:
+        query = "SELECT * FROM alert_events WHERE rule_id = $1 AND status = $2"
+        rows = await self.db.fetch_all(query, rule_id, AlertStatus.FIRING.value)
+        return [self._to_event(row) for row in rows]
+    
+    async def list_active(self) -> List[AlertEvent]:
+        query = "SELECT * FROM alert_events WHERE status = $1"
+        rows = await self.db.fetch_all(query, AlertStatus.FIRING.value)
+        return [self._to_event(row) for row in rows]
+    
+    async def touch(self, event_ids: List[str], occurred_at: datetime) -> None:
+        if not event_ids:
+            return
+        query = "UPDATE alert_events SET last_occurred_at = $1 WHERE id = ANY($2)"
+        await self.db.execute(query, occurred_at, event_ids)
+    
+    def _to_event(self, row) -> AlertEvent:
+        return AlertEvent(
+            **{
+                **row,
+                "status": AlertStatus(row["status"]),
+                "severity": AlertSeverity(row["severity"])
+            }
+        )
@@ -6,6 +6,7 @@ from croniter import croniter
 from sqlalchemy.orm import Session
 
 from app.crud import storage_policy
+from app.crud.log import log as crud_log
 from app.models.storage import StoragePolicy
 from app.infrastructure.persistence.database import SessionLocal
 
@@ -107,12 +108,9 @@ class StoragePolicyExecutor:
             affected_rows = result.rowcount
             
         elif policy.data_type == "logs":
-            # 清理日志数据
-            result = await db.execute(
-                "DELETE FROM logs WHERE timestamp < :cutoff",
-                {"cutoff": cutoff_date}
-            )
-            affected_rows = result.rowcount
+            # 与日志分区维护任务执行同一套保留逻辑; 归档会流式读写整天的
+            # 分区, 在线程中用独立会话执行, 不阻塞事件循环
+            affected_rows = await asyncio.to_thread(self._apply_log_retention, policy)
             
         elif policy.data_type == "alerts":
             # 清理告警数据
@@ -132,6 +130,17 @@ class StoragePolicyExecutor:
         
         return affected_rows
     
+    def _apply_log_retention(self, policy: StoragePolicy) -> int:
+        db = SessionLocal()
+        try:
+            return crud_log.apply_retention(
+                db,
+                retention_days=policy.retention_days,
+                archive_after_days=policy.compression_after_days if policy.compression_enabled else None
+            )
+        finally:
+            db.close()
+    
     def _get_next_run(self, schedule: str) -> datetime:
         """获取下次执行时间"""
         cron = croniter(schedule, datetime.now())
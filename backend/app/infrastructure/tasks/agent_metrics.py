@@ -2,11 +2,11 @@ import logging
 from datetime import datetime, timedelta
 import asyncio
 from uuid import uuid4
-from ...domain.agent.metrics import AgentMetricsHourly
+from ...domain.agent.metrics import AgentMetrics, AgentMetricsHourly
 from ...domain.agent.service import AgentService
 from ...infrastructure.config import settings
 from ...domain.agent.exceptions import MetricsAggregationError
-from typing import List
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -16,13 +16,46 @@ class AgentMetricsAggregator:
     def __init__(self, service: AgentService):
         self.service = service
     
-    async def aggregate_hourly_metrics(self):
-        """聚合小时指标"""
+    def _last_complete_hour(self) -> datetime:
+        """最近一个已结束的整点小时"""
+        now = datetime.now()
+        return now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    
+    async def rollup_hourly_metrics(self) -> int:
+        """在数据库侧汇总小时指标
+        
+        每小时一条INSERT ... SELECT, 从上次汇总的下一小时补算到最近
+        一个完整小时, 停机期间遗漏的小时会在恢复后自动补齐。
+        """
+        try:
+            last_hour = self._last_complete_hour()
+            earliest = last_hour - timedelta(hours=settings.AGENT_METRICS_ROLLUP_BACKFILL_HOURS - 1)
+            latest = await self.service.metrics_repo.get_latest_hourly_hour()
+            
+            # 从上次汇总的小时开始重算(纳入迟到的样本), 首次运行时补算整个窗口
+            hour = earliest if latest is None else max(min(latest, last_hour), earliest)
+            
+            total = 0
+            while hour <= last_hour:
+                rows = await self.service.metrics_repo.rollup_hourly_metrics(hour)
+                logger.info(f"Rolled up hourly metrics for {hour.isoformat()}: {rows} agents")
+                total += rows
+                if self.service.metrics_cache:
+                    # 重算的小时可能落在已缓存的聚合桶内
+                    await self.service.metrics_cache.invalidate_hourly(hour)
+                hour += timedelta(hours=1)
+            return total
+            
+        except Exception as e:
+            logger.error(f"Metrics rollup failed: {str(e)}", exc_info=True)
+            raise MetricsAggregationError(f"指标汇总失败: {str(e)}")
+    
+    async def aggregate_hourly_metrics(self, hour_start: Optional[datetime] = None):
+        """聚合小时指标(逐Agent在Python中计算)"""
         try:
             # 获取所有Agent
             agents = await self.service.agent_repo.list_all()
-            now = datetime.now()
-            hour_start = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+            hour_start = hour_start or self._last_complete_hour()
             hour_end = hour_start + timedelta(hours=1)
             
             logger.info(f"Starting hourly metrics aggregation for {len(agents)} agents")
@@ -105,7 +138,10 @@ class AgentMetricsAggregator:
         while True:
             try:
                 # 执行小时聚合
-                await self.aggregate_hourly_metrics()
+                if settings.AGENT_METRICS_ROLLUP_MODE == "sql":
+                    await self.rollup_hourly_metrics()
+                else:
+                    await self.aggregate_hourly_metrics()
                 
                 # 每天执行一次清理(在UTC 0点)
                 now = datetime.utcnow()
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from ...domain.agent.metrics import AgentMetrics
+from ...domain.alert.service import AlertService
+from ...domain.alert.engine import MetricWindows
+from ...domain.alert.streaming import AlertTransition, StreamingAlertEvaluator
+from ...domain.alert.grouping import AlertGrouper, ChannelRateLimiter
+from ...domain.monitor.service import MonitorService
+from ...infrastructure.config import settings
+from ..notification.sender import notification_dispatcher
+from ..persistence.database import Database
+from ..persistence.alert import (
+    AlertLevelRepositoryImpl,
+    AlertRuleRepositoryImpl,
+    AlertEventRepositoryImpl,
+    NotificationChannelRepositoryImpl
+)
+from ..persistence.monitor import (
+    CustomMetricRepositoryImpl,
+    MetricValueRepositoryImpl,
+    MetricAggregationRepositoryImpl,
+    AggregatedMetricRepositoryImpl,
+    RetentionPolicyRepositoryImpl
+)
+
+logger = logging.getLogger(__name__)
+
+# Agent指标中参与告警评估的字段, 字段名即规则的metric_type
+AGENT_METRIC_FIELDS = (
+    "cpu_percent", "memory_percent", "disk_usage", "network_in", "network_out",
+    # 周期内峰值与P95, 旧版本Agent不上报时为空, 不参与评估
+    "cpu_percent_max", "cpu_percent_p95", "memory_percent_max", "memory_percent_p95"
+)
+
+ServerProjectsLoader = Callable[[], Awaitable[Dict[str, str]]]
+# since -> [(server_id, metric_type, timestamp, value)]
+MetricSamplesLoader = Callable[[datetime], Awaitable[List[Tuple[str, str, datetime, float]]]]
+
+def create_alert_grouper() -> Optional[AlertGrouper]:
+    """按配置创建告警分组器, ALERT_GROUP_WINDOW为0时不分组"""
+    if settings.ALERT_GROUP_WINDOW <= 0:
+        return None
+    return AlertGrouper(settings.ALERT_GROUP_BY, settings.ALERT_GROUP_WINDOW)
+
+def create_rate_limiter() -> Optional[ChannelRateLimiter]:
+    """按配置创建渠道限流器, ALERT_CHANNEL_RATE_LIMIT为0时不限流"""
+    if settings.ALERT_CHANNEL_RATE_LIMIT <= 0:
+        return None
+    return ChannelRateLimiter(settings.ALERT_CHANNEL_RATE_LIMIT)
+
+def create_alert_service(db: Database) -> AlertService:
+    """创建进程内共享的告警服务, 流式与批量评估共用同一个活动告警索引"""
+    monitor_service = MonitorService(
+        custom_metric_repo=CustomMetricRepositoryImpl(db),
+        metric_value_repo=MetricValueRepositoryImpl(db),
+        aggregation_repo=MetricAggregationRepositoryImpl(db),
+        aggregated_metric_repo=AggregatedMetricRepositoryImpl(db),
+        retention_policy_repo=RetentionPolicyRepositoryImpl(db)
+    )
+    return AlertService(
+        rule_repo=AlertRuleRepositoryImpl(db),
+        event_repo=AlertEventRepositoryImpl(db),
+        channel_repo=NotificationChannelRepositoryImpl(db),
+        monitor_service=monitor_service,
+        level_repo=AlertLevelRepositoryImpl(db),
+        notification_sender=notification_dispatcher,
+        alert_grouper=create_alert_grouper(),
+        rate_limiter=create_rate_limiter()
+    )
+
+def server_projects_loader(db: Database) -> ServerProjectsLoader:
+    """从servers表读取 server_id -> project_id"""
+    async def load() -> Dict[str, str]:
+        rows = await db.fetch_all("SELECT id, project_id FROM servers")
+        return {row["id"]: row["project_id"] for row in rows}
+    return load
+
+def metric_samples_loader(db: Database) -> MetricSamplesLoader:
+    """读取since之后的Agent指标, 按服务器展开为告警样本"""
+    columns = ", ".join(f"m.{field}" for field in AGENT_METRIC_FIELDS)
+    
+    async def load(since: datetime) -> List[Tuple[str, str, datetime, float]]:
+        rows = await db.fetch_all(
+            f"""
+            SELECT a.server_id, m.timestamp, {columns}
+            FROM agent_metrics m
+            JOIN agents a ON a.id = m.agent_id
+            WHERE m.timestamp >= $1
+            """,
+            since
+        )
+        return [
+            (row["server_id"], field, row["timestamp"], row[field])
+            for row in rows
+            for field in AGENT_METRIC_FIELDS
+            if row[field] is not None
+        ]
+    return load
+
+class AlertCheckTask:
+    """定期批量检查告警
+
+    每ALERT_CHECK_INTERVAL秒读取最长规则窗口内的全部指标构建列式窗口,
+    由向量化规则引擎一次评估所有规则。与流式评估共用活动告警索引,
+    补上流式路径漏掉的情况(如进程重启前后的样本、停止上报的服务器)。
+    """
+    
+    def __init__(
+        self,
+        service: AlertService,
+        server_projects_loader: ServerProjectsLoader,
+        samples_loader: MetricSamplesLoader,
+        interval: Optional[float] = None
+    ):
+        self.service = service
+        self._load_server_projects = server_projects_loader
+        self._load_samples = samples_loader
+        self.interval = interval or settings.ALERT_CHECK_INTERVAL
+        self.running = False
+    
+    async def check(self) -> None:
+        rules = await self.service.rule_repo.list_enabled()
+        if not rules:
+            return
+        now = datetime.now()
+        since = now - timedelta(seconds=max(rule.interval for rule in rules))
+        windows = MetricWindows.from_samples(await self._load_samples(since), now)
+        await self.service.check_alerts(windows, await self._load_server_projects())
+    
+    async def run(self) -> None:
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Alert check failed: {str(e)}")
+    
+    def stop(self) -> None:
+        self.running = False
+
+class AlertStreamTask:
+    """流式告警任务
+
+    指标写入路径通过feed同步推送样本, 评估在O(1)内完成;
+    产生的状态变化进入队列, 由后台协程写库并发送通知。
+    """
+    
+    def __init__(self):
+        self.service: Optional[AlertService] = None
+        self.evaluator: Optional[StreamingAlertEvaluator] = None
+        self.running = False
+        self._loader: Optional[ServerProjectsLoader] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    async def start(self, service: AlertService, server_projects_loader: ServerProjectsLoader):
+        """启动任务
+        
+        server_projects_loader: 返回 server_id -> project_id 映射
+        """
+        self.service = service
+        self._loader = server_projects_loader
+        index = service.rule_engine.index
+        if not index.loaded:
+            index.load(await service.event_repo.list_active())
+        self.evaluator = StreamingAlertEvaluator(index)
+        await self.sync()
+        
+        self._queue = asyncio.Queue()
+        self.running = True
+        self._tasks = [
+            asyncio.create_task(self._consume()),
+            asyncio.create_task(self._run_sync_task()),
+            asyncio.create_task(self._run_group_flush_task())
+        ]
+    
+    async def stop(self):
+        """停止任务, 队列中尚未写库的状态变化在下次启动时由样本重新产生
+
+        窗口未结束的告警分组立即发送, 不随进程退出丢失。
+        """
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.service and self.service.alert_grouper:
+            try:
+                await self.service.flush_alert_groups(force=True)
+            except Exception as e:
+                logger.error(f"Failed to flush alert groups on shutdown: {str(e)}")
+    
+    def feed(self, server_id: str, metrics: AgentMetrics) -> None:
+        """输入一条Agent指标"""
+        if not self.running:
+            return
+        for field in AGENT_METRIC_FIELDS:
+            value = getattr(metrics, field)
+            if value is None:
+                continue
+            for transition in self.evaluator.observe(
+                server_id, field, metrics.timestamp, value
+            ):
+                self._queue.put_nowait(transition)
+    
+    async def sync(self):
+        """同步规则和服务器归属"""
+        rules = await self.service.rule_repo.list_enabled()
+        server_projects = await self._loader()
+        self.evaluator.sync(rules, server_projects)
+        logger.info(f"Streaming alert evaluator synced {len(rules)} rules")
+    
+    async def _run_sync_task(self):
+        """定期同步规则"""
+        while self.running:
+            await asyncio.sleep(settings.ALERT_STREAM_SYNC_INTERVAL)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Failed to sync alert rules: {str(e)}")
+    
+    async def _run_group_flush_task(self):
+        """定期发送告警分组摘要, 流式与批量评估产生的分组都由此发送"""
+        if not self.service.alert_grouper:
+            return
+        while self.running:
+            await asyncio.sleep(1)
+            try:
+                await self.service.flush_alert_groups()
+            except Exception as e:
+                logger.error(f"Failed to flush alert groups: {str(e)}")
+    
+    async def _consume(self):
+        """处理告警状态变化"""
+        while self.running:
+            transition: AlertTransition = await self._queue.get()
+            try:
+                await self.service.apply_transition(transition)
+                self.evaluator.commit(transition)
+            except Exception as e:
+                # 保持原状态, 之后的样本重新产生这次变化
+                self.evaluator.abort(transition)
+                logger.error(
+                    f"Failed to apply alert transition for rule {transition.rule.id} "
+                    f"on server {transition.server_id}: {str(e)}"
+                )
+
+alert_stream = AlertStreamTask()
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Callable
+from sqlalchemy.orm import Session
+from ...crud.log import log as crud_log
+from ...crud.storage import storage_policy
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class LogPartitionMaintainer:
+    """日志分区维护
+
+    每小时提前创建未来几天的日分区, 并执行日志保留: 有logs存储策略时
+    按策略先归档再删除, 否则删除超出LOG_RETENTION_DAYS的分区。
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], interval: int = 3600):
+        self.session_factory = session_factory
+        self.interval = interval
+
+    def maintain(self) -> None:
+        db = self.session_factory()
+        try:
+            created = crud_log.ensure_partitions(
+                db, start=date.today(), days=settings.LOG_PARTITION_PREMAKE_DAYS + 1
+            )
+            policy = storage_policy.get_by_type(db, "logs")
+            if policy:
+                dropped = crud_log.apply_retention(
+                    db,
+                    retention_days=policy.retention_days,
+                    archive_after_days=policy.compression_after_days if policy.compression_enabled else None
+                )
+            else:
+                dropped = crud_log.apply_retention(db, retention_days=settings.LOG_RETENTION_DAYS)
+            if created or dropped:
+                logger.info(f"Log partitions maintained: created={created}, affected_rows~{dropped}")
+        finally:
+            db.close()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.maintain)
+            except Exception as e:
+                logger.error(f"Log partition maintenance failed: {str(e)}")
+            await asyncio.sleep(self.interval)
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from typing import List, Union
+import asyncio
 import os
 from .dependencies import get_current_user, get_agent_service
 from .schemas.agent import (
@@ -13,6 +14,8 @@ from .schemas.agent import (
     MetricsResponse,
     HourlyMetricsResponse
 )
+from ...infrastructure.ingest.agent_metrics import agent_metrics_ingest
+from ...ws.agent import ws_manager
 from ...domain.agent.exceptions import AgentMetricsError, MetricsNotFoundError, InvalidTimeRangeError
 
 router = APIRouter()
@@ -158,4 +161,33 @@ async def get_agent_metrics(
         raise HTTPException(
             status_code=500,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+@router.get("/agents/{agent_id}/raw-samples")
+async def get_raw_samples(
+    agent_id: str,
+    seconds: int = Query(300, ge=1, le=3600),
+    user = Depends(get_current_user)
+):
+    """经WebSocket从Agent本地环形缓冲拉取最近seconds秒的高频原始样本"""
+    try:
+        reply = await ws_manager.request(agent_id, {"type": "raw_request", "seconds": seconds})
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Agent未连接")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Agent响应超时")
+    return {
+        "agent_id": agent_id,
+        "sample_interval": reply.get("sample_interval"),
+        "fields": reply.get("fields", []),
+        "samples": reply.get("samples", [])
+    }
+
+@router.get("/agent-metrics/ingest-stats")
+async def get_ingest_stats(
+    user = Depends(get_current_user)
+):
+    """获取指标写入缓冲统计(刷新延迟、写入速率、队列深度)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+    return agent_metrics_ingest.get_stats()
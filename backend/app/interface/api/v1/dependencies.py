@@ -15,7 +15,7 @@ from ....infrastructure.persistence.alert import (
     AlertLevelRepositoryImpl,
     NotificationChannelRepositoryImpl
 )
-from ....infrastructure.notification.sender import NotificationSender
+from ....infrastructure.notification.sender import NotificationSender, notification_dispatcher
 from ....domain.monitor.service import MonitorService
 from ....infrastructure.persistence.monitor import (
     CustomMetricRepositoryImpl,
@@ -44,6 +44,7 @@ from ...infrastructure.persistence.agent import (
     AgentMetricsRepositoryImpl
 )
 from ...domain.agent.service import AgentService
+from ...infrastructure.cache.agent_metrics import get_agent_metrics_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -80,7 +81,7 @@ async def get_notification_service() -> NotificationService:
     return NotificationService(repo)
 
 async def get_notification_sender() -> NotificationSender:
-    return NotificationSender() 
+    return notification_dispatcher
 
 async def get_monitor_service() -> MonitorService:
     """获取监控服务"""
@@ -124,4 +125,7 @@ async def get_agent_service(
     version_repo = AgentVersionRepositoryImpl(db)
     task_repo = UpgradeTaskRepositoryImpl(db)
     metrics_repo = AgentMetricsRepositoryImpl(db)
-    return AgentService(agent_repo, version_repo, task_repo, metrics_repo) 
\ No newline at end of file
+    return AgentService(
+        agent_repo, version_repo, task_repo, metrics_repo,
+        metrics_cache=get_agent_metrics_cache()
+    ) 
\ No newline at end of file
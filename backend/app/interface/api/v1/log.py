@@ -1,14 +1,17 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.interface.api.v1.dependencies import get_db
 from app.interface.api.v1.schemas.log import (
     LogSourceCreate, LogSourceUpdate, LogSourceInDB,
     LogParseRuleCreate, LogParseRuleUpdate, LogParseRuleInDB,
-    LogEntry, LogQuery
+    LogEntry, LogQuery, LogSearchResult, LogTemplateStat,
+    LogMetricRuleCreate, LogMetricRuleInDB
 )
 from app.crud import log_source, log_parse_rule, log
+from app.crud.log import log_metric_rule
 
 router = APIRouter()
 
@@ -107,14 +110,59 @@ async def update_log_parse_rule(
         raise HTTPException(status_code=404, detail="Log parse rule not found")
     return await log_parse_rule.update(db, db_obj=db_obj, obj_in=rule_in)
 
+# 日志派生指标规则
+@router.post("/log-metric-rules", response_model=LogMetricRuleInDB)
+async def create_log_metric_rule(
+    rule_in: LogMetricRuleCreate,
+    db: Session = Depends(get_db)
+):
+    """创建日志派生指标规则, 采集任务在下次刷新规则时生效"""
+    return log_metric_rule.create(db, obj_in=rule_in)
+
+@router.get("/log-metric-rules", response_model=List[LogMetricRuleInDB])
+async def list_log_metric_rules(
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """获取日志派生指标规则列表"""
+    return log_metric_rule.get_multi(db, skip=skip, limit=limit)
+
+@router.delete("/log-metric-rules/{rule_id}")
+async def delete_log_metric_rule(
+    rule_id: int,
+    db: Session = Depends(get_db)
+):
+    """删除日志派生指标规则"""
+    if not log_metric_rule.delete(db, id=rule_id):
+        raise HTTPException(status_code=404, detail="Log metric rule not found")
+    return {"msg": "Log metric rule deleted successfully"}
+
 # 日志查询
-@router.post("/logs/search", response_model=List[LogEntry])
+@router.post("/logs/search", response_model=LogSearchResult)
 async def search_logs(
     query: LogQuery,
     db: Session = Depends(get_db)
 ):
-    """搜索日志"""
-    return await log.search(db, query=query)
+    """搜索日志, 翻页时传入上一页返回的next_cursor"""
+    try:
+        items, next_cursor = log.search(db, query=query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return LogSearchResult(logs=items, next_cursor=next_cursor)
+
+@router.get("/logs/templates/top", response_model=List[LogTemplateStat])
+async def top_log_templates(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    source_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """时间范围内条数最多的日志模板, 可用返回的template_id在搜索中下钻"""
+    return log.top_templates(
+        db, start_time=start_time, end_time=end_time, source_id=source_id, limit=limit
+    )
 
 @router.post("/logs", response_model=LogEntry)
 async def create_log(
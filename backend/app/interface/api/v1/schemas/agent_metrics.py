@@ -16,6 +16,10 @@ class MetricsResponse(BaseModel):
     disk_usage: float
     network_in: int
     network_out: int
+    cpu_percent_max: Optional[float] = None
+    cpu_percent_p95: Optional[float] = None
+    memory_percent_max: Optional[float] = None
+    memory_percent_p95: Optional[float] = None
 
 class HourlyMetricsResponse(BaseModel):
     """小时聚合指标响应"""
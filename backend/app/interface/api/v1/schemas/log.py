@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, constr, validator
+from pydantic import BaseModel, Field, constr, validator
 
 class LogSourceBase(BaseModel):
     name: constr(min_length=1, max_length=50)
@@ -67,6 +67,43 @@ class LogEntry(BaseModel):
     message: str
     parsed_fields: Optional[Dict[str, Any]]
     metadata: Optional[Dict[str, Any]]
+    # Drain模板ID, 参数保存在parsed_fields["template_params"]
+    template_id: Optional[int]
+
+class LogInDB(LogEntry):
+    id: int
+
+    class Config:
+        orm_mode = True
+
+class LogMetricRuleBase(BaseModel):
+    name: constr(min_length=1, max_length=50)
+    source_id: Optional[int] = None
+    metric_id: str
+    server_id: str
+    kind: constr(regex='^(counter|histogram)$') = 'counter'
+    filters: Dict[str, Any] = {}
+    group_by: List[str] = []
+    value_field: Optional[str] = None
+    buckets: Optional[List[float]] = None
+    enabled: bool = True
+
+    @validator('value_field', always=True)
+    def validate_value_field(cls, v, values):
+        if values.get('kind') == 'histogram' and not v:
+            raise ValueError('Histogram rule requires value_field')
+        return v
+
+class LogMetricRuleCreate(LogMetricRuleBase):
+    pass
+
+class LogMetricRuleInDB(LogMetricRuleBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
 
 class LogQuery(BaseModel):
     start_time: Optional[datetime]
@@ -74,6 +111,28 @@ class LogQuery(BaseModel):
     source_ids: Optional[List[int]]
     levels: Optional[List[str]]
     search_text: Optional[str]
+    # substring: 子串匹配(三元组索引); fulltext: 分词匹配(全文索引), 支持"短语"、or、-排除
+    # 归档中的日志按单词近似匹配, IP、路径等片段的切分与数据库可能不同
+    search_mode: constr(regex='^(substring|fulltext)$') = 'substring'
     field_filters: Optional[Dict[str, Any]]
-    limit: int = 100
-    offset: int = 0 
\ No newline at end of file
+    template_ids: Optional[List[int]]
+    limit: int = Field(100, ge=1, le=1000)
+    # 上一页返回的next_cursor, 为空时从最新日志开始
+    cursor: Optional[str]
+
+    @validator('start_time', 'end_time')
+    def to_naive_utc(cls, v):
+        # 日志时间以不带时区的UTC存储, 带时区的查询时间(如 ...Z)先换算
+        if v is not None and v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+class LogSearchResult(BaseModel):
+    logs: List[LogInDB]
+    next_cursor: Optional[str]
+
+class LogTemplateStat(BaseModel):
+    template_id: int
+    template: Optional[str]
+    sample: Optional[str]
+    count: int
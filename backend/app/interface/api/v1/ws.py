@@ -1,65 +1,130 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import Dict, Set
+from typing import Dict, Iterable, Optional
 from ..auth import verify_token
+from ...ws.broadcaster import Broadcaster, DeliveryPolicy
+from ...ws.backplane import ws_backplane
+from ...ws.manager import SubscriptionIndex, TOPIC_FIELDS, normalize_topics
+from ....domain.log.tail import LiveTailFilter, LiveTailSession
+from ....infrastructure.config import settings
+import asyncio
 import logging
 from datetime import datetime
+import json
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/ws")
 
-# 存储活跃的WebSocket连接
-connections: Dict[str, Set[WebSocket]] = {
-    "alerts": set(),
-    "metrics": set(),
-    "logs": set()
-}
+# 活跃连接及其发送队列
+broadcaster = Broadcaster(queue_size=settings.WS_CLIENT_QUEUE_SIZE)
+broadcaster.add_channel("alerts", DeliveryPolicy.DROP_OLDEST)
+broadcaster.add_channel("metrics", DeliveryPolicy.COALESCE)  # 慢连接只保留每台服务器的最新指标
+broadcaster.add_channel("logs", DeliveryPolicy.DROP_OLDEST)
+# 各连接的订阅, 消息只路由给匹配的连接
+subscriptions = SubscriptionIndex()
+# 日志连接的实时跟踪, 开启后该连接只接收过滤、采样后的日志
+live_tails: Dict[WebSocket, LiveTailSession] = {}
+# 定期推送采样丢弃摘要, 有跟踪连接时运行
+_summary_task: Optional[asyncio.Task] = None
 
-@router.websocket("/alerts")
-async def alerts_ws(
-    websocket: WebSocket,
-    token: str = Query(...)
-):
-    """告警实时推送"""
+def _stop_tail(websocket: WebSocket) -> None:
+    if live_tails.pop(websocket, None) is not None:
+        ws_backplane.set_presence("live_tail", len(live_tails))
+
+async def _handle_client_message(websocket: WebSocket, text: str):
+    """处理客户端订阅消息
+    
+    {"action": "subscribe", "project_id": [...], "server_id": [...], "metric_type": [...], "source": [...]}
+    {"action": "unsubscribe", ...}  不带维度时清空订阅, 恢复接收全部
+    {"action": "tail", "filter": {...}, "max_rate": 100}  开始实时跟踪, 见_start_tail
+    {"action": "untail"}  停止实时跟踪
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(data, dict):
+        return
+    if data.get("action") == "tail":
+        await _start_tail(websocket, data)
+        return
+    if data.get("action") == "untail":
+        _stop_tail(websocket)
+        await websocket.send_json({"type": "tail", "data": None})
+        return
+    if data.get("action") not in ("subscribe", "unsubscribe"):
+        return
+    topics = {f: data[f] for f in TOPIC_FIELDS if f in data}
+    if data["action"] == "subscribe":
+        subscriptions.subscribe(websocket, **topics)
+    else:
+        subscriptions.unsubscribe(websocket, **topics)
+    await websocket.send_json({"type": "subscriptions", "data": subscriptions.subscriptions(websocket)})
+
+async def _start_tail(websocket: WebSocket, data: dict):
+    """开始实时跟踪
+
+    filter: {"source_id": [1], "level": ["error"], "pattern": "timeout|refused",
+             "fields": [{"field": "status", "op": "gte", "value": 500}]}
+    条件在服务端编译一次; max_rate只能低于服务端上限。
+    """
+    if broadcaster.channel_of(websocket) != "logs":
+        await websocket.send_json({"type": "error", "data": "Live tail is only available on /ws/logs"})
+        return
+    try:
+        tail_filter = LiveTailFilter.from_dict(data.get("filter") or {})
+        max_rate = float(data.get("max_rate") or settings.WS_LIVE_TAIL_MAX_RATE)
+    except (TypeError, ValueError) as e:
+        await websocket.send_json({"type": "error", "data": str(e)})
+        return
+    max_rate = min(max(max_rate, 1.0), settings.WS_LIVE_TAIL_MAX_RATE)
+    live_tails[websocket] = LiveTailSession(
+        tail_filter, max_rate, settings.WS_LIVE_TAIL_SUMMARY_INTERVAL
+    )
+    ws_backplane.set_presence("live_tail", len(live_tails))
+    global _summary_task
+    if _summary_task is None or _summary_task.done():
+        _summary_task = asyncio.create_task(_summary_loop())
+    await websocket.send_json({"type": "tail", "data": {"filter": tail_filter.to_dict(), "max_rate": max_rate}})
+
+async def _serve(websocket: WebSocket, token: str, channel: str, label: str):
+    """接受连接并保持到客户端断开"""
     try:
         # 验证token
         user = await verify_token(token)
         
         await websocket.accept()
-        connections["alerts"].add(websocket)
-        logger.info(f"Alert WebSocket connected: user={user['username']}")
+        broadcaster.register(channel, websocket)
+        subscriptions.add(websocket)
+        logger.info(f"{label} WebSocket connected: user={user['username']}")
         
         try:
             while True:
-                await websocket.receive_text()
+                await _handle_client_message(websocket, await websocket.receive_text())
         except WebSocketDisconnect:
-            connections["alerts"].remove(websocket)
-            logger.info(f"Alert WebSocket disconnected: user={user['username']}")
+            logger.info(f"{label} WebSocket disconnected: user={user['username']}")
+        finally:
+            subscriptions.remove(websocket)
+            _stop_tail(websocket)
+            broadcaster.unregister(websocket)
     except Exception as e:
-        logger.error(f"Alert WebSocket error: {e}")
+        logger.error(f"{label} WebSocket error: {e}")
         await websocket.close(code=4003)
 
+@router.websocket("/alerts")
+async def alerts_ws(
+    websocket: WebSocket,
+    token: str = Query(...)
+):
+    """告警实时推送"""
+    await _serve(websocket, token, "alerts", "Alert")
+
 @router.websocket("/metrics")
 async def metrics_ws(
     websocket: WebSocket,
     token: str = Query(...)
 ):
     """监控指标实时推送"""
-    try:
-        user = await verify_token(token)
-        
-        await websocket.accept()
-        connections["metrics"].add(websocket)
-        logger.info(f"Metrics WebSocket connected: user={user['username']}")
-        
-        try:
-            while True:
-                await websocket.receive_text()
-        except WebSocketDisconnect:
-            connections["metrics"].remove(websocket)
-            logger.info(f"Metrics WebSocket disconnected: user={user['username']}")
-    except Exception as e:
-        logger.error(f"Metrics WebSocket error: {e}")
-        await websocket.close(code=4003)
+    await _serve(websocket, token, "metrics", "Metrics")
 
 @router.websocket("/logs")
 async def logs_ws(
@@ -67,92 +132,132 @@ async def logs_ws(
     token: str = Query(...)
 ):
     """日志实时推送"""
-    try:
-        user = await verify_token(token)
-        
-        await websocket.accept()
-        connections["logs"].add(websocket)
-        logger.info(f"Logs WebSocket connected: user={user['username']}")
-        
-        try:
-            while True:
-                await websocket.receive_text()
-        except WebSocketDisconnect:
-            connections["logs"].remove(websocket)
-            logger.info(f"Logs WebSocket disconnected: user={user['username']}")
-    except Exception as e:
-        logger.error(f"Logs WebSocket error: {e}")
-        await websocket.close(code=4003)
+    await _serve(websocket, token, "logs", "Logs")
+
+@router.get("/stats")
+async def ws_stats():
+    """各频道连接数、队列深度和丢弃统计"""
+    stats = broadcaster.get_stats()
+    stats["backplane"] = ws_backplane.get_stats()
+    return stats
+
+async def _publish(channel: str, message: dict, key: Optional[str] = None, **topics):
+    """经广播总线发布, 每个进程投递给本进程的订阅连接"""
+    await ws_backplane.publish("api", {
+        "channel": channel,
+        "message": message,
+        "key": key,
+        "topics": {f: sorted(v) for f, v in normalize_topics(topics).items()}
+    })
+
+async def _deliver(payload: dict):
+    """本进程投递: 消息只序列化一次, 放入匹配连接的发送队列后立即返回"""
+    targets = subscriptions.match(**payload["topics"])
+    if payload["channel"] == "logs" and live_tails:
+        # 实时跟踪的连接改由_deliver_tail投递
+        targets = targets.difference(live_tails)
+    broadcaster.publish(
+        payload["channel"],
+        payload["message"],
+        key=payload.get("key"),
+        targets=targets
+    )
+
+async def _deliver_tail(payload: dict):
+    """本进程投递一批日志到各实时跟踪连接
+
+    每个连接的过滤条件不同, 只有命中的日志才序列化。
+    """
+    entries = payload["entries"]
+    for websocket, session in list(live_tails.items()):
+        lines = session.offer(entries)
+        if lines:
+            broadcaster.publish("logs", {
+                "type": "log_tail",
+                "data": lines,
+                "timestamp": datetime.now().isoformat()
+            }, targets=[websocket])
+
+async def _summary_loop():
+    """按间隔把采样丢弃摘要推送给各实时跟踪连接, 没有新日志时也按时推送"""
+    interval = min(1.0, settings.WS_LIVE_TAIL_SUMMARY_INTERVAL)
+    while live_tails:
+        await asyncio.sleep(interval)
+        for websocket, session in list(live_tails.items()):
+            summary = session.sampler.summary()
+            if summary:
+                broadcaster.publish("logs", {
+                    "type": "tail_summary",
+                    "data": summary,
+                    "timestamp": datetime.now().isoformat()
+                }, targets=[websocket])
+
+ws_backplane.add_handler("api", _deliver)
+ws_backplane.add_handler("live_tail", _deliver_tail)
 
 # 广播消息的辅助函数
 async def broadcast_alert(alert: dict):
     """广播告警消息"""
-    for ws in list(connections["alerts"]):
-        try:
-            await ws.send_json({
-                "type": "alert",
-                "data": alert,
-                "timestamp": datetime.now().isoformat()
-            })
-        except Exception as e:
-            logger.error(f"Failed to broadcast alert: {e}")
-            try:
-                connections["alerts"].remove(ws)
-            except KeyError:
-                pass
-
-async def broadcast_metrics(metrics: dict):
-    """广播监控指标"""
-    for ws in list(connections["metrics"]):
-        try:
-            await ws.send_json({
-                "type": "metric",
-                "data": metrics,
-                "timestamp": datetime.now().isoformat()
-            })
-        except Exception as e:
-            logger.error(f"Failed to broadcast metrics: {e}")
-            try:
-                connections["metrics"].remove(ws)
-            except KeyError:
-                pass
+    await _publish("alerts", {
+        "type": "alert",
+        "data": alert,
+        "timestamp": datetime.now().isoformat()
+    },
+        project_id=alert.get("project_id"),
+        server_id=alert.get("server_id"),
+        metric_type=alert.get("metric_type")
+    )
+
+async def broadcast_metrics(metrics: dict, key: Optional[str] = None):
+    """广播监控指标
+    
+    key: 合并键, 默认取server_id, 慢连接队列中同一key只保留最新一条
+    """
+    await _publish("metrics", {
+        "type": "metric",
+        "data": metrics,
+        "timestamp": datetime.now().isoformat()
+    },
+        key=key or metrics.get("server_id"),
+        project_id=metrics.get("project_id"),
+        server_id=metrics.get("server_id"),
+        metric_type=metrics.get("metric_type", metrics.keys())
+    )
 
 async def broadcast_logs(log: dict):
     """广播日志消息"""
-    for ws in list(connections["logs"]):
-        try:
-            await ws.send_json({
-                "type": "log",
-                "data": log,
-                "timestamp": datetime.now().isoformat()
-            })
-        except Exception as e:
-            logger.error(f"Failed to broadcast log: {e}")
-            try:
-                connections["logs"].remove(ws)
-            except KeyError:
-                pass
-
-@router.on_event("startup")
-async def startup():
-    """启动时初始化连接管理"""
-    global connections
-    connections = {
-        "alerts": set(),
-        "metrics": set(),
-        "logs": set()
-    }
-    logger.info("WebSocket connections initialized")
+    await _publish("logs", {
+        "type": "log",
+        "data": log,
+        "timestamp": datetime.now().isoformat()
+    },
+        project_id=log.get("project_id"),
+        server_id=log.get("server_id"),
+        source=log.get("source")
+    )
+
+async def broadcast_log_entries(entries: Iterable):
+    """把一批解析后的日志发给实时跟踪连接
+
+    所有进程都没有跟踪连接时直接返回, 不做任何转换和发布。
+    """
+    if not ws_backplane.has_presence("live_tail"):
+        return
+    await ws_backplane.publish("live_tail", {"entries": [
+        {
+            "source_id": e.source_id,
+            "timestamp": e.timestamp.isoformat(),
+            "level": e.level,
+            "message": e.message,
+            "parsed_fields": e.parsed_fields,
+            "template_id": e.template_id,
+        }
+        for e in entries
+    ]})
 
 @router.on_event("shutdown") 
 async def shutdown():
     """关闭时清理所有连接"""
-    for channel, connections in connections.items():
-        count = len(connections)
-        for ws in connections:
-            try:
-                await ws.close(code=1001)  # Going Away
-            except:
-                pass
-        logger.info(f"Closed {count} {channel} WebSocket connections")
-    connections.clear() 
\ No newline at end of file
+    for channel, stats in broadcaster.get_stats().items():
+        logger.info(f"Closing {stats['clients']} {channel} WebSocket connections")
+    await broadcaster.close_all(code=1001)  # Going Away
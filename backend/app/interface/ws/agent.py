@@ -1,29 +1,70 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
 import json
 import logging
+import secrets
+import time
 from ...domain.agent.service import AgentService
 from ...domain.agent.aggregate import AgentStatus
 from ...domain.agent.metrics import AgentMetrics
+from ...domain.agent.codec import CODEC_NAME, FRAME_SEQ, CodecError, MetricDecoder, MetricSchema
+from ...infrastructure.ingest.agent_metrics import agent_metrics_ingest
+from ...infrastructure.tasks.alert import alert_stream
+from ...infrastructure.config import settings
 from datetime import datetime
 from uuid import uuid4
 
 logger = logging.getLogger(__name__)
 
+# 二进制指标帧中入库需要的字段, 依次对应AgentMetrics的各列
+INGEST_FIELDS = (
+    "cpu_percent", "memory_percent", "disk_usage", "network.bytes_recv", "network.bytes_sent"
+)
+# 上报周期内高频采样的统计, 旧版本Agent不上报
+SUMMARY_FIELDS = ("cpu_percent_max", "cpu_percent_p95", "memory_percent_max", "memory_percent_p95")
+
 class AgentWebSocketManager:
     """Agent WebSocket连接管理器"""
     
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        # 请求ID -> 等待Agent回复的Future
+        self._pending: Dict[str, asyncio.Future] = {}
     
     async def connect(self, agent_id: str, websocket: WebSocket):
         """建立连接"""
         await websocket.accept()
         self.active_connections[agent_id] = websocket
     
-    def disconnect(self, agent_id: str):
-        """断开连接"""
-        self.active_connections.pop(agent_id, None)
+    def disconnect(self, agent_id: str, websocket: Optional[WebSocket] = None):
+        """断开连接; 给出websocket时只在它仍是当前连接时移除, 避免误删已重连的新连接"""
+        if websocket is None or self.active_connections.get(agent_id) is websocket:
+            self.active_connections.pop(agent_id, None)
+    
+    async def request(self, agent_id: str, message: dict, timeout: float = 10.0) -> dict:
+        """向Agent发送请求并等待带相同request_id的回复
+
+        Agent未连接到本进程时抛出KeyError, 超时抛出asyncio.TimeoutError。
+        """
+        websocket = self.active_connections.get(agent_id)
+        if websocket is None:
+            raise KeyError(agent_id)
+        request_id = uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await websocket.send_json({**message, "request_id": request_id})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+    
+    def resolve(self, message: dict) -> None:
+        """把Agent的回复交给等待中的请求"""
+        future = self._pending.get(message.get("request_id"))
+        if future is not None and not future.done():
+            future.set_result(message)
     
     async def broadcast(self, message: dict):
         """广播消息"""
@@ -35,46 +76,261 @@ class AgentWebSocketManager:
 
 ws_manager = AgentWebSocketManager()
 
+@dataclass
+class AgentSession:
+    """Agent会话, 断线后凭resume_token恢复"""
+    token: str
+    agent_id: str
+    agent: Any
+    ack_seq: int = 0  # 已接收的最后一个上报序号
+    detached_at: Optional[float] = None
+    offline_task: Optional[asyncio.Task] = None
+
+class AgentSessionStore:
+    """Agent会话表
+
+    断线的会话保留ttl秒, Agent带着resume_token重连时恢复会话并告知
+    已接收的序号, Agent只补发之后的积压数据。
+    断线超过offline_grace仍未恢复才标记离线, 网络抖动等短暂中断不会
+    让所有Agent的状态来回翻转。会话只保存在本进程内存中, 无法恢复时
+    Agent按新会话处理, 积压数据照常补发。
+    """
+
+    def __init__(self, ttl: float, offline_grace: float):
+        self.ttl = ttl
+        self.offline_grace = offline_grace
+        self._sessions: Dict[str, AgentSession] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, agent_id: str, agent: Any) -> AgentSession:
+        self._expire()
+        # 同一Agent只保留最新的会话
+        for token, session in list(self._sessions.items()):
+            if session.agent_id == agent_id:
+                self._drop(token)
+        session = AgentSession(token=secrets.token_urlsafe(24), agent_id=agent_id, agent=agent)
+        self._sessions[session.token] = session
+        return session
+
+    def resume(self, agent_id: str, token: Optional[str]) -> Optional[AgentSession]:
+        """恢复未过期的会话, 取消待执行的离线标记"""
+        session = self._sessions.get(token) if token else None
+        if session is None or session.agent_id != agent_id:
+            return None
+        if session.detached_at is not None and time.monotonic() - session.detached_at > self.ttl:
+            self._drop(token)
+            return None
+        if session.offline_task:
+            session.offline_task.cancel()
+            session.offline_task = None
+        session.detached_at = None
+        return session
+
+    def detach(self, session: AgentSession, on_offline: Callable[[], Awaitable[None]]) -> None:
+        """连接断开, offline_grace秒内未恢复则调用on_offline"""
+        session.detached_at = time.monotonic()
+
+        async def mark_offline():
+            await asyncio.sleep(self.offline_grace)
+            session.offline_task = None
+            try:
+                await on_offline()
+            except Exception as e:
+                logger.error(f"Failed to mark agent {session.agent_id} offline: {str(e)}")
+
+        session.offline_task = asyncio.create_task(mark_offline())
+
+    def _drop(self, token: str) -> None:
+        session = self._sessions.pop(token, None)
+        if session and session.offline_task:
+            session.offline_task.cancel()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for token, session in list(self._sessions.items()):
+            if session.detached_at is not None and now - session.detached_at > self.ttl:
+                # 离线标记早已执行, 只需移除
+                self._sessions.pop(token, None)
+
+agent_sessions = AgentSessionStore(settings.AGENT_RESUME_TTL, settings.AGENT_OFFLINE_GRACE)
+
+async def _ingest_metrics(
+    service: AgentService,
+    agent,
+    agent_id: str,
+    timestamp: datetime,
+    cpu_percent: float,
+    memory_percent: float,
+    disk_usage: float,
+    network_in: int,
+    network_out: int,
+    summary: Optional[Dict[str, Optional[float]]] = None
+):
+    """保存一个指标样本并评估告警, summary为SUMMARY_FIELDS中的统计值"""
+    metrics = AgentMetrics(
+        **(summary or {}),
+        id=str(uuid4()),
+        agent_id=agent_id,
+        timestamp=timestamp,
+        cpu_percent=cpu_percent,
+        memory_percent=memory_percent,
+        disk_usage=disk_usage,
+        network_in=network_in,
+        network_out=network_out,
+        created_at=datetime.now()
+    )
+    if agent_metrics_ingest.running:
+        # 经写入缓冲批量落库, 队列满时在此处背压
+        await agent_metrics_ingest.submit(metrics)
+    else:
+        await service.metrics_repo.save_metrics(metrics)
+    # 在写入路径上直接评估告警规则
+    if agent:
+        alert_stream.feed(agent.server_id, metrics)
+
+def _negotiate_codec(message: dict) -> Optional[MetricDecoder]:
+    """处理Agent的hello握手, 支持二进制指标帧时返回解码器"""
+    if CODEC_NAME not in (message.get("codecs") or []):
+        return None
+    try:
+        decoder = MetricDecoder(MetricSchema.from_dict(message["schema"]))
+        decoder.reader(*INGEST_FIELDS)
+    except (CodecError, KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Rejected agent metric schema: {e}")
+        return None
+    return decoder
+
+def _summary_reader(decoder: Optional[MetricDecoder]) -> Optional[Callable[[list], Dict]]:
+    """字段模式包含周期统计时返回从行中取出它们的函数"""
+    if decoder is None or not all(name in decoder.schema.names for name in SUMMARY_FIELDS):
+        return None
+    read = decoder.reader(*SUMMARY_FIELDS)
+    return lambda row: dict(zip(SUMMARY_FIELDS, read(row)[1:]))
+
 async def agent_websocket_endpoint(
     websocket: WebSocket,
     agent_id: str,
     service: AgentService
 ):
-    """Agent WebSocket处理"""
+    """Agent WebSocket处理
+
+    连接后先下发session消息(resume_token与已接收的序号)。文本消息为JSON;
+    Agent在hello中声明支持delta-v1并给出字段模式后, 指标改以二进制帧
+    上报, 解码失败时要求Agent重新握手。每收到一批指标回复ack, Agent
+    据此清理本地积压。握手时协商seq_frames的Agent在二进制帧前附带序号,
+    断线重发的样本按序号跳过; 未协商的旧Agent按样本数顺延序号。
+    """
+    decoder: Optional[MetricDecoder] = None
+    seq_frames = False
+    read = None
+    read_summary = None
+    session: Optional[AgentSession] = None
+    agent = None
     try:
         await ws_manager.connect(agent_id, websocket)
         
-        # 更新Agent状态为在线
+        session = agent_sessions.resume(agent_id, websocket.query_params.get("resume"))
+        resumed = session is not None
+        # 读取最新的Agent; 恢复的会话可能已超过离线宽限期被标记为离线
         agent = await service.agent_repo.get_by_id(agent_id)
-        if agent:
+        if agent and agent.status != AgentStatus.ONLINE:
             agent.status = AgentStatus.ONLINE
             await service.agent_repo.save(agent)
+        if resumed:
+            session.agent = agent
+        else:
+            session = agent_sessions.create(agent_id, agent)
+        await websocket.send_json({
+            "type": "session",
+            "resume_token": session.token,
+            "resumed": resumed,
+            "ack_seq": session.ack_seq
+        })
         
         while True:
             # 接收消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            if received.get("bytes") is not None:
+                # 二进制指标帧
+                frame = received["bytes"]
+                try:
+                    if decoder is None:
+                        raise CodecError("Metric frame before codec negotiation")
+                    if seq_frames:
+                        if len(frame) < FRAME_SEQ.size:
+                            raise CodecError("Metric frame without sequence number")
+                        first_seq = FRAME_SEQ.unpack_from(frame)[0]
+                        frame = frame[FRAME_SEQ.size:]
+                    else:
+                        # 旧Agent的帧不带序号, 按样本数顺延
+                        first_seq = session.ack_seq + 1
+                    # 重发的帧也要解码, 解码器的差值状态依赖之前的每一帧
+                    rows = decoder.decode_rows(frame)
+                except CodecError as e:
+                    logger.warning(f"Failed to decode metric frame from agent {agent_id}: {e}")
+                    decoder = None
+                    await websocket.send_json({"type": "codec_reset"})
+                    continue
+                for seq, row in enumerate(rows, first_seq):
+                    if seq <= session.ack_seq:
+                        # 断线前已接收的重发数据
+                        continue
+                    await _ingest_metrics(
+                        service, agent, agent_id, *read(row),
+                        summary=read_summary(row) if read_summary else None
+                    )
+                session.ack_seq = max(session.ack_seq, first_seq + len(rows) - 1)
+                await websocket.send_json({"type": "ack", "seq": session.ack_seq})
+                continue
+            message = json.loads(received["text"])
             
             # 处理不同类型的消息
             msg_type = message.get("type")
-            if msg_type == "heartbeat":
+            if msg_type == "hello":
+                # 新会话沿用Agent已确认的序号
+                session.ack_seq = max(session.ack_seq, int(message.get("seq") or 0))
+                # 协商指标编码
+                decoder = _negotiate_codec(message)
+                read = decoder.reader(*INGEST_FIELDS) if decoder else None
+                read_summary = _summary_reader(decoder)
+                seq_frames = decoder is not None and bool(message.get("seq_frames"))
+                await websocket.send_json({
+                    "type": "codec",
+                    "codec": CODEC_NAME if decoder else "json",
+                    "schema_id": decoder.schema.id if decoder else None,
+                    "seq_frames": seq_frames
+                })
+            elif msg_type == "heartbeat":
                 # 更新心跳
                 await service.update_heartbeat(agent_id)
             elif msg_type == "metrics":
+                seq = message.get("seq")
+                if seq is not None and seq <= session.ack_seq:
+                    # 断线前已接收的重发数据
+                    await websocket.send_json({"type": "ack", "seq": session.ack_seq})
+                    continue
                 # 处理指标数据
                 data = message.get("data", {})
-                metrics = AgentMetrics(
-                    id=str(uuid4()),
-                    agent_id=agent_id,
-                    timestamp=datetime.fromisoformat(message["timestamp"]),
-                    cpu_percent=data["cpu_percent"],
-                    memory_percent=data["memory_percent"],
-                    disk_usage=data["disk_usage"],
-                    network_in=data["network"]["bytes_recv"],
-                    network_out=data["network"]["bytes_sent"],
-                    created_at=datetime.now()
+                await _ingest_metrics(
+                    service, agent, agent_id,
+                    datetime.fromisoformat(message["timestamp"]),
+                    data["cpu_percent"],
+                    data["memory_percent"],
+                    data["disk_usage"],
+                    data["network"]["bytes_recv"],
+                    data["network"]["bytes_sent"],
+                    summary={name: data.get(name) for name in SUMMARY_FIELDS}
                 )
-                await service.metrics_repo.save_metrics(metrics)
+                if seq is not None:
+                    session.ack_seq = seq
+                    await websocket.send_json({"type": "ack", "seq": seq})
+            elif msg_type == "raw_samples":
+                # 按需拉取的高频原始样本
+                ws_manager.resolve(message)
             elif msg_type == "upgrade_result":
                 # 处理升级结果
                 status = message.get("status")
@@ -83,10 +339,17 @@ async def agent_websocket_endpoint(
                 await service.update_task_status(task_id, status, error)
     
     except WebSocketDisconnect:
-        # 断开连接时更新状态
-        if agent:
-            agent.status = AgentStatus.OFFLINE
-            await service.agent_repo.save(agent)
+        pass
     
     finally:
-        ws_manager.disconnect(agent_id) 
\ No newline at end of file
+        ws_manager.disconnect(agent_id, websocket)
+        if session:
+            async def mark_offline():
+                # 宽限期内未恢复会话才标记离线; 重新读取, 不覆盖断线后更新的字段
+                if agent_id in ws_manager.active_connections:
+                    return
+                current = await service.agent_repo.get_by_id(agent_id)
+                if current and current.status != AgentStatus.OFFLINE:
+                    current.status = AgentStatus.OFFLINE
+                    await service.agent_repo.save(current)
+            agent_sessions.detach(session, mark_offline)
@@ -0,0 +1,271 @@
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+from collections import deque
+from ...infrastructure.config import settings
+import asyncio
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 投递回调: 收到广播后交给本进程的连接
+Handler = Callable[[dict], Awaitable[None]]
+
+class Backplane:
+    """跨进程广播总线
+
+    广播先发布到总线, 再由每个进程投递给本进程持有的连接。
+    基类即本地实现: 只有单个进程时直接在本进程投递, 也用于测试。
+    set_presence/has_presence记录各进程某类订阅者的数量, 发布方可在
+    所有进程都没有订阅者时跳过发布。
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._presence: Dict[str, int] = {}
+        self.running = False
+
+    def add_handler(self, target: str, handler: Handler) -> None:
+        """注册投递回调, target区分不同的WebSocket入口"""
+        self._handlers[target] = handler
+
+    async def start(self) -> None:
+        self.running = True
+
+    async def stop(self) -> None:
+        self.running = False
+
+    async def publish(self, target: str, payload: dict) -> None:
+        await self._dispatch({"target": target, "payload": payload})
+
+    def set_presence(self, key: str, count: int) -> None:
+        """更新本进程某类订阅者的数量"""
+        self._presence[key] = count
+
+    def has_presence(self, key: str) -> bool:
+        """是否有进程存在该类订阅者"""
+        return self._presence.get(key, 0) > 0
+
+    def get_stats(self) -> Dict:
+        return {"backend": "local", "running": self.running}
+
+    async def _dispatch(self, envelope: dict) -> None:
+        handler = self._handlers.get(envelope.get("target"))
+        if handler is None:
+            return
+        try:
+            await handler(envelope["payload"])
+        except Exception as e:
+            logger.error(f"WebSocket broadcast delivery failed: {e}")
+
+class RedisBackplane(Backplane):
+    """基于Redis发布订阅的广播总线
+
+    发布的消息先在本地攒批, 按条数或时间合并为一次PUBLISH;
+    每个进程订阅同一频道, 收到批次后逐条投递给本进程的连接。
+    总线未启动或Redis不可用时退化为本进程投递。等待发布的消息最多
+    max_pending条, Redis响应慢导致积压时丢弃最旧的并计数。
+
+    订阅者存在标记为每进程一个带过期时间的键, 每presence_interval秒
+    刷新并扫描一次, 进程异常退出后标记自动过期; 其他进程新增的订阅者
+    最多延迟一个刷新间隔才被发布方看到。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        batch_size: int = 100,
+        batch_interval: float = 0.02,
+        presence_interval: float = 2.0,
+        max_pending: int = 10000,
+        redis=None
+    ):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.presence_interval = presence_interval
+        self.max_pending = max_pending
+        self.reconnect_delay = 1.0
+        self.instance_id = uuid.uuid4().hex
+        # 未传入时在start中按url创建客户端
+        self._redis = redis
+        self._buffer: Deque[dict] = deque()
+        self._flush_event: Optional[asyncio.Event] = None
+        self._presence_event: Optional[asyncio.Event] = None
+        # 其他进程的订阅者存在情况, 由_presence_loop刷新
+        self._remote_presence: Dict[str, bool] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        if self._redis is None:
+            # redis>=4.2 自带asyncio客户端, 接口与aioredis 2.x一致
+            from redis import asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.url)
+        self._flush_event = asyncio.Event()
+        self._presence_event = asyncio.Event()
+        self.running = True
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._subscribe_loop()),
+            asyncio.create_task(self._presence_loop()),
+        ]
+        logger.info(f"WebSocket backplane started: channel={self.channel}")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self._flush_event.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush()
+        try:
+            keys = [self._presence_key(key) for key in self._presence]
+            if keys:
+                await self._redis.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Failed to clear WebSocket presence: {e}")
+        await self._redis.close()
+        self._redis = None
+
+    async def publish(self, target: str, payload: dict) -> None:
+        envelope = {"target": target, "payload": payload}
+        if not self.running:
+            await self._dispatch(envelope)
+            return
+        if len(self._buffer) >= self.max_pending:
+            self._buffer.popleft()
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"WebSocket backplane backlog full, "
+                               f"{self.dropped} messages dropped so far")
+        self._buffer.append(envelope)
+        if len(self._buffer) >= self.batch_size:
+            self._flush_event.set()
+
+    def set_presence(self, key: str, count: int) -> None:
+        changed = (self._presence.get(key, 0) > 0) != (count > 0)
+        super().set_presence(key, count)
+        if changed and self._presence_event is not None:
+            self._presence_event.set()
+
+    def has_presence(self, key: str) -> bool:
+        if not self.running:
+            return super().has_presence(key)
+        if key not in self._remote_presence:
+            # 首次查询, 在下一次刷新前按有订阅者处理, 不丢消息
+            self._remote_presence[key] = True
+            self._presence_event.set()
+        return super().has_presence(key) or self._remote_presence[key]
+
+    def _presence_key(self, key: str) -> str:
+        return f"{self.channel}:presence:{key}:{self.instance_id}"
+
+    async def _presence_loop(self) -> None:
+        """刷新本进程的存在标记, 并查询其他进程是否有订阅者"""
+        ttl = max(int(self.presence_interval * 5), 10)
+        while self.running:
+            try:
+                await asyncio.wait_for(self._presence_event.wait(), self.presence_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._presence_event.clear()
+            try:
+                for key, count in list(self._presence.items()):
+                    if count > 0:
+                        await self._redis.set(self._presence_key(key), count, ex=ttl)
+                    else:
+                        await self._redis.delete(self._presence_key(key))
+                for key in list(self._remote_presence):
+                    found = False
+                    async for _ in self._redis.scan_iter(match=f"{self.channel}:presence:{key}:*"):
+                        found = True
+                        break
+                    self._remote_presence[key] = found
+            except Exception as e:
+                # Redis不可用时按有订阅者处理
+                logger.error(f"WebSocket presence refresh failed: {e}")
+                for key in self._remote_presence:
+                    self._remote_presence[key] = True
+
+    async def _flush_loop(self) -> None:
+        while self.running:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self._flush()
+
+    async def _flush(self) -> None:
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            data = json.dumps(batch, ensure_ascii=False, default=str)
+            try:
+                await self._redis.publish(self.channel, data)
+                self.published += len(batch)
+            except Exception as e:
+                # Redis不可用时至少保证本进程的连接收到
+                logger.error(f"Failed to publish WebSocket batch, delivering locally: {e}")
+                for envelope in batch:
+                    await self._dispatch(envelope)
+
+    async def _subscribe_loop(self) -> None:
+        while self.running:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    for envelope in json.loads(message["data"]):
+                        self.received += 1
+                        await self._dispatch(envelope)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket backplane subscription error: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "redis",
+            "instance_id": self.instance_id,
+            "running": self.running,
+            "pending": len(self._buffer),
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+def create_backplane() -> Backplane:
+    """按配置创建广播总线"""
+    if settings.WS_BACKPLANE == "redis":
+        return RedisBackplane(
+            settings.WS_BACKPLANE_REDIS_URL,
+            settings.WS_BACKPLANE_CHANNEL,
+            batch_size=settings.WS_BACKPLANE_BATCH_SIZE,
+            batch_interval=settings.WS_BACKPLANE_BATCH_INTERVAL,
+            presence_interval=settings.WS_BACKPLANE_PRESENCE_INTERVAL,
+            max_pending=settings.WS_BACKPLANE_MAX_PENDING
+        )
+    return Backplane()
+
+# 全局广播总线
+ws_backplane = create_backplane()
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, Optional, Set
+from fastapi import WebSocket
+import asyncio
+import itertools
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DeliveryPolicy:
+    """慢消费者处理策略"""
+    DROP_OLDEST = "drop_oldest"  # 队列满时丢弃最旧的消息
+    COALESCE = "coalesce"        # 同一key只保留最新一条(如每台服务器的最新指标)
+
+@dataclass
+class ClientStats:
+    """单连接发送统计"""
+    sent: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+
+class ClientQueue:
+    """单连接发送队列
+
+    有界队列由独立协程排空, 单个慢连接只会积压自己的队列,
+    不影响其他连接的投递。
+    """
+
+    _seq = itertools.count()
+
+    def __init__(self, websocket: WebSocket, channel: str, policy: str, maxsize: int):
+        self.websocket = websocket
+        self.channel = channel
+        self.policy = policy
+        self.maxsize = maxsize
+        self.stats = ClientStats()
+        self._pending: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self, on_error) -> None:
+        self._task = asyncio.create_task(self._drain(on_error))
+
+    def stop(self) -> None:
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, text: str, key: Optional[Hashable] = None) -> None:
+        """放入已序列化的消息, 不阻塞"""
+        if self.closed:
+            return
+        if key is not None and self.policy == DeliveryPolicy.COALESCE and key in self._pending:
+            # 原位置替换为最新值, 保持消息顺序
+            self._pending[key] = text
+            self.stats.coalesced += 1
+            return
+        if len(self._pending) >= self.maxsize:
+            self._pending.popitem(last=False)
+            self.stats.dropped += 1
+        if key is None or self.policy != DeliveryPolicy.COALESCE:
+            key = ("_", next(self._seq))
+        self._pending[key] = text
+        self._ready.set()
+
+    async def _drain(self, on_error) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._pending:
+                    _, text = self._pending.popitem(last=False)
+                    await self.websocket.send_text(text)
+                    self.stats.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"WebSocket send failed, dropping client: {e}")
+            on_error(self)
+
+class Broadcaster:
+    """WebSocket广播器
+
+    每条消息只序列化一次, 随后把同一份文本放入各连接的发送队列。
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self.channels: Dict[str, Set[ClientQueue]] = {}
+        self.policies: Dict[str, str] = {}
+        self._clients: Dict[WebSocket, ClientQueue] = {}
+        self._retired: Dict[str, ClientStats] = {}
+
+    def add_channel(self, channel: str, policy: str = DeliveryPolicy.DROP_OLDEST) -> None:
+        self.channels.setdefault(channel, set())
+        self.policies[channel] = policy
+        self._retired.setdefault(channel, ClientStats())
+
+    def register(self, channel: str, websocket: WebSocket) -> ClientQueue:
+        """注册连接, 连接需已accept"""
+        client = ClientQueue(websocket, channel, self.policies[channel], self.queue_size)
+        self.channels[channel].add(client)
+        self._clients[websocket] = client
+        client.start(self._on_error)
+        return client
+
+    def unregister(self, websocket: WebSocket) -> None:
+        client = self._clients.pop(websocket, None)
+        # ClientQueue定义了__len__, 队列为空时为假, 须与None比较
+        if client is None:
+            return
+        client.stop()
+        self.channels[client.channel].discard(client)
+        retired = self._retired[client.channel]
+        retired.sent += client.stats.sent
+        retired.dropped += client.stats.dropped
+        retired.coalesced += client.stats.coalesced
+
+    def channel_of(self, websocket: WebSocket) -> Optional[str]:
+        client = self._clients.get(websocket)
+        return client.channel if client is not None else None
+
+    def _on_error(self, client: ClientQueue) -> None:
+        self.unregister(client.websocket)
+
+    def publish(
+        self,
+        channel: str,
+        message: dict,
+        key: Optional[Hashable] = None,
+        targets: Optional[Iterable[WebSocket]] = None
+    ) -> int:
+        """发布消息到频道, 返回投递的连接数
+
+        targets: 只投递给其中的连接(如订阅索引的匹配结果), 默认为频道内全部连接
+        """
+        clients = self.channels.get(channel)
+        if clients and targets is not None:
+            clients = [
+                client for client in map(self._clients.get, targets)
+                if client is not None and client.channel == channel
+            ]
+        if not clients:
+            return 0
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        for client in clients:
+            client.put(text, key)
+        return len(clients)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """按频道统计连接数、队列深度和丢弃数"""
+        stats = {}
+        for channel, clients in self.channels.items():
+            retired = self._retired[channel]
+            depths = [len(c) for c in clients]
+            stats[channel] = {
+                "clients": len(clients),
+                "queue_depth": sum(depths),
+                "max_queue_depth": max(depths, default=0),
+                "sent": retired.sent + sum(c.stats.sent for c in clients),
+                "dropped": retired.dropped + sum(c.stats.dropped for c in clients),
+                "coalesced": retired.coalesced + sum(c.stats.coalesced for c in clients),
+            }
+        return stats
+
+    async def close_all(self, code: int = 1001) -> None:
+        for websocket in list(self._clients):
+            self.unregister(websocket)
+            try:
+                await websocket.close(code=code)
+            except Exception:
+                pass
@@ -1,19 +1,148 @@
-from typing import Dict, Set
+from typing import Dict, Iterable, Optional, Set, Union
 from fastapi import WebSocket
-import json
+from .backplane import ws_backplane
+from .broadcaster import Broadcaster, DeliveryPolicy
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 可订阅的维度
+TOPIC_FIELDS = ("project_id", "server_id", "metric_type", "source")
+
+TopicValue = Union[str, Iterable[str], None]
+
+def normalize_topics(topics: Dict[str, TopicValue]) -> Dict[str, Set[str]]:
+    """统一为 维度 -> 取值集合, 忽略为None的维度"""
+    normalized = {}
+    for field, values in topics.items():
+        if field not in TOPIC_FIELDS:
+            raise ValueError(f"Unknown subscription topic: {field}")
+        if values is None:
+            continue
+        if isinstance(values, str) or not hasattr(values, "__iter__"):
+            values = [values]
+        normalized[field] = {str(v) for v in values}
+    return normalized
+
+class SubscriptionIndex:
+    """订阅索引
+
+    每个连接在各维度上订阅一组取值, 未订阅的维度视为接收全部。
+    消息带有若干维度的取值, 只路由给所有维度都匹配的连接。
+    """
+
+    def __init__(self):
+        # 维度 -> 取值 -> 订阅了该取值的连接
+        self._index: Dict[str, Dict[str, Set[WebSocket]]] = {f: {} for f in TOPIC_FIELDS}
+        # 维度 -> 未限制该维度的连接
+        self._any: Dict[str, Set[WebSocket]] = {f: set() for f in TOPIC_FIELDS}
+        # 连接 -> 维度 -> 订阅的取值
+        self._subs: Dict[WebSocket, Dict[str, Set[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def __contains__(self, websocket: WebSocket) -> bool:
+        return websocket in self._subs
+
+    def add(self, websocket: WebSocket) -> None:
+        """加入连接, 初始不限制任何维度"""
+        if websocket in self._subs:
+            return
+        self._subs[websocket] = {f: set() for f in TOPIC_FIELDS}
+        for field in TOPIC_FIELDS:
+            self._any[field].add(websocket)
+
+    def remove(self, websocket: WebSocket) -> None:
+        subs = self._subs.pop(websocket, None)
+        if subs is None:
+            return
+        for field, values in subs.items():
+            self._any[field].discard(websocket)
+            for value in values:
+                self._discard(field, value, websocket)
+
+    def subscribe(self, websocket: WebSocket, **topics: TopicValue) -> None:
+        """在指定维度上追加订阅取值"""
+        self.add(websocket)
+        subs = self._subs[websocket]
+        for field, values in normalize_topics(topics).items():
+            if not values:
+                continue
+            self._any[field].discard(websocket)
+            subs[field] |= values
+            for value in values:
+                self._index[field].setdefault(value, set()).add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, **topics: TopicValue) -> None:
+        """取消订阅取值, 未指定维度时清空全部订阅
+
+        某维度的取值全部取消后, 该维度恢复为接收全部。
+        """
+        subs = self._subs.get(websocket)
+        if subs is None:
+            return
+        topics = normalize_topics(topics)
+        if not topics:
+            topics = {f: set(v) for f, v in subs.items()}
+        for field, values in topics.items():
+            for value in values & subs[field]:
+                subs[field].discard(value)
+                self._discard(field, value, websocket)
+            if not subs[field]:
+                self._any[field].add(websocket)
+
+    def subscriptions(self, websocket: WebSocket) -> Dict[str, list]:
+        subs = self._subs.get(websocket, {})
+        return {f: sorted(v) for f, v in subs.items() if v}
+
+    def match(self, **topics: TopicValue) -> Set[WebSocket]:
+        """返回订阅匹配的连接
+
+        消息未携带的维度不参与过滤; 多个取值(如一条样本含多个指标)
+        只要命中其一即匹配。先取候选最少的维度, 再逐个检查其余维度,
+        代价与匹配的连接数成正比, 而不是与连接总数成正比。
+        """
+        topics = normalize_topics(topics)
+        if not topics:
+            return set(self._subs)
+
+        candidates = []
+        for field, values in topics.items():
+            sets = [self._any[field]]
+            sets.extend(self._index[field][v] for v in values if v in self._index[field])
+            candidates.append((sum(len(s) for s in sets), field, sets))
+        _, base_field, base_sets = min(candidates, key=lambda c: c[0])
+
+        result = set()
+        for sockets in base_sets:
+            for websocket in sockets:
+                subs = self._subs[websocket]
+                if all(
+                    not subs[field] or not subs[field].isdisjoint(values)
+                    for field, values in topics.items()
+                    if field != base_field
+                ):
+                    result.add(websocket)
+        return result
+
+    def _discard(self, field: str, value: str, websocket: WebSocket) -> None:
+        sockets = self._index[field].get(value)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self._index[field][value]
+
 class ConnectionManager:
     def __init__(self):
         # 所有连接
         self.active_connections: Set[WebSocket] = set()
-        # 按项目分组的连接
-        self.project_connections: Dict[str, Set[WebSocket]] = {}
-        # 按服务器分组的连接
-        self.server_connections: Dict[str, Set[WebSocket]] = {}
-    
+        # 订阅索引, 按项目/服务器/指标类型/日志来源路由消息
+        self.subscriptions = SubscriptionIndex()
+        # 发送队列, 指标消息按服务器合并
+        self.broadcaster = Broadcaster()
+        self.broadcaster.add_channel("default", DeliveryPolicy.COALESCE)
+
     async def connect(
         self,
         websocket: WebSocket,
@@ -23,19 +152,11 @@ class ConnectionManager:
         """建立连接"""
         await websocket.accept()
         self.active_connections.add(websocket)
-        
-        if project_id:
-            if project_id not in self.project_connections:
-                self.project_connections[project_id] = set()
-            self.project_connections[project_id].add(websocket)
-        
-        if server_id:
-            if server_id not in self.server_connections:
-                self.server_connections[server_id] = set()
-            self.server_connections[server_id].add(websocket)
-        
+        self.subscriptions.subscribe(websocket, project_id=project_id, server_id=server_id)
+        self.broadcaster.register("default", websocket)
+
         logger.info(f"New WebSocket connection: {websocket.client}")
-    
+
     async def disconnect(
         self,
         websocket: WebSocket,
@@ -43,49 +164,55 @@ class ConnectionManager:
         server_id: str = None
     ):
         """断开连接"""
-        self.active_connections.remove(websocket)
-        
-        if project_id and project_id in self.project_connections:
-            self.project_connections[project_id].remove(websocket)
-            if not self.project_connections[project_id]:
-                del self.project_connections[project_id]
-        
-        if server_id and server_id in self.server_connections:
-            self.server_connections[server_id].remove(websocket)
-            if not self.server_connections[server_id]:
-                del self.server_connections[server_id]
-        
+        self.active_connections.discard(websocket)
+        self.subscriptions.remove(websocket)
+        self.broadcaster.unregister(websocket)
+
         logger.info(f"WebSocket disconnected: {websocket.client}")
-    
+
+    async def handle_message(self, websocket: WebSocket, data: dict) -> Optional[dict]:
+        """处理客户端订阅消息
+
+        {"action": "subscribe", "server_id": ["s1"], "metric_type": "cpu_percent"}
+        {"action": "unsubscribe", "server_id": "s1"}  不带维度时清空订阅
+        返回当前订阅, 非订阅消息返回None
+        """
+        action = data.get("action")
+        if action not in ("subscribe", "unsubscribe"):
+            return None
+        topics = {f: data[f] for f in TOPIC_FIELDS if f in data}
+        if action == "subscribe":
+            self.subscriptions.subscribe(websocket, **topics)
+        else:
+            self.subscriptions.unsubscribe(websocket, **topics)
+        return {"type": "subscriptions", "data": self.subscriptions.subscriptions(websocket)}
+
+    async def publish(self, message: dict, key: Optional[str] = None, **topics: TopicValue) -> None:
+        """经广播总线发布消息, 各进程按本地订阅投递"""
+        topics = {f: sorted(v) for f, v in normalize_topics(topics).items()}
+        await ws_backplane.publish("manager", {"message": message, "key": key, "topics": topics})
+
+    async def deliver(self, payload: dict) -> int:
+        """投递总线上的消息到本进程匹配的连接, 返回投递的连接数"""
+        targets = self.subscriptions.match(**payload["topics"])
+        if not targets:
+            return 0
+        return self.broadcaster.publish(
+            "default", payload["message"], key=payload.get("key"), targets=targets
+        )
+
     async def broadcast(self, message: dict):
         """广播消息到所有连接"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Failed to send message: {e}")
-    
+        return await self.publish(message)
+
     async def broadcast_to_project(self, project_id: str, message: dict):
-        """广播消息到项目的所有连接"""
-        if project_id not in self.project_connections:
-            return
-        
-        for connection in self.project_connections[project_id]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Failed to send message to project {project_id}: {e}")
-    
+        """广播消息到订阅了该项目的连接"""
+        return await self.publish(message, project_id=project_id)
+
     async def broadcast_to_server(self, server_id: str, message: dict):
-        """广播消息到服务器的所有连接"""
-        if server_id not in self.server_connections:
-            return
-        
-        for connection in self.server_connections[server_id]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Failed to send message to server {server_id}: {e}")
+        """广播消息到订阅了该服务器的连接"""
+        return await self.publish(message, server_id=server_id)
 
 # 全局WebSocket连接管理器
-manager = ConnectionManager() 
\ No newline at end of file
+manager = ConnectionManager()
+ws_backplane.add_handler("manager", manager.deliver)
@@ -8,7 +8,12 @@ async def broadcast_alert(alert: dict):
         "data": alert,
         "timestamp": datetime.now().isoformat()
     }
-    await manager.broadcast_to_project(alert["project_id"], message)
+    await manager.publish(
+        message,
+        project_id=alert["project_id"],
+        server_id=alert.get("server_id"),
+        metric_type=alert.get("metric_type")
+    )
 
 async def broadcast_metrics(server_id: str, metrics: dict):
     """广播监控数据"""
@@ -17,7 +22,8 @@ async def broadcast_metrics(server_id: str, metrics: dict):
         "data": metrics,
         "timestamp": datetime.now().isoformat()
     }
-    await manager.broadcast_to_server(server_id, message)
+    # 样本包含的指标字段即其指标类型, 订阅了任一字段的连接都会收到
+    await manager.publish(message, key=server_id, server_id=server_id, metric_type=metrics.keys())
 
 async def broadcast_logs(server_id: str, logs: list):
     """广播日志数据"""
@@ -26,7 +32,8 @@ async def broadcast_logs(server_id: str, logs: list):
         "data": logs,
         "timestamp": datetime.now().isoformat()
     }
-    await manager.broadcast_to_server(server_id, message)
+    sources = {log["source"] for log in logs if log.get("source")}
+    await manager.publish(message, server_id=server_id, source=sources or None)
 
 async def broadcast_agent_status(server_id: str, status: dict):
     """广播Agent状态"""
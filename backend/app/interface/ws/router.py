@@ -1,7 +1,9 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from .manager import manager
 from ..api.v1.dependencies import get_current_user
+import logging
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.websocket("/ws")
@@ -10,7 +12,11 @@ async def websocket_endpoint(
     project_id: str = None,
     server_id: str = None
 ):
-    """WebSocket连接端点"""
+    """WebSocket连接端点
+    
+    连接后可发送订阅消息, 只接收匹配的项目/服务器/指标类型/日志来源:
+    {"action": "subscribe", "project_id": [...], "server_id": [...], "metric_type": [...], "source": [...]}
+    """
     try:
         # 建立连接
         await manager.connect(websocket, project_id, server_id)
@@ -19,13 +25,18 @@ async def websocket_endpoint(
             try:
                 # 接收消息
                 data = await websocket.receive_json()
-                # TODO: 处理接收到的消息
+                reply = await manager.handle_message(websocket, data)
+                if reply is not None:
+                    await websocket.send_json(reply)
             except WebSocketDisconnect:
                 # 断开连接
                 await manager.disconnect(websocket, project_id, server_id)
                 break
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "message": str(e)})
             except Exception as e:
                 logger.error(f"WebSocket error: {e}")
+                await manager.disconnect(websocket, project_id, server_id)
                 break
     except Exception as e:
         logger.error(f"Failed to establish WebSocket connection: {e}") 
\ No newline at end of file
@@ -15,6 +15,21 @@ from .infrastructure.tasks.monitor import MonitorTasks
 from .infrastructure.tasks.agent import AgentStatusChecker
 from .interface.api.v1.dependencies import get_agent_service
 from .infrastructure.tasks.agent_metrics import AgentMetricsAggregator
+from .infrastructure.ingest.agent_metrics import agent_metrics_ingest
+from .infrastructure.notification.sender import notification_dispatcher
+from .infrastructure.ingest.logs import log_writer
+from .infrastructure.ingest.log_metrics import log_metrics
+from .infrastructure.persistence.monitor import MetricValueRepositoryImpl
+from .infrastructure.tasks.logs import LogPartitionMaintainer
+from .infrastructure.tasks.alert import (
+    AlertCheckTask,
+    alert_stream,
+    create_alert_service,
+    metric_samples_loader,
+    server_projects_loader
+)
+from .infrastructure.persistence.database import SessionLocal
+from .interface.ws.backplane import ws_backplane
 from app.infrastructure.log.service import LogService
 from app.infrastructure.storage.executor import StoragePolicyExecutor
 from app.infrastructure.backup.executor import BackupExecutor
@@ -94,17 +109,44 @@ async def startup_event():
     checker = AgentStatusChecker(service)
     asyncio.create_task(checker.run())
     
+    # 启动指标写入缓冲
+    await agent_metrics_ingest.start(service.metrics_repo, service.metrics_cache)
+    
+    # 启动通知分发器
+    await notification_dispatcher.start()
+    
+    # 启动WebSocket跨进程广播总线
+    await ws_backplane.start()
+    
+    # 启动流式告警评估, 由Agent指标写入路径驱动; 批量检查定期兜底
+    alert_service = create_alert_service(service.agent_repo.db)
+    await alert_stream.start(alert_service, server_projects_loader(service.agent_repo.db))
+    alert_checker = AlertCheckTask(
+        alert_service,
+        server_projects_loader(service.agent_repo.db),
+        metric_samples_loader(service.agent_repo.db)
+    )
+    asyncio.create_task(alert_checker.run())
+    
     # 启动指标聚合任务
     aggregator = AgentMetricsAggregator(service)
     asyncio.create_task(aggregator.run())
     
-    # 启动日志服务
+    # 启动日志批量写入和日志服务
+    await log_writer.start(SessionLocal)
+    await log_metrics.start(MetricValueRepositoryImpl(service.metrics_repo.db), SessionLocal)
+    asyncio.create_task(LogPartitionMaintainer(SessionLocal).run())
     asyncio.create_task(start_log_service())
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    # 清理资源
-    pass 
+    # 清理资源, 写出缓冲中剩余的指标
+    await agent_metrics_ingest.stop()
+    await alert_stream.stop()
+    await notification_dispatcher.stop()
+    await ws_backplane.stop()
+    await log_writer.stop()
+    await log_metrics.stop()
 
 async def start_log_service():
     """启动日志服务"""
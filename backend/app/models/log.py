@@ -52,7 +52,35 @@ class Log(Base):
     message = Column(Text, nullable=False)
     parsed_fields = Column(JSON)
     metadata = Column(JSON)
+    template_id = Column(BigInteger)
     created_at = Column(DateTime, server_default=func.now())
 
     # 关联
-    source = relationship("LogSource", back_populates="logs") 
\ No newline at end of file
+    source = relationship("LogSource", back_populates="logs")
+
+class LogTemplate(Base):
+    __tablename__ = "log_templates"
+
+    id = Column(BigInteger, primary_key=True)
+    source_id = Column(Integer, ForeignKey("log_sources.id", ondelete="CASCADE"), index=True)
+    template = Column(Text, nullable=False)
+    sample = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now()) 
+
+class LogMetricRule(Base):
+    __tablename__ = "log_metric_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, unique=True)
+    source_id = Column(Integer, ForeignKey("log_sources.id", ondelete="CASCADE"))
+    metric_id = Column(String(36), nullable=False)
+    server_id = Column(String(36), nullable=False)
+    kind = Column(String(20), nullable=False)
+    filters = Column(JSON)
+    group_by = Column(JSON)
+    value_field = Column(String(50))
+    buckets = Column(JSON)
+    enabled = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,12 @@
+-- 每个Agent每小时只保留一条聚合记录, 使SQL侧汇总可按小时幂等重跑
+DELETE FROM agent_metrics_hourly a
+USING agent_metrics_hourly b
+WHERE a.agent_id = b.agent_id
+  AND a.hour = b.hour
+  AND (a.created_at, a.id) < (b.created_at, b.id);
+
+DROP INDEX IF EXISTS idx_agent_metrics_hourly_agent_id_hour;
+CREATE UNIQUE INDEX idx_agent_metrics_hourly_agent_id_hour ON agent_metrics_hourly(agent_id, hour);
+
+-- 汇总按时间范围扫描全部Agent的原始指标
+CREATE INDEX idx_agent_metrics_timestamp ON agent_metrics(timestamp);
@@ -0,0 +1,17 @@
+-- 日志搜索索引: 子串搜索走三元组索引, 分词搜索走全文索引, 字段过滤走jsonb包含索引
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- message ILIKE '%...%'
+CREATE INDEX idx_logs_message_trgm ON logs USING gin (message gin_trgm_ops);
+
+-- to_tsvector('simple', message) @@ websearch_to_tsquery('simple', ...)
+CREATE INDEX idx_logs_message_fts ON logs USING gin (to_tsvector('simple', message));
+
+-- parsed_fields @> '{"field": "value"}', jsonb_path_ops比默认操作符类更小、包含查询更快
+DROP INDEX IF EXISTS idx_logs_parsed_fields;
+CREATE INDEX idx_logs_parsed_fields ON logs USING gin (parsed_fields jsonb_path_ops);
+
+-- 按 (timestamp, id) 倒序的游标分页
+DROP INDEX IF EXISTS idx_logs_timestamp;
+CREATE INDEX idx_logs_timestamp_id ON logs (timestamp DESC, id DESC);
+CREATE INDEX idx_logs_source_timestamp_id ON logs (source_id, timestamp DESC, id DESC);
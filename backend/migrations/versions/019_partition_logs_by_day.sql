@@ -0,0 +1,63 @@
+-- 日志表按天分区: 查询带时间条件时只扫描相关分区, 保留策略直接删除过期分区
+
+-- 创建 [start_day, start_day + days) 范围内缺失的日分区, 返回新建分区数
+CREATE OR REPLACE FUNCTION ensure_log_partitions(start_day DATE, days INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..GREATEST(days, 1) - 1 LOOP
+        partition_day := start_day + i;
+        partition_name := 'logs_p' || to_char(partition_day, 'YYYYMMDD');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+                partition_name, partition_day, partition_day + 1
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 删除整天早于cutoff的分区, 返回删除分区的估算行数
+CREATE OR REPLACE FUNCTION drop_log_partitions_before(cutoff DATE)
+RETURNS BIGINT AS $$
+DECLARE
+    part RECORD;
+    dropped BIGINT := 0;
+BEGIN
+    FOR part IN
+        SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT AS rows
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'logs'::regclass
+          AND c.relname ~ '^logs_p\d{8}$'
+          AND to_date(substring(c.relname from 7), 'YYYYMMDD') + 1 <= cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', part.relname);
+        dropped := dropped + part.rows;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 把原有的整年分区拆分为日分区
+ALTER TABLE logs DETACH PARTITION logs_recent;
+
+SELECT ensure_log_partitions(
+    COALESCE((SELECT min(timestamp)::DATE FROM logs_recent), CURRENT_DATE),
+    GREATEST(
+        COALESCE((SELECT max(timestamp)::DATE FROM logs_recent), CURRENT_DATE)
+            - COALESCE((SELECT min(timestamp)::DATE FROM logs_recent), CURRENT_DATE) + 1,
+        1
+    )
+);
+-- 预建未来7天的分区, 之后由后台任务滚动创建
+SELECT ensure_log_partitions(CURRENT_DATE, 8);
+
+INSERT INTO logs SELECT * FROM logs_recent;
+DROP TABLE logs_recent;
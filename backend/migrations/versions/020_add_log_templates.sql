@@ -0,0 +1,17 @@
+-- 日志模板: 采集时由Drain模板挖掘为每行分配模板ID, 按模板聚合和下钻走索引
+CREATE TABLE IF NOT EXISTS log_templates (
+    id BIGINT PRIMARY KEY,
+    source_id INTEGER REFERENCES log_sources(id) ON DELETE CASCADE,
+    template TEXT NOT NULL,
+    sample TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_log_templates_source_id ON log_templates(source_id);
+
+-- 分区表上新增的列和索引会同步到所有日分区
+ALTER TABLE logs ADD COLUMN IF NOT EXISTS template_id BIGINT;
+
+-- 某时间段内的模板排行与按模板下钻
+CREATE INDEX IF NOT EXISTS idx_logs_template_timestamp ON logs (template_id, timestamp DESC, id DESC);
@@ -0,0 +1,16 @@
+-- 日志派生指标规则: 采集时把日志流折算为自定义指标写入custom_metric_values
+CREATE TABLE IF NOT EXISTS log_metric_rules (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE,
+    source_id INTEGER REFERENCES log_sources(id) ON DELETE CASCADE,  -- 为空时匹配所有日志源
+    metric_id VARCHAR(36) NOT NULL REFERENCES custom_metrics(id) ON DELETE CASCADE,
+    server_id VARCHAR(36) NOT NULL REFERENCES servers(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL,          -- counter/histogram
+    filters JSONB,                      -- 字段取值相等过滤, 如 {"level": "error"}
+    group_by JSONB,                     -- 作为标签的字段, 如 ["status"]
+    value_field VARCHAR(50),            -- 直方图取值字段, 如 request_time
+    buckets JSONB,                      -- 直方图分桶上界
+    enabled BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,6 @@
+-- Agent上报周期内高频采样的峰值与P95, 旧版本Agent不上报, 允许为空
+ALTER TABLE agent_metrics
+    ADD COLUMN cpu_percent_max FLOAT,
+    ADD COLUMN cpu_percent_p95 FLOAT,
+    ADD COLUMN memory_percent_max FLOAT,
+    ADD COLUMN memory_percent_p95 FLOAT;
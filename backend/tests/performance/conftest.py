@@ -0,0 +1,27 @@
+import time
+from pathlib import Path
+import pytest
+
+HERE = Path(__file__).parent
+
+def pytest_collection_modifyitems(config, items):
+    """未通过-m选择时跳过本目录下标记为slow的基准测试, 用 -m slow 运行"""
+    if config.option.markexpr:
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with -m slow")
+    for item in items:
+        if "slow" in item.keywords and HERE in item.path.parents:
+            item.add_marker(skip)
+
+@pytest.fixture
+def timed():
+    """计时执行fn, 返回 (结果, 耗时秒数)
+
+    测试数据在调用前生成, 只计入fn本身; 纯CPU负载可传clock=time.process_time,
+    不受同机其他进程影响。
+    """
+    def run(fn, *args, clock=time.perf_counter):
+        start = clock()
+        result = fn(*args)
+        return result, clock() - start
+    return run
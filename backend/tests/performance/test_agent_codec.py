@@ -0,0 +1,108 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.domain.agent.codec import (
+    AGENT_METRIC_FIELDS, CodecError, MetricDecoder, MetricEncoder, MetricSchema
+)
+
+FIELDS = ("cpu_percent", "memory_percent", "disk_usage", "network.bytes_recv", "network.bytes_sent")
+
+def _samples(count: int, seed: int = 0):
+    """模拟一个Agent每分钟的上报"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    network = {
+        "bytes_sent": rng.randrange(1 << 40), "bytes_recv": rng.randrange(1 << 40),
+        "packets_sent": rng.randrange(1 << 32), "packets_recv": rng.randrange(1 << 32),
+        "errin": 0, "errout": 0, "dropin": 12, "dropout": 0,
+    }
+    samples = []
+    for i in range(count):
+        network = dict(network)
+        network["bytes_sent"] += rng.randrange(50_000_000)
+        network["bytes_recv"] += rng.randrange(80_000_000)
+        network["packets_sent"] += rng.randrange(60_000)
+        network["packets_recv"] += rng.randrange(90_000)
+        cpu = round(rng.uniform(0, 80), 2)
+        memory = round(rng.uniform(30, 80), 2)
+        samples.append((start + timedelta(minutes=i), {
+            "cpu_percent": cpu,
+            "memory_percent": memory,
+            "disk_usage": 71.3,
+            "cpu_percent_min": round(cpu * 0.5, 1),
+            "cpu_percent_max": round(cpu + rng.uniform(0, 20), 1),
+            "cpu_percent_p95": round(cpu + rng.uniform(0, 10), 1),
+            "memory_percent_min": round(memory - 0.4, 2),
+            "memory_percent_max": round(memory + 0.8, 2),
+            "memory_percent_p95": round(memory + 0.5, 2),
+            "network": network,
+        }))
+    return samples
+
+def _json(ts, data) -> str:
+    return json.dumps({"type": "metrics", "timestamp": ts.isoformat(), "data": data})
+
+def test_codec_round_trip():
+    """测试单样本帧、多样本列式帧、关键帧与异常帧"""
+    schema = MetricSchema.from_dict(MetricSchema(AGENT_METRIC_FIELDS).to_dict())
+    encoder = MetricEncoder(schema, keyframe_interval=5)
+    decoder = MetricDecoder(schema)
+    samples = _samples(30)
+
+    decoded = []
+    for sample in samples[:10]:
+        decoded.extend(decoder.decode(encoder.encode([sample])))
+    decoded.extend(decoder.decode(encoder.encode(samples[10:])))
+    assert decoded == samples
+    fresh = MetricDecoder(schema)
+    row, = fresh.decode_rows(MetricEncoder(schema).encode(samples[-1:]))
+    ts, data = samples[-1]
+    assert fresh.reader(*FIELDS)(row) == (ts, data["cpu_percent"], data["memory_percent"], data["disk_usage"],
+                                    data["network"]["bytes_recv"], data["network"]["bytes_sent"])
+
+    # 没有关键帧的增量帧无法还原
+    fresh = MetricDecoder(schema)
+    with pytest.raises(CodecError):
+        fresh.decode(encoder.encode(samples[:1]))
+    with pytest.raises(CodecError):
+        decoder.decode(b"\x00" * 4)
+
+@pytest.mark.slow
+def test_codec_benchmark(timed):
+    """对比JSON与增量编码的字节数和服务端解码耗时"""
+    schema = MetricSchema(AGENT_METRIC_FIELDS)
+    agents = 1000
+    samples = _samples(60)
+    frames = []
+    for agent in range(agents):
+        encoder = MetricEncoder(schema)
+        frames.append([encoder.encode([s]) for s in samples])
+    texts = [_json(ts, data) for ts, data in samples]
+
+    json_bytes = sum(len(t) for t in texts) * agents
+    codec_bytes = sum(len(f) for agent_frames in frames for f in agent_frames)
+
+    # 服务端两条路径都只取入库需要的字段
+    def decode_json():
+        for _ in range(agents):
+            for text in texts:
+                message = json.loads(text)
+                data = message["data"]
+                (datetime.fromisoformat(message["timestamp"]), data["cpu_percent"], data["memory_percent"],
+                 data["disk_usage"], data["network"]["bytes_recv"], data["network"]["bytes_sent"])
+
+    def decode_frames():
+        for agent_frames in frames:
+            decoder = MetricDecoder(schema)
+            read = decoder.reader(*FIELDS)
+            for frame in agent_frames:
+                for row in decoder.decode_rows(frame):
+                    read(row)
+
+    _, json_elapsed = timed(decode_json, clock=time.process_time)
+    _, codec_elapsed = timed(decode_frames, clock=time.process_time)
+
+    assert json_bytes / codec_bytes > 8
+    assert codec_elapsed < json_elapsed
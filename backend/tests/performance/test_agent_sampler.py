@@ -0,0 +1,52 @@
+import random
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.agent.sampler import SampleRing, percentile
+
+FIELDS = ("cpu_percent", "memory_percent", "disk_usage")
+
+def test_ring_window_and_summary():
+    """测试环形缓冲覆盖、按时间取窗口与统计"""
+    ring = SampleRing(FIELDS, capacity=120)
+    start = datetime(2024, 1, 1)
+    for i in range(300):
+        # 每分钟第30秒出现一次持续1秒的尖峰
+        cpu = 95.0 if i % 60 == 30 else 10.0
+        ring.append(start + timedelta(seconds=i), (cpu, 50.0 + i % 2, 70.0))
+
+    assert len(ring) == 120
+    samples = ring.since()
+    assert samples[0][0] == start + timedelta(seconds=180)
+    assert samples[-1][0] == start + timedelta(seconds=299)
+
+    summary = ring.summarize(start + timedelta(seconds=240))
+    assert summary["cpu_percent"]["max"] == 95.0
+    assert summary["cpu_percent"]["p95"] == 10.0
+    assert summary["cpu_percent"]["avg"] == (59 * 10.0 + 95.0) / 60
+    assert summary["memory_percent"]["min"] == 50.0
+    assert ring.summarize(start + timedelta(hours=1)) == {}
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+
+@pytest.mark.slow
+def test_sampler_throughput(timed):
+    """测试一小时1秒样本缓冲下逐分钟汇总的开销"""
+    ring = SampleRing(FIELDS, capacity=3600)
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    minutes = 24 * 60
+    samples = [
+        [(start + timedelta(minutes=minute, seconds=second),
+          (rng.uniform(0, 100), rng.uniform(30, 90), 70.0)) for second in range(60)]
+        for minute in range(minutes)
+    ]
+
+    def run():
+        for minute, batch in enumerate(samples):
+            for ts, values in batch:
+                ring.append(ts, values)
+            ring.summarize(start + timedelta(minutes=minute))
+
+    _, elapsed = timed(run, clock=time.process_time)
+    assert len(ring) == 3600
+    assert elapsed / minutes < 0.01  # 每次上报前的汇总不超过10ms
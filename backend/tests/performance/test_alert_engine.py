@@ -0,0 +1,55 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from app.domain.alert.aggregate import AlertRule, AlertSeverity
+from app.domain.alert.engine import AlertRuleEngine, MetricWindows, compile_condition
+
+def _build_rules(count: int, projects: int, now: datetime):
+    conditions = ["value > 90", "avg > 50 and max > 95", "rate > 0.5", "40 < min <= 60"]
+    return [
+        AlertRule(
+            id=f"rule-{i}",
+            project_id=f"project-{i % projects}",
+            name=f"rule-{i}",
+            description="",
+            metric_type="cpu_percent" if i % 2 else "memory_percent",
+            condition=conditions[i % len(conditions)].replace("90", str(80 + i % 20)),
+            severity=AlertSeverity.WARNING,
+            interval=(300, 900, 3600)[i % 3],
+            enabled=True,
+            created_at=now,
+            updated_at=now
+        )
+        for i in range(count)
+    ]
+
+def test_compile_condition():
+    """测试条件编译与向量化求值"""
+    predicate = compile_condition("50 < value <= 90 or max > 99")
+    result = predicate({
+        "value": np.array([40.0, 60.0, 95.0]),
+        "max": np.array([100.0, 60.0, 95.0])
+    })
+    assert result.tolist() == [True, True, False]
+
+@pytest.mark.slow
+def test_alert_engine_throughput(timed):
+    """测试批量规则评估性能(10k规则 × 5k服务器)"""
+    now = datetime.now()
+    servers = [f"server-{i}" for i in range(5000)]
+    samples = 60
+    times = np.tile(now.timestamp() - np.arange(samples)[::-1] * 60.0, (len(servers), 1))
+
+    windows = MetricWindows(servers, now)
+    rng = np.random.default_rng(0)
+    for metric_type in ("cpu_percent", "memory_percent"):
+        windows.add_metric(metric_type, rng.random((len(servers), samples)) * 100, times)
+
+    server_projects = {s: f"project-{i % 100}" for i, s in enumerate(servers)}
+    rules = _build_rules(10000, 100, now)
+    engine = AlertRuleEngine()
+
+    result, elapsed = timed(engine.evaluate, rules, windows, server_projects)
+
+    assert result.fired
+    assert elapsed < 60  # 应在一个检查周期(60秒)内完成
@@ -0,0 +1,87 @@
+import time
+import pytest
+from app.domain.log.tail import LiveTailFilter, LiveTailSession
+
+LEVELS = ("info", "info", "info", "warning", "error")
+
+def _entries(count: int):
+    return [
+        {
+            "source_id": i % 4 + 1,
+            "timestamp": "2024-01-01T00:00:00",
+            "level": LEVELS[i % len(LEVELS)],
+            "message": f"GET /api/items/{i % 500} upstream timed out" if i % 10 == 0
+                       else f"GET /api/items/{i % 500} ok",
+            "parsed_fields": {"status": str(500 + i % 4 if i % 10 == 0 else 200), "path": "/api/items"},
+            "template_id": None,
+        }
+        for i in range(count)
+    ]
+
+def test_filter_compilation():
+    """测试过滤条件解析、编译和非法条件"""
+    tail_filter = LiveTailFilter.from_dict({
+        "source_id": [1, 3],
+        "level": "INFO",
+        "pattern": "timed out",
+        "fields": [{"field": "status", "op": "gte", "value": 502}],
+    })
+    matches = tail_filter.compile()
+    hits = [e for e in _entries(1000) if matches(e)]
+    assert hits
+    assert all(e["source_id"] in (1, 3) and e["level"] == "info" for e in hits)
+    assert all(int(e["parsed_fields"]["status"]) >= 502 for e in hits)
+
+    shorthand = LiveTailFilter.from_dict({"fields": {"status": "200"}}).compile()
+    assert sum(map(shorthand, _entries(100))) == 90
+
+    for bad in ({"pattern": "("}, {"fields": [{"field": "status", "op": "gt", "value": "x"}]},
+                {"fields": [{"field": "status", "op": "like"}]}, {"source_id": ["a"]},
+                # 嵌套量词会灾难性回溯
+                {"pattern": "(a+)+$"}, {"fields": [{"field": "path", "op": "regex", "value": "(\\w*)*x"}]}):
+        with pytest.raises(ValueError):
+            LiveTailFilter.from_dict(bad)
+
+def test_sampling_and_summary():
+    """测试超速时整批等间隔采样并汇总丢弃条数"""
+    session = LiveTailSession(LiveTailFilter(), max_rate=100, summary_interval=1.0)
+    entries = _entries(1000)
+    now = time.monotonic()
+
+    sent = session.offer(entries, now)
+    assert len(sent) == 100
+    # 抽样覆盖整批, 而不是只保留开头
+    assert sent[-1] is entries[990]
+    assert session.offer(entries, now) == []
+
+    # 半秒补充50条
+    assert len(session.offer(entries, now + 0.5)) == 50
+    summary = session.sampler.summary(now + 1.0)
+    assert summary["matched"] == 3000
+    assert summary["sent"] == 150
+    assert summary["dropped"] == 2850
+    assert sum(summary["dropped_by_level"].values()) == 2850
+    assert session.sampler.summary(now + 2.5) is None
+
+@pytest.mark.slow
+def test_live_tail_throughput(timed):
+    """测试百个跟踪连接逐批过滤的性能"""
+    entries = _entries(10_000)
+    sessions = [
+        LiveTailSession(LiveTailFilter.from_dict({
+            "source_id": i % 4 + 1,
+            "level": ["warning", "error"],
+            "pattern": "timed out" if i % 2 else None,
+        }), max_rate=200)
+        for i in range(100)
+    ]
+    rounds = 10
+
+    def run():
+        for _ in range(rounds):
+            for session in sessions:
+                session.offer(entries)
+
+    _, elapsed = timed(run)
+    evaluated = rounds * len(entries) * len(sessions)
+    assert evaluated / elapsed > 330_000  # 条目×过滤器/秒
@@ -0,0 +1,86 @@
+import os
+from datetime import date, datetime, timedelta
+import pytest
+from app.infrastructure.log.archive import ArchiveQuery, LogArchive, LogArchiveStore
+
+LEVELS = ("info", "info", "info", "warning", "error")
+
+def _rows(day: date, count: int, start_id: int = 0):
+    base = datetime(day.year, day.month, day.day)
+    step = 86400 * 1_000_000 // count
+    for i in range(count):
+        yield (
+            start_id + i,
+            i % 4 + 1,
+            base + timedelta(microseconds=i * step),
+            LEVELS[i % len(LEVELS)],
+            f"GET /api/items/{i % 500} HTTP/1.1 status={200 if i % 50 else 500} upstream=10.0.0.{i % 8}",
+            {"status": "500" if i % 50 == 0 else "200"},
+            {"host": "web-1"},
+            i % 20
+        )
+
+def test_archive_round_trip_and_block_skipping(tmp_path):
+    """测试归档读写、游标分页、块跳过和同日合并重写"""
+    store = LogArchiveStore(str(tmp_path), workers=2, block_rows=1000)
+    days = [date(2024, 1, d) for d in (1, 2, 3)]
+    for n, day in enumerate(days):
+        assert store.write_day(day, _rows(day, 10_000, start_id=n * 10_000)) == 10_000
+    assert store.days() == days
+
+    page = store.search(ArchiveQuery(levels=["error"], limit=50))
+    assert len(page) == 50
+    assert all(r["level"] == "error" for r in page)
+    assert page[0]["timestamp"].date() == days[-1]
+    keys = [(r["timestamp"], r["id"]) for r in page]
+    assert keys == sorted(keys, reverse=True)
+
+    # 游标之后的下一页紧接上一页, 不重复
+    following = store.search(ArchiveQuery(levels=["error"], cursor=keys[-1], limit=50))
+    assert (following[0]["timestamp"], following[0]["id"]) < keys[-1]
+
+    # 一小时的时间窗只需解压覆盖它的块
+    archive = LogArchive(store.path_for(days[1]))
+    window = ArchiveQuery(start_time=datetime(2024, 1, 2, 6), end_time=datetime(2024, 1, 2, 7))
+    assert len(archive.candidate_blocks(window)) <= 2
+    rows = store.search(ArchiveQuery(start_time=window.start_time, end_time=window.end_time,
+                                     search_text="status=500", limit=1000))
+    assert rows and all(window.start_time <= r["timestamp"] <= window.end_time for r in rows)
+    assert all(r["parsed_fields"] == {"status": "500"} for r in rows)
+
+    # 分区删除后又到达的迟到日志与已有归档合并
+    late = [(99_999, 1, datetime(2024, 1, 2, 12), "error", "late", None, None, None)]
+    store.write_day(days[1], late)
+    assert LogArchive(store.path_for(days[1])).rows == 10_001
+    assert store.search(ArchiveQuery(search_text="late", limit=10))[0]["id"] == 99_999
+
+    # 删除分区前中断后重新归档同一批行, 不产生重复
+    store.write_day(days[1], late)
+    assert LogArchive(store.path_for(days[1])).rows == 10_001
+
+    assert store.delete_before(days[1]) == 10_000
+    assert store.days() == days[1:]
+
+@pytest.mark.slow
+def test_archive_throughput(tmp_path, timed):
+    """测试归档写入、压缩率与全量扫描性能"""
+    store = LogArchiveStore(str(tmp_path), workers=4)
+    days = [date(2024, 2, d) for d in range(1, 5)]
+    per_day = 100_000
+
+    rows = {day: list(_rows(day, per_day, start_id=n * per_day)) for n, day in enumerate(days)}
+    total = per_day * len(days)
+
+    def write():
+        for day, day_rows in rows.items():
+            store.write_day(day, day_rows)
+
+    _, write_elapsed = timed(write)
+    raw = sum(len(str(r)) for r in rows[days[0]])
+    ratio = raw / os.path.getsize(store.path_for(days[0]))
+    found, scan_elapsed = timed(store.search, ArchiveQuery(search_text="no such text", limit=100))
+
+    assert found == []
+    assert ratio > 3
+    assert total / write_elapsed > 10_000  # 行/秒
+    assert total / scan_elapsed > 13_000  # 行/秒
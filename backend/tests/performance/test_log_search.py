@@ -0,0 +1,98 @@
+"""日志搜索索引基准测试
+
+需要PostgreSQL: 设置 LOG_SEARCH_BENCH_DSN 后运行, 默认生成5000万行
+(可用 LOG_SEARCH_BENCH_ROWS 调整)。数据写入独立schema, 索引直接执行
+018迁移脚本创建, 与线上结构一致。
+"""
+import json
+import os
+from pathlib import Path
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+DSN = os.environ.get("LOG_SEARCH_BENCH_DSN")
+ROWS = int(os.environ.get("LOG_SEARCH_BENCH_ROWS", 50_000_000))
+SCHEMA = "bench_log_search"
+MIGRATION = Path(__file__).parents[2] / "migrations" / "versions" / "018_add_log_search_indexes.sql"
+
+pytestmark = [pytest.mark.slow, pytest.mark.skipif(not DSN, reason="LOG_SEARCH_BENCH_DSN not set")]
+
+# 与CRUDLog.search生成的条件一致
+QUERIES = {
+    "substring": (
+        "message ILIKE %s",
+        ["%timeout upstream 4217%"]
+    ),
+    "fulltext": (
+        "to_tsvector('simple', message) @@ websearch_to_tsquery('simple', %s)",
+        ['"connection refused" host7311']
+    ),
+    "field_filter": (
+        "parsed_fields @> CAST(%s AS jsonb)",
+        [json.dumps({"status": "503", "upstream": "api-42"})]
+    ),
+    "keyset_page": (
+        "(timestamp, id) < (now() - interval '20 days', 9223372036854775807)",
+        []
+    ),
+}
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+        cur.execute(f"SET search_path TO {SCHEMA}, public")
+        cur.execute("SELECT to_regclass('logs')")
+        if cur.fetchone()[0] is None:
+            _populate(cur)
+    yield conn
+    conn.close()
+
+def _populate(cur):
+    cur.execute("""
+        CREATE TABLE logs (
+            id BIGSERIAL PRIMARY KEY,
+            source_id INTEGER,
+            timestamp TIMESTAMP NOT NULL,
+            level VARCHAR(20),
+            message TEXT NOT NULL,
+            parsed_fields JSONB,
+            metadata JSONB,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        INSERT INTO logs (source_id, timestamp, level, message, parsed_fields)
+        SELECT
+            i % 50,
+            now() - (i || ' seconds')::interval * (2592000.0 / %s),
+            (ARRAY['debug', 'info', 'warning', 'error'])[i % 4 + 1],
+            (ARRAY['connection refused', 'timeout upstream', 'request completed', 'cache miss'])[i % 4 + 1]
+                || ' ' || (i % 9973) || ' host' || (i % 10007),
+            jsonb_build_object('status', (ARRAY['200', '404', '500', '503'])[i % 4 + 1], 'upstream', 'api-' || (i % 97))
+        FROM generate_series(1, %s) AS i
+    """, (ROWS, ROWS))
+    cur.execute(MIGRATION.read_text())
+    cur.execute("ANALYZE logs")
+
+@pytest.mark.parametrize("name", list(QUERIES))
+def test_log_search_uses_index(conn, timed, name):
+    """测试各类搜索条件在大表上走索引并在1秒内返回一页"""
+    condition, params = QUERIES[name]
+    sql = f"SELECT id FROM logs WHERE {condition} ORDER BY timestamp DESC, id DESC LIMIT 100"
+    with conn.cursor() as cur:
+        cur.execute(f"SET search_path TO {SCHEMA}, public")
+        cur.execute("EXPLAIN " + sql, params)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+
+        def query():
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+        _, elapsed = timed(query)
+
+    assert "Seq Scan" not in plan, plan
+    assert elapsed < 1.0
@@ -0,0 +1,49 @@
+import random
+import pytest
+from app.domain.log.template import PARAM, TemplateMiner
+
+TEMPLATES = (
+    "Connection from 10.0.{a}.{b} closed after {ms}ms",
+    "user {user} logged in from 192.168.{a}.{b}",
+    "GET /api/v1/servers/{b} completed with status 200 in {ms}ms",
+    "disk /dev/sd{c}1 usage {pct}% exceeds threshold",
+    "worker {b} restarted after signal {a}",
+)
+USERS = ("alice", "bob", "carol", "dave")
+
+def _line(i: int) -> str:
+    return TEMPLATES[i % len(TEMPLATES)].format(
+        a=i % 256, b=i % 1000, ms=i % 997, pct=i % 100,
+        c="abcd"[i % 4], user=USERS[i % len(USERS)]
+    )
+
+def test_template_mining_and_reload():
+    """测试模板归类、参数提取与重启后沿用模板ID"""
+    miner = TemplateMiner(source_id=1)
+    results = miner.add_batch(_line(i) for i in range(1000))
+    connection, params = results[0]
+
+    assert connection.template == f"Connection from {PARAM} closed after {PARAM}"
+    assert params == ["10.0.0.0", "0ms"]
+    assert results[5][0] is connection
+    assert {t.id for t, _ in results} == set(miner.templates)
+    assert len(miner.pop_dirty()) == len(miner.templates)
+    assert miner.pop_dirty() == []
+
+    restarted = TemplateMiner(source_id=1)
+    restarted.load((t.id, t.template) for t in miner.templates.values())
+    assert restarted.add(_line(10))[0].id == connection.id
+    assert restarted.pop_dirty() == []
+
+@pytest.mark.slow
+def test_template_mining_throughput(timed):
+    """测试百万行日志的模板归类性能"""
+    total = 1_000_000
+    rng = random.Random(0)
+    lines = [_line(rng.randrange(1 << 30)) for _ in range(total)]
+    miner = TemplateMiner(source_id=1)
+
+    _, elapsed = timed(miner.add_batch, lines)
+
+    assert len(miner.templates) < 50
+    assert total / elapsed > 33_000  # 行/秒
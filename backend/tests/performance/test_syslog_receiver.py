@@ -0,0 +1,125 @@
+import asyncio
+import multiprocessing
+import socket
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from app.infrastructure.log.syslog import MAX_FRAME_SIZE, SyslogReceiver, SyslogTCPProtocol, parse_syslog_message
+
+RFC5424_LINE = (
+    '<{pri}>1 2024-10-10T13:55:{s:02d}.{us:06d}Z web{a} app {b} ID47 '
+    '[exampleSDID@32473 iut="3" eventSource="App\\]lication"] request {b} completed'
+)
+RFC3164_LINE = "<{pri}>Oct 10 13:55:{s:02d} web{a} sshd[{b}]: Accepted publickey for deploy"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _message(i: int) -> str:
+    line = RFC5424_LINE if i % 2 else RFC3164_LINE
+    return line.format(pri=8 + i % 8, s=i % 60, us=i % 1000000, a=i % 16, b=i % 30000)
+
+def _load_generator(port: int, total: int) -> None:
+    """负载生成进程: 按RFC 6587混合使用octet-counting与换行分帧发送"""
+    chunk = []
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        for i in range(total):
+            data = _message(i).encode()
+            chunk.append(b"%d %s" % (len(data), data) if i % 3 else data + b"\n")
+            if len(chunk) == 1000:
+                sock.sendall(b"".join(chunk))
+                chunk = []
+        sock.sendall(b"".join(chunk))
+
+def test_parse_rfc5424_and_rfc3164():
+    """测试两种头部格式的解析"""
+    modern = parse_syslog_message(_message(1))
+    assert modern["level"] == "critical"
+    assert modern["parsed_fields"]["hostname"] == "web1"
+    assert modern["parsed_fields"]["msgid"] == "ID47"
+    assert modern["parsed_fields"]["structured_data"].endswith('lication"]')
+    assert modern["message"] == "request 1 completed"
+    assert modern["timestamp"].microsecond == 1
+
+    legacy = parse_syslog_message(_message(4))
+    assert legacy["level"] == "warning"
+    assert legacy["parsed_fields"]["app_name"] == "sshd"
+    assert legacy["parsed_fields"]["procid"] == "4"
+    assert legacy["message"] == "Accepted publickey for deploy"
+    assert parse_syslog_message("no header") is None
+
+def test_tcp_framing_across_chunks():
+    """测试TCP分帧: 两种方式混用且帧被拆在多个数据块中"""
+    async def run():
+        receiver = SyslogReceiver(1, protocol="tcp", batch_size=1)
+        receiver._queue = asyncio.Queue()
+        protocol = SyslogTCPProtocol(receiver)
+        first, second = _message(1).encode(), _message(2).encode()
+        stream = b"%d %s" % (len(first), first) + second + b"\n"
+        for i in range(0, len(stream), 7):
+            protocol.data_received(stream[i:i + 7])
+        return [receiver._queue.get_nowait()[0] for _ in range(receiver._queue.qsize())]
+
+    entries = asyncio.run(run())
+    assert [e.parsed_fields["procid"] for e in entries] == ["1", "2"]
+
+def test_timestamps_are_naive_local_time():
+    """测试带时区的RFC 5424时间与RFC 3164时间一样转换为无时区的本地时间"""
+    utc = datetime(2024, 10, 10, 13, 55, tzinfo=timezone.utc)
+    local = utc.astimezone().replace(tzinfo=None)
+    for stamp in ("2024-10-10T13:55:00Z", "2024-10-10T21:55:00+08:00"):
+        parsed = parse_syslog_message(f"<14>1 {stamp} web1 app - - - hello")
+        assert parsed["timestamp"] == local
+    legacy = parse_syslog_message("<14>Oct 10 13:55:00 web1 app: hello")
+    assert legacy["timestamp"].tzinfo is None
+    assert (legacy["timestamp"].month, legacy["timestamp"].hour) == (10, 13)
+
+def test_oversized_octet_count_closes_connection():
+    """测试声明长度超过上限的帧不被缓冲, 交付此前的帧后断开连接"""
+    async def run():
+        receiver = SyslogReceiver(1, protocol="tcp", batch_size=1)
+        receiver._queue = asyncio.Queue()
+        protocol = SyslogTCPProtocol(receiver)
+        transport = SimpleNamespace(closed=False, get_extra_info=lambda name: ("127.0.0.1", 514))
+        transport.close = lambda: setattr(transport, "closed", True)
+        protocol.connection_made(transport)
+        first = _message(1).encode()
+        protocol.data_received(b"%d %s%d <14>" % (len(first), first, MAX_FRAME_SIZE + 1))
+        return transport, protocol, receiver._queue.qsize()
+
+    transport, protocol, queued = asyncio.run(run())
+    assert transport.closed
+    assert protocol.buffer == b""
+    assert queued == 1
+
+@pytest.mark.slow
+def test_syslog_tcp_throughput():
+    """测试单核接收20万条syslog消息的吞吐
+
+    负载生成在独立进程中, 吞吐按接收进程自身占用的CPU时间计算,
+    不受负载生成进程是否与之共用核心的影响。
+    """
+    total = 200_000
+    port = _free_port()
+
+    async def run():
+        receiver = SyslogReceiver(1, host="127.0.0.1", port=port, protocol="tcp")
+        await receiver.start()
+        generator = multiprocessing.Process(target=_load_generator, args=(port, total))
+        received = 0
+        start_cpu = time.process_time()
+        generator.start()
+        async for entries in receiver.batches():
+            received += len(entries)
+            if received >= total:
+                break
+        cpu = time.process_time() - start_cpu
+        receiver.close()
+        generator.join()
+        return cpu
+
+    cpu = asyncio.run(run())
+    assert total / cpu > 50_000  # 目标10万条/秒, 为CI机器留出余量
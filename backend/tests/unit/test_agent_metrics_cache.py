@@ -0,0 +1,129 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from app.domain.agent.metrics import AgentMetrics, AgentMetricsHourly
+from app.infrastructure.cache.agent_metrics import RAW_CODEC, AgentMetricsCache
+
+class FakeRedis:
+    """缓存用到的redis命令的内存实现"""
+
+    def __init__(self):
+        self.data = {}
+        self.scans = 0
+
+    async def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key.decode() if isinstance(key, bytes) else key, None)
+
+    async def smembers(self, key):
+        return {k.encode() for k in self.data.get(key, set())}
+
+    async def scan_iter(self, match):
+        self.scans += 1
+        for key in list(self.data):
+            yield key
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def setex(self, key, ttl, value):
+        self.ops.append(lambda: self.redis.data.__setitem__(key, value))
+
+    def sadd(self, key, member):
+        self.ops.append(lambda: self.redis.data.setdefault(key, set()).add(member))
+
+    def expire(self, key, ttl):
+        pass
+
+    async def execute(self):
+        for op in self.ops:
+            op()
+
+def _sample(ts: datetime, **fields) -> AgentMetrics:
+    return AgentMetrics(
+        id=str(uuid.uuid4()), agent_id="agent-1", timestamp=ts,
+        cpu_percent=1.5, memory_percent=2.5, disk_usage=3.5,
+        network_in=2 ** 40, network_out=0, created_at=ts, **fields
+    )
+
+def _hourly(agent_id: str, hour: datetime) -> AgentMetricsHourly:
+    return AgentMetricsHourly(
+        id=str(uuid.uuid4()), agent_id=agent_id, hour=hour,
+        cpu_percent_avg=1.0, cpu_percent_max=2.0, memory_percent_avg=1.0,
+        memory_percent_max=2.0, disk_usage_avg=1.0, disk_usage_max=2.0,
+        network_in_total=1, network_out_total=2, created_at=hour
+    )
+
+def test_codec_round_trip_keeps_microseconds():
+    """测试列式编码往返保留微秒精度与空值"""
+    samples = [
+        _sample(datetime(2024, 3, 1, 12, 0, 0, 999_999), cpu_percent_max=9.5),
+        _sample(datetime(2262, 4, 11, 23, 47, 16, 854_775)),
+        _sample(datetime(1901, 1, 1, 0, 0, 0, 1), memory_percent_p95=0.0),
+    ]
+    decoded = RAW_CODEC.decode(RAW_CODEC.encode(samples), AgentMetrics, agent_id="agent-1")
+    assert decoded == samples
+
+def test_range_assembled_from_cached_and_loaded_buckets():
+    """测试范围由缓存桶拼装, 只对缺失的连续桶回源, 未结束的桶不缓存"""
+    redis = FakeRedis()
+    cache = AgentMetricsCache(redis, raw_bucket_seconds=600, raw_lateness=0)
+    start = datetime(2024, 3, 1, 12)
+    samples = [_sample(start + timedelta(minutes=5 * i)) for i in range(12)]
+    calls = []
+
+    async def loader(agent_id, range_start, range_end):
+        calls.append((range_start, range_end))
+        return [s for s in samples if range_start <= s.timestamp <= range_end]
+
+    async def run():
+        end = start + timedelta(minutes=59)
+        first = await cache.get_raw_metrics("agent-1", start, end, loader)
+        assert first == samples
+        assert len(calls) == 1
+
+        # 中间一个桶失效, 再次查询只回源这一个桶
+        await cache.invalidate("agent-1", start + timedelta(minutes=20), start + timedelta(minutes=25))
+        second = await cache.get_raw_metrics("agent-1", start + timedelta(minutes=1), end, loader)
+        assert second == samples[1:]
+        assert calls[1] == (start + timedelta(minutes=20),
+                            start + timedelta(minutes=30) - timedelta(microseconds=1))
+        assert cache.get_stats()["raw"]["partial_hits"] == 1
+
+    asyncio.run(run())
+
+def test_invalidate_hourly_uses_bucket_key_set():
+    """测试小时聚合失效只删除记录在该桶集合中的key, 不扫描keyspace"""
+    redis = FakeRedis()
+    cache = AgentMetricsCache(redis, hourly_lateness=0)
+    day = datetime(2024, 3, 1)
+
+    async def loader(agent_id, range_start, range_end):
+        return [_hourly(agent_id, day + timedelta(hours=h)) for h in range(24)]
+
+    async def run():
+        for agent_id in ("agent-1", "agent-2"):
+            await cache.get_hourly_metrics(agent_id, day, day + timedelta(hours=23), loader)
+        bucket_keys = [k for k in redis.data if k.startswith(cache.hourly_prefix)]
+        assert len(bucket_keys) == 2
+        redis.data["unrelated"] = b"x"
+
+        await cache.invalidate_hourly(day + timedelta(hours=5))
+        assert list(redis.data) == ["unrelated"]
+        assert redis.scans == 0
+
+    asyncio.run(run())
@@ -0,0 +1,141 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from app.domain.agent.metrics import AgentMetrics
+from app.infrastructure.ingest import agent_metrics as ingest
+from app.infrastructure.ingest.agent_metrics import AgentMetricsIngestBuffer
+
+NOW = datetime(2024, 1, 1, 12)
+
+def _metrics(i: int) -> AgentMetrics:
+    return AgentMetrics(
+        id=str(i), agent_id="agent-1", timestamp=NOW + timedelta(seconds=i),
+        cpu_percent=float(i), memory_percent=0.0, disk_usage=0.0,
+        network_in=0, network_out=0, created_at=NOW
+    )
+
+class FakeRepo:
+    """按批记录写入, down为True时写入失败"""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+
+    async def save_metrics_batch(self, batch):
+        await asyncio.sleep(0)
+        if self.down:
+            raise ConnectionError("db down")
+        self.batches.append([m.id for m in batch])
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+def _buffer(tmp_path, **options) -> AgentMetricsIngestBuffer:
+    options.setdefault("batch_size", 10)
+    options.setdefault("flush_interval", 0.05)
+    return AgentMetricsIngestBuffer(spill_path=str(tmp_path / "spill.jsonl"), **options)
+
+async def _until(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+def test_flush_on_batch_size_and_interval(tmp_path):
+    """测试攒满批量立即写入, 不满时到刷新间隔写入"""
+    async def run():
+        repo = FakeRepo()
+        buffer = _buffer(tmp_path, flush_interval=10)
+        await buffer.start(repo)
+        for i in range(25):
+            await buffer.submit(_metrics(i))
+        await _until(lambda: len(repo.batches) == 2)
+        assert [len(b) for b in repo.batches] == [10, 10]
+        await buffer.stop()
+        assert repo.rows == [str(i) for i in range(25)]
+
+        repo = FakeRepo()
+        buffer = _buffer(tmp_path, flush_interval=0.05)
+        await buffer.start(repo)
+        for i in range(3):
+            await buffer.submit(_metrics(i))
+        await _until(lambda: repo.batches)
+        assert repo.batches == [["0", "1", "2"]]
+        await buffer.stop()
+
+    asyncio.run(run())
+
+def test_spill_and_replay(tmp_path):
+    """测试数据库不可用时批次落盘, 恢复后按顺序重放"""
+    async def run():
+        repo = FakeRepo()
+        repo.down = True
+        buffer = _buffer(tmp_path)
+        await buffer.start(repo)
+        for i in range(15):
+            await buffer.submit(_metrics(i))
+        await _until(lambda: buffer.stats.rows_spilled == 15)
+        assert os.path.getsize(buffer.spill_path) > 0
+
+        repo.down = False
+        await _until(lambda: buffer.stats.rows_replayed == 15)
+        assert repo.rows == [str(i) for i in range(15)]
+        assert buffer.get_stats()["spill_bytes"] == 0
+        await buffer.stop()
+
+    asyncio.run(run())
+
+def test_spill_failure_keeps_loop_running(tmp_path):
+    """测试溢出文件无法写入时丢弃批次并计数, 刷新循环继续运行"""
+    async def run():
+        blocker = tmp_path / "blocker"
+        blocker.write_text("")
+        repo = FakeRepo()
+        repo.down = True
+        # 溢出文件所在目录是一个普通文件, 无法创建
+        buffer = AgentMetricsIngestBuffer(
+            batch_size=5, flush_interval=0.05, spill_path=str(blocker / "spill.jsonl")
+        )
+        await buffer.start(repo)
+        for i in range(5):
+            await buffer.submit(_metrics(i))
+        await _until(lambda: buffer.stats.rows_dropped == 5)
+        assert buffer.running
+
+        repo.down = False
+        await buffer.submit(_metrics(5))
+        await _until(lambda: repo.rows == ["5"])
+        await buffer.stop()
+
+    asyncio.run(run())
+
+def test_stop_drains_collecting_and_queued(tmp_path):
+    """测试停止时写出正在收集的批次与队列中剩余的样本"""
+    async def run():
+        repo = FakeRepo()
+        buffer = _buffer(tmp_path, batch_size=100, flush_interval=10)
+        await buffer.start(repo)
+        for i in range(30):
+            await buffer.submit(_metrics(i))
+        await asyncio.sleep(0.01)
+        await buffer.stop()
+        assert repo.rows == [str(i) for i in range(30)]
+        assert not buffer.running
+
+    asyncio.run(run())
+
+def test_rows_per_second_uses_recent_window(monkeypatch):
+    """测试写入速率按最近的统计窗口计算, 而不是启动以来的平均"""
+    clock = [1000.0]
+    monkeypatch.setattr(ingest.time, "monotonic", lambda: clock[0])
+    stats = ingest.IngestStats(started_at=clock[0])
+
+    clock[0] += 10
+    stats.record_written(600)
+    assert stats.rows_per_second == 60.0
+
+    clock[0] += ingest.RATE_WINDOW * 10
+    stats.record_written(120)
+    assert stats.rows_per_second == 120 / ingest.RATE_WINDOW
+    assert stats.rows_written == 720
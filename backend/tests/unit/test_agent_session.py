@@ -0,0 +1,243 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+from app.agent import client as agent_client
+from app.agent.client import AgentClient, Backoff
+from app.domain.agent.codec import AGENT_METRIC_FIELDS, FRAME_SEQ, MetricEncoder, MetricSchema
+from app.interface.ws import agent as agent_ws
+
+START = datetime(2024, 1, 1, 12)
+
+def _report(i: int) -> dict:
+    return {
+        "cpu_percent": float(i), "memory_percent": 50.0, "disk_usage": 10.0,
+        "cpu_percent_max": float(i), "cpu_percent_p95": float(i),
+        "memory_percent_max": 50.0, "memory_percent_p95": 50.0,
+        "network": {"bytes_recv": 1000 * i, "bytes_sent": 10 * i},
+    }
+
+class Link:
+    """内存中的一条WebSocket连接, lose_acks为True时服务端发出的ack丢失"""
+
+    def __init__(self, query: dict):
+        self.to_server = asyncio.Queue()
+        self.to_client = asyncio.Queue()
+        self.query_params = query
+        self.lose_acks = False
+        self.closed = False
+
+    def drop(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.to_server.put_nowait(None)
+            self.to_client.put_nowait(None)
+
+    # Agent端, 接口与websockets的连接一致
+    async def send(self, message) -> None:
+        if self.closed:
+            raise ConnectionError("connection closed")
+        self.to_server.put_nowait(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.to_client.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self) -> None:
+        self.drop()
+
+class ServerSocket:
+    """服务端, 接口与starlette的WebSocket一致"""
+
+    def __init__(self, link: Link):
+        self.link = link
+        self.query_params = link.query_params
+
+    async def accept(self) -> None:
+        pass
+
+    async def receive(self) -> dict:
+        message = await self.link.to_server.get()
+        if message is None:
+            return {"type": "websocket.disconnect", "code": 1006}
+        key = "bytes" if isinstance(message, bytes) else "text"
+        return {"type": "websocket.receive", key: message}
+
+    async def send_json(self, data: dict) -> None:
+        if self.link.closed or (self.link.lose_acks and data["type"] == "ack"):
+            return
+        self.link.to_client.put_nowait(json.dumps(data))
+
+class Server:
+    """按连接启动agent_websocket_endpoint, 记录入库的样本"""
+
+    def __init__(self):
+        self.saved = []
+        self.links = []
+        self.tasks = []
+        self.lose_acks = False
+
+        async def get_by_id(agent_id):
+            return None
+
+        async def save_metrics(metrics):
+            self.saved.append(metrics)
+
+        async def update_heartbeat(agent_id):
+            pass
+
+        self.service = SimpleNamespace(
+            agent_repo=SimpleNamespace(get_by_id=get_by_id),
+            metrics_repo=SimpleNamespace(save_metrics=save_metrics),
+            update_heartbeat=update_heartbeat
+        )
+
+    def open(self, agent_id: str, query: dict) -> Link:
+        link = Link(query)
+        link.lose_acks = self.lose_acks
+        self.links.append(link)
+        self.tasks.append(asyncio.create_task(
+            agent_ws.agent_websocket_endpoint(ServerSocket(link), agent_id, self.service)
+        ))
+        return link
+
+    def connect(self, url: str):
+        parsed = urlparse(url)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        link = self.open(parsed.path.rsplit("/", 1)[-1], query)
+
+        class Connection:
+            async def __aenter__(self):
+                return link
+
+            async def __aexit__(self, *exc):
+                link.drop()
+        return Connection()
+
+    @property
+    def cpu(self):
+        return [m.cpu_percent for m in self.saved]
+
+async def _until(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+def _fresh_sessions(monkeypatch) -> None:
+    monkeypatch.setattr(agent_ws, "agent_sessions", agent_ws.AgentSessionStore(ttl=60, offline_grace=0))
+    monkeypatch.setattr(agent_ws, "ws_manager", agent_ws.AgentWebSocketManager())
+
+def test_resume_after_dropped_connection(monkeypatch):
+    """测试ack丢失后断线, 恢复会话时按服务端已接收的序号清理积压, 不重复入库"""
+    _fresh_sessions(monkeypatch)
+    server = Server()
+    monkeypatch.setattr(agent_client.websockets, "connect", server.connect)
+
+    async def run():
+        client = AgentClient(
+            "ws://server", "agent-1", heartbeat_interval=60, sample_interval=60,
+            report_interval=3600, backoff=Backoff(initial=0.01, maximum=0.02)
+        )
+        for i in range(1, 4):
+            client.backlog.append((i, START + timedelta(minutes=i), _report(i)))
+        client.seq = 3
+        server.lose_acks = True
+        task = asyncio.create_task(client.run())
+        await _until(lambda: len(server.saved) == 3)
+        assert client.acked_seq == 0
+        first_token = client.resume_token
+        server.lose_acks = False
+        server.links[0].drop()
+
+        # 重连后恢复会话, 服务端告知已接收到3
+        await _until(lambda: len(server.links) == 2 and client.acked_seq == 3)
+        assert server.links[1].query_params == {"resume": first_token}
+        assert not client.backlog
+
+        for i in range(4, 6):
+            client.backlog.append((i, START + timedelta(minutes=i), _report(i)))
+        client.seq = 5
+        client._pending.set()
+        await _until(lambda: client.acked_seq == 5)
+        assert server.cpu == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+        await client.stop()
+        task.cancel()
+        await asyncio.gather(task, *server.tasks, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+async def _handshake(link: Link, seq_frames: bool) -> None:
+    await link.send(json.dumps({
+        "type": "hello", "codecs": ["delta-v1"], "seq": 0, "seq_frames": seq_frames,
+        "schema": MetricSchema(AGENT_METRIC_FIELDS).to_dict()
+    }))
+
+async def _replies(link: Link, count: int) -> list:
+    return [json.loads(await asyncio.wait_for(link.to_client.get(), 1.0)) for _ in range(count)]
+
+def test_binary_frames_skip_already_received_seqs(monkeypatch):
+    """测试带序号的二进制帧中已接收的样本被跳过, ack为帧内最后的序号"""
+    _fresh_sessions(monkeypatch)
+    server = Server()
+    encoder = MetricEncoder(MetricSchema(AGENT_METRIC_FIELDS))
+    samples = [(START + timedelta(minutes=i), _report(i)) for i in range(1, 6)]
+
+    async def run():
+        link = server.open("agent-1", {})
+        await _handshake(link, seq_frames=True)
+        session, codec = await _replies(link, 2)
+        assert codec["seq_frames"] is True
+
+        await link.send(FRAME_SEQ.pack(1) + encoder.encode(samples[0:3]))
+        # 与上一帧重叠的重发
+        await link.send(FRAME_SEQ.pack(2) + encoder.encode(samples[1:5]))
+        acks = await _replies(link, 2)
+        assert [a["seq"] for a in acks] == [3, 5]
+        assert server.cpu == [1.0, 2.0, 3.0, 4.0, 5.0]
+        link.drop()
+        await asyncio.gather(*server.tasks)
+        await asyncio.sleep(0.01)  # 离线标记
+
+    asyncio.run(run())
+
+def test_unnumbered_frames_from_old_agents(monkeypatch):
+    """测试未协商seq_frames的旧Agent, 序号按帧内样本数顺延"""
+    _fresh_sessions(monkeypatch)
+    server = Server()
+    encoder = MetricEncoder(MetricSchema(AGENT_METRIC_FIELDS))
+    samples = [(START + timedelta(minutes=i), _report(i)) for i in range(1, 4)]
+
+    async def run():
+        link = server.open("agent-1", {})
+        await _handshake(link, seq_frames=False)
+        _, codec = await _replies(link, 2)
+        assert codec["seq_frames"] is False
+
+        await link.send(encoder.encode(samples[:2]))
+        await link.send(encoder.encode(samples[2:]))
+        assert [a["seq"] for a in await _replies(link, 2)] == [2, 3]
+        link.drop()
+        await asyncio.gather(*server.tasks)
+        await asyncio.sleep(0.01)  # 离线标记
+
+    asyncio.run(run())
+
+def test_backoff_jitter_and_reset(monkeypatch):
+    """测试退避上限按倍数增长且不超过maximum, 连接稳定后才重置"""
+    monkeypatch.setattr(agent_client.random, "uniform", lambda low, high: high)
+    backoff = Backoff(initial=1, maximum=10, multiplier=2, stable_after=30)
+    assert [backoff.next_delay() for _ in range(6)] == [1, 2, 4, 8, 10, 10]
+
+    backoff.connection_lasted(5)
+    assert backoff.next_delay() == 10
+    backoff.connection_lasted(30)
+    assert backoff.next_delay() == 1
@@ -0,0 +1,84 @@
+from datetime import datetime
+import pytest
+from app.domain.alert.aggregate import AlertEvent, AlertRule, AlertSeverity, AlertStatus
+from app.domain.alert.grouping import DIGEST_MAX_LINES, AlertGrouper, ChannelRateLimiter
+
+NOW = datetime(2024, 1, 1, 12)
+
+def _rule(rule_id: str, severity: AlertSeverity = AlertSeverity.WARNING) -> AlertRule:
+    return AlertRule(
+        id=rule_id, project_id="project-1", name=f"rule {rule_id}", description="",
+        metric_type="cpu_percent", condition="value > 90", severity=severity,
+        interval=60, enabled=True, created_at=NOW, updated_at=NOW
+    )
+
+def _event(rule: AlertRule, server_id: str, severity: AlertSeverity = None) -> AlertEvent:
+    return AlertEvent(
+        id=f"{rule.id}-{server_id}", rule_id=rule.id, server_id=server_id,
+        status=AlertStatus.FIRING, severity=severity or rule.severity,
+        summary=f"Alert: {rule.name}", details={"value": 95.0},
+        first_occurred_at=NOW, last_occurred_at=NOW, resolved_at=None,
+        notification_sent=False
+    )
+
+def test_groups_by_configured_labels():
+    """测试按配置的标签归组, 每组生成一条摘要"""
+    grouper = AlertGrouper(["rule"], window=30)
+    cpu, disk = _rule("cpu"), _rule("disk")
+    for i in range(DIGEST_MAX_LINES + 5):
+        grouper.add(_event(cpu, f"server-{i}"), cpu, now=0)
+    grouper.add(_event(disk, "server-1"), disk, now=0)
+    assert grouper.pending() == DIGEST_MAX_LINES + 6
+
+    digests = {d.group.labels["rule"]: d for d in grouper.flush(force=True)}
+    assert set(digests) == {"rule cpu", "rule disk"}
+    cpu_digest = digests["rule cpu"]
+    assert cpu_digest.params["count"] == DIGEST_MAX_LINES + 5
+    assert len(cpu_digest.params["servers"]) == DIGEST_MAX_LINES
+    assert "另有5条告警未列出" in cpu_digest.content
+    assert grouper.pending() == 0
+
+    with pytest.raises(ValueError):
+        AlertGrouper(["rack"], window=30)
+
+def test_group_severity_is_highest_in_group():
+    """测试不按级别分组时, 分组级别取组内最高的告警级别"""
+    grouper = AlertGrouper(["project"], window=30)
+    warning, critical = _rule("w", AlertSeverity.WARNING), _rule("c", AlertSeverity.CRITICAL)
+    grouper.add(_event(warning, "server-1"), warning, now=0)
+    grouper.add(_event(critical, "server-2"), critical, now=0)
+    grouper.add(_event(warning, "server-3", AlertSeverity.INFO), warning, now=0)
+
+    [digest] = grouper.flush(force=True)
+    assert digest.group.severity == AlertSeverity.CRITICAL
+    assert digest.params["severity"] == "critical"
+    assert digest.subject.startswith("[critical] 3条告警")
+
+def test_flush_waits_for_window():
+    """测试分组窗口从组内第一条告警开始计时, 结束后才取出"""
+    grouper = AlertGrouper(["rule"], window=30)
+    cpu, disk = _rule("cpu"), _rule("disk")
+    grouper.add(_event(cpu, "server-1"), cpu, now=100)
+    grouper.add(_event(disk, "server-1"), disk, now=120)
+    grouper.add(_event(cpu, "server-2"), cpu, now=125)
+
+    assert grouper.flush(now=129) == []
+    [digest] = grouper.flush(now=130)
+    assert digest.group.labels == {"rule": "rule cpu"}
+    assert digest.params["count"] == 2
+    assert grouper.pending() == 1
+    assert [d.group.labels["rule"] for d in grouper.flush(now=150)] == ["rule disk"]
+
+def test_rate_limiter_carries_suppressed_count():
+    """测试渠道每分钟超出上限的摘要被限流, 告警数附在下一条摘要上"""
+    limiter = ChannelRateLimiter(per_minute=2)
+    assert limiter.acquire("email", 3, now=0) == 0
+    assert limiter.acquire("email", 4, now=10) == 0
+    assert limiter.acquire("email", 5, now=20) is None
+    assert limiter.acquire("email", 6, now=30) is None
+    # 其他渠道不受影响
+    assert limiter.acquire("slack", 1, now=30) == 0
+
+    assert limiter.acquire("email", 1, now=60) == 11
+    assert limiter.acquire("email", 1, now=65) is None
+    assert limiter.acquire("email", 1, now=70) == 1
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app.domain.alert.aggregate import AlertRule, AlertSeverity
+from app.domain.alert.engine import MetricWindows
+from app.domain.alert.service import AlertService
+from app.domain.alert.streaming import AlertTransition
+
+NOW = datetime(2024, 1, 1, 12)
+
+def _rule() -> AlertRule:
+    return AlertRule(
+        id="rule-1",
+        project_id="project-1",
+        name="cpu",
+        description="",
+        metric_type="cpu_percent",
+        condition="value > 90",
+        severity=AlertSeverity.WARNING,
+        interval=300,
+        enabled=True,
+        created_at=NOW,
+        updated_at=NOW
+    )
+
+def _service(saved: list, dispatched: list, fail: list = None) -> AlertService:
+    async def save(event):
+        # 让出事件循环, 模拟写库期间另一条路径处理同一告警
+        await asyncio.sleep(0)
+        if fail:
+            raise fail.pop()
+        saved.append(event)
+
+    async def list_active():
+        return []
+
+    async def touch(ids, now):
+        pass
+
+    async def list_enabled():
+        return [_rule()]
+
+    async def get_channels_by_level(severity):
+        return [SimpleNamespace(id="channel-1")]
+
+    def dispatch(channel, message):
+        dispatched.append(message)
+        return True
+
+    return AlertService(
+        rule_repo=SimpleNamespace(list_enabled=list_enabled),
+        event_repo=SimpleNamespace(save=save, list_active=list_active, touch=touch),
+        channel_repo=SimpleNamespace(get_channels_by_level=get_channels_by_level),
+        monitor_service=None,
+        level_repo=None,
+        notification_sender=SimpleNamespace(dispatch=dispatch)
+    )
+
+def _windows() -> MetricWindows:
+    samples = [("server-1", "cpu_percent", NOW - timedelta(minutes=i), 95.0) for i in range(5)]
+    return MetricWindows.from_samples(samples, NOW)
+
+def test_concurrent_checks_create_one_event():
+    """测试批量检查与流式评估并发触发同一告警时只创建一个事件"""
+    saved, dispatched = [], []
+    service = _service(saved, dispatched)
+    transition = AlertTransition(rule=_rule(), server_id="server-1", firing=True, details={})
+
+    async def run():
+        await asyncio.gather(
+            service.check_alerts(_windows(), {"server-1": "project-1"}),
+            service.apply_transition(transition)
+        )
+
+    asyncio.run(run())
+    created = {event.id for event in saved}
+    assert len(created) == 1
+    assert len(dispatched) == 1
+    assert service.rule_engine.index.get("rule-1", "server-1").id in created
+
+def test_failed_save_releases_index():
+    """测试新告警写库失败后释放索引, 下一次检查重新创建"""
+    saved, dispatched = [], []
+    service = _service(saved, dispatched, fail=[RuntimeError("db down")])
+    transition = AlertTransition(rule=_rule(), server_id="server-1", firing=True, details={})
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.apply_transition(transition))
+    assert service.rule_engine.index.get("rule-1", "server-1") is None
+
+    asyncio.run(service.apply_transition(transition))
+    assert len(saved) == 1
+    assert len(dispatched) == 1
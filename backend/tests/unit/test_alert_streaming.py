@@ -0,0 +1,150 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from app.domain.agent.metrics import AgentMetrics
+from app.domain.alert.aggregate import AlertEvent, AlertRule, AlertSeverity, AlertStatus
+from app.domain.alert.engine import ActiveAlertIndex
+from app.domain.alert.streaming import SlidingWindow, StreamingAlertEvaluator
+
+NOW = datetime(2024, 1, 1, 12)
+
+def _rule(condition: str, interval: int = 60) -> AlertRule:
+    return AlertRule(
+        id="rule-1",
+        project_id="project-1",
+        name="cpu",
+        description="",
+        metric_type="cpu_percent",
+        condition=condition,
+        severity=AlertSeverity.WARNING,
+        interval=interval,
+        enabled=True,
+        created_at=NOW,
+        updated_at=NOW
+    )
+
+def test_sliding_window_matches_recomputation():
+    """测试滑动窗口的增量聚合与逐窗口重算一致"""
+    rng = random.Random(0)
+    window = SlidingWindow(30)
+    samples = []
+    for i in range(500):
+        ts, value = float(i * 2), rng.uniform(0, 100)
+        window.add(ts, value)
+        samples.append((ts, value))
+        inside = [v for t, v in samples if t >= ts - 30]
+        cols = window.columns()
+        assert cols["count"] == len(inside)
+        assert abs(cols["sum"] - sum(inside)) < 1e-6
+        assert cols["max"] == max(inside)
+        assert cols["min"] == min(inside)
+        assert cols["value"] == value
+
+    # 乱序样本被忽略
+    assert window.add(0.0, 1000.0) is False
+    assert window.columns()["max"] < 1000
+
+def _event(event_id: str = "event-1") -> AlertEvent:
+    return AlertEvent(
+        id=event_id, rule_id="rule-1", server_id="server-1", status=AlertStatus.FIRING,
+        severity=AlertSeverity.WARNING, summary="cpu", details={}, first_occurred_at=NOW,
+        last_occurred_at=NOW, resolved_at=None, notification_sent=False
+    )
+
+def test_transition_commit_and_abort():
+    """测试未确认的状态变化不重复产生, abort后由下一个样本重新产生"""
+    index = ActiveAlertIndex()
+    evaluator = StreamingAlertEvaluator(index)
+    evaluator.sync([_rule("value > 90")], {"server-1": "project-1"})
+
+    first = evaluator.observe("server-1", "cpu_percent", NOW, 95.0)
+    assert len(first) == 1 and first[0].firing
+    # 尚未确认时不重复产生
+    assert evaluator.observe("server-1", "cpu_percent", NOW + timedelta(seconds=1), 96.0) == []
+
+    evaluator.abort(first[0])
+    retry = evaluator.observe("server-1", "cpu_percent", NOW + timedelta(seconds=2), 97.0)
+    assert len(retry) == 1 and retry[0].firing
+
+    # 告警服务写库后更新索引
+    index.add(_event())
+    evaluator.commit(retry[0])
+    assert evaluator.observe("server-1", "cpu_percent", NOW + timedelta(seconds=3), 98.0) == []
+    resolved = evaluator.observe("server-1", "cpu_percent", NOW + timedelta(seconds=4), 10.0)
+    assert len(resolved) == 1 and not resolved[0].firing
+
+def test_state_follows_shared_index():
+    """测试批量检查触发或恢复告警后, 流式评估按共享索引的状态判断"""
+    index = ActiveAlertIndex()
+    evaluator = StreamingAlertEvaluator(index)
+    evaluator.sync([_rule("value > 90")], {"server-1": "project-1"})
+
+    # 批量检查先触发了告警, 流式评估不再重复触发
+    index.add(_event())
+    assert evaluator.observe("server-1", "cpu_percent", NOW, 95.0) == []
+
+    # 批量检查恢复了告警, 下一个越过阈值的样本重新触发
+    index.pop("rule-1", "server-1")
+    fired = evaluator.observe("server-1", "cpu_percent", NOW + timedelta(seconds=1), 96.0)
+    assert len(fired) == 1 and fired[0].firing
+
+def test_stream_task_retries_failed_transition():
+    """测试写库失败的状态变化在下一个样本重新写入"""
+    from app.infrastructure.tasks.alert import AlertStreamTask
+
+    applied = []
+    failures = [RuntimeError("db down")]
+    index = ActiveAlertIndex()
+
+    async def apply_transition(transition):
+        if failures:
+            raise failures.pop()
+        applied.append(transition.firing)
+        # 与AlertService一致, 写库后更新共享的活动告警索引
+        if transition.firing:
+            index.add(_event())
+        else:
+            index.pop(transition.rule.id, transition.server_id)
+
+    async def list_active():
+        return []
+
+    async def list_enabled():
+        return [_rule("value > 90")]
+
+    async def load_server_projects():
+        return {"server-1": "project-1"}
+
+    service = SimpleNamespace(
+        rule_engine=SimpleNamespace(index=index),
+        event_repo=SimpleNamespace(list_active=list_active),
+        rule_repo=SimpleNamespace(list_enabled=list_enabled),
+        apply_transition=apply_transition,
+        alert_grouper=None
+    )
+
+    def metrics(offset: int, cpu: float) -> AgentMetrics:
+        return AgentMetrics(
+            id=str(offset), agent_id="agent-1", timestamp=NOW + timedelta(seconds=offset),
+            cpu_percent=cpu, memory_percent=0.0, disk_usage=0.0,
+            network_in=0, network_out=0, created_at=NOW
+        )
+
+    async def run():
+        task = AlertStreamTask()
+        await task.start(service, load_server_projects)
+        try:
+            task.feed("server-1", metrics(0, 95.0))
+            await asyncio.sleep(0.01)
+            assert applied == []
+            task.feed("server-1", metrics(1, 95.0))
+            await asyncio.sleep(0.01)
+            assert applied == [True]
+            task.feed("server-1", metrics(2, 95.0))
+            await asyncio.sleep(0.01)
+            assert applied == [True]
+        finally:
+            await task.stop()
+
+    asyncio.run(run())
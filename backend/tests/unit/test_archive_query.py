@@ -0,0 +1,43 @@
+import os
+from datetime import date, datetime
+from app.infrastructure.log.archive import ArchiveQuery, LogArchiveStore
+
+def _matches(search_text: str, message: str) -> bool:
+    row = {"message": message}
+    return ArchiveQuery(search_text=search_text, search_mode="fulltext").row_filter()(row)
+
+def test_fulltext_matches_whole_words():
+    """测试全文模式按单词整体匹配, 不把单词的一部分当作命中"""
+    assert _matches("error", "Connection ERROR: reset")
+    assert not _matches("err", "Connection ERROR: reset")
+    assert not _matches("error", "errors=0")
+    assert _matches("status=500", "GET /api status=500")
+    assert not _matches("status=500", "GET /api status=200 code=500")
+
+def test_fulltext_or_phrase_and_exclude():
+    """测试or分组、短语相邻与-排除"""
+    assert _matches("timeout or refused", "connection refused")
+    assert _matches("disk full or timeout", "disk is full")
+    assert not _matches("disk full or timeout", "disk ok")
+    assert _matches('"connection reset"', "peer: connection reset by peer")
+    assert not _matches('"connection reset"', "reset connection")
+    assert _matches("error -retry", "fatal error")
+    assert not _matches("error -retry", "error, will retry")
+    assert not _matches('"" -', "anything")
+
+def test_delete_before_skips_undeletable_files(tmp_path, monkeypatch):
+    """测试删除失败的归档留到下次清理, 不计入删除行数也不中断其余文件"""
+    store = LogArchiveStore(str(tmp_path))
+    days = [date(2024, 1, d) for d in (1, 2, 3)]
+    for i, day in enumerate(days):
+        store.write_day(day, [(i, 1, datetime(2024, 1, day.day), "info", "m", None, None, None)])
+
+    remove = os.remove
+    def flaky_remove(path):
+        if path == store.path_for(days[0]):
+            raise PermissionError("read-only")
+        remove(path)
+    monkeypatch.setattr(os, "remove", flaky_remove)
+
+    assert store.delete_before(days[2]) == 1
+    assert store.days() == [days[0], days[2]]
@@ -0,0 +1,72 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+import pytest
+from app.crud.log import CRUDLog
+from app.interface.api.v1.schemas.log import LogEntry
+
+class CheckViolation(Exception):
+    pgcode = "23514"
+
+class FakeSession:
+    """只识别ensure_log_partitions调用和日志INSERT, missing中的日期没有分区"""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.bind = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+        self.ensured = []
+        self.inserted = []
+        self.rollbacks = 0
+
+    def connection(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql", driver="asyncpg"))
+
+    def execute(self, statement, params):
+        if "ensure_log_partitions" in str(statement):
+            self.ensured.append(params["start"])
+            self.missing -= {params["start"]}
+            return SimpleNamespace(scalar=lambda: 1)
+        days = {row["timestamp"].date() for row in params}
+        if days & self.missing:
+            raise CheckViolation('no partition of relation "logs" found for row')
+        self.inserted.extend(params)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+def _entries(day: date, count: int = 2):
+    return [
+        LogEntry(source_id=1, timestamp=datetime(day.year, day.month, day.day, 12),
+                 level="info", message=f"m{i}")
+        for i in range(count)
+    ]
+
+def test_dropped_partition_recreated_and_retried():
+    """测试缓存记为存在的分区被其他进程删除后, 重新建分区并重试一次"""
+    day = date(2024, 1, 1)
+    crud = CRUDLog()
+    db = FakeSession()
+    assert crud.create_many(db, objs_in=_entries(day)) == 2
+    assert db.ensured == [day]
+
+    # 另一个worker删除了该分区, 本进程的缓存仍认为存在
+    db.missing.add(day)
+    assert crud.create_many(db, objs_in=_entries(day)) == 2
+    assert db.ensured == [day, day]
+    assert db.rollbacks == 1
+    assert len(db.inserted) == 4
+
+def test_other_errors_not_retried():
+    """测试其他写入错误直接抛出, 不重建分区"""
+    crud = CRUDLog()
+    db = FakeSession()
+    crud.create_many(db, objs_in=_entries(date(2024, 1, 1)))
+
+    def fail(statement, params):
+        raise ValueError("bad row")
+    db.execute = fail
+    with pytest.raises(ValueError):
+        crud.create_many(db, objs_in=_entries(date(2024, 1, 1)))
+    assert db.rollbacks == 1
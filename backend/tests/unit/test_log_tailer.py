@@ -0,0 +1,81 @@
+import os
+from app.infrastructure.log.tailer import FileTailer
+
+def _tailer(tmp_path, **options) -> FileTailer:
+    return FileTailer(
+        [str(tmp_path / "app.log")],
+        checkpoint_path=str(tmp_path / "checkpoint.json"),
+        start_at_end=False,
+        use_inotify=False,
+        checkpoint_interval=0,
+        **options
+    )
+
+def _poll(tailer: FileTailer) -> list:
+    lines = [line for _, batch in tailer.poll() for line in batch]
+    tailer.commit()
+    return lines
+
+def _append(path, text: str) -> None:
+    with open(path, "a") as f:
+        f.write(text)
+
+def test_rotation_reads_old_file_until_grace(tmp_path):
+    """测试改名轮转后旧文件在宽限期内继续读取, 残片不提前作为整行"""
+    log = tmp_path / "app.log"
+    _append(log, "a\nb\npar")
+    tailer = _tailer(tmp_path, rotate_grace=60)
+    tailer.open_files()
+    assert _poll(tailer) == ["a", "b"]
+
+    os.rename(log, tmp_path / "app.log.1")
+    _append(log, "x\n")
+    _append(tmp_path / "app.log.1", "tial")
+    assert _poll(tailer) == ["x"]
+
+    _append(tmp_path / "app.log.1", "\nc\nta")
+    assert _poll(tailer) == ["partial", "c"]
+
+    # 宽限期过后残片作为最后一行, 旧文件关闭
+    tailer.rotate_grace = 0
+    assert _poll(tailer) == ["ta"]
+    assert tailer.rotated == []
+    tailer.close()
+
+def test_truncation_restarts_from_beginning(tmp_path):
+    """测试copytruncate截断后从头读取"""
+    log = tmp_path / "app.log"
+    _append(log, "one\ntwo\n")
+    tailer = _tailer(tmp_path)
+    tailer.open_files()
+    assert _poll(tailer) == ["one", "two"]
+
+    with open(log, "w") as f:
+        f.write("new\n")
+    assert _poll(tailer) == ["new"]
+    tailer.close()
+
+def test_restart_resumes_from_checkpoint(tmp_path):
+    """测试重启后从确认的位置继续, 停机期间的轮转先补读旧文件"""
+    log = tmp_path / "app.log"
+    _append(log, "1\n2\n")
+    tailer = _tailer(tmp_path)
+    tailer.open_files()
+    assert _poll(tailer) == ["1", "2"]
+    _append(log, "3\n")
+    # 读取但未确认, 重启后重新读取
+    assert [line for _, batch in tailer.poll() for line in batch] == ["3"]
+    tailer.close()
+
+    tailer = _tailer(tmp_path)
+    tailer.open_files()
+    assert _poll(tailer) == ["3"]
+    tailer.close()
+
+    _append(log, "4\n")
+    os.rename(log, tmp_path / "app.log.1")
+    _append(log, "5\n")
+    tailer = _tailer(tmp_path)
+    tailer.open_files()
+    assert _poll(tailer) == ["4", "5"]
+    tailer.close()
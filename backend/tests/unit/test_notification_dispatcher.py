@@ -0,0 +1,180 @@
+import asyncio
+from datetime import datetime
+from app.domain.alert.aggregate import NotificationChannel, NotificationType
+from app.infrastructure.config import settings
+from app.infrastructure.notification.sender import NotificationDispatcher, NotificationSender
+
+NOW = datetime(2024, 1, 1)
+
+def _channel(channel_id: str, **config) -> NotificationChannel:
+    return NotificationChannel(
+        id=channel_id,
+        name=channel_id,
+        type=NotificationType.WEBHOOK,
+        config=config,
+        enabled=True,
+        created_at=NOW,
+        updated_at=NOW
+    )
+
+class FakeSender(NotificationSender):
+    """按渠道阻塞或失败的发送器, 记录各渠道的最大并发"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.gates = {}
+        self.active = {}
+        self.peak = {}
+        self.sent = []
+        self.closed = False
+
+    async def send(self, channel, message) -> bool:
+        self.active[channel.id] = self.active.get(channel.id, 0) + 1
+        self.peak[channel.id] = max(self.peak.get(channel.id, 0), self.active[channel.id])
+        try:
+            gate = self.gates.get(channel.id)
+            if gate:
+                await gate.wait()
+            await asyncio.sleep(0)
+            if self.failures:
+                self.failures -= 1
+                return False
+            self.sent.append((channel.id, message))
+            return True
+        finally:
+            self.active[channel.id] -= 1
+
+    async def close(self) -> None:
+        self.closed = True
+
+async def _until(predicate, timeout: float = 1.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.001)
+
+def test_slow_channel_does_not_starve_others():
+    """测试慢渠道占满并发上限时, 其他渠道照常发送"""
+    async def run():
+        sender = FakeSender()
+        sender.gates["slow"] = asyncio.Event()
+        dispatcher = NotificationDispatcher(sender, workers=2, channel_concurrency=1, max_retries=0)
+        await dispatcher.start()
+        slow, fast = _channel("slow"), _channel("fast")
+        for i in range(5):
+            assert dispatcher.dispatch(slow, {"n": i})
+        await asyncio.sleep(0.01)
+        assert await asyncio.wait_for(dispatcher.send(fast, {"n": 0}), 1.0)
+
+        sender.gates["slow"].set()
+        await _until(lambda: len(sender.sent) == 6)
+        assert sender.peak["slow"] == 1
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+def test_channel_limit_follows_config():
+    """测试渠道并发上限取自最新的渠道配置"""
+    async def run():
+        sender = FakeSender()
+        sender.gates["c"] = asyncio.Event()
+        dispatcher = NotificationDispatcher(sender, workers=4, channel_concurrency=1, max_retries=0)
+        await dispatcher.start()
+        for i in range(3):
+            dispatcher.dispatch(_channel("c"), {"n": i})
+        await asyncio.sleep(0.01)
+        assert sender.active["c"] == 1
+
+        for i in range(3):
+            dispatcher.dispatch(_channel("c", max_concurrency=3), {"n": i})
+        await asyncio.sleep(0.01)
+        assert sender.active["c"] == 3
+
+        sender.gates["c"].set()
+        await _until(lambda: len(sender.sent) == 6)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+def test_retry_with_backoff(monkeypatch):
+    """测试失败后退避重试, 超过重试次数后以失败结束"""
+    monkeypatch.setattr(settings, "NOTIFICATION_RETRY_BACKOFF", 0.001)
+    monkeypatch.setattr(settings, "NOTIFICATION_RETRY_BACKOFF_MAX", 0.004)
+
+    async def run():
+        sender = FakeSender(failures=2)
+        dispatcher = NotificationDispatcher(sender, workers=1, max_retries=2)
+        await dispatcher.start()
+        assert await dispatcher.send(_channel("c"), {"n": 0})
+        assert dispatcher.get_stats()["c"]["retried"] == 2
+
+        sender.failures = 3
+        assert not await dispatcher.send(_channel("c"), {"n": 1})
+        stats = dispatcher.get_stats()["c"]
+        assert (stats["sent"], stats["failed"], stats["pending"]) == (1, 1, 0)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    dispatcher = NotificationDispatcher(FakeSender())
+    assert all(0 <= dispatcher._backoff(attempt) <= 0.004 for attempt in range(10))
+
+def test_queue_capacity():
+    """测试未完成的通知达到容量后拒绝新通知"""
+    async def run():
+        sender = FakeSender()
+        sender.gates["c"] = asyncio.Event()
+        dispatcher = NotificationDispatcher(sender, workers=1, queue_size=2, max_retries=0)
+        await dispatcher.start()
+        assert dispatcher.dispatch(_channel("c"), {"n": 0})
+        assert dispatcher.dispatch(_channel("c"), {"n": 1})
+        assert not dispatcher.dispatch(_channel("c"), {"n": 2})
+        sender.gates["c"].set()
+        await dispatcher.stop()
+        assert len(sender.sent) == 2
+
+    asyncio.run(run())
+
+def test_stop_drains_queue():
+    """测试停止时先发送完已入队的通知, 之后拒绝新通知"""
+    async def run():
+        sender = FakeSender()
+        dispatcher = NotificationDispatcher(sender, workers=1, channel_concurrency=1, max_retries=0)
+        await dispatcher.start()
+        for i in range(5):
+            dispatcher.dispatch(_channel("c"), {"n": i})
+
+        await dispatcher.stop()
+        assert [m["n"] for _, m in sender.sent] == [0, 1, 2, 3, 4]
+        assert sender.closed
+        assert not dispatcher.dispatch(_channel("c"), {"n": 5})
+
+    asyncio.run(run())
+
+def test_stop_fails_waiting_retry(monkeypatch):
+    """测试停止时取消退避中的重试, 等待结果的调用方得到失败"""
+    monkeypatch.setattr(settings, "NOTIFICATION_RETRY_BACKOFF", 10.0)
+    monkeypatch.setattr(settings, "NOTIFICATION_RETRY_BACKOFF_MAX", 10.0)
+
+    async def run():
+        sender = FakeSender(failures=1)
+        dispatcher = NotificationDispatcher(sender, workers=1, max_retries=3)
+        await dispatcher.start()
+        pending = asyncio.ensure_future(dispatcher.send(_channel("c"), {"n": 0}))
+        await _until(lambda: dispatcher.get_stats().get("c", {}).get("retried") == 1)
+        await asyncio.wait_for(dispatcher.stop(), 1.0)
+        assert await pending is False
+
+    asyncio.run(run())
+
+def test_dispatch_before_start_keeps_task():
+    """测试未启动时直接发送的后台任务被持有, 停止时等待其完成"""
+    async def run():
+        sender = FakeSender()
+        dispatcher = NotificationDispatcher(sender)
+        assert dispatcher.dispatch(_channel("c"), {"n": 0})
+        assert len(dispatcher._direct) == 1
+        await dispatcher.stop()
+        assert sender.sent == [("c", {"n": 0})]
+        assert not dispatcher._direct
+
+    asyncio.run(run())
@@ -0,0 +1,172 @@
+import asyncio
+from app.interface.ws.backplane import Backplane, RedisBackplane
+
+class FakeBroker:
+    """多个进程共用的内存发布订阅, drop_subscriptions模拟Redis断开连接"""
+
+    def __init__(self):
+        self.subscribers = []
+        self.keys = {}
+        self.publish_gate = None
+
+    def drop_subscriptions(self):
+        for queue in self.subscribers:
+            queue.put_nowait(ConnectionError("connection lost"))
+        self.subscribers = []
+
+    def client(self) -> "FakeRedis":
+        return FakeRedis(self)
+
+class FakeRedis:
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+
+    async def publish(self, channel, data):
+        if self.broker.publish_gate:
+            await self.broker.publish_gate.wait()
+        for queue in self.broker.subscribers:
+            queue.put_nowait({"type": "message", "data": data})
+
+    def pubsub(self):
+        return FakePubSub(self.broker)
+
+    async def set(self, key, value, ex=None):
+        self.broker.keys[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.broker.keys.pop(key, None)
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in list(self.broker.keys):
+            if key.startswith(prefix):
+                yield key
+
+    async def close(self):
+        pass
+
+class FakePubSub:
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subscribers.append(self.queue)
+
+    async def listen(self):
+        while True:
+            message = await self.queue.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def close(self):
+        if self.queue in self.broker.subscribers:
+            self.broker.subscribers.remove(self.queue)
+
+def _node(broker: FakeBroker, received: list, **options) -> RedisBackplane:
+    backplane = RedisBackplane("redis://fake", "ws:test", batch_interval=0.005,
+                               redis=broker.client(), **options)
+    backplane.reconnect_delay = 0.01
+
+    async def deliver(payload):
+        received.append(payload)
+    backplane.add_handler("api", deliver)
+    return backplane
+
+async def _until(predicate, timeout: float = 1.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.002)
+
+def test_local_backplane_delivers_by_target():
+    """测试本地总线按target投递, 投递回调出错不影响发布方"""
+    async def run():
+        backplane = Backplane()
+        api, tail = [], []
+
+        async def deliver_api(payload):
+            api.append(payload)
+
+        async def deliver_tail(payload):
+            tail.append(payload)
+            raise RuntimeError("closed socket")
+
+        backplane.add_handler("api", deliver_api)
+        backplane.add_handler("live_tail", deliver_tail)
+        await backplane.publish("api", {"n": 1})
+        await backplane.publish("live_tail", {"n": 2})
+        await backplane.publish("unknown", {"n": 3})
+        assert (api, tail) == ([{"n": 1}], [{"n": 2}])
+
+        backplane.set_presence("live_tail", 1)
+        assert backplane.has_presence("live_tail")
+        backplane.set_presence("live_tail", 0)
+        assert not backplane.has_presence("live_tail")
+
+    asyncio.run(run())
+
+def test_fan_out_to_every_process():
+    """测试一个进程发布的消息按顺序投递到所有进程"""
+    async def run():
+        broker = FakeBroker()
+        received = [[], [], []]
+        nodes = [_node(broker, r) for r in received]
+        for node in nodes:
+            await node.start()
+        await _until(lambda: len(broker.subscribers) == 3)
+
+        for i in range(250):
+            await nodes[0].publish("api", {"n": i})
+        await _until(lambda: all(len(r) == 250 for r in received))
+        assert all([p["n"] for p in r] == list(range(250)) for r in received)
+        assert nodes[0].published == 250
+        for node in nodes:
+            await node.stop()
+
+    asyncio.run(run())
+
+def test_subscription_reconnects_after_connection_loss():
+    """测试订阅连接断开后重新订阅, 之后的广播照常收到"""
+    async def run():
+        broker = FakeBroker()
+        sender_received, received = [], []
+        publisher, subscriber = _node(broker, sender_received), _node(broker, received)
+        await publisher.start()
+        await subscriber.start()
+        await _until(lambda: len(broker.subscribers) == 2)
+
+        broker.drop_subscriptions()
+        await _until(lambda: len(broker.subscribers) == 2)
+        await publisher.publish("api", {"n": 1})
+        await _until(lambda: received == [{"n": 1}])
+        await publisher.stop()
+        await subscriber.stop()
+
+    asyncio.run(run())
+
+def test_pending_messages_bounded():
+    """测试Redis响应慢时积压的消息有上限, 丢弃最旧的并计数"""
+    async def run():
+        broker = FakeBroker()
+        broker.publish_gate = asyncio.Event()
+        received = []
+        node = _node(broker, received, batch_size=10, max_pending=50)
+        await node.start()
+        await _until(lambda: broker.subscribers)
+
+        await node.publish("api", {"n": -1})
+        await asyncio.sleep(0.02)  # 第一批卡在PUBLISH上
+        for i in range(200):
+            await node.publish("api", {"n": i})
+        assert node.get_stats()["pending"] == 50
+        assert node.dropped == 150
+
+        broker.publish_gate.set()
+        await _until(lambda: len(received) == 51)
+        assert [p["n"] for p in received] == [-1] + list(range(150, 200))
+        await node.stop()
+
+    asyncio.run(run())
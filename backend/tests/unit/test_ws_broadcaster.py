@@ -0,0 +1,123 @@
+import asyncio
+import json
+from app.interface.ws.broadcaster import Broadcaster, DeliveryPolicy
+
+class FakeWebSocket:
+    """记录发送内容, gate未放行时send_text阻塞, fail为True时发送失败"""
+
+    def __init__(self, gate: asyncio.Event = None, fail: bool = False):
+        self.gate = gate
+        self.fail = fail
+        self.texts = []
+        self.closed_with = None
+
+    async def send_text(self, text: str) -> None:
+        if self.gate:
+            await self.gate.wait()
+        if self.fail:
+            raise ConnectionError("client went away")
+        self.texts.append(text)
+
+    async def close(self, code: int) -> None:
+        self.closed_with = code
+
+    @property
+    def messages(self):
+        return [json.loads(t) for t in self.texts]
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_fan_out_serializes_once():
+    """测试消息投递给频道内的全部连接或指定目标, 各连接收到同一份文本"""
+    async def run():
+        broadcaster = Broadcaster()
+        broadcaster.add_channel("metrics")
+        broadcaster.add_channel("alerts")
+        a, b, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        broadcaster.register("metrics", a)
+        broadcaster.register("metrics", b)
+        broadcaster.register("alerts", other)
+
+        assert broadcaster.publish("metrics", {"n": 1}) == 2
+        assert broadcaster.publish("metrics", {"n": 2}, targets=[b, other]) == 1
+        await _settle()
+        assert a.messages == [{"n": 1}]
+        assert b.messages == [{"n": 1}, {"n": 2}]
+        assert a.texts[0] is b.texts[0]
+        assert other.texts == []
+
+    asyncio.run(run())
+
+def test_slow_consumer_drops_oldest_without_blocking_others():
+    """测试慢连接只积压并丢弃自己队列中最旧的消息, 不影响其他连接"""
+    async def run():
+        broadcaster = Broadcaster(queue_size=5)
+        broadcaster.add_channel("metrics")
+        gate = asyncio.Event()
+        slow, fast = FakeWebSocket(gate=gate), FakeWebSocket()
+        broadcaster.register("metrics", slow)
+        broadcaster.register("metrics", fast)
+
+        for i in range(20):
+            broadcaster.publish("metrics", {"n": i})
+            await _settle()
+        assert [m["n"] for m in fast.messages] == list(range(20))
+        stats = broadcaster.get_stats()["metrics"]
+        assert stats["max_queue_depth"] == 5
+        assert stats["dropped"] == 14
+
+        gate.set()
+        await _settle()
+        # 卡在发送中的第一条, 之后是队列中最新的5条
+        assert [m["n"] for m in slow.messages] == [0, 15, 16, 17, 18, 19]
+
+    asyncio.run(run())
+
+def test_coalesce_keeps_latest_per_key():
+    """测试合并策略下同一key只保留最新一条, 位置不变"""
+    async def run():
+        broadcaster = Broadcaster()
+        broadcaster.add_channel("metrics", DeliveryPolicy.COALESCE)
+        gate = asyncio.Event()
+        ws = FakeWebSocket(gate=gate)
+        broadcaster.register("metrics", ws)
+
+        broadcaster.publish("metrics", {"server": "warmup"}, key="warmup")
+        await _settle()
+        for value in range(3):
+            broadcaster.publish("metrics", {"server": "s1", "v": value}, key="s1")
+            broadcaster.publish("metrics", {"server": "s2", "v": value}, key="s2")
+        assert broadcaster.get_stats()["metrics"]["coalesced"] == 4
+
+        gate.set()
+        await _settle()
+        assert ws.messages == [
+            {"server": "warmup"}, {"server": "s1", "v": 2}, {"server": "s2", "v": 2}
+        ]
+
+    asyncio.run(run())
+
+def test_failed_client_removed_and_stats_kept():
+    """测试发送失败的连接被移除, 其统计计入频道总数"""
+    async def run():
+        broadcaster = Broadcaster()
+        broadcaster.add_channel("alerts")
+        ok, broken = FakeWebSocket(), FakeWebSocket(fail=True)
+        broadcaster.register("alerts", ok)
+        broadcaster.register("alerts", broken)
+
+        broadcaster.publish("alerts", {"n": 1})
+        await _settle()
+        assert broadcaster.channel_of(broken) is None
+        assert broadcaster.publish("alerts", {"n": 2}) == 1
+        await _settle()
+        stats = broadcaster.get_stats()["alerts"]
+        assert (stats["clients"], stats["sent"]) == (1, 2)
+
+        await broadcaster.close_all()
+        assert ok.closed_with == 1001
+        assert broadcaster.get_stats()["alerts"]["clients"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import random
+import pytest
+from app.interface.ws.manager import TOPIC_FIELDS, SubscriptionIndex
+
+class Socket:
+    """只用作索引键的连接"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+def test_unrestricted_fields_match_everything():
+    """测试未订阅的维度接收全部, 已订阅的维度只接收订阅的取值"""
+    index = SubscriptionIndex()
+    everything, project, server = Socket("everything"), Socket("project"), Socket("server")
+    index.add(everything)
+    index.subscribe(project, project_id="p1")
+    index.subscribe(server, project_id="p1", server_id=["s1", "s2"])
+
+    assert index.match() == {everything, project, server}
+    assert index.match(project_id="p1", server_id="s1") == {everything, project, server}
+    assert index.match(project_id="p1", server_id="s3") == {everything, project}
+    assert index.match(project_id="p2") == {everything}
+    # 消息未携带的维度不参与过滤, 多个取值命中其一即可
+    assert index.match(server_id="s9") == {everything, project}
+    assert index.match(server_id=["s9", "s2"]) == {everything, project, server}
+
+    with pytest.raises(ValueError):
+        index.match(rack="r1")
+
+def test_unsubscribe_and_remove():
+    """测试取消全部取值后恢复接收全部, 移除连接后不再匹配且不残留索引"""
+    index = SubscriptionIndex()
+    ws = Socket("ws")
+    index.subscribe(ws, metric_type=["cpu", "memory"], source="nginx")
+    assert index.subscriptions(ws) == {"metric_type": ["cpu", "memory"], "source": ["nginx"]}
+
+    index.unsubscribe(ws, metric_type="cpu")
+    assert index.match(metric_type="cpu") == set()
+    index.unsubscribe(ws, metric_type="memory")
+    assert index.match(metric_type="cpu", source="nginx") == {ws}
+    assert index.match(source="syslog") == set()
+
+    index.unsubscribe(ws)
+    assert index.subscriptions(ws) == {}
+    assert index.match(source="syslog") == {ws}
+
+    index.subscribe(ws, server_id="s1")
+    index.remove(ws)
+    assert ws not in index
+    assert len(index) == 0
+    assert index.match(server_id="s1") == set()
+    assert all(not values for values in index._index.values())
+    assert all(not sockets for sockets in index._any.values())
+
+def test_match_agrees_with_linear_scan():
+    """测试随机订阅下索引匹配与逐个连接检查的结果一致"""
+    rng = random.Random(7)
+    values = {field: [f"{field}-{i}" for i in range(4)] for field in TOPIC_FIELDS}
+    index = SubscriptionIndex()
+    sockets = [Socket(f"ws{i}") for i in range(60)]
+    for ws in sockets:
+        index.add(ws)
+        for field in TOPIC_FIELDS:
+            if rng.random() < 0.5:
+                index.subscribe(ws, **{field: rng.sample(values[field], rng.randint(1, 2))})
+    for ws in rng.sample(sockets, 10):
+        index.remove(ws)
+    for ws in rng.sample(sockets, 10):
+        index.unsubscribe(ws, project_id=values["project_id"][0])
+
+    def expected(topics):
+        result = set()
+        for ws in sockets:
+            if ws not in index:
+                continue
+            subs = index.subscriptions(ws)
+            if all(field not in subs or set(subs[field]) & set(vals) for field, vals in topics.items()):
+                result.add(ws)
+        return result
+
+    for _ in range(200):
+        topics = {
+            field: rng.sample(values[field], rng.randint(1, 2))
+            for field in rng.sample(TOPIC_FIELDS, rng.randint(1, len(TOPIC_FIELDS)))
+        }
+        assert index.match(**topics) == expected(topics)